@@ -0,0 +1,427 @@
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+
+from models.database import db, DifficultyLevel, GeneratedSet, ProblemSet, Provider
+from providers import LLMProvider
+from utils.answer_verifier import WRONG, AnswerVerifier
+from utils.blob_store import file_digest
+from utils.cancellation import CancelToken, CancelledError, cancellation_scope, check_cancelled
+from utils.latex_compiler import LatexCompiler
+from utils.latex_parser import format_list, parse_problems, parse_solutions
+from utils.metrics import ANSWER_CHECKS, DUPLICATE_PROBLEMS, span
+from utils import problem_bank
+from utils.problem_bank import DuplicateCheck
+from utils.problem_generator import SOLUTIONS_PREAMBLE, ProblemGenerator, challenge_count
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Concurrent requests for the same PDF share one compile
+_compile_flight = SingleFlight()
+
+def compile_latex(latex: str, pdf_path: str, compiler: LatexCompiler) -> str:
+    """
+    Compile a LaTeX document to the given PDF path.
+
+    The PDF is built in a scratch directory next to its destination and moved
+    into place atomically, so readers never see a partially written file.
+
+    Args:
+        latex: Complete LaTeX document
+        pdf_path: Where the PDF should end up
+        compiler: Compiler used to build the PDF
+
+    Returns:
+        str: pdf_path
+    """
+    output_dir = os.path.dirname(pdf_path)
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+    
+    with span('pdf.compile', document=name), tempfile.TemporaryDirectory(dir=output_dir) as scratch_dir:
+        tex_file = os.path.join(scratch_dir, f'{name}.tex')
+        with open(tex_file, 'w') as f:
+            f.write(latex)
+        compiled = compiler.compile_to_pdf(tex_file, scratch_dir)
+        os.replace(compiled, pdf_path)
+        
+    return pdf_path
+
+def ensure_pdf(generated_set: GeneratedSet, kind: str, compiler_factory=None) -> str:
+    """
+    Make sure the problems or solutions PDF of a generated set is compiled.
+
+    PDFs that have not been compiled yet (no hash on the row) are built from
+    the stored LaTeX. Concurrent callers in this process share one build, and
+    a lock file next to the PDF keeps other worker processes from building
+    it again. The content hash and size are then recorded on the row.
+
+    Args:
+        generated_set: The generated set to compile
+        kind: 'problems' or 'solutions'
+        compiler_factory: Callable returning a compiler (default: LatexCompiler)
+
+    Returns:
+        str: Path to the compiled PDF
+    """
+    pdf_path = getattr(generated_set, f'{kind}_pdf_path')
+    if getattr(generated_set, f'{kind}_pdf_hash'):
+        return pdf_path
+        
+    compiler_factory = compiler_factory or LatexCompiler
+    
+    def build():
+        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        with open(pdf_path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another process may have finished the build while we waited
+                if not os.path.exists(pdf_path):
+                    compile_latex(getattr(generated_set, f'{kind}_latex'), pdf_path, compiler_factory())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        try:
+            os.remove(pdf_path + '.lock')
+        except FileNotFoundError:
+            pass
+        return file_digest(pdf_path)
+        
+    digest = _compile_flight.do(pdf_path, build)
+    setattr(generated_set, f'{kind}_pdf_hash', digest)
+    setattr(generated_set, f'{kind}_pdf_size', os.path.getsize(pdf_path))
+    db.session.commit()
+    return pdf_path
+
+def _report(progress: Optional[Callable], message: str, percent: Optional[int] = None) -> None:
+    # Every step boundary is also a cancellation point
+    check_cancelled()
+    if progress:
+        progress(message, percent)
+
+def convert_pdf(pdf_path: str, provider: LLMProvider, progress: Optional[Callable] = None,
+                cancel_token: Optional[CancelToken] = None) -> str:
+    """
+    Extract a LaTeX template from an uploaded PDF.
+
+    Args:
+        pdf_path: The uploaded PDF
+        provider: LLM provider doing the conversion
+        progress: Called with (message, percent) as the conversion advances
+        cancel_token: Cancels the conversion, aborting the provider request
+
+    Returns:
+        str: The LaTeX template
+    """
+    from math_latex import MathLatexConverter
+    with cancellation_scope(cancel_token):
+        _report(progress, "Initializing LaTeX converter...", 60)
+        converter = MathLatexConverter(provider)
+        _report(progress, "Converting PDF to LaTeX...", 70)
+        latex_template = converter.convert_to_latex(pdf_path)
+        _report(progress, "LaTeX extracted successfully", 80)
+        return latex_template
+
+def run_generation(problem_set: ProblemSet, provider_name: str, difficulty: str, num_problems: int,
+                   provider: LLMProvider, compiler, output_dir: str, lazy_compile: bool = False,
+                   progress: Optional[Callable] = None, cancel_token: Optional[CancelToken] = None,
+                   pooled: bool = False, mode: str = 'generate', query: Optional[str] = None,
+                   duplicate_check: Optional[DuplicateCheck] = None,
+                   answer_verifier: Optional[AnswerVerifier] = None) -> GeneratedSet:
+    """
+    Generate a new problem set and its solutions from a problem set's template.
+
+    Runs the whole pipeline: problems, solutions, PDF compilation (unless
+    deferred to the first download) and the database row. Used both by the
+    web process and by background workers. The problems and solutions are
+    added to the problem bank and marked seen by the problem set's owner;
+    those of pooled sets only once the set is claimed.
+
+    Args:
+        problem_set: Problem set whose template is the model for the new problems
+        provider_name: 'claude' or 'gemini', as recorded on the generated set
+        difficulty: 'same', 'challenge' or 'harder'
+        num_problems: Number of problems to generate
+        provider: LLM provider used for generation
+        compiler: LaTeX compiler for the PDFs
+        output_dir: Fresh directory for the PDFs
+        lazy_compile: Only store the LaTeX and compile each PDF on first download
+        progress: Called with (message, percent) after each step
+        cancel_token: Cancels the run; stages still to come are skipped, provider
+            requests and compiles in flight are aborted and nothing is saved
+        pooled: Save the set into the pre-generation pool instead of handing it out
+        mode: 'generate' asks the LLM for every problem; 'assemble' draws problems the
+            owner has not seen from the bank and only generates the shortfall
+        query: In assemble mode, only draw banked problems matching this full-text query
+        duplicate_check: Checks generated problems for near-duplicates before their
+            solutions are generated, replacing or flagging them
+        answer_verifier: Checks the boxed answers of the generated solutions,
+            regenerating or flagging wrong ones
+
+    Returns:
+        GeneratedSet: The committed generated set
+
+    Raises:
+        CancelledError: If the run was cancelled
+    """
+    with cancellation_scope(cancel_token):
+        try:
+            return _generate(problem_set, provider_name, difficulty, num_problems, provider, compiler,
+                             output_dir, lazy_compile, progress, pooled, mode, query, duplicate_check,
+                             answer_verifier)
+        except CancelledError:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise
+
+def _generate(problem_set: ProblemSet, provider_name: str, difficulty: str, num_problems: int,
+              provider: LLMProvider, compiler, output_dir: str, lazy_compile: bool,
+              progress: Optional[Callable], pooled: bool, mode: str, query: Optional[str],
+              duplicate_check: Optional[DuplicateCheck],
+              answer_verifier: Optional[AnswerVerifier]) -> GeneratedSet:
+    generator = ProblemGenerator(provider, latex_compiler=compiler)
+    if answer_verifier:
+        # The checking processes start while the LLM writes the problems
+        answer_verifier.start()
+    
+    if mode == 'assemble':
+        problems, solutions, duplicates, wrong_answers = _assemble(
+            problem_set, difficulty, num_problems, generator, progress, query, duplicate_check, answer_verifier)
+    else:
+        problems, solutions, duplicates, wrong_answers = _generate_latex(
+            problem_set, difficulty, num_problems, generator, progress, duplicate_check, answer_verifier)
+    problems_latex = generator.latex_document(problems, "Problems")
+    solutions_latex = generator.latex_document(solutions, "Solutions")
+    
+    problems_pdf = os.path.join(output_dir, 'problems.pdf')
+    solutions_pdf = os.path.join(output_dir, 'solutions.pdf')
+    problems_pdf_hash = solutions_pdf_hash = None
+    problems_pdf_size = solutions_pdf_size = None
+    
+    # With lazy compilation the PDFs are built on first download instead
+    if not lazy_compile:
+        # Step 3: Compile problems PDF
+        _report(progress, "Compiling problems PDF...")
+        compile_latex(problems_latex, problems_pdf, compiler)
+        problems_pdf_hash = file_digest(problems_pdf)
+        problems_pdf_size = os.path.getsize(problems_pdf)
+        
+        # Step 4: Compile solutions PDF
+        _report(progress, "Compiling solutions PDF...")
+        compile_latex(solutions_latex, solutions_pdf, compiler)
+        solutions_pdf_hash = file_digest(solutions_pdf)
+        solutions_pdf_size = os.path.getsize(solutions_pdf)
+    
+    _report(progress, "Generation complete!")
+    
+    generated_set = GeneratedSet(
+        problem_set_id=problem_set.id,
+        provider=Provider[provider_name.upper()],
+        difficulty=DifficultyLevel[difficulty.upper()],
+        num_problems=num_problems,
+        problems_pdf_path=problems_pdf,
+        solutions_pdf_path=solutions_pdf,
+        problems_pdf_hash=problems_pdf_hash,
+        solutions_pdf_hash=solutions_pdf_hash,
+        problems_pdf_size=problems_pdf_size,
+        solutions_pdf_size=solutions_pdf_size,
+        problems_latex=problems_latex,
+        solutions_latex=solutions_latex,
+        pooled=pooled,
+        pooled_at=datetime.utcnow() if pooled else None,
+        duplicate_problems=duplicates,
+        wrong_answers=wrong_answers
+    )
+    
+    check_cancelled()
+    with span('db.commit'):
+        db.session.add(generated_set)
+        db.session.commit()
+    
+    try:
+        with span('bank.add'):
+            problem_bank.bank_set(problem_set.latex_template_hash, provider_name, difficulty, problems, solutions,
+                                  problem_set.user_id, generated_set.id, seen=not pooled)
+    except Exception as e:
+        # The set is already saved; the bank only loses these problems
+        db.session.rollback()
+        logger.error(f"Error banking generated set {generated_set.id}: {str(e)}")
+    return generated_set
+
+def _generate_latex(problem_set: ProblemSet, difficulty: str, num_problems: int, generator: ProblemGenerator,
+                    progress: Optional[Callable], duplicate_check: Optional[DuplicateCheck],
+                    answer_verifier: Optional[AnswerVerifier]) -> Tuple[str, str, Optional[int], Optional[int]]:
+    # Step 1: Generate problems from the template, written to a scratch file
+    _report(progress, "Generating problems...")
+    duplicates = None
+    with tempfile.NamedTemporaryFile(suffix='.tex', mode='w') as template_file:
+        template_file.write(problem_set.latex_template)
+        template_file.flush()
+        problems = generator.generate_problems(template_file.name, difficulty, num_problems)
+        if duplicate_check:
+            with span('generator.dedup'):
+                problems, duplicates = _replace_duplicates(problem_set, template_file.name, difficulty, problems,
+                                                           generator, progress, duplicate_check)
+    
+    # Step 2: Generate solutions
+    _report(progress, "Generating solutions...")
+    solutions = generator.generate_solutions(problems)
+    wrong_answers = None
+    if answer_verifier:
+        with span('generator.verify'):
+            solutions, wrong_answers = _regenerate_wrong_answers(problems, solutions, generator, progress,
+                                                                 answer_verifier)
+    return problems, solutions, duplicates, wrong_answers
+
+def _replace_duplicates(problem_set: ProblemSet, template_file: str, difficulty: str, problems: str,
+                        generator: ProblemGenerator, progress: Optional[Callable],
+                        duplicate_check: DuplicateCheck) -> Tuple[str, Optional[int]]:
+    """Regenerate near-duplicate problems, before any solutions are paid for.
+
+    Returns:
+        The problems and the number of duplicates left in them, or None if
+        the output could not be split into problems
+    """
+    items = problem_bank.split_problems(problems)
+    if not items:
+        return problems, None
+    duplicates = duplicate_check.find(problem_set.user_id, problem_set.latex_template_hash, items)
+    replaced = 0
+    rounds = 0
+    while duplicates and duplicate_check.replace and rounds < duplicate_check.max_rounds:
+        rounds += 1
+        _report(progress, f"Replacing {len(duplicates)} near-duplicate problems...")
+        fresh = problem_bank.split_problems(generator.generate_problems(template_file, difficulty, len(duplicates)))
+        for position, item in zip(sorted(duplicates), fresh):
+            items[position] = item
+            replaced += 1
+        duplicates = duplicate_check.find(problem_set.user_id, problem_set.latex_template_hash, items)
+    if replaced:
+        DUPLICATE_PROBLEMS.labels(outcome='replaced').inc(replaced)
+        problems = format_list(items)
+    if duplicates:
+        DUPLICATE_PROBLEMS.labels(outcome='kept').inc(len(duplicates))
+        logger.warning(f"Keeping {len(duplicates)} near-duplicate problems for problem set {problem_set.id}")
+    return problems, len(duplicates)
+
+def _regenerate_wrong_answers(problems: str, solutions: str, generator: ProblemGenerator,
+                              progress: Optional[Callable],
+                              answer_verifier: AnswerVerifier) -> Tuple[str, Optional[int]]:
+    """Check the boxed answers locally and ask again only for the solutions that got them wrong.
+
+    Returns:
+        The solutions and the number of wrong answers left in them, or None
+        if problems and solutions could not be paired up
+    """
+    problem_items = parse_problems(problems).items
+    document = parse_solutions(solutions)
+    if not problem_items or len(problem_items) != len(document.items):
+        logger.info(f"Not checking answers: {len(problem_items)} problems but {len(document.items)} solutions")
+        return solutions, None
+    _report(progress, "Checking answers...")
+    verdicts = answer_verifier.verify(problem_items, document.items)
+    rounds = 0
+    while WRONG in verdicts and answer_verifier.regenerate and rounds < answer_verifier.max_rounds:
+        rounds += 1
+        wrong = [position for position, verdict in enumerate(verdicts) if verdict == WRONG]
+        _report(progress, f"Regenerating {len(wrong)} solutions with wrong answers...")
+        fresh = parse_solutions(generator.generate_solutions(
+            format_list(problem_items[position].latex for position in wrong))).items
+        if len(fresh) != len(wrong):
+            logger.warning(f"Regenerated {len(fresh)} solutions for {len(wrong)} problems; keeping the old ones")
+            break
+        for position, item, verdict in zip(wrong, fresh, answer_verifier.verify(
+                [problem_items[position] for position in wrong], fresh)):
+            document.items[position] = item
+            verdicts[position] = verdict
+        solutions = document.to_latex()
+    for verdict in verdicts:
+        ANSWER_CHECKS.labels(verdict=verdict).inc()
+    wrong_answers = verdicts.count(WRONG)
+    if wrong_answers:
+        logger.warning(f"Keeping {wrong_answers} solutions whose answers failed the check")
+    return solutions, wrong_answers
+
+def _assemble(problem_set: ProblemSet, difficulty: str, num_problems: int, generator: ProblemGenerator,
+              progress: Optional[Callable], query: Optional[str], duplicate_check: Optional[DuplicateCheck],
+              answer_verifier: Optional[AnswerVerifier]) -> Tuple[str, str, Optional[int], Optional[int]]:
+    _report(progress, "Assembling problems from the bank...")
+    num_challenging = challenge_count(difficulty, num_problems)
+    rows = []
+    with span('bank.draw', num_problems=num_problems):
+        wanted = [(False, num_problems - num_challenging), (True, num_challenging)]
+        # Then make up a shortage of one kind with the other before paying for generation
+        wanted += [(False, None), (True, None)]
+        for challenge, count in wanted:
+            rows += problem_bank.draw(problem_set.user_id, problem_set.latex_template_hash, challenge,
+                                      num_problems - len(rows) if count is None else count, query,
+                                      exclude=[row.id for row in rows])
+    problems, solutions = problem_bank.assemble(rows)
+    
+    shortfall = num_problems - len(rows)
+    if not shortfall:
+        # Banked problems are unseen, but may still repeat each other
+        return problems, SOLUTIONS_PREAMBLE + "\n" + solutions, None, None
+    
+    # Banked answers were checked when they were generated; only the new ones are
+    logger.info(f"Bank had {len(rows)} of {num_problems} unseen problems; generating {shortfall}")
+    new_problems, new_solutions, duplicates, wrong_answers = _generate_latex(
+        problem_set, difficulty, shortfall, generator, progress, duplicate_check, answer_verifier)
+    if not rows:
+        return new_problems, new_solutions, duplicates, wrong_answers
+    new_items = problem_bank.split_problems(new_problems)
+    if not new_items:
+        # Output that cannot be split is kept as it is, ahead of a list of the banked problems
+        return (new_problems + "\n" + problems, new_solutions.rstrip() + "\n\n" + solutions,
+                duplicates, wrong_answers)
+    # Fresh problems come first so their solutions, preamble included, stay in front
+    items = new_items + [row.problem_latex for row in rows]
+    problems = format_list(items)
+    return problems, new_solutions.rstrip() + "\n\n" + solutions, duplicates, wrong_answers
+
+
+def generation_key(problem_set: ProblemSet, provider_name: str, difficulty: str, num_problems: int) -> str:
+    """Identify generation requests that would run the same pipeline on the same input."""
+    raw = f"{problem_set.latex_template_hash}|{provider_name.lower()}|{difficulty.lower()}|{num_problems}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def copy_generated_set(generated_set: GeneratedSet, problem_set: ProblemSet, output_dir: str) -> GeneratedSet:
+    """
+    Give another problem set its own copy of a shared generation result.
+
+    The LaTeX blobs are shared by hash; compiled PDFs are copied so each row
+    owns its files and can be evicted or deleted on its own.
+
+    Args:
+        generated_set: The result to copy
+        problem_set: Problem set the copy belongs to
+        output_dir: Fresh directory for the copied PDFs
+
+    Returns:
+        GeneratedSet: The committed copy
+    """
+    copy = GeneratedSet(
+        problem_set_id=problem_set.id,
+        provider=generated_set.provider,
+        difficulty=generated_set.difficulty,
+        num_problems=generated_set.num_problems,
+        problems_latex_hash=generated_set.problems_latex_hash,
+        problems_latex_size=generated_set.problems_latex_size,
+        solutions_latex_hash=generated_set.solutions_latex_hash,
+        solutions_latex_size=generated_set.solutions_latex_size
+    )
+    for kind in ('problems', 'solutions'):
+        source = getattr(generated_set, f'{kind}_pdf_path')
+        target = os.path.join(output_dir, os.path.basename(source))
+        setattr(copy, f'{kind}_pdf_path', target)
+        if getattr(generated_set, f'{kind}_pdf_hash') and os.path.exists(source):
+            shutil.copyfile(source, target)
+            setattr(copy, f'{kind}_pdf_hash', getattr(generated_set, f'{kind}_pdf_hash'))
+            setattr(copy, f'{kind}_pdf_size', os.path.getsize(target))
+    db.session.add(copy)
+    db.session.commit()
+    return copy
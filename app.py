@@ -1,20 +1,36 @@
-from flask import Flask, request, jsonify, send_file, Response, stream_with_context
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, decode_token
-from flask_bcrypt import Bcrypt
-from flask_migrate import Migrate
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
+from urllib.parse import quote
+from werkzeug.utils import secure_filename
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, decode_token, verify_jwt_in_request
 from flask_cors import CORS
+import click
 from datetime import datetime, timedelta
 import os
 import traceback
 import logging
-import tempfile
 import queue
 import threading
+import time
 import json
+import base64
+import hashlib
+import random
 
 from config import Config
-from models.database import db, User, ProblemSet, GeneratedSet, DifficultyLevel, Provider
-from utils.problem_generator import ProblemGenerator
+from models.database import db, User, ProblemSet, GeneratedSet, DifficultyLevel, Provider, Job, JobKind
+from utils.blob_store import create_blob_store, get_default_blob_store, set_default_blob_store
+from utils.password_hasher import PasswordHasher, HasherBusyError
+from utils.zip_stream import ZipEntry, ZipStream
+from utils.storage import StorageGarbageCollector, new_storage_dir, run_locked, storage_usage
+from utils import generation_pool, job_queue
+from utils.cancellation import CancellationRegistry, CancelToken, CancelledError
+from utils.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_DURATION, SSE_CONNECTIONS, end_span, metrics_response, span, start_span
+from utils.profiler import Profile, ProfileStore, SamplingProfiler, propagate
+from utils.answer_verifier import AnswerVerifier
+from utils.problem_bank import DuplicateCheck
+from utils.single_flight import SingleFlight
+from utils.latex_compiler import LatexCompiler
+from api.service import convert_pdf, copy_generated_set, ensure_pdf, generation_key, run_generation
 from providers.claude_provider import ClaudeProvider
 from providers.gemini_provider import GeminiProvider
 
@@ -29,16 +45,27 @@ logging.basicConfig(
 
 # Initialize extensions
 db.init_app(app)
+set_default_blob_store(create_blob_store(app.config))
 jwt = JWTManager(app)
-bcrypt = Bcrypt(app)
-migrate = Migrate(app, db)
+password_hasher = PasswordHasher(
+    rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    max_workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_QUEUE_SIZE'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+    retry_after=app.config['PASSWORD_HASH_RETRY_AFTER']
+)
+if click.get_current_context(silent=True) is not None:
+    # Only the 'flask db' commands need Flask-Migrate, and importing it (and
+    # alembic) would add most of a second to every web and worker start
+    from flask_migrate import Migrate
+    Migrate(app, db)
 
 # Configure CORS with more permissive settings for development
 CORS(app, 
      origins=["http://localhost:3000"],
      supports_credentials=True,
-     allow_headers=["Content-Type", "Authorization"],
-     expose_headers=["Content-Type", "Authorization"],
+     allow_headers=["Content-Type", "Authorization", "X-Profile"],
+     expose_headers=["Content-Type", "Authorization", "X-Next-Cursor", "ETag", "Content-Range", "Accept-Ranges", "X-Profile-Id"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
 # JWT configuration
@@ -47,16 +74,297 @@ app.config['JWT_TOKEN_LOCATION'] = ['headers']
 app.config['JWT_HEADER_NAME'] = 'Authorization'
 app.config['JWT_HEADER_TYPE'] = 'Bearer'
 
-# Create tables
-with app.app_context():
-    db.create_all()
-
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+def get_provider(name: str):
+    """Create the LLM provider for 'claude' or 'gemini', honouring PROVIDER_FACTORY."""
+    factory = app.config['PROVIDER_FACTORY']
+    if factory:
+        return factory(name)
+    return ClaudeProvider() if name == 'claude' else GeminiProvider()
+
+def get_latex_compiler():
+    """Create a LaTeX compiler, honouring LATEX_COMPILER_FACTORY."""
+    factory = app.config['LATEX_COMPILER_FACTORY']
+    return factory() if factory else LatexCompiler()
+
+def get_duplicate_check():
+    """Create the near-duplicate check for new sets, or None when DEDUP_MODE is 'off'."""
+    mode = app.config['DEDUP_MODE']
+    if mode == 'off':
+        return None
+    return DuplicateCheck(threshold=app.config['DEDUP_THRESHOLD'], replace=mode == 'replace',
+                          max_rounds=app.config['DEDUP_MAX_ROUNDS'])
+
+def get_answer_verifier():
+    """Create the answer check for new sets, or None when ANSWER_CHECK_MODE is 'off'."""
+    mode = app.config['ANSWER_CHECK_MODE']
+    if mode == 'off':
+        return None
+    return AnswerVerifier(processes=app.config['ANSWER_CHECK_PROCESSES'], timeout=app.config['ANSWER_CHECK_TIMEOUT'],
+                          regenerate=mode == 'regenerate', max_rounds=app.config['ANSWER_CHECK_MAX_ROUNDS'])
+
+def over_quota(user_id: int) -> bool:
+    """Check whether a user has used up their storage quota."""
+    quota = app.config['USER_STORAGE_QUOTA_BYTES']
+    return bool(quota) and storage_usage(user_id) >= quota
+
+def create_storage_gc() -> StorageGarbageCollector:
+    # Reusing an existing blob only refreshes its timestamp on local disk, so
+    # orphaned blobs are only collected for the local backend
+    collect_blobs = app.config['BLOB_STORE_BACKEND'] == 'local'
+    return StorageGarbageCollector(
+        app.config['UPLOAD_FOLDER'],
+        blob_store=get_default_blob_store() if collect_blobs else None,
+        grace_period=app.config['STORAGE_GC_GRACE_PERIOD'],
+        retention_days=app.config['GENERATED_PDF_RETENTION_DAYS'],
+        user_quota_bytes=app.config['USER_STORAGE_QUOTA_BYTES']
+    )
+
+def run_storage_gc():
+    """Run one garbage collection pass unless another worker is running one."""
+    lock_path = os.path.join(app.config['UPLOAD_FOLDER'], '.storage_gc.lock')
+    with app.app_context():
+        report = run_locked(create_storage_gc(), lock_path)
+    if report:
+        app.logger.info(f"Storage GC reclaimed {report['bytes_reclaimed']} bytes: {report}")
+    return report
+
+storage_gc_started = False
+storage_gc_lock = threading.Lock()
+
+@app.before_request
+def start_storage_gc():
+    """Start the periodic storage collector with the first request this worker serves."""
+    global storage_gc_started
+    interval = app.config['STORAGE_GC_INTERVAL']
+    if storage_gc_started or not interval or app.testing:
+        return
+    with storage_gc_lock:
+        if storage_gc_started:
+            return
+        storage_gc_started = True
+        
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_storage_gc()
+            except Exception as e:
+                app.logger.error(f"Storage GC error: {str(e)}")
+                
+    threading.Thread(target=loop, name='storage-gc', daemon=True).start()
+
+def pregenerate(demand) -> GeneratedSet:
+    """Generate one set into the pool for a demand row's settings."""
+    problem_set = db.session.get(ProblemSet, demand.problem_set_id)
+    if not problem_set or not problem_set.latex_template_hash:
+        raise LookupError(f"Problem set {demand.problem_set_id} has no LaTeX template")
+    return run_generation(
+        problem_set, demand.provider, demand.difficulty, demand.num_problems,
+        get_provider(demand.provider), get_latex_compiler(),
+        output_dir=new_storage_dir(app.config['UPLOAD_FOLDER'], 'generated'),
+        lazy_compile=app.config['LAZY_PDF_COMPILE'],
+        pooled=True,
+        duplicate_check=get_duplicate_check(),
+        answer_verifier=get_answer_verifier()
+    )
+
+def generation_idle() -> bool:
+    """Check that no user is waiting on a generation the pool refill would compete with."""
+    if app.config['GENERATION_MODE'] == 'queue':
+        return not job_queue.pending()
+    return not cancellations.active()
+
+def create_pool_refiller() -> generation_pool.PoolRefiller:
+    return generation_pool.PoolRefiller(
+        pregenerate,
+        pool_size=app.config['POOL_SIZE'],
+        min_demand=app.config['POOL_MIN_DEMAND'],
+        half_life=app.config['POOL_DEMAND_HALF_LIFE'],
+        daily_budget=app.config['POOL_DAILY_BUDGET'],
+        max_age_days=app.config['POOL_MAX_AGE_DAYS'],
+        is_idle=generation_idle
+    )
+
+def run_pool_refill():
+    """Run one pool refill pass unless another process is running one."""
+    if not app.config['POOL_SIZE']:
+        return None
+    lock_path = os.path.join(app.config['UPLOAD_FOLDER'], '.pool_refill.lock')
+    with app.app_context():
+        return run_locked(create_pool_refiller(), lock_path)
+
+pool_refill_started = False
+pool_refill_lock = threading.Lock()
+pool_refill_wakeup = threading.Event()
+
+def start_pool_refill():
+    """Wake the web process's pool refill, starting it the first time.
+
+    With GENERATION_MODE=queue the workers refill the pool between jobs instead.
+    """
+    global pool_refill_started
+    if not app.config['POOL_SIZE'] or app.config['GENERATION_MODE'] == 'queue' or app.testing:
+        return
+    with pool_refill_lock:
+        start = not pool_refill_started
+        pool_refill_started = True
+        
+    def loop():
+        while True:
+            pool_refill_wakeup.wait(app.config['POOL_REFILL_INTERVAL'])
+            pool_refill_wakeup.clear()
+            try:
+                run_pool_refill()
+            except Exception as e:
+                app.logger.error(f"Pool refill error: {str(e)}")
+                
+    if start:
+        threading.Thread(target=loop, name='pool-refill', daemon=True).start()
+    pool_refill_wakeup.set()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create any missing tables; use 'flask db upgrade' for databases managed by migrations."""
+    db.create_all()
+    print("Database tables created")
+
+@app.cli.command('storage-gc')
+def storage_gc_command():
+    """Remove orphaned files and blobs and enforce retention and quotas."""
+    report = run_storage_gc()
+    if report is None:
+        print("Another storage GC run is in progress")
+    else:
+        print(json.dumps(report, indent=2))
+
+@app.cli.command('pool-refill')
+def pool_refill_command():
+    """Top up the pre-generation pool for popular problem sets."""
+    report = run_pool_refill()
+    if report is None:
+        print("The pool is disabled or another refill is in progress")
+    else:
+        print(json.dumps(report, indent=2))
+
+@app.before_request
+def start_request_metrics():
+    """Open the root span of the request; stage spans started by the view nest under it."""
+    HTTP_IN_FLIGHT.inc()
+    g.request_start = time.perf_counter()
+    g.request_span = start_span('http.request', method=request.method, path=request.path)
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    # Streamed responses can tear the request down more than once
+    if 'request_start' not in g:
+        return
+    request_start = g.pop('request_start')
+    HTTP_IN_FLIGHT.dec()
+    status = 500 if error else g.get('response_status', 500)
+    # Label by route pattern, not path, to keep the number of series bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_DURATION.labels(method=request.method, endpoint=endpoint, status=status).observe(
+        time.perf_counter() - request_start)
+    request_span, token = g.pop('request_span')
+    request_span.set(status=status)
+    end_span(request_span, token, error)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, aggregated across worker processes."""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Unauthorized'}), 401
+    body, content_type = metrics_response()
+    return Response(body, content_type=content_type)
+
+profiler = SamplingProfiler(interval=app.config['PROFILE_INTERVAL'])
+
+def is_admin() -> bool:
+    """Check whether the request carries a valid token for a user listed in ADMIN_EMAILS."""
+    admins = app.config['ADMIN_EMAILS']
+    if not admins:
+        return False
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return False
+    if identity is None:
+        return False
+    user = db.session.get(User, int(identity))
+    return bool(user) and user.email.lower() in admins
+
+def profile_store() -> ProfileStore:
+    return ProfileStore(app.config['PROFILE_DIR'], max_profiles=app.config['PROFILE_MAX_COUNT'])
+
+@app.before_request
+def start_request_profile():
+    """Profile the request when an admin asks for it or it falls in the sampled fraction."""
+    requested = request.headers.get('X-Profile') == '1'
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    sampled = rate > 0 and random.random() < rate
+    if not requested and not sampled:
+        return
+    if requested and not sampled and not is_admin():
+        return
+    profile = Profile(f"{request.method} {request.path}", method=request.method, path=request.path,
+                      trigger='header' if requested else 'sampled')
+    g.request_profile = (profile, profiler.start(profile))
+    g.request_span[0].set(profile_id=profile.id)
+
+@app.after_request
+def add_profile_header(response):
+    if 'request_profile' in g:
+        response.headers['X-Profile-Id'] = g.request_profile[0].id
+    return response
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    # Streamed responses can tear the request down more than once
+    if 'request_profile' not in g:
+        return
+    profile, token = g.pop('request_profile')
+    profiler.stop(profile, token)
+    profile.metadata['status'] = 500 if error else g.get('response_status', 500)
+    try:
+        profile_store().save(profile)
+    except OSError as e:
+        app.logger.error(f"Error saving profile {profile.id}: {str(e)}")
+
+@app.route('/api/admin/profiles')
+@jwt_required()
+def list_profiles():
+    """List stored request profiles, newest first."""
+    if not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify({'profiles': profile_store().list()})
+
+@app.route('/api/admin/profiles/<profile_id>')
+@jwt_required()
+def download_profile(profile_id):
+    """Download a profile as folded stacks, for flamegraph.pl or speedscope."""
+    if not is_admin():
+        return jsonify({'error': 'Admin access required'}), 403
+    path = profile_store().get(profile_id)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=f"{profile_id}.folded")
+
 # Progress queue for SSE
 progress_queues = {}
 
+# In-flight inline work by user, cancelled on request or when nobody is watching
+cancellations = CancellationRegistry(grace_period=app.config['CANCEL_GRACE_PERIOD'])
+
 def send_progress(user_id: int, message: str, progress: int = None):
     """Send a progress message to the user's queue."""
     app.logger.info(f"Sending progress for user {user_id}: {message}")
@@ -83,6 +391,9 @@ def events():
         decoded_token = decode_token(token)
         user_id = int(decoded_token['sub'])
         app.logger.info(f"SSE connection established for user {user_id}")
+        # Generations run under the problem set they are for, uploads under None;
+        # a stream only keeps alive the work of the set it follows
+        watched = (user_id, request.args.get('problem_set', type=int))
         
         # Create queue for this user if it doesn't exist
         if user_id not in progress_queues:
@@ -96,11 +407,15 @@ def events():
         
         def generate():
             app.logger.info(f"Starting event stream for user {user_id}")
+            SSE_CONNECTIONS.inc()
+            cancellations.subscribe(watched)
             try:
+                # SSE comment so the response headers go out before the first message
+                yield ": connected\n\n"
                 while True:
                     try:
-                        # Get message from queue, timeout after 30 seconds
-                        msg = progress_queues[user_id].get(timeout=30)
+                        # Ping when idle; a closed stream is only noticed on a write
+                        msg = progress_queues[user_id].get(timeout=app.config['SSE_PING_INTERVAL'])
                         app.logger.info(f"Sending message to user {user_id}: {msg}")
                         yield f"data: {json.dumps(msg)}\n\n"
                     except queue.Empty:
@@ -114,6 +429,8 @@ def events():
                         
             finally:
                 # Cleanup when client disconnects
+                SSE_CONNECTIONS.dec()
+                cancellations.unsubscribe(watched)
                 app.logger.info(f"Client disconnected for user {user_id}")
                 if user_id in progress_queues:
                     del progress_queues[user_id]
@@ -134,6 +451,15 @@ def events():
         app.logger.error(f"SSE Error: {str(e)}")
         return jsonify({'error': 'Invalid token'}), 401
 
+@app.errorhandler(HasherBusyError)
+def handle_hasher_busy(e):
+    """Shed authentication load instead of queueing it without bound."""
+    app.logger.warning("Password hashing queue full, rejecting request")
+    response = jsonify({'error': 'Server is busy, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 @app.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -144,7 +470,7 @@ def register():
     if User.query.filter_by(email=data['email']).first():
         return jsonify({'error': 'Email already registered'}), 409
         
-    hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    hashed_password = password_hasher.hash_password(data['password'])
     user = User(email=data['email'], password_hash=hashed_password)
     
     db.session.add(user)
@@ -162,9 +488,17 @@ def login():
         return jsonify({'error': 'Missing email or password'}), 400
         
     user = User.query.filter_by(email=data['email']).first()
-    if not user or not bcrypt.check_password_hash(user.password_hash, data['password']):
+    if not user or not password_hasher.check_password(user.password_hash, data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
         
+    # Upgrade hashes made with a different cost now that we know the password
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.password_hash = password_hasher.hash_password(data['password'])
+            db.session.commit()
+        except HasherBusyError:
+            app.logger.info(f"Skipping password rehash for user {user.id}, hashing queue full")
+        
     # Convert user ID to string before creating token
     access_token = create_access_token(identity=str(user.id))
     return jsonify({'token': access_token, 'user_id': user.id}), 200
@@ -190,17 +524,18 @@ def create_problem_set():
             if not file.filename.lower().endswith('.pdf'):
                 app.logger.warning(f"Invalid file type: {file.filename}")
                 return jsonify({'error': 'Only PDF files are allowed'}), 400
+                
+            if over_quota(user_id):
+                return jsonify({'error': 'Storage quota exceeded'}), 507
             
             try:
                 # Save the uploaded file
                 app.logger.info("Saving uploaded file...")
                 send_progress(user_id, "Saving uploaded file...", progress=20)
                 
-                # Create upload directory if it doesn't exist
-                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                upload_dir = new_storage_dir(app.config['UPLOAD_FOLDER'], 'originals')
+                filename = secure_filename(file.filename) or 'upload.pdf'
+                filepath = os.path.join(upload_dir, filename)
                 app.logger.info(f"Saving file to: {filepath}")
                 
                 # Read file in chunks to track progress
@@ -213,7 +548,7 @@ def create_problem_set():
                 file.seek(0)  # Reset to beginning
                 
                 bytes_read = 0
-                with open(filepath, 'wb') as f:
+                with span('upload.save', bytes=total_size), open(filepath, 'wb') as f:
                     while True:
                         chunk = file.read(chunk_size)
                         if not chunk:
@@ -226,28 +561,55 @@ def create_problem_set():
                 app.logger.info("File saved successfully")
                 send_progress(user_id, "File saved successfully", progress=40)
                 
+                name = request.form.get('name', file.filename.replace('.pdf', ''))
+                app.logger.info(f"Using name: {name}")
+                
+                if app.config['GENERATION_MODE'] == 'queue':
+                    # Save the set without a template; a worker fills it in
+                    problem_set = ProblemSet(
+                        user_id=user_id,
+                        name=name,
+                        original_pdf_path=filepath,
+                        original_pdf_size=bytes_read
+                    )
+                    with span('db.commit'):
+                        db.session.add(problem_set)
+                        db.session.commit()
+                    job = job_queue.enqueue(JobKind.CONVERT, user_id, {}, problem_set_id=problem_set.id,
+                                  max_attempts=app.config['JOB_MAX_ATTEMPTS'])
+                    return jsonify({
+                        'id': problem_set.id,
+                        'name': problem_set.name,
+                        'created_at': problem_set.created_at.isoformat(),
+                        'generated_sets_count': 0,
+                        'job': serialize_job(job)
+                    }), 202, {'Location': f'/api/jobs/{job.id}'}
+                
                 # Extract LaTeX from PDF
                 app.logger.info("Extracting LaTeX from PDF")
                 send_progress(user_id, "Extracting LaTeX from PDF...", progress=50)
-                
-                from math_latex import MathLatexConverter
-                send_progress(user_id, "Initializing LaTeX converter...", progress=60)
-                
-                latex_converter = MathLatexConverter(ClaudeProvider())
-                send_progress(user_id, "Converting PDF to LaTeX...", progress=70)
-                
-                latex_template = latex_converter.convert_to_latex(filepath)
+                token = CancelToken()
+                cancellations.register((user_id, None), token)
+                try:
+                    latex_template = convert_pdf(
+                        filepath, get_provider('claude'),
+                        progress=lambda message, percent=None: send_progress(user_id, message, percent),
+                        cancel_token=token
+                    )
+                except CancelledError as e:
+                    app.logger.info(f"Conversion for user {user_id} cancelled: {str(e)}")
+                    send_progress(user_id, f"Cancelled: {str(e)}")
+                    return jsonify({'error': f'Conversion cancelled: {str(e)}'}), 499
+                finally:
+                    cancellations.unregister((user_id, None), token)
                 app.logger.info("LaTeX template extracted successfully")
-                send_progress(user_id, "LaTeX extracted successfully", progress=80)
-                
-                name = request.form.get('name', file.filename.replace('.pdf', ''))
-                app.logger.info(f"Using name: {name}")
                 send_progress(user_id, "Creating problem set entry...", progress=90)
                 
                 problem_set = ProblemSet(
                     user_id=user_id,
                     name=name,
                     original_pdf_path=filepath,
+                    original_pdf_size=bytes_read,
                     latex_template=latex_template  # Save the extracted LaTeX
                 )
                 
@@ -276,8 +638,9 @@ def create_problem_set():
         
         try:
             send_progress(user_id, "Saving to database...", progress=95)
-            db.session.add(problem_set)
-            db.session.commit()
+            with span('db.commit'):
+                db.session.add(problem_set)
+                db.session.commit()
             app.logger.info(f"Problem set created with ID: {problem_set.id}")
             send_progress(user_id, "Problem set created successfully!", progress=100)
             
@@ -308,13 +671,24 @@ def get_problem_sets():
         user_id = int(get_jwt_identity())
         app.logger.info(f"Fetching problem sets for user {user_id}")
         
-        problem_sets = ProblemSet.query.filter_by(user_id=user_id).all()
+        problem_sets = ProblemSet.query.filter_by(user_id=user_id).options(
+            db.load_only(ProblemSet.id, ProblemSet.name, ProblemSet.created_at)
+        ).order_by(ProblemSet.created_at.desc()).all()
+        
+        # Count generated sets in one grouped query instead of loading each relationship
+        counts = dict(db.session.query(
+            GeneratedSet.problem_set_id,
+            db.func.count(GeneratedSet.id)
+        ).filter(
+            GeneratedSet.problem_set_id.in_([ps.id for ps in problem_sets]),
+            GeneratedSet.pooled.is_(False)
+        ).group_by(GeneratedSet.problem_set_id).all())
         
         return jsonify([{
             'id': ps.id,
             'name': ps.name,
             'created_at': ps.created_at.isoformat(),
-            'generated_sets_count': len(ps.generated_sets)
+            'generated_sets_count': counts.get(ps.id, 0)
         } for ps in problem_sets]), 200
         
     except ValueError as e:
@@ -336,7 +710,7 @@ def generate_problems(set_id):
         if not problem_set:
             return jsonify({'error': 'Problem set not found'}), 404
             
-        if not problem_set.latex_template:
+        if not problem_set.latex_template_hash:
             app.logger.error(f"Problem set {set_id} has no LaTeX template")
             return jsonify({'error': 'Problem set has no LaTeX template'}), 400
             
@@ -349,6 +723,12 @@ def generate_problems(set_id):
         provider_name = data.get('provider')
         difficulty = data.get('difficulty')
         num_problems = data.get('num_problems')
+        # 'assemble' builds the set from banked problems the user has not seen
+        mode = data.get('mode', 'generate')
+        query = data.get('query') or None
+        # Opt in to receiving the result of an identical generation already in flight;
+        # assembled sets depend on what each user has seen, so they are never shared
+        shared_result = bool(data.get('shared_result')) and mode == 'generate'
         
         app.logger.info(f"Extracted values - provider: {provider_name}, difficulty: {difficulty}, num_problems: {num_problems}")
         
@@ -366,74 +746,89 @@ def generate_problems(set_id):
         if provider_name.lower() not in ['claude', 'gemini']:
             return jsonify({'error': 'Invalid provider. Must be "claude" or "gemini"'}), 400
             
-        # Create provider instance
-        provider = ClaudeProvider() if provider_name.lower() == 'claude' else GeminiProvider()
-        
-        # Create output directory for this generation
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'generated_{timestamp}')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Write template to a temporary file
-        template_file = os.path.join(output_dir, 'template.tex')
-        with open(template_file, 'w') as f:
-            f.write(problem_set.latex_template)
-        
-        # Generate problems and solutions
-        generator = ProblemGenerator(provider)
-        try:
-            # Step 1: Generate problems
-            send_progress(user_id, "Generating problems...")
-            problems = generator.generate_problems(template_file, difficulty, num_problems)
-            problems_latex = generator._create_latex_document(problems, "Problems")
-            
-            # Step 2: Generate solutions
-            send_progress(user_id, "Generating solutions...")
-            solutions = generator.generate_solutions(problems)
-            solutions_latex = generator._create_latex_document(solutions, "Solutions")
+        if str(difficulty).upper() not in DifficultyLevel.__members__:
+            return jsonify({'error': 'Invalid difficulty. Must be "same", "challenge" or "harder"'}), 400
             
-            # Step 3: Compile problems PDF
-            send_progress(user_id, "Compiling problems PDF...")
-            with tempfile.NamedTemporaryFile(suffix='.tex', mode='w') as temp:
-                temp.write(problems_latex)
-                temp.flush()
-                problems_pdf = generator.latex_compiler.compile_to_pdf(temp.name, output_dir)
+        if mode not in ('generate', 'assemble'):
+            return jsonify({'error': 'Invalid mode. Must be "generate" or "assemble"'}), 400
             
-            # Step 4: Compile solutions PDF
-            send_progress(user_id, "Compiling solutions PDF...")
-            with tempfile.NamedTemporaryFile(suffix='.tex', mode='w') as temp:
-                temp.write(solutions_latex)
-                temp.flush()
-                solutions_pdf = generator.latex_compiler.compile_to_pdf(temp.name, output_dir)
+        if over_quota(user_id):
+            return jsonify({'error': 'Storage quota exceeded'}), 507
             
-            send_progress(user_id, "Generation complete!")
+        # Pooled sets are fresh generations; assembled sets come from the bank
+        if app.config['POOL_SIZE'] and mode == 'generate':
+            generation_pool.record_demand(set_id, provider_name, difficulty, num_problems,
+                                          app.config['POOL_DEMAND_HALF_LIFE'])
+            pooled_set = generation_pool.claim(set_id, provider_name, difficulty, num_problems)
+            start_pool_refill()
+            if pooled_set:
+                # Each pooled set is a distinct variant, handed out once
+                send_progress(user_id, "Generation complete!", 100)
+                return jsonify({
+                    'id': pooled_set.id,
+                    'created_at': pooled_set.created_at.isoformat(),
+                    'problems_path': pooled_set.problems_pdf_path,
+                    'solutions_path': pooled_set.solutions_pdf_path,
+                    'shared': False,
+                    'pooled': True
+                }), 201
             
-            # Create new generated set record
-            generated_set = GeneratedSet(
-                problem_set_id=set_id,
-                provider=Provider[provider_name.upper()],
-                difficulty=DifficultyLevel[difficulty.upper()],
-                num_problems=num_problems,
-                problems_pdf_path=problems_pdf,
-                solutions_pdf_path=solutions_pdf,
-                problems_latex=problems_latex,
-                solutions_latex=solutions_latex
-            )
+        if app.config['GENERATION_MODE'] == 'queue':
+            # A worker process runs the pipeline; the client polls the job
+            job = job_queue.enqueue(JobKind.GENERATE, user_id, {
+                'provider': provider_name.lower(),
+                'difficulty': difficulty,
+                'num_problems': num_problems,
+                'mode': mode,
+                'query': query
+            }, problem_set_id=set_id, max_attempts=app.config['JOB_MAX_ATTEMPTS'],
+               dedup_key=generation_key(problem_set, provider_name, difficulty, num_problems) if shared_result else None)
+            return jsonify(serialize_job(job)), 202, {'Location': f'/api/jobs/{job.id}'}
             
-            db.session.add(generated_set)
-            db.session.commit()
+        # Create provider instance
+        provider = get_provider(provider_name.lower())
+        
+        token = CancelToken()
+        cancellations.register((user_id, set_id), token)
+        try:
+            progress = lambda message, percent=None: send_progress(user_id, message, percent)
+            shared = False
+            if shared_result:
+                generated_set, shared = run_shared_generation(
+                    problem_set, provider_name, difficulty, num_problems, provider, progress, token)
+            else:
+                generated_set = run_generation(
+                    problem_set, provider_name, difficulty, num_problems, provider, get_latex_compiler(),
+                    output_dir=new_storage_dir(app.config['UPLOAD_FOLDER'], 'generated'),
+                    lazy_compile=app.config['LAZY_PDF_COMPILE'],
+                    progress=progress,
+                    cancel_token=token,
+                    mode=mode,
+                    query=query,
+                    duplicate_check=get_duplicate_check(),
+                    answer_verifier=get_answer_verifier()
+                )
             
             return jsonify({
                 'id': generated_set.id,
                 'created_at': generated_set.created_at.isoformat(),
                 'problems_path': generated_set.problems_pdf_path,
-                'solutions_path': generated_set.solutions_pdf_path
+                'solutions_path': generated_set.solutions_pdf_path,
+                'shared': shared,
+                'pooled': False
             }), 201
             
+        except CancelledError as e:
+            app.logger.info(f"Generation for set {set_id} cancelled: {str(e)}")
+            send_progress(user_id, f"Cancelled: {str(e)}")
+            # 499: the client gave up on the request (nginx convention)
+            return jsonify({'error': f'Generation cancelled: {str(e)}'}), 499
         except Exception as e:
             app.logger.error(f"Error generating problems: {str(e)}\n{''.join(traceback.format_tb(e.__traceback__))}")
             send_progress(user_id, f"Error: {str(e)}")
             return jsonify({'error': str(e)}), 500
+        finally:
+            cancellations.unregister((user_id, set_id), token)
             
     except ValueError as e:
         app.logger.error(f"Invalid user ID format: {str(e)}\n{''.join(traceback.format_tb(e.__traceback__))}")
@@ -442,26 +837,240 @@ def generate_problems(set_id):
         app.logger.error(f"Error generating problems: {str(e)}\n{''.join(traceback.format_tb(e.__traceback__))}")
         return jsonify({'error': str(e)}), 500
 
+# Identical inline generations in flight, keyed by generation_key()
+generation_flight = SingleFlight()
+
+def run_shared_generation(problem_set, provider_name, difficulty, num_problems, provider, progress, cancel_token):
+    """
+    Run a generation, or follow an identical one already running in this process.
+
+    The pipeline runs on its own thread and is only cancelled once every
+    request following it has been cancelled. Requests for another problem
+    set with the same template get their own copy of the result.
+
+    Returns:
+        Tuple of the GeneratedSet and whether it came from another request's run
+    """
+    set_id = problem_set.id
+
+    def execute(report, shared_token):
+        with app.app_context():
+            generated_set = run_generation(
+                db.session.get(ProblemSet, set_id), provider_name, difficulty, num_problems, provider,
+                get_latex_compiler(),
+                output_dir=new_storage_dir(app.config['UPLOAD_FOLDER'], 'generated'),
+                lazy_compile=app.config['LAZY_PDF_COMPILE'],
+                progress=report,
+                cancel_token=shared_token,
+                duplicate_check=get_duplicate_check(),
+                answer_verifier=get_answer_verifier()
+            )
+            return generated_set.id
+
+    key = generation_key(problem_set, provider_name, difficulty, num_problems)
+    generated_set_id, joined = generation_flight.do_shared(key, propagate(execute), listener=progress,
+                                                           cancel_token=cancel_token)
+    generated_set = db.session.get(GeneratedSet, generated_set_id)
+    if generated_set.problem_set_id != set_id:
+        generated_set = copy_generated_set(generated_set, problem_set,
+                                           new_storage_dir(app.config['UPLOAD_FOLDER'], 'generated'))
+    return generated_set, joined
+
+def serialize_job(job: Job) -> dict:
+    return {
+        'id': job.id,
+        'kind': job.kind.value,
+        'status': job.status.value,
+        'problem_set_id': job.problem_set_id,
+        'progress': job.progress,
+        'message': job.message,
+        'attempts': job.attempts,
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+@app.route('/api/jobs/<int:job_id>')
+@jwt_required()
+def get_job(job_id):
+    """Report the status of a queued generation or conversion job."""
+    user_id = int(get_jwt_identity())
+    job = Job.query.filter_by(id=job_id, user_id=user_id).first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    # Polling keeps the job alive; see JOB_UNWATCHED_TIMEOUT
+    job_queue.watch(job)
+    return jsonify(serialize_job(job))
+
+@app.route('/api/problem-sets/<int:set_id>/generate/cancel', methods=['POST'])
+@jwt_required()
+def cancel_generation(set_id):
+    """Cancel the user's in-flight generations for a problem set."""
+    user_id = int(get_jwt_identity())
+    cancelled = cancellations.cancel((user_id, set_id))
+    if not cancelled:
+        return jsonify({'error': 'No generation in progress'}), 404
+    return jsonify({'cancelled': cancelled}), 202
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_job(job_id):
+    """Cancel a queued job, or stop a running one at its worker's next heartbeat."""
+    user_id = int(get_jwt_identity())
+    if not job_queue.cancel(job_id, user_id):
+        job = Job.query.filter_by(id=job_id, user_id=user_id).first()
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'error': f'Job already {job.status.value}'}), 409
+    return jsonify(serialize_job(db.session.get(Job, job_id, populate_existing=True))), 202
+
+def encode_cursor(created_at: datetime, set_id: int) -> str:
+    """Encode a (created_at, id) position as an opaque pagination cursor."""
+    raw = f"{created_at.isoformat()}|{set_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor: str):
+    """Decode a pagination cursor produced by encode_cursor.
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, set_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), int(set_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
 @app.route('/api/problem-sets/<int:set_id>/generated', methods=['GET'])
 @jwt_required()
 def get_generated_sets(set_id):
     user_id = int(get_jwt_identity())
     
-    # Get all generated sets for this problem set
-    generated_sets = GeneratedSet.query.join(ProblemSet).filter(
+    try:
+        limit = int(request.args.get('limit', app.config['GENERATED_SETS_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    limit = min(limit, app.config['GENERATED_SETS_MAX_PAGE_SIZE'])
+    
+    # Only load the metadata columns; the LaTeX bodies are fetched on demand
+    query = GeneratedSet.query.join(ProblemSet).filter(
         ProblemSet.id == set_id,
-        ProblemSet.user_id == user_id
-    ).order_by(GeneratedSet.created_at.desc()).all()
+        ProblemSet.user_id == user_id,
+        GeneratedSet.pooled.is_(False)
+    ).options(db.load_only(
+        GeneratedSet.id,
+        GeneratedSet.created_at,
+        GeneratedSet.provider,
+        GeneratedSet.difficulty,
+        GeneratedSet.num_problems,
+        GeneratedSet.duplicate_problems,
+        GeneratedSet.wrong_answers,
+        GeneratedSet.problems_pdf_path,
+        GeneratedSet.solutions_pdf_path
+    ))
     
-    return jsonify([{
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        query = query.filter(db.or_(
+            GeneratedSet.created_at < cursor_created_at,
+            db.and_(GeneratedSet.created_at == cursor_created_at, GeneratedSet.id < cursor_id)
+        ))
+    
+    # Fetch one extra row to know whether another page exists
+    generated_sets = query.order_by(
+        GeneratedSet.created_at.desc(),
+        GeneratedSet.id.desc()
+    ).limit(limit + 1).all()
+    
+    has_more = len(generated_sets) > limit
+    generated_sets = generated_sets[:limit]
+    
+    response = jsonify([{
         'id': set.id,
         'created_at': set.created_at.isoformat(),
         'provider': set.provider.value,
         'difficulty': set.difficulty.value,
         'num_problems': set.num_problems,
+        'duplicate_problems': set.duplicate_problems,
+        'wrong_answers': set.wrong_answers,
         'problems_path': set.problems_pdf_path,
         'solutions_path': set.solutions_pdf_path
     } for set in generated_sets])
+    
+    if has_more:
+        last = generated_sets[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last.created_at, last.id)
+    return response
+
+@app.route('/api/generated-sets/<int:set_id>/latex', methods=['GET'])
+@jwt_required()
+def get_generated_set_latex(set_id):
+    user_id = int(get_jwt_identity())
+    latex_type = request.args.get('type')
+    
+    if latex_type not in [None, 'problems', 'solutions']:
+        return jsonify({'error': 'Invalid LaTeX type'}), 400
+        
+    wanted = [latex_type] if latex_type else ['problems', 'solutions']
+    
+    generated_set = GeneratedSet.query.join(ProblemSet).filter(
+        GeneratedSet.id == set_id,
+        ProblemSet.user_id == user_id,
+        GeneratedSet.pooled.is_(False)
+    ).first()
+    
+    if not generated_set:
+        return jsonify({'error': 'Generated set not found'}), 404
+        
+    result = {'id': generated_set.id}
+    for name in wanted:
+        result[f'{name}_latex'] = getattr(generated_set, f'{name}_latex')
+    return jsonify(result), 200
+
+def send_pdf(file_path: str, download_name: str, etag: str = None):
+    """Build a PDF download response, or None if the file is missing.
+    
+    Depending on PDF_SENDFILE_MODE the bytes are either streamed by Flask
+    (with If-None-Match and Range support) or left to the front proxy via
+    X-Accel-Redirect / X-Sendfile.
+    """
+    mode = app.config['PDF_SENDFILE_MODE']
+    upload_root = os.path.abspath(app.config['UPLOAD_FOLDER'])
+    abs_path = os.path.abspath(file_path)
+    
+    if mode == 'x-accel-redirect' and abs_path.startswith(upload_root + os.sep):
+        relative_path = os.path.relpath(abs_path, upload_root).replace(os.sep, '/')
+        response = Response(mimetype='application/pdf')
+        response.headers['X-Accel-Redirect'] = app.config['PDF_ACCEL_REDIRECT_PREFIX'] + quote(relative_path)
+    elif mode == 'x-sendfile':
+        response = Response(mimetype='application/pdf')
+        response.headers['X-Sendfile'] = abs_path
+    else:
+        try:
+            return send_file(
+                file_path,
+                mimetype='application/pdf',
+                as_attachment=True,
+                download_name=download_name,
+                etag=etag or True,
+                conditional=True
+            )
+        except FileNotFoundError:
+            return None
+            
+    response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    if etag:
+        response.set_etag(etag)
+    return response
 
 @app.route('/api/generated-sets/<int:set_id>/download', methods=['GET'])
 @jwt_required()
@@ -475,23 +1084,36 @@ def download_generated_set(set_id):
             
         generated_set = GeneratedSet.query.join(ProblemSet).filter(
             GeneratedSet.id == set_id,
-            ProblemSet.user_id == user_id
+            ProblemSet.user_id == user_id,
+            GeneratedSet.pooled.is_(False)
         ).first()
         
         if not generated_set:
             return jsonify({'error': 'Generated set not found'}), 404
             
-        file_path = generated_set.problems_pdf_path if download_type == 'problems' else generated_set.solutions_pdf_path
+        # Sets generated with lazy compilation are built on first download
+        if not getattr(generated_set, f'{download_type}_pdf_hash'):
+            try:
+                ensure_pdf(generated_set, download_type, app.config['LATEX_COMPILER_FACTORY'])
+            except Exception as e:
+                app.logger.error(f"Compile error for generated set {set_id}: {str(e)}")
+                return jsonify({'error': f'Failed to compile {download_type} PDF'}), 500
+                
+        file_path = getattr(generated_set, f'{download_type}_pdf_path')
+        etag = getattr(generated_set, f'{download_type}_pdf_hash')
         
-        if not os.path.exists(file_path):
-            return jsonify({'error': f'{download_type.title()} PDF not found'}), 404
-            
-        response = send_file(
-            file_path,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'{download_type}.pdf'
-        )
+        # The ETag is the content hash, so a matching client copy is current
+        # and we can answer without touching the file system
+        if etag and request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+        else:
+            response = send_pdf(file_path, f'{download_type}.pdf', etag)
+            if response is None:
+                return jsonify({'error': f'{download_type.title()} PDF not found'}), 404
+                
+        response.cache_control.private = True
+        response.cache_control.max_age = app.config['PDF_CACHE_MAX_AGE']
         
         # Add CORS headers
         response.headers['Access-Control-Allow-Origin'] = 'http://localhost:3000'
@@ -502,5 +1124,179 @@ def download_generated_set(set_id):
         app.logger.error(f"Download error: {str(e)}")
         return jsonify({'error': 'Failed to download file'}), 500
 
+# PDFs compiled in the background for exports, as (generated set id, kind)
+export_compiles = set()
+export_compile_failures = set()
+export_compiles_lock = threading.Lock()
+
+def compile_export_pdfs(batch):
+    with app.app_context():
+        for set_id, kind in batch:
+            failed = False
+            try:
+                ensure_pdf(db.session.get(GeneratedSet, set_id), kind, app.config['LATEX_COMPILER_FACTORY'])
+            except Exception as e:
+                failed = True
+                db.session.rollback()
+                app.logger.error(f"Compile error for generated set {set_id}: {str(e)}")
+            with export_compiles_lock:
+                export_compiles.discard((set_id, kind))
+                if failed:
+                    export_compile_failures.add((set_id, kind))
+
+def start_export_compiles(generated_sets):
+    """
+    Compile the PDFs an export is missing on a background thread.
+
+    Lazily compiled sets only get their PDFs on first download, and an export
+    may cover many of them. At most EXPORT_MAX_COMPILES PDFs are started per
+    request, one after the other; PDFs already being compiled are not started
+    again, so clients retrying the export make progress without piling up
+    compiles.
+
+    Returns:
+        Tuple of the number of PDFs still missing and the (id, kind) pairs
+        whose last compile failed; failures are reported once, and the next
+        export starts them again
+    """
+    missing = [(generated_set.id, kind) for generated_set in generated_sets for kind in ('problems', 'solutions')
+               if not getattr(generated_set, f'{kind}_pdf_hash')]
+    with export_compiles_lock:
+        failed = [item for item in missing if item in export_compile_failures]
+        export_compile_failures.difference_update(failed)
+        batch = [item for item in missing if item not in export_compiles and item not in failed]
+        batch = batch[:app.config['EXPORT_MAX_COMPILES']]
+        export_compiles.update(batch)
+    if batch:
+        threading.Thread(target=compile_export_pdfs, args=(batch,), name='export-compile', daemon=True).start()
+    return len(missing), failed
+
+def build_export(problem_set: ProblemSet, generated_sets):
+    """Lay out the export archive for the given generated sets.
+    
+    PDFs are read from disk and LaTeX from the blob store while the archive
+    streams, so only sizes and hashes are needed up front. Every PDF must
+    already be compiled; see start_export_compiles.
+    
+    Returns:
+        Tuple of the ZipStream and its ETag
+    """
+    store = get_default_blob_store()
+    entries = []
+    manifest = {
+        'problem_set': {'id': problem_set.id, 'name': problem_set.name},
+        'generated_sets': []
+    }
+    
+    for generated_set in generated_sets:
+        folder = f'generated_set_{generated_set.id}'
+        files = []
+        for kind in ('problems', 'solutions'):
+            pdf_path = getattr(generated_set, f'{kind}_pdf_path')
+            entries.append(ZipEntry(
+                f'{folder}/{kind}.pdf', os.path.getsize(pdf_path), pdf_path, generated_set.created_at
+            ))
+            files.append({'name': f'{folder}/{kind}.pdf', 'sha256': getattr(generated_set, f'{kind}_pdf_hash')})
+            
+            digest = getattr(generated_set, f'{kind}_latex_hash')
+            entries.append(ZipEntry(
+                f'{folder}/{kind}.tex', getattr(generated_set, f'{kind}_latex_size'),
+                lambda digest=digest: store.get(digest), generated_set.created_at
+            ))
+            files.append({'name': f'{folder}/{kind}.tex', 'sha256': digest})
+            
+        manifest['generated_sets'].append({
+            'id': generated_set.id,
+            'created_at': generated_set.created_at.isoformat(),
+            'provider': generated_set.provider.value,
+            'difficulty': generated_set.difficulty.value,
+            'num_problems': generated_set.num_problems,
+            'files': files
+        })
+        
+    # The manifest only depends on the sets and their content hashes, so the
+    # archive bytes are identical across requests and safe to resume
+    manifest_bytes = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+    entries.insert(0, ZipEntry('manifest.json', len(manifest_bytes), lambda: manifest_bytes, problem_set.created_at))
+    return ZipStream(entries), hashlib.sha256(manifest_bytes).hexdigest()
+
+@app.route('/api/problem-sets/<int:set_id>/export', methods=['GET'])
+@jwt_required()
+def export_problem_set(set_id):
+    try:
+        user_id = int(get_jwt_identity())
+        
+        problem_set = ProblemSet.query.filter_by(id=set_id, user_id=user_id).first()
+        if not problem_set:
+            return jsonify({'error': 'Problem set not found'}), 404
+            
+        query = GeneratedSet.query.filter_by(problem_set_id=set_id, pooled=False)
+        ids = request.args.get('ids')
+        if ids:
+            try:
+                wanted = [int(i) for i in ids.split(',')]
+            except ValueError:
+                return jsonify({'error': 'ids must be a comma separated list of integers'}), 400
+            query = query.filter(GeneratedSet.id.in_(wanted))
+        generated_sets = query.order_by(GeneratedSet.created_at, GeneratedSet.id).all()
+        
+        if not generated_sets:
+            return jsonify({'error': 'No generated sets to export'}), 404
+            
+        pending, failed = start_export_compiles(generated_sets)
+        if failed:
+            return jsonify({'error': f'Failed to compile the PDFs of generated set {failed[0][0]}'}), 500
+        if pending:
+            # Compiling inline would hold the request for every lazily compiled set
+            response = jsonify({'status': 'compiling', 'pending_pdfs': pending})
+            response.status_code = 202
+            response.headers['Retry-After'] = str(app.config['EXPORT_RETRY_AFTER'])
+            return response
+            
+        try:
+            archive, etag = build_export(problem_set, generated_sets)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 413
+            
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+            
+        # Honour Range only if the client's copy is of this exact archive
+        start, stop, status = 0, archive.total_size, 200
+        byte_range = request.range
+        if byte_range and (not request.if_range.etag or request.if_range.etag == etag):
+            bounds = byte_range.range_for_length(archive.total_size)
+            if bounds is None:
+                response = Response(status=416)
+                response.headers['Content-Range'] = f'bytes */{archive.total_size}'
+                return response
+            start, stop = bounds
+            status = 206
+            
+        response = Response(
+            stream_with_context(archive.iter_bytes(start, stop)),
+            status=status,
+            mimetype='application/zip',
+            direct_passthrough=True
+        )
+        response.content_length = stop - start
+        response.accept_ranges = 'bytes'
+        if status == 206:
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{archive.total_size}'
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.headers['Content-Disposition'] = f'attachment; filename=problem_set_{set_id}.zip'
+        return response
+        
+    except Exception as e:
+        app.logger.error(f"Export error: {str(e)}\n{''.join(traceback.format_tb(e.__traceback__))}")
+        return jsonify({'error': 'Failed to export problem set'}), 500
+
 if __name__ == '__main__':
+    # The development server creates the schema itself; deployments run
+    # 'flask db upgrade' or 'flask init-db' once instead of in every worker
+    with app.app_context():
+        db.create_all()
     app.run(port=8081, debug=True)
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""Drive the Flask API with a scripted request mix and report per-endpoint latency.
+
+Run with ``python -m benchmarks.load_test benchmarks/scenarios/smoke.json``.
+By default the app is booted in-process on a throwaway SQLite database with
+StubProvider and FakeLatexCompiler standing in for the LLMs and Tectonic;
+pass ``--database-url`` to use a local Postgres instead, or ``--url`` to load
+a server that is already running.
+
+Requests are issued open-loop at the scenario's target rate, and latency is
+measured from when each request was due rather than when a worker picked it
+up, so a saturated server shows up as rising latency instead of a quietly
+lower request rate.
+
+A scenario is a JSON file::
+
+    {
+        "name": "classroom",
+        "stages": [{"duration": 30, "rate": 5}, {"duration": 120, "rate": 20}],
+        "arrival": "poisson",
+        "concurrency": 64,
+        "users": 20,
+        "mix": {"login": 5, "list_problem_sets": 30, "generate": 5, "download": 20},
+        "llm_latency": 2.0,
+        "compile_latency": 0.5
+    }
+
+"duration" and "rate" may be given instead of "stages" for a flat profile.
+With ``--replay <log>`` (or "replay" in the scenario) the LLM answers come
+from a recorded interaction log instead of StubProvider.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.stubs import MINIMAL_PDF
+
+console = Console()
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'load-test-password'
+TEMPLATE = r"""\begin{enumerate}
+\item $\displaystyle \lim_{x \to \infty} \frac{3x^2 + 1}{x^2 - 4}$
+\item $\displaystyle \lim_{x \to 0} \frac{\sin(x)}{x}$
+\end{enumerate}"""
+
+SCENARIO_DEFAULTS = {
+    'name': 'unnamed',
+    'duration': 60,
+    'rate': 10,
+    'arrival': 'poisson',
+    'concurrency': 64,
+    'users': 10,
+    'generated_sets_per_user': 1,
+    'mix': {'list_problem_sets': 1},
+    'llm_latency': 1.0,
+    'llm_jitter': 0.0,
+    'response_size': 2000,
+    'compiler': 'fake',
+    'compile_latency': 0.2,
+    'compile_jitter': 0.0,
+    'lazy_pdf_compile': False,
+    'bcrypt_rounds': 12,
+    'sse_hold': 5.0,
+    'replay': None,
+    'replay_latency': 'recorded',
+    'seed': None
+}
+
+def setup_args() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Load test the Flask API with stubbed LLM and compiler backends'
+    )
+    parser.add_argument('scenario',
+                       help='Scenario JSON file (see benchmarks/scenarios/)')
+    parser.add_argument('--url',
+                       help='Load an already running server instead of booting one in-process')
+    parser.add_argument('--database-url',
+                       help='Database for the in-process server (default: temporary SQLite file)')
+    parser.add_argument('--rate', type=float,
+                       help='Override the target request rate of every stage (requests/second)')
+    parser.add_argument('--duration', type=float,
+                       help='Override the duration of every stage (seconds)')
+    parser.add_argument('--llm-latency', type=float,
+                       help="Override the scenario's stub LLM latency (seconds)")
+    parser.add_argument('--compile-latency', type=float,
+                       help="Override the scenario's fake compile latency (seconds)")
+    parser.add_argument('--replay',
+                       help='Interaction log (directory or file) to replay instead of the stub LLM')
+    parser.add_argument('--replay-latency', choices=['none', 'recorded', 'sampled'],
+                       help="With --replay: no delay, each recorded latency, or latencies sampled from the log "
+                            "(default: the scenario's, else recorded)")
+    parser.add_argument('--json', dest='json_output',
+                       help='Write the report as JSON to this file')
+    parser.add_argument('--max-error-rate', type=float,
+                       help='Exit non-zero if the overall error rate exceeds this fraction')
+    parser.add_argument('--verbose', action='store_true',
+                       help='Keep the app and request logs')
+    return parser
+
+def load_scenario(path: str) -> dict:
+    """
+    Read a scenario file and fill in defaults.
+
+    Raises:
+        ValueError: If the scenario names an unknown operation
+    """
+    with open(path) as f:
+        scenario = {**SCENARIO_DEFAULTS, **json.load(f)}
+    unknown = set(scenario['mix']) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    if not scenario.get('stages'):
+        scenario['stages'] = [{'duration': scenario['duration'], 'rate': scenario['rate']}]
+    return scenario
+
+class Client:
+    """Minimal keep-alive HTTP client with one connection per thread."""
+
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+    def json(self, method: str, path: str, payload=None, token: Optional[str] = None) -> Tuple[int, object]:
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        status, data = self.request(method, path, body, headers)
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def stream(self, path: str, hold: float) -> Tuple[int, int]:
+        """Read a streaming response for up to hold seconds; returns status and bytes read."""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=hold)
+        received = 0
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            deadline = time.monotonic() + hold
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                conn.sock.settimeout(remaining)
+                try:
+                    chunk = response.fp.read1(8192)
+                except TimeoutError:
+                    break
+                if not chunk:
+                    break
+                received += len(chunk)
+            return response.status, received
+        finally:
+            conn.close()
+
+class UserPool:
+    """Registered users with their problem sets and generated sets."""
+
+    def __init__(self, rng: random.Random):
+        self.users: List[dict] = []
+        self._rng = rng
+        self._lock = threading.Lock()
+
+    def add(self, user: dict) -> None:
+        with self._lock:
+            self.users.append(user)
+
+    def pick(self) -> dict:
+        with self._lock:
+            return self._rng.choice(self.users)
+
+    def choice(self, items: list):
+        with self._lock:
+            return self._rng.choice(items) if items else None
+
+def _multipart(filename: str, content: bytes, fields: Dict[str, str]) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: application/pdf\r\n\r\n'.encode() + content + b'\r\n'
+    )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+# Each operation issues one request and returns its status code
+
+def op_register(client: Client, pool: UserPool, scenario: dict):
+    status, _ = client.json('POST', '/api/auth/register',
+                            {'email': f'load-{uuid.uuid4().hex}@example.com', 'password': PASSWORD})
+    return status
+
+def op_login(client: Client, pool: UserPool, scenario: dict):
+    user = pool.pick()
+    status, data = client.json('POST', '/api/auth/login', {'email': user['email'], 'password': PASSWORD})
+    if status == 200:
+        user['token'] = data['token']
+    return status
+
+def op_create_problem_set(client: Client, pool: UserPool, scenario: dict):
+    user = pool.pick()
+    status, data = client.json('POST', '/api/problem-sets',
+                               {'name': 'Load test', 'template': TEMPLATE}, user['token'])
+    if status == 201:
+        user['problem_sets'].append(data['id'])
+    return status
+
+def op_upload(client: Client, pool: UserPool, scenario: dict):
+    user = pool.pick()
+    body, content_type = _multipart('worksheet.pdf', MINIMAL_PDF, {'name': 'Uploaded worksheet'})
+    status, data = client.request('POST', '/api/problem-sets', body, {
+        'Content-Type': content_type, 'Authorization': f"Bearer {user['token']}"
+    })
+    if status == 201:
+        user['problem_sets'].append(json.loads(data)['id'])
+    return status
+
+def op_generate(client: Client, pool: UserPool, scenario: dict):
+    user = pool.pick()
+    set_id = pool.choice(user['problem_sets'])
+    status, data = client.json('POST', f'/api/problem-sets/{set_id}/generate', {
+        'provider': 'claude', 'difficulty': 'same', 'num_problems': 5
+    }, user['token'])
+    if status == 201:
+        user['generated_sets'].append(data['id'])
+    return status
+
+def op_list_problem_sets(client: Client, pool: UserPool, scenario: dict):
+    status, _ = client.json('GET', '/api/problem-sets', token=pool.pick()['token'])
+    return status
+
+def op_list_generated(client: Client, pool: UserPool, scenario: dict):
+    user = pool.pick()
+    set_id = pool.choice(user['problem_sets'])
+    status, _ = client.json('GET', f'/api/problem-sets/{set_id}/generated', token=user['token'])
+    return status
+
+def op_download(client: Client, pool: UserPool, scenario: dict):
+    user = pool.pick()
+    set_id = pool.choice(user['generated_sets'])
+    kind = pool.choice(['problems', 'solutions'])
+    status, _ = client.request('GET', f'/api/generated-sets/{set_id}/download?type={kind}',
+                               headers={'Authorization': f"Bearer {user['token']}"})
+    return status
+
+def op_export(client: Client, pool: UserPool, scenario: dict):
+    user = pool.pick()
+    # The seeded problem set is the one known to have generated sets
+    set_id = user['problem_sets'][0]
+    status, _ = client.request('GET', f'/api/problem-sets/{set_id}/export',
+                               headers={'Authorization': f"Bearer {user['token']}"})
+    return status
+
+def op_events(client: Client, pool: UserPool, scenario: dict):
+    status, _ = client.stream(f"/api/events?token={pool.pick()['token']}", scenario['sse_hold'])
+    return status
+
+OPERATIONS = {
+    'register': ('POST /api/auth/register', op_register),
+    'login': ('POST /api/auth/login', op_login),
+    'create_problem_set': ('POST /api/problem-sets (template)', op_create_problem_set),
+    'upload': ('POST /api/problem-sets (upload)', op_upload),
+    'generate': ('POST /api/problem-sets/<id>/generate', op_generate),
+    'list_problem_sets': ('GET /api/problem-sets', op_list_problem_sets),
+    'list_generated': ('GET /api/problem-sets/<id>/generated', op_list_generated),
+    'download': ('GET /api/generated-sets/<id>/download', op_download),
+    'export': ('GET /api/problem-sets/<id>/export', op_export),
+    'events': ('GET /api/events (SSE)', op_events),
+}
+
+def create_provider_factory(scenario: dict):
+    """
+    Return the PROVIDER_FACTORY for the in-process app.
+
+    A replayed log is loaded once and shared by every request. Prompts the
+    log does not have, such as those regenerating duplicates, get a random
+    recorded response and are counted as misses.
+    """
+    if scenario['replay']:
+        from providers.replay_provider import ReplayProvider
+        latency = scenario['replay_latency']
+        provider = ReplayProvider(scenario['replay'], latency=None if latency == 'none' else latency,
+                                  on_miss='any', seed=scenario['seed'])
+        return lambda name: provider
+    from benchmarks.stubs import StubProvider
+    return lambda name: StubProvider(
+        latency=scenario['llm_latency'], jitter=scenario['llm_jitter'], response_size=scenario['response_size'])
+
+def boot_app(scenario: dict, database_url: Optional[str], work_dir: str, verbose: bool, provider_factory):
+    """Start the app in-process with stub backends; returns the server and its URL."""
+    # Config is read from the environment when the app is first imported
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(work_dir, 'load.db')}?timeout=30"
+    os.environ['BCRYPT_LOG_ROUNDS'] = str(scenario['bcrypt_rounds'])
+    os.environ['LAZY_PDF_COMPILE'] = 'true' if scenario['lazy_pdf_compile'] else 'false'
+    os.environ['BLOB_STORE_BACKEND'] = 'local'
+    os.environ['BLOB_STORE_PATH'] = os.path.join(work_dir, 'blobs')
+    os.environ['STORAGE_GC_INTERVAL'] = '0'
+    os.environ.setdefault('LLM_LOG_SAMPLE_RATE', '0')
+    # MathLatexConverter reads its prompt relative to the working directory
+    os.chdir(REPO_ROOT)
+
+    from werkzeug.serving import make_server
+    from app import app
+    from models.database import db
+    from benchmarks.stubs import create_compiler
+
+    app.config['UPLOAD_FOLDER'] = os.path.join(work_dir, 'uploads')
+    app.config['PROVIDER_FACTORY'] = provider_factory
+    app.config['LATEX_COMPILER_FACTORY'] = lambda: create_compiler(
+        scenario['compiler'], latency=scenario['compile_latency'], jitter=scenario['compile_jitter'])
+    with app.app_context():
+        db.create_all()
+
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        app.logger.setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def seed_users(client: Client, pool: UserPool, scenario: dict) -> None:
+    """Register the scenario's users, each with a problem set and generated sets."""
+    def create(index: int):
+        email = f'load-user-{index}-{uuid.uuid4().hex[:8]}@example.com'
+        status, data = client.json('POST', '/api/auth/register', {'email': email, 'password': PASSWORD})
+        if status != 201:
+            raise RuntimeError(f"Registering {email} failed with status {status}")
+        user = {'email': email, 'token': data['token'], 'problem_sets': [], 'generated_sets': []}
+        status, data = client.json('POST', '/api/problem-sets',
+                                   {'name': 'Load test', 'template': TEMPLATE}, user['token'])
+        if status != 201:
+            raise RuntimeError(f"Creating a problem set failed with status {status}")
+        user['problem_sets'].append(data['id'])
+        for _ in range(scenario['generated_sets_per_user']):
+            status, data = client.json('POST', f"/api/problem-sets/{user['problem_sets'][0]}/generate", {
+                'provider': 'claude', 'difficulty': 'same', 'num_problems': 5
+            }, user['token'])
+            if status != 201:
+                raise RuntimeError(f"Generating a set failed with status {status}")
+            user['generated_sets'].append(data['id'])
+        pool.add(user)
+
+    with ThreadPoolExecutor(max_workers=min(16, scenario['users'])) as executor:
+        list(executor.map(create, range(scenario['users'])))
+
+def run_load(client: Client, pool: UserPool, scenario: dict, rng: random.Random) -> Tuple[List[dict], float, int]:
+    """
+    Issue requests open-loop following the scenario's stages.
+
+    Returns:
+        The per-request records, the elapsed time in seconds, and how many
+        requests were skipped because every worker was busy
+    """
+    names = list(scenario['mix'])
+    weights = [scenario['mix'][name] for name in names]
+    records: List[dict] = []
+    in_flight = threading.Semaphore(scenario['concurrency'])
+    skipped = 0
+
+    def execute(name: str, due: float):
+        start = time.perf_counter()
+        endpoint, operation = OPERATIONS[name]
+        record = {'operation': name, 'endpoint': endpoint, 'status': None, 'error': None}
+        try:
+            record['status'] = operation(client, pool, scenario)
+        except Exception as e:
+            record['error'] = type(e).__name__
+        finally:
+            end = time.perf_counter()
+            record['latency'] = end - due
+            record['service_time'] = end - start
+            records.append(record)
+            in_flight.release()
+
+    started = time.perf_counter()
+    offset = 0.0
+    with ThreadPoolExecutor(max_workers=scenario['concurrency']) as executor:
+        for stage in scenario['stages']:
+            stage_end = offset + stage['duration']
+            rate = stage['rate']
+            if rate <= 0:
+                offset = stage_end
+                continue
+            while True:
+                offset += rng.expovariate(rate) if scenario['arrival'] == 'poisson' else 1 / rate
+                if offset >= stage_end:
+                    offset = stage_end
+                    break
+                due = started + offset
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if not in_flight.acquire(blocking=False):
+                    skipped += 1
+                    continue
+                executor.submit(execute, rng.choices(names, weights)[0], due)
+    return records, time.perf_counter() - started, skipped
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(records: List[dict], elapsed: float) -> Dict[str, dict]:
+    """Group records by endpoint and compute throughput, latency percentiles and error rates."""
+    groups = defaultdict(list)
+    for record in records:
+        groups[record['endpoint']].append(record)
+    groups['overall'] = records
+
+    report = {}
+    for endpoint, group in groups.items():
+        latencies = sorted(record['latency'] * 1000 for record in group)
+        errors = [record for record in group if record['status'] is None or record['status'] >= 400]
+        report[endpoint] = {
+            'requests': len(group),
+            'throughput_rps': len(group) / elapsed if elapsed else 0.0,
+            'errors': len(errors),
+            'error_rate': len(errors) / len(group) if group else 0.0,
+            'statuses': dict(Counter(str(record['status'] or record['error']) for record in group)),
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'mean_service_ms': statistics.mean(record['service_time'] * 1000 for record in group) if group else 0.0
+        }
+    return report
+
+def main():
+    args = setup_args().parse_args()
+    try:
+        scenario = load_scenario(args.scenario)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        return 1
+
+    for stage in scenario['stages']:
+        if args.rate is not None:
+            stage['rate'] = args.rate
+        if args.duration is not None:
+            stage['duration'] = args.duration
+    if args.llm_latency is not None:
+        scenario['llm_latency'] = args.llm_latency
+    if args.compile_latency is not None:
+        scenario['compile_latency'] = args.compile_latency
+    if args.replay:
+        scenario['replay'] = os.path.abspath(args.replay)
+    if args.replay_latency:
+        scenario['replay_latency'] = args.replay_latency
+
+    rng = random.Random(scenario['seed'])
+    replay = None
+    with tempfile.TemporaryDirectory() as work_dir:
+        server = None
+        base_url = args.url
+        if not base_url:
+            console.print("[yellow]Booting the app with stub backends...[/yellow]")
+            provider_factory = create_provider_factory(scenario)
+            if scenario['replay']:
+                replay = provider_factory('claude')
+            server, base_url = boot_app(scenario, args.database_url, work_dir, args.verbose, provider_factory)
+
+        try:
+            client = Client(base_url)
+            pool = UserPool(rng)
+            console.print(f"[yellow]Seeding {scenario['users']} users...[/yellow]")
+            seed_users(client, pool, scenario)
+
+            total = sum(stage['duration'] for stage in scenario['stages'])
+            console.print(f"[yellow]Running scenario '{scenario['name']}' for {total:.0f}s against {base_url}...[/yellow]")
+            records, elapsed, skipped = run_load(client, pool, scenario, rng)
+        finally:
+            if server:
+                server.shutdown()
+
+    report = summarize(records, elapsed)
+    table = Table(title=f"Load test: {scenario['name']}")
+    for column in ('Endpoint', 'Requests', 'RPS', 'p50 ms', 'p95 ms', 'p99 ms', 'Errors'):
+        table.add_column(column)
+    for endpoint, stats in sorted(report.items(), key=lambda item: item[0] == 'overall'):
+        table.add_row(endpoint, str(stats['requests']), f"{stats['throughput_rps']:.1f}",
+                      f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}", f"{stats['p99_ms']:.1f}",
+                      f"{stats['errors']} ({stats['error_rate']:.1%})")
+    console.print(table)
+    replay_stats = None
+    if replay:
+        replay_stats = {key: value for key, value in replay.stats().items() if key != 'missed_prompts'}
+        console.print(f"Replayed {replay_stats['hits']} LLM calls from the log, {replay_stats['misses']} misses")
+    if skipped:
+        console.print(f"[red]{skipped} requests were skipped because all {scenario['concurrency']} workers were busy[/red]")
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump({'scenario': scenario, 'elapsed_s': elapsed, 'skipped': skipped, 'replay': replay_stats,
+                       'endpoints': report}, f, indent=2)
+        console.print(f"[green]✓ Results saved to: {args.json_output}[/green]")
+
+    if args.max_error_rate is not None and report['overall']['error_rate'] > args.max_error_rate:
+        console.print(f"[red]Error: error rate {report['overall']['error_rate']:.1%} exceeds {args.max_error_rate:.1%}[/red]")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Time the generation pipeline offline with stub providers.
+
+Run with ``python -m benchmarks.pipeline_benchmark``. Each benchmark runs in
+a fresh interpreter so its peak RSS is its own. Save a run with ``--json``
+and pass it back with ``--baseline`` to check a change for regressions.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_FILE = os.path.join(REPO_ROOT, 'tests', 'test_data', 'test_limits.tex')
+SAMPLE_PDF = os.path.join(REPO_ROOT, 'limits.pdf')
+BENCHMARKS = ['create_problem_set', 'compile_to_pdf', 'convert_to_latex']
+
+def setup_args() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Benchmark ProblemGenerator, LatexCompiler and MathLatexConverter with stub providers'
+    )
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS),
+                       help=f"Comma separated benchmarks to run (default: {','.join(BENCHMARKS)})")
+    parser.add_argument('--iterations', type=int, default=20,
+                       help='Timed iterations per benchmark (default: 20)')
+    parser.add_argument('--warmup', type=int, default=2,
+                       help='Untimed iterations before measuring (default: 2)')
+    parser.add_argument('--llm-latency', type=float, default=0.0,
+                       help='Seconds each stub LLM call takes (default: 0)')
+    parser.add_argument('--response-size', type=int, default=2000,
+                       help='Approximate stub LLM response length in characters (default: 2000)')
+    parser.add_argument('--compiler', choices=['auto', 'fake', 'tectonic'], default='auto',
+                       help='LaTeX compiler: Tectonic if installed, else a fake one (default: auto)')
+    parser.add_argument('--compile-latency', type=float, default=0.0,
+                       help='Seconds each fake compilation takes (default: 0)')
+    parser.add_argument('--num-problems', type=int, default=5,
+                       help='Problems per generated set (default: 5)')
+    parser.add_argument('--replay',
+                       help='Interaction log (directory or file) to replay instead of the stub LLM; '
+                            'record one by generating from tests/test_data/test_limits.tex')
+    parser.add_argument('--replay-latency', choices=['none', 'recorded', 'sampled'], default='none',
+                       help='With --replay: no delay, each recorded latency, or latencies sampled '
+                            'from the log (default: none)')
+    parser.add_argument('--json', dest='json_output',
+                       help='Write the results as JSON to this file')
+    parser.add_argument('--baseline',
+                       help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                       help='Relative slowdown of mean wall time counted as a regression (default: 0.10)')
+    return parser
+
+class StageTimer:
+    """Record how long each wrapped method call takes, grouped by stage name."""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, obj, method: str, stage: str) -> None:
+        original = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.durations[stage].append(time.perf_counter() - start)
+
+        setattr(obj, method, timed)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {
+            stage: {
+                'calls': len(durations),
+                'total_s': sum(durations),
+                'mean_ms': statistics.mean(durations) * 1000
+            }
+            for stage, durations in self.durations.items()
+        }
+
+def create_provider(options: dict):
+    """Replay the recorded interaction log if one is given, else use the stub LLM."""
+    if options.get('replay'):
+        from providers.replay_provider import ReplayProvider
+        latency = options.get('replay_latency', 'none')
+        return ReplayProvider(options['replay'], latency=None if latency == 'none' else latency)
+    from benchmarks.stubs import StubProvider
+    return StubProvider(latency=options['llm_latency'], response_size=options['response_size'], seed=0)
+
+def _build(name: str, options: dict, timer: StageTimer, work_dir: str):
+    """Return a callable running one iteration of the named benchmark, and the provider it uses."""
+    from benchmarks.stubs import StubProvider, create_compiler
+
+    provider = create_provider(options)
+    compiler = create_compiler(options['compiler'], latency=options['compile_latency'])
+    timer.wrap(provider, 'execute', 'llm')
+    timer.wrap(compiler, 'compile_to_pdf', 'compile')
+
+    if name == 'create_problem_set':
+        from utils.problem_generator import ProblemGenerator
+        generator = ProblemGenerator(provider, latex_compiler=compiler, log_dir=os.path.join(work_dir, 'logs'))
+        timer.wrap(generator, 'generate_problems', 'generate_problems')
+        timer.wrap(generator, 'generate_solutions', 'generate_solutions')
+        counter = iter(range(1 << 30))
+        return lambda: generator.create_problem_set(
+            TEMPLATE_FILE,
+            output_dir=os.path.join(work_dir, f'set_{next(counter)}'),
+            num_problems=options['num_problems']
+        ), provider
+
+    if name == 'compile_to_pdf':
+        from utils.problem_generator import ProblemGenerator
+        # The document only has to compile; it need not come from the replayed log
+        generator = ProblemGenerator(provider, latex_compiler=compiler, log_dir=os.path.join(work_dir, 'logs'))
+        document = generator.latex_document(
+            StubProvider(response_size=options['response_size']).execute('Generate problems'), 'Problems')
+        tex_file = os.path.join(work_dir, 'problems.tex')
+        with open(tex_file, 'w') as f:
+            f.write(document)
+        return lambda: compiler.compile_to_pdf(tex_file, os.path.join(work_dir, 'out')), provider
+
+    if name == 'convert_to_latex':
+        from math_latex import MathLatexConverter
+        converter = MathLatexConverter(provider, log_dir=os.path.join(work_dir, 'logs'))
+        return lambda: converter.convert_to_latex(SAMPLE_PDF), provider
+
+    raise ValueError(f"Unknown benchmark: {name}")
+
+def run_benchmark(name: str, options: dict) -> dict:
+    """Run one benchmark and return its measurements. Meant to run in a fresh process."""
+    from utils.logger import setup_logging
+
+    # MathLatexConverter reads its prompt relative to the working directory
+    os.chdir(REPO_ROOT)
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as work_dir:
+        iteration, provider = _build(name, options, timer, work_dir)
+        for _ in range(options['warmup']):
+            iteration()
+        timer.durations.clear()
+
+        timings = []
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for _ in range(options['iterations']):
+            start = time.perf_counter()
+            iteration()
+            timings.append(time.perf_counter() - start)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        # Finish the interaction log before its directory is removed
+        setup_logging(os.path.join(work_dir, 'logs')).close()
+
+    timings.sort()
+    return {
+        'name': name,
+        'iterations': len(timings),
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'p50_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[max(0, int(len(timings) * 0.95) - 1)] * 1000,
+        # Linux reports kilobytes
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'stages': timer.report(),
+        # Hits and misses of the replayed log, if any
+        'replay': {key: value for key, value in provider.stats().items() if key != 'missed_prompts'}
+        if options.get('replay') else None
+    }
+
+def compare(results: List[dict], baseline: dict, threshold: float) -> List[dict]:
+    """Compare mean wall times against a baseline run."""
+    previous = {result['name']: result for result in baseline.get('benchmarks', [])}
+    comparisons = []
+    for result in results:
+        before = previous.get(result['name'])
+        if not before or not before['mean_ms']:
+            continue
+        change = result['mean_ms'] / before['mean_ms'] - 1
+        comparisons.append({
+            'name': result['name'],
+            'baseline_mean_ms': before['mean_ms'],
+            'mean_ms': result['mean_ms'],
+            'change': change,
+            'regression': change > threshold
+        })
+    return comparisons
+
+def main():
+    args = setup_args().parse_args()
+    names = [name.strip() for name in args.benchmarks.split(',') if name.strip()]
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        console.print(f"[red]Error: unknown benchmarks: {', '.join(sorted(unknown))}[/red]")
+        return 1
+
+    options = {
+        'iterations': args.iterations,
+        'warmup': args.warmup,
+        'llm_latency': args.llm_latency,
+        'response_size': args.response_size,
+        'compiler': args.compiler,
+        'compile_latency': args.compile_latency,
+        'num_problems': args.num_problems,
+        'replay': os.path.abspath(args.replay) if args.replay else None,
+        'replay_latency': args.replay_latency
+    }
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for name in names:
+        console.print(f"[yellow]Running {name}...[/yellow]")
+        with context.Pool(1) as pool:
+            results.append(pool.apply(run_benchmark, (name, options)))
+
+    table = Table(title='Pipeline benchmark')
+    for column in ('Benchmark', 'Mean ms', 'p95 ms', 'CPU s', 'Peak RSS MB', 'Stages (mean ms)'):
+        table.add_column(column)
+    for result in results:
+        stages = ', '.join(f"{stage} {data['mean_ms']:.2f}" for stage, data in result['stages'].items())
+        table.add_row(result['name'], f"{result['mean_ms']:.2f}", f"{result['p95_ms']:.2f}",
+                      f"{result['cpu_s']:.3f}", f"{result['peak_rss_kb'] / 1024:.1f}", stages)
+    console.print(table)
+    for result in results:
+        if result['replay']:
+            console.print(f"{result['name']}: {result['replay']['hits']} replayed calls, "
+                          f"{result['replay']['misses']} misses")
+
+    output = {'options': options, 'benchmarks': results}
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparisons = compare(results, json.load(f), args.threshold)
+        output['comparison'] = comparisons
+        for comparison in comparisons:
+            color = 'red' if comparison['regression'] else 'green'
+            console.print(f"[{color}]{comparison['name']}: {comparison['baseline_mean_ms']:.2f} ms -> "
+                          f"{comparison['mean_ms']:.2f} ms ({comparison['change']:+.1%})[/{color}]")
+        if any(comparison['regression'] for comparison in comparisons):
+            console.print(f"[red]Error: slower than baseline by more than {args.threshold:.0%}[/red]")
+            status = 1
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(output, f, indent=2)
+        console.print(f"[green]✓ Results saved to: {args.json_output}[/green]")
+    return status
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Seed the listing tables with realistic row counts and check query plans.
+
+Run with ``python -m benchmarks.query_benchmark``. By default a throwaway
+SQLite database is used; pass ``--database-url`` to benchmark Postgres.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import sqlalchemy as sa
+from rich.console import Console
+
+from models.database import db, User, ProblemSet, GeneratedSet, Provider, DifficultyLevel
+
+console = Console()
+
+BATCH_SIZE = 10000
+FAKE_HASH = '0' * 64
+
+def setup_args() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Benchmark the listing queries and verify they use the composite indexes'
+    )
+    parser.add_argument('--database-url',
+                       help='Scratch database to benchmark; its tables are dropped and recreated (default: temporary SQLite file)')
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                       help='Comma separated generated_sets row counts to measure at (default: 10000,100000,1000000)')
+    parser.add_argument('--sets-per-problem-set', type=int, default=100,
+                       help='Generated sets per problem set (default: 100)')
+    parser.add_argument('--problem-sets-per-user', type=int, default=10,
+                       help='Problem sets per user (default: 10)')
+    parser.add_argument('--page-size', type=int, default=20,
+                       help='Page size used by the generated sets listing (default: 20)')
+    parser.add_argument('--repeat', type=int, default=50,
+                       help='Executions per query and size (default: 50)')
+    parser.add_argument('--json', dest='json_output',
+                       help='Write the results as JSON to this file')
+    return parser
+
+def listing_queries(user_id: int, problem_set_id: int, page_size: int) -> Dict[str, sa.Select]:
+    """Build the same query shapes app.py issues for the listing endpoints."""
+    cursor_created_at = datetime(2024, 1, 1) + timedelta(days=180)
+    generated = sa.select(
+        GeneratedSet.id, GeneratedSet.created_at, GeneratedSet.provider, GeneratedSet.difficulty,
+        GeneratedSet.num_problems, GeneratedSet.problems_pdf_path, GeneratedSet.solutions_pdf_path
+    ).join(ProblemSet).where(
+        ProblemSet.id == problem_set_id,
+        ProblemSet.user_id == user_id,
+        GeneratedSet.pooled.is_(False)
+    ).order_by(GeneratedSet.created_at.desc(), GeneratedSet.id.desc()).limit(page_size + 1)
+
+    return {
+        'problem_sets': sa.select(ProblemSet.id, ProblemSet.name, ProblemSet.created_at).where(
+            ProblemSet.user_id == user_id
+        ).order_by(ProblemSet.created_at.desc()),
+        'generated_sets_count': sa.select(
+            GeneratedSet.problem_set_id, sa.func.count(GeneratedSet.id)
+        ).where(
+            GeneratedSet.problem_set_id.in_(sa.select(ProblemSet.id).where(ProblemSet.user_id == user_id)),
+            GeneratedSet.pooled.is_(False)
+        ).group_by(GeneratedSet.problem_set_id),
+        'generated_sets_first_page': generated,
+        'generated_sets_cursor_page': generated.where(sa.or_(
+            GeneratedSet.created_at < cursor_created_at,
+            sa.and_(GeneratedSet.created_at == cursor_created_at, GeneratedSet.id < 1)
+        )),
+    }
+
+def explain(conn, query: sa.Select) -> str:
+    """Return the database's query plan as text."""
+    compiled = query.compile(conn, compile_kwargs={'literal_binds': True})
+    if conn.dialect.name == 'sqlite':
+        rows = conn.execute(sa.text(f'EXPLAIN QUERY PLAN {compiled}'))
+        return '\n'.join(row[-1] for row in rows)
+    rows = conn.execute(sa.text(f'EXPLAIN {compiled}'))
+    return '\n'.join(row[0] for row in rows)
+
+def uses_index(plan: str, dialect: str) -> bool:
+    """Check that no listing table is read with a full scan."""
+    if dialect == 'sqlite':
+        return not any(
+            line.strip().startswith('SCAN') and 'USING' not in line
+            for line in plan.splitlines()
+        )
+    return 'Seq Scan' not in plan
+
+def seed(conn, start: int, stop: int, args) -> None:
+    """Insert generated sets (and their users and problem sets) with ids in [start, stop)."""
+    per_user = args.problem_sets_per_user * args.sets_per_problem_set
+    base_time = datetime(2024, 1, 1)
+    users: List[dict] = []
+    problem_sets: List[dict] = []
+    generated_sets: List[dict] = []
+
+    def flush():
+        for table, rows in ((User.__table__, users), (ProblemSet.__table__, problem_sets),
+                            (GeneratedSet.__table__, generated_sets)):
+            if rows:
+                conn.execute(table.insert(), rows)
+                rows.clear()
+
+    for i in range(start, stop):
+        problem_set_id = i // args.sets_per_problem_set + 1
+        user_id = i // per_user + 1
+        if i % per_user == 0:
+            users.append({
+                'id': user_id, 'email': f'user{user_id}@example.com',
+                'password_hash': 'x', 'created_at': base_time
+            })
+        if i % args.sets_per_problem_set == 0:
+            problem_sets.append({
+                'id': problem_set_id, 'user_id': user_id, 'name': f'Problem set {problem_set_id}',
+                'created_at': base_time + timedelta(minutes=problem_set_id)
+            })
+        generated_sets.append({
+            'id': i + 1, 'problem_set_id': problem_set_id,
+            'provider': Provider.CLAUDE.name, 'difficulty': DifficultyLevel.SAME.name, 'num_problems': 5,
+            'problems_pdf_path': f'uploads/{i}/problems.pdf', 'solutions_pdf_path': f'uploads/{i}/solutions.pdf',
+            'problems_latex_hash': FAKE_HASH, 'problems_latex_size': 0,
+            'solutions_latex_hash': FAKE_HASH, 'solutions_latex_size': 0,
+            'created_at': base_time + timedelta(minutes=i)
+        })
+        if len(generated_sets) >= BATCH_SIZE:
+            flush()
+    flush()
+
+def measure(conn, query: sa.Select, repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'median_ms': statistics.median(timings),
+        'p95_ms': timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0],
+    }
+
+def main():
+    args = setup_args().parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    temp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        temp_dir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(temp_dir.name, 'benchmark.db')}"
+
+    engine = sa.create_engine(database_url)
+    results = []
+    all_indexed = True
+
+    try:
+        db.metadata.drop_all(engine)
+        db.metadata.create_all(engine)
+
+        seeded = 0
+        for size in sizes:
+            console.print(f"[yellow]Seeding up to {size} generated sets...[/yellow]")
+            with engine.begin() as conn:
+                seed(conn, seeded, size, args)
+                conn.execute(sa.text('ANALYZE'))
+            seeded = size
+
+            # Query the most recent user so the pages are full
+            last_user = (size - 1) // (args.problem_sets_per_user * args.sets_per_problem_set) + 1
+            last_problem_set = (size - 1) // args.sets_per_problem_set + 1
+
+            with engine.connect() as conn:
+                for name, query in listing_queries(last_user, last_problem_set, args.page_size).items():
+                    plan = explain(conn, query)
+                    indexed = uses_index(plan, conn.dialect.name)
+                    all_indexed = all_indexed and indexed
+                    timing = measure(conn, query, args.repeat)
+                    results.append({'rows': size, 'query': name, 'indexed': indexed, 'plan': plan, **timing})
+                    status = '[green]indexed[/green]' if indexed else '[red]FULL SCAN[/red]'
+                    console.print(f"  {name:<28} median {timing['median_ms']:8.3f} ms  "
+                                  f"p95 {timing['p95_ms']:8.3f} ms  {status}")
+                    if not indexed:
+                        console.print(plan)
+    finally:
+        engine.dispose()
+        if temp_dir:
+            temp_dir.cleanup()
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(results, f, indent=2)
+        console.print(f"[green]✓ Results saved to: {args.json_output}[/green]")
+
+    if not all_indexed:
+        console.print("[red]Error: some listing queries do not use an index[/red]")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
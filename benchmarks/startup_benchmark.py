@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Measure how long a fresh worker takes to import the app and serve a request.
+
+Run with ``python -m benchmarks.startup_benchmark``. Each run starts a new
+interpreter with ``-X importtime``, so the report breaks the import time
+down by module and by top-level package. The run fails when the median
+time to the first response exceeds ``--budget`` (DEFAULT_BUDGET_S unless
+given; 0 turns the check off).
+
+The default budget is the one second target for a fresh worker. Most of
+that time goes to importing Flask and SQLAlchemy, which takes about a
+second by itself on slow hosts such as small CI containers. The report
+therefore also shows how much of the import is the repository's own code,
+so a failure can be told apart from a slow host.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds a fresh worker may take to import the app and answer its first request
+DEFAULT_BUDGET_S = 1.0
+
+# Runs in the fresh interpreter; prints its timings as JSON on the last line
+WORKER_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import {module} as target
+imported = time.perf_counter()
+status = target.app.test_client().get({path!r}).status_code
+ready = time.perf_counter()
+print(json.dumps({{'import_s': imported - start, 'ready_s': ready - start, 'status': status}}))
+"""
+
+def setup_args() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Measure app import time and time to the first response in fresh interpreters'
+    )
+    parser.add_argument('--module', default='app',
+                       help='Module exposing the Flask app (default: app)')
+    parser.add_argument('--path', default='/metrics',
+                       help='Path requested once the app is imported (default: /metrics)')
+    parser.add_argument('--runs', type=int, default=5,
+                       help='Fresh interpreters to start (default: 5)')
+    parser.add_argument('--top', type=int, default=15,
+                       help='Modules and packages listed in the breakdown (default: 15)')
+    parser.add_argument('--database-url', default='sqlite:///:memory:',
+                       help='DATABASE_URL for the workers (default: in-memory SQLite)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_S,
+                       help=f'Fail when the median seconds to the first response exceed this, 0 to never fail '
+                            f'(default: {DEFAULT_BUDGET_S})')
+    parser.add_argument('--json', dest='json_output',
+                       help='Write the results as JSON to this file')
+    return parser
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    Parse the ``-X importtime`` report.
+
+    Returns:
+        One dict per imported module with its self and cumulative time in
+        microseconds and its nesting depth
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # Skips the header line
+            continue
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        modules.append({
+            'module': stripped,
+            'self_us': int(fields[0]),
+            'cumulative_us': int(fields[1]),
+            'depth': (len(name) - len(stripped) - 1) // 2
+        })
+    return modules
+
+def package_breakdown(modules: List[Dict]) -> Dict[str, int]:
+    """Sum the self time of modules by top-level package, in microseconds."""
+    totals: Dict[str, int] = defaultdict(int)
+    for module in modules:
+        totals[module['module'].split('.')[0]] += module['self_us']
+    return dict(totals)
+
+def is_own_package(name: str) -> bool:
+    """Whether a top-level package is part of this repository rather than a dependency."""
+    return os.path.isfile(os.path.join(REPO_ROOT, f'{name}.py')) or os.path.isdir(os.path.join(REPO_ROOT, name))
+
+def run_once(module: str, path: str, database_url: str) -> Dict:
+    """Start one interpreter, import the app and serve a request."""
+    env = {**os.environ, 'DATABASE_URL': database_url}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', WORKER_SCRIPT.format(module=module, path=path)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    process_s = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Worker failed: {result.stderr.strip().splitlines()[-1:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process_s'] = process_s
+    timings['modules'] = parse_importtime(result.stderr)
+    return timings
+
+def summarize(runs: List[Dict]) -> Dict:
+    """Take medians across runs, per module and per package."""
+    module_times: Dict[str, List[int]] = defaultdict(list)
+    package_times: Dict[str, List[int]] = defaultdict(list)
+    for run in runs:
+        for module in run['modules']:
+            module_times[module['module']].append(module['cumulative_us'])
+        for package, self_us in package_breakdown(run['modules']).items():
+            package_times[package].append(self_us)
+    return {
+        'runs': len(runs),
+        'import_s': statistics.median(run['import_s'] for run in runs),
+        'ready_s': statistics.median(run['ready_s'] for run in runs),
+        'process_s': statistics.median(run['process_s'] for run in runs),
+        'modules': {name: statistics.median(times) for name, times in module_times.items()},
+        'packages': {name: statistics.median(times) for name, times in package_times.items()},
+        'own_import_s': statistics.median(
+            sum(self_us for package, self_us in package_breakdown(run['modules']).items() if is_own_package(package))
+            for run in runs
+        ) / 1e6
+    }
+
+def main():
+    args = setup_args().parse_args()
+    runs = []
+    for index in range(args.runs):
+        console.print(f"[yellow]Starting worker {index + 1}/{args.runs}...[/yellow]")
+        try:
+            runs.append(run_once(args.module, args.path, args.database_url))
+        except RuntimeError as e:
+            console.print(f"[red]Error: {str(e)}[/red]")
+            return 1
+    summary = summarize(runs)
+
+    packages = Table(title='Self import time by package (median)')
+    packages.add_column('Package')
+    packages.add_column('ms')
+    for name, self_us in sorted(summary['packages'].items(), key=lambda item: -item[1])[:args.top]:
+        packages.add_row(name, f"{self_us / 1000:.1f}")
+    console.print(packages)
+
+    modules = Table(title='Cumulative import time by module (median)')
+    modules.add_column('Module')
+    modules.add_column('ms')
+    for name, cumulative_us in sorted(summary['modules'].items(), key=lambda item: -item[1])[:args.top]:
+        modules.add_row(name, f"{cumulative_us / 1000:.1f}")
+    console.print(modules)
+
+    console.print(f"Import: {summary['import_s'] * 1000:.0f} ms, first response: {summary['ready_s'] * 1000:.0f} ms, "
+                  f"whole process: {summary['process_s'] * 1000:.0f} ms")
+    console.print(f"Repository code: {summary['own_import_s'] * 1000:.0f} ms of the import; the rest is dependencies")
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        console.print(f"[green]✓ Results saved to: {args.json_output}[/green]")
+
+    if args.budget and summary['ready_s'] > args.budget:
+        console.print(f"[red]Error: first response after {summary['ready_s']:.2f}s, budget is {args.budget:.2f}s[/red]")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
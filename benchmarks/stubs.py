@@ -0,0 +1,145 @@
+"""Offline stand-ins for the LLM providers and the LaTeX compiler.
+
+Both stubs sleep for a configurable latency and produce output shaped like
+the real thing, so benchmarks and load tests exercise the rest of the
+pipeline without network access or a Tectonic install.
+"""
+import os
+import random
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from providers import LLMProvider
+from utils.cancellation import current_token
+
+def _minimal_pdf() -> bytes:
+    """Build the smallest well-formed single-page PDF, with a correct xref table."""
+    objects = [
+        b"<</Type/Catalog/Pages 2 0 R>>",
+        b"<</Type/Pages/Kids[3 0 R]/Count 1>>",
+        b"<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj" % number + body + b"endobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer<</Size %d/Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+# Good enough for downloads, archives and anything that only opens the file
+MINIMAL_PDF = _minimal_pdf()
+
+PROBLEM = r"\item $\displaystyle \lim_{x \to \infty} \frac{%d x^2 + 1}{x^2 - %d}$"
+SOLUTION = r"""Solution:
+$\displaystyle \lim_{x \to \infty} \frac{%d x^2 + 1}{x^2 - %d}$
+\begin{align*}
+&= \lim_{x \to \infty} \frac{%d + \frac{1}{x^2}}{1 - \frac{%d}{x^2}} \\
+&= \boxed{%d}
+\end{align*}"""
+
+def _sleep(latency: float, jitter: float, rng: random.Random) -> None:
+    delay = latency + (rng.uniform(-jitter, jitter) if jitter else 0.0)
+    token = current_token()
+    if token:
+        # Wake up as soon as the work is cancelled, like an aborted request or killed compile
+        token.wait(max(delay, 0.0))
+        token.check()
+    elif delay > 0:
+        time.sleep(delay)
+
+class StubProvider(LLMProvider):
+    """LLM provider returning synthetic LaTeX after a configurable delay.
+
+    Args:
+        latency: Seconds each call takes
+        jitter: Maximum random deviation from latency, in seconds
+        response_size: Approximate response length in characters
+        seed: Seed for the jitter, for repeatable runs
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, response_size: int = 2000,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.response_size = response_size
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def execute(self, prompt: str, file_paths: Optional[List[str]] = None) -> str:
+        self.calls += 1
+        _sleep(self.latency, self.jitter, self._random)
+
+        if "Generate detailed solutions" in prompt:
+            return self._repeat(lambda i: SOLUTION % (i, i, i, i, i), '\n\n')
+        items = self._repeat(lambda i: PROBLEM % (i, i), '\n')
+        if "Convert this math problem" in prompt:
+            return ("\\documentclass{article}\n\\usepackage{amsmath}\n\\begin{document}\n"
+                    f"\\begin{{enumerate}}\n{items}\n\\end{{enumerate}}\n\\end{{document}}")
+        return f"\\begin{{enumerate}}\n{items}\n\\end{{enumerate}}"
+
+    def _repeat(self, render, separator: str) -> str:
+        parts = []
+        length = 0
+        i = 1
+        while length < self.response_size or not parts:
+            part = render(i)
+            parts.append(part)
+            length += len(part) + len(separator)
+            i += 1
+        return separator.join(parts)
+
+class FakeLatexCompiler:
+    """Drop-in for LatexCompiler that writes a minimal PDF instead of running Tectonic.
+
+    Args:
+        latency: Seconds each compilation takes
+        jitter: Maximum random deviation from latency, in seconds
+        seed: Seed for the jitter, for repeatable runs
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def compile_to_pdf(self, tex_file: str, output_dir: Optional[str] = None) -> str:
+        tex_path = Path(tex_file)
+        if not tex_path.exists():
+            raise FileNotFoundError(f"LaTeX file not found: {tex_file}")
+        self.calls += 1
+        _sleep(self.latency, self.jitter, self._random)
+
+        # Same output naming as LatexCompiler
+        pdf_path = str(tex_path).replace(".tex", ".pdf")
+        with open(pdf_path, 'wb') as f:
+            f.write(MINIMAL_PDF)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            final_pdf = os.path.join(output_dir, f"{tex_path.stem}.pdf")
+            shutil.move(pdf_path, final_pdf)
+            return final_pdf
+        return pdf_path
+
+def create_compiler(kind: str = 'auto', latency: float = 0.0, jitter: float = 0.0):
+    """
+    Create the LaTeX compiler a benchmark should use.
+
+    Args:
+        kind: 'tectonic', 'fake', or 'auto' (Tectonic when installed)
+        latency: Delay for the fake compiler, in seconds
+        jitter: Jitter for the fake compiler, in seconds
+
+    Returns:
+        LatexCompiler or FakeLatexCompiler
+    """
+    if kind == 'tectonic' or (kind == 'auto' and shutil.which('tectonic')):
+        from utils.latex_compiler import LatexCompiler
+        return LatexCompiler()
+    return FakeLatexCompiler(latency=latency, jitter=jitter)
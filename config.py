@@ -12,10 +12,116 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key')
     JWT_ACCESS_TOKEN_EXPIRES = 24 * 60 * 60  # 24 hours
     
+    # Password Hashing
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 32))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 1))  # seconds
+    
     # File Storage
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
+    # Storage Retention
+    STORAGE_GC_INTERVAL = int(os.getenv('STORAGE_GC_INTERVAL', 60 * 60))  # seconds, 0 disables
+    STORAGE_GC_GRACE_PERIOD = int(os.getenv('STORAGE_GC_GRACE_PERIOD', 60 * 60))  # seconds
+    GENERATED_PDF_RETENTION_DAYS = int(os.getenv('GENERATED_PDF_RETENTION_DAYS', 0))  # 0 keeps PDFs forever
+    USER_STORAGE_QUOTA_BYTES = int(os.getenv('USER_STORAGE_QUOTA_BYTES', 0))  # 0 is unlimited
+    
+    # PDF Downloads
+    # Only store the LaTeX at generation time and compile each PDF on first download
+    LAZY_PDF_COMPILE = os.getenv('LAZY_PDF_COMPILE', 'false').lower() in ('1', 'true', 'yes')
+    PDF_CACHE_MAX_AGE = int(os.getenv('PDF_CACHE_MAX_AGE', 24 * 60 * 60))  # seconds
+    # '' serves bytes from Python; 'x-accel-redirect' (nginx) or 'x-sendfile'
+    # (Apache, lighttpd) hand the file to the front proxy after authorization
+    PDF_SENDFILE_MODE = os.getenv('PDF_SENDFILE_MODE', '')
+    # Internal nginx location that maps onto UPLOAD_FOLDER
+    PDF_ACCEL_REDIRECT_PREFIX = os.getenv('PDF_ACCEL_REDIRECT_PREFIX', '/protected-uploads/')
+    # Exports of sets with uncompiled PDFs answer 202 and compile them in the background
+    EXPORT_MAX_COMPILES = int(os.getenv('EXPORT_MAX_COMPILES', 4))  # PDFs started per export request
+    EXPORT_RETRY_AFTER = int(os.getenv('EXPORT_RETRY_AFTER', 5))  # seconds clients wait before retrying
+    
+    # Blob Storage (LaTeX payloads, content-addressed and zstd-compressed)
+    BLOB_STORE_BACKEND = os.getenv('BLOB_STORE_BACKEND', 'local')  # 'local' or 's3'
+    BLOB_STORE_PATH = os.getenv('BLOB_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blobs'))
+    BLOB_STORE_S3_BUCKET = os.getenv('BLOB_STORE_S3_BUCKET')
+    BLOB_STORE_S3_PREFIX = os.getenv('BLOB_STORE_S3_PREFIX', '')
+    BLOB_STORE_S3_ENDPOINT_URL = os.getenv('BLOB_STORE_S3_ENDPOINT_URL')
+    BLOB_STORE_COMPRESSION_LEVEL = int(os.getenv('BLOB_STORE_COMPRESSION_LEVEL', 3))
+    
+    # Metrics
+    # When set, /metrics requires 'Authorization: Bearer <token>'. Set
+    # PROMETHEUS_MULTIPROC_DIR to aggregate metrics across worker processes.
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    
+    # Profiling
+    # Admins can profile a request by sending 'X-Profile: 1'; a sampled
+    # fraction of all requests can be profiled as well
+    ADMIN_EMAILS = [email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()]
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.0))  # fraction of requests, 0 disables
+    PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.005))  # seconds between stack samples
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+    PROFILE_MAX_COUNT = int(os.getenv('PROFILE_MAX_COUNT', 100))  # most recent profiles kept
+    
+    # Background Jobs
+    # 'inline' runs generation and PDF conversion in the web process; 'queue'
+    # only enqueues jobs for worker processes (python worker.py)
+    GENERATION_MODE = os.getenv('GENERATION_MODE', 'inline')
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 2))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 60))  # a job is requeued when its worker goes quiet this long
+    JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', 5))  # seconds; also bounds how long a cancelled job keeps running
+    JOB_UNWATCHED_TIMEOUT = float(os.getenv('JOB_UNWATCHED_TIMEOUT', 60))  # seconds a polled job runs on after polling stops; 0 to never cancel
+    WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', 2))  # jobs each worker process runs at once
+    WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', 1.0))  # seconds between polls of an empty queue
+    
+    # Pre-generation Pool
+    # Popular problem set settings keep a few generated sets ready; a request
+    # takes one instantly and the pool is refilled in the background
+    POOL_SIZE = int(os.getenv('POOL_SIZE', 0))  # sets kept ready per popular setting, 0 disables the pool
+    POOL_MIN_DEMAND = float(os.getenv('POOL_MIN_DEMAND', 5))  # decayed requests before settings get a pool
+    POOL_DEMAND_HALF_LIFE = float(os.getenv('POOL_DEMAND_HALF_LIFE', 7 * 24 * 60 * 60))  # seconds
+    POOL_DAILY_BUDGET = int(os.getenv('POOL_DAILY_BUDGET', 50))  # pre-generations per 24 hours
+    POOL_MAX_AGE_DAYS = int(os.getenv('POOL_MAX_AGE_DAYS', 7))  # unclaimed pooled sets are dropped after this
+    POOL_REFILL_INTERVAL = float(os.getenv('POOL_REFILL_INTERVAL', 60))  # seconds between refill passes
+    
+    # Near-duplicate Problems
+    DEDUP_MODE = os.getenv('DEDUP_MODE', 'replace')  # 'replace' regenerates duplicates, 'flag' only counts them, 'off'
+    DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', 0.85))  # estimated similarity that counts as a duplicate
+    DEDUP_MAX_ROUNDS = int(os.getenv('DEDUP_MAX_ROUNDS', 1))  # regeneration attempts before duplicates are kept
+    
+    # Answer Checking
+    # Boxed answers to limit problems are checked with SymPy in worker processes
+    ANSWER_CHECK_MODE = os.getenv('ANSWER_CHECK_MODE', 'regenerate')  # 'regenerate' wrong solutions, 'flag' only counts them, 'off'
+    ANSWER_CHECK_PROCESSES = int(os.getenv('ANSWER_CHECK_PROCESSES', 2))
+    ANSWER_CHECK_TIMEOUT = float(os.getenv('ANSWER_CHECK_TIMEOUT', 5))  # seconds per answer before it counts as unchecked
+    ANSWER_CHECK_MAX_ROUNDS = int(os.getenv('ANSWER_CHECK_MAX_ROUNDS', 1))  # regeneration attempts before wrong answers are kept
+    
+    # Cancellation
+    # In-flight work a progress stream was watching is cancelled once every
+    # stream of its user has been closed for this long
+    CANCEL_GRACE_PERIOD = float(os.getenv('CANCEL_GRACE_PERIOD', 10))  # seconds
+    SSE_PING_INTERVAL = float(os.getenv('SSE_PING_INTERVAL', 15))  # seconds; closed streams are noticed on the next ping
+    
+    # Backend Hooks
+    # Callables used instead of the real backends, e.g. by tests and load tests:
+    # PROVIDER_FACTORY(name) returns an LLM provider, LATEX_COMPILER_FACTORY() a compiler
+    PROVIDER_FACTORY = None
+    LATEX_COMPILER_FACTORY = None
+    
+    # Pagination
+    GENERATED_SETS_PAGE_SIZE = int(os.getenv('GENERATED_SETS_PAGE_SIZE', 20))
+    GENERATED_SETS_MAX_PAGE_SIZE = int(os.getenv('GENERATED_SETS_MAX_PAGE_SIZE', 100))
+    
+    # LLM Interaction Log
+    LLM_LOG_DIR = os.getenv('LLM_LOG_DIR', 'logs')  # where conversions and generations are recorded
+    LLM_LOG_BACKEND = os.getenv('LLM_LOG_BACKEND', 'jsonl')  # 'jsonl' or 'legacy' (one JSON file per call)
+    LLM_LOG_SAMPLE_RATE = float(os.getenv('LLM_LOG_SAMPLE_RATE', 1.0))  # fraction of calls recorded
+    LLM_LOG_MAX_BYTES = int(os.getenv('LLM_LOG_MAX_BYTES', 64 * 1024 * 1024))  # rotate segments at this size
+    LLM_LOG_ROTATE_INTERVAL = int(os.getenv('LLM_LOG_ROTATE_INTERVAL', 24 * 60 * 60))  # seconds, 0 disables
+    LLM_LOG_COMPRESS = os.getenv('LLM_LOG_COMPRESS', 'true').lower() in ('1', 'true', 'yes')  # gzip closed segments
+    LLM_LOG_QUEUE_SIZE = int(os.getenv('LLM_LOG_QUEUE_SIZE', 1000))  # entries buffered before dropping
+    
     # API Keys
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams } from 'react-router-dom';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import {
   Box,
   Button,
@@ -30,6 +30,7 @@ import {
 import { Add as AddIcon, Download as DownloadIcon, Close as CloseIcon } from '@mui/icons-material';
 import axios from '../utils/axios';
 import { downloadService } from '../services/downloadService';
+import { jobService } from '../services/jobService';
 import { formatDistanceToNow } from 'date-fns';
 
 function GeneratedSets() {
@@ -47,7 +48,7 @@ function GeneratedSets() {
     if (!token) return;
 
     console.log('Creating EventSource connection...');
-    const eventSource = new EventSource(`http://localhost:8081/api/events?token=${token}`, {
+    const eventSource = new EventSource(`http://localhost:8081/api/events?token=${token}&problem_set=${problemSetId}`, {
       withCredentials: true
     });
     
@@ -80,13 +81,27 @@ function GeneratedSets() {
       console.log('Closing SSE connection');
       eventSource.close();
     };
-  }, []);
+  }, [problemSetId]);
 
-  const { data: generatedSets, isLoading } = useQuery({
+  // Sets come a page at a time, newest first; X-Next-Cursor points to the next page
+  const {
+    data,
+    isLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
     queryKey: ['generatedSets', problemSetId],
-    queryFn: async () =>
-      axios.get(`/api/problem-sets/${problemSetId}/generated`).then((res) => res.data),
+    queryFn: async ({ pageParam }) => {
+      const res = await axios.get(`/api/problem-sets/${problemSetId}/generated`, {
+        params: pageParam ? { cursor: pageParam } : {},
+      });
+      return { sets: res.data, nextCursor: res.headers['x-next-cursor'] };
+    },
+    initialPageParam: null,
+    getNextPageParam: (lastPage) => lastPage.nextCursor || undefined,
   });
+  const generatedSets = data?.pages.flatMap((page) => page.sets);
 
   const handleClose = () => {
     setOpen(false);
@@ -110,6 +125,13 @@ function GeneratedSets() {
           num_problems: numProblems,
         };
         const response = await axios.post(`/api/problem-sets/${problemSetId}/generate`, data);
+        if (response.status === 202) {
+          // Queue mode: a worker generates the set while we poll its job
+          const job = await jobService.waitForJob(response.data, (current) =>
+            setProgress(current.message || '')
+          );
+          return { ...job.result, id: job.result.generated_set_id };
+        }
         return response.data;
       } catch (error) {
         console.error('Generate error:', error.response?.data || error);
@@ -159,47 +181,52 @@ function GeneratedSets() {
       {/* Generated Sets List */}
       <Box sx={{ mt: 3 }}>
         <List>
-          {generatedSets
-            ?.sort((a, b) => new Date(a.created_at) - new Date(b.created_at))
-            .map((set) => (
-              <ListItem 
-                key={set.id}
-                divider
-                sx={{ 
-                  backgroundColor: 'background.paper',
-                  borderRadius: 1,
-                  mb: 1,
-                  '&:hover': {
-                    backgroundColor: 'action.hover',
-                  }
-                }}
-              >
-                <ListItemText
-                  primary={formatDistanceToNow(new Date(set.created_at))}
-                  secondary={
-                    <Typography variant="body2" color="text.secondary">
-                      {set.num_problems} problems • {set.difficulty} difficulty • {set.provider.toLowerCase()} provider
-                    </Typography>
-                  }
-                />
-                <ListItemSecondaryAction>
-                  <Button 
-                    onClick={() => handleDownload('problems', set.id)}
-                    color="primary"
-                    sx={{ mr: 1 }}
-                  >
-                    Problems
-                  </Button>
-                  <Button 
-                    onClick={() => handleDownload('solutions', set.id)}
-                    color="secondary"
-                  >
-                    Solutions
-                  </Button>
-                </ListItemSecondaryAction>
-              </ListItem>
-            ))}
+          {generatedSets?.map((set) => (
+            <ListItem 
+              key={set.id}
+              divider
+              sx={{ 
+                backgroundColor: 'background.paper',
+                borderRadius: 1,
+                mb: 1,
+                '&:hover': {
+                  backgroundColor: 'action.hover',
+                }
+              }}
+            >
+              <ListItemText
+                primary={formatDistanceToNow(new Date(set.created_at))}
+                secondary={
+                  <Typography variant="body2" color="text.secondary">
+                    {set.num_problems} problems • {set.difficulty} difficulty • {set.provider.toLowerCase()} provider
+                  </Typography>
+                }
+              />
+              <ListItemSecondaryAction>
+                <Button 
+                  onClick={() => handleDownload('problems', set.id)}
+                  color="primary"
+                  sx={{ mr: 1 }}
+                >
+                  Problems
+                </Button>
+                <Button 
+                  onClick={() => handleDownload('solutions', set.id)}
+                  color="secondary"
+                >
+                  Solutions
+                </Button>
+              </ListItemSecondaryAction>
+            </ListItem>
+          ))}
         </List>
+        {hasNextPage && (
+          <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+            <Button onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+              {isFetchingNextPage ? 'Loading...' : 'Load more'}
+            </Button>
+          </Box>
+        )}
       </Box>
 
       {/* Generation Dialog */}
@@ -286,7 +313,7 @@ function GeneratedSets() {
 
           {generateSet.isError && (
             <Typography color="error" sx={{ mt: 2 }}>
-              Error: {generateSet.error?.response?.data?.error || 'Failed to generate problems'}
+              Error: {generateSet.error?.response?.data?.error || generateSet.error?.job?.error || 'Failed to generate problems'}
             </Typography>
           )}
         </DialogContent>
@@ -27,6 +27,7 @@ import {
 import { Add as AddIcon, Upload as UploadIcon } from '@mui/icons-material';
 import { useDropzone } from 'react-dropzone';
 import axios from '../utils/axios';
+import { jobService } from '../services/jobService';
 import { formatDistanceToNow } from 'date-fns';
 import { useSnackbar } from 'notistack';
 
@@ -159,6 +160,15 @@ function ProblemSets() {
           console.log('Upload progress:', progress);
           setUploadProgress(progress);
         },
+      }).then(async (response) => {
+        if (response.status === 202) {
+          // Queue mode: a worker converts the PDF while we poll its job
+          await jobService.waitForJob(response.data.job, (job) => {
+            setProgress(job.message || '');
+            setProcessingProgress(job.progress || 0);
+          });
+        }
+        return response;
       });
     },
     onSuccess: (response) => {
@@ -183,7 +193,7 @@ function ProblemSets() {
       if (error.response?.status === 401) {
         window.location.href = '/login';
       } else {
-        alert(error.response?.data?.error || 'Error uploading file. Please check the console for details.');
+        alert(error.response?.data?.error || error.job?.error || 'Error uploading file. Please check the console for details.');
       }
     }
   });
@@ -1,14 +1,33 @@
 import axios from '../utils/axios';
 
+// Downloaded files keyed by URL, revalidated with their ETag on each open
+const cache = new Map();
+
+const fetchBlob = async (url) => {
+  const cached = cache.get(url);
+  const response = await axios({
+    url,
+    method: 'GET',
+    responseType: 'blob',
+    headers: cached ? { 'If-None-Match': cached.etag } : {},
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+
+  if (response.status === 304 && cached) {
+    return cached.blob;
+  }
+
+  const blob = new Blob([response.data], { type: response.headers['content-type'] });
+  const etag = response.headers['etag'];
+  if (etag) {
+    cache.set(url, { etag, blob });
+  }
+  return blob;
+};
+
 const downloadFile = async (url, filename) => {
   try {
-    const response = await axios({
-      url,
-      method: 'GET',
-      responseType: 'blob',
-    });
-
-    const blob = new Blob([response.data], { type: response.headers['content-type'] });
+    const blob = await fetchBlob(url);
     const downloadUrl = window.URL.createObjectURL(blob);
     const link = document.createElement('a');
     link.href = downloadUrl;
@@ -0,0 +1,30 @@
+import axios from '../utils/axios';
+
+const FINISHED = ['succeeded', 'failed', 'cancelled'];
+const POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Poll a queued job (GENERATION_MODE=queue) until a worker finishes it
+const waitForJob = async (job, onProgress) => {
+  let current = job;
+  while (!FINISHED.includes(current.status)) {
+    await sleep(POLL_INTERVAL_MS);
+    const response = await axios.get(`/api/jobs/${current.id}`);
+    current = response.data;
+    if (onProgress) {
+      onProgress(current);
+    }
+  }
+
+  if (current.status !== 'succeeded') {
+    const error = new Error(current.error || `Job ${current.status}`);
+    error.job = current;
+    throw error;
+  }
+  return current;
+};
+
+export const jobService = {
+  waitForJob,
+};
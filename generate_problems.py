@@ -1,64 +1,352 @@
 #!/usr/bin/env python3
+"""Generate problem sets similar to a template.
+
+Give a LaTeX or PDF template to generate one set. Give a directory of
+templates, or a JSONL manifest with one {"template", "difficulty",
+"num_problems"} object per line, to generate a set for each template (and
+each of --difficulties) in batch mode. Batch mode writes every set to its
+own directory under --output-dir and appends a line per finished set to a
+JSONL results manifest; running the same batch again skips the sets the
+manifest lists as done.
+"""
 import argparse
+import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 from rich.console import Console
 from utils.problem_generator import ProblemGenerator
+from utils.single_flight import SingleFlight
+from math_latex import MathLatexConverter
 from providers.claude_provider import ClaudeProvider
 from providers.gemini_provider import GeminiProvider
 
 console = Console()
 
+DIFFICULTIES = ['same', 'challenge', 'harder']
+TEMPLATE_EXTENSIONS = ('.tex', '.pdf')
+
 def setup_args() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description='Generate math problems similar to a template'
     )
     parser.add_argument('template_file',
-                       help='Input LaTeX template file')
+                       help='Input LaTeX template file, or a directory of templates or JSONL manifest for batch mode')
     parser.add_argument('--output-dir',
-                       help='Output directory for generated files')
+                       help='Output directory for generated files (required in batch mode)')
     parser.add_argument('--provider', choices=['claude', 'gemini'],
                        default='claude',
                        help='LLM provider to use (default: claude)')
-    parser.add_argument('--difficulty', choices=['same', 'challenge', 'harder'], default='same',
+    parser.add_argument('--difficulty', choices=DIFFICULTIES, default='same',
                       help='Difficulty level: same (100% same), challenge (20% harder), harder (80% harder)')
     parser.add_argument('--num-problems', type=int,
                        default=5,
                        help='Number of problems to generate (default: 5)')
+    parser.add_argument('--difficulties',
+                       help='Batch mode: comma separated difficulties to generate for each template '
+                            '(default: --difficulty)')
+    parser.add_argument('--llm-concurrency', type=int, default=4,
+                       help='Batch mode: sets generated by the LLM at the same time (default: 4)')
+    parser.add_argument('--compile-concurrency', type=int, default=2,
+                       help='Batch mode: sets compiled at the same time (default: 2)')
+    parser.add_argument('--results',
+                       help='Batch mode: JSONL results manifest (default: results.jsonl in --output-dir)')
+    parser.add_argument('--rerun', action='store_true',
+                       help='Batch mode: generate sets again even if the results manifest lists them as done')
     return parser
 
+class BatchItem:
+    """One set to generate in batch mode.
+
+    Args:
+        template: Path to the LaTeX or PDF template
+        difficulty: Difficulty level
+        num_problems: Number of problems
+        item_id: Name of the set's output directory and key in the results manifest
+    """
+
+    def __init__(self, template: str, difficulty: str, num_problems: int, item_id: Optional[str] = None):
+        self.template = template
+        self.difficulty = difficulty
+        self.num_problems = num_problems
+        self.id = item_id or _item_id(template, difficulty, num_problems)
+
+def _slug(path: str) -> str:
+    """Turn a template path into a file name."""
+    name = os.path.splitext(os.path.normpath(path))[0].replace(os.sep, '__')
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('._') or 'template'
+
+def _item_id(template: str, difficulty: str, num_problems: int) -> str:
+    return f"{_slug(template)}-{difficulty}-{num_problems}"
+
+def find_items(source: str, difficulties: List[str], num_problems: int) -> List[BatchItem]:
+    """
+    List the sets of a batch.
+
+    Args:
+        source: Directory searched recursively for templates, or a JSONL manifest;
+            manifest templates are relative to the manifest
+        difficulties: Difficulties generated for each template of a directory,
+            and for manifest entries without one
+        num_problems: Default number of problems
+
+    Returns:
+        The sets, in a stable order
+    """
+    if os.path.isdir(source):
+        templates = sorted(
+            os.path.relpath(os.path.join(root, name), source)
+            for root, _, names in os.walk(source) for name in names
+            if name.lower().endswith(TEMPLATE_EXTENSIONS)
+        )
+        return [BatchItem(os.path.join(source, template), difficulty, num_problems,
+                          _item_id(template, difficulty, num_problems))
+                for template in templates for difficulty in difficulties]
+
+    items = []
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'template' not in entry:
+                raise ValueError(f"{source}:{number}: entry has no template")
+            template = os.path.join(base, entry['template'])
+            for difficulty in ([entry['difficulty']] if 'difficulty' in entry else difficulties):
+                if difficulty not in DIFFICULTIES:
+                    raise ValueError(f"{source}:{number}: unknown difficulty {difficulty}")
+                count = int(entry.get('num_problems', num_problems))
+                items.append(BatchItem(template, difficulty, count,
+                                       entry.get('id') or _item_id(entry['template'], difficulty, count)))
+    return items
+
+def completed_items(results_path: str) -> Dict[str, dict]:
+    """Return the last successful result of each set in a results manifest whose PDFs still exist."""
+    done = {}
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # The last line of a run that was killed may be cut off
+                continue
+            if result.get('status') == 'ok':
+                done[result['id']] = result
+            else:
+                done.pop(result.get('id'), None)
+    return {item_id: result for item_id, result in done.items()
+            if os.path.exists(result['problems_pdf']) and os.path.exists(result['solutions_pdf'])}
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+class _ResultWriter:
+    """Append results to the manifest, one flushed line each, from any thread."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+        if self._file.tell() and not _ends_with_newline(path):
+            # Keep the next result off the cut-off line a killed run left behind
+            self._file.write("\n")
+
+    def write(self, result: dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(result) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+def run_batch(generator: ProblemGenerator, items: List[BatchItem], output_dir: str,
+              results_path: Optional[str] = None, llm_concurrency: int = 4, compile_concurrency: int = 2,
+              rerun: bool = False, on_result: Optional[Callable[[dict], None]] = None,
+              log_dir: Optional[str] = None) -> dict:
+    """
+    Generate and compile the sets of a batch.
+
+    LLM calls and compilations run in separate thread pools, so sets waiting
+    for the LLM do not hold up compilation and the other way round. PDF
+    templates are converted to LaTeX once, under output_dir/templates, and
+    the conversion is reused by every set of the template. A failed set is
+    recorded and the batch goes on.
+
+    Args:
+        generator: Generates and compiles each set
+        items: The sets
+        output_dir: Each set is written to its own directory here
+        results_path: JSONL results manifest (default: output_dir/results.jsonl)
+        llm_concurrency: Sets generated at the same time
+        compile_concurrency: Sets compiled at the same time
+        rerun: Whether to generate sets the manifest already lists as done
+        on_result: Called with each set's result as it finishes
+        log_dir: Interaction log of the PDF conversions (default: output_dir/logs)
+
+    Returns:
+        Aggregate counts and timings of the run
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results_path = results_path or os.path.join(output_dir, 'results.jsonl')
+    log_dir = log_dir or os.path.join(output_dir, 'logs')
+    done = {} if rerun else completed_items(results_path)
+    pending = [item for item in items if item.id not in done]
+    writer = _ResultWriter(results_path)
+    conversions = SingleFlight()
+    summary = {'items': len(items), 'skipped': len(items) - len(pending), 'ok': 0, 'failed': 0,
+               'problems': 0, 'llm_seconds': 0.0, 'compile_seconds': 0.0}
+    summary_lock = threading.Lock()
+
+    def template_for(item: BatchItem) -> str:
+        if not item.template.lower().endswith('.pdf'):
+            return item.template
+        converted = os.path.join(output_dir, 'templates', _slug(os.path.abspath(item.template)) + '.tex')
+        if not os.path.exists(converted):
+            def convert():
+                if not os.path.exists(converted):
+                    latex = MathLatexConverter(generator.provider, log_dir).convert_to_latex(item.template)
+                    os.makedirs(os.path.dirname(converted), exist_ok=True)
+                    with open(converted + '.part', 'w') as f:
+                        f.write(latex)
+                    os.replace(converted + '.part', converted)
+            conversions.do(converted, convert)
+        return converted
+
+    def finish(item: BatchItem, result: dict) -> None:
+        result = {'id': item.id, 'template': item.template, 'difficulty': item.difficulty,
+                  'num_problems': item.num_problems, **result}
+        writer.write(result)
+        with summary_lock:
+            if result['status'] == 'ok':
+                summary['ok'] += 1
+                summary['problems'] += item.num_problems
+            else:
+                summary['failed'] += 1
+            summary['llm_seconds'] += result.get('llm_seconds', 0.0)
+            summary['compile_seconds'] += result.get('compile_seconds', 0.0)
+        if on_result:
+            on_result(result)
+
+    def compile_item(item: BatchItem, problems_latex: str, solutions_latex: str, llm_seconds: float) -> None:
+        start = time.perf_counter()
+        try:
+            problems_pdf, solutions_pdf = generator.compile_set(problems_latex, solutions_latex,
+                                                                os.path.join(output_dir, item.id))
+        except Exception as e:
+            finish(item, {'status': 'error', 'stage': 'compile', 'error': str(e), 'llm_seconds': llm_seconds,
+                          'compile_seconds': time.perf_counter() - start})
+            return
+        finish(item, {'status': 'ok', 'problems_pdf': problems_pdf, 'solutions_pdf': solutions_pdf,
+                      'llm_seconds': llm_seconds, 'compile_seconds': time.perf_counter() - start})
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max(1, llm_concurrency)) as llm_pool, \
+                ThreadPoolExecutor(max(1, compile_concurrency)) as compile_pool:
+            def generate_item(item: BatchItem):
+                llm_start = time.perf_counter()
+                try:
+                    problems_latex, solutions_latex = generator.generate_set(
+                        template_for(item), item.difficulty, item.num_problems)
+                except Exception as e:
+                    finish(item, {'status': 'error', 'stage': 'llm', 'error': str(e),
+                                  'llm_seconds': time.perf_counter() - llm_start})
+                    return None
+                return compile_pool.submit(compile_item, item, problems_latex, solutions_latex,
+                                           time.perf_counter() - llm_start)
+
+            try:
+                # Every compilation is submitted before the compile pool shuts down
+                for future in [llm_pool.submit(generate_item, item) for item in pending]:
+                    compiled = future.result()
+                    if compiled:
+                        compiled.result()
+            except BaseException:
+                # Interrupted: finish the sets in progress, start no new ones
+                llm_pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        writer.close()
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+def print_throughput(summary: dict) -> None:
+    """Print how much a batch run generated and how fast."""
+    seconds = summary['seconds']
+    finished = summary['ok'] + summary['failed']
+    console.print(f"\n[bold]{summary['ok']} sets generated, {summary['failed']} failed, "
+                  f"{summary['skipped']} already done[/bold] in {seconds:.1f}s")
+    if finished and seconds > 0:
+        console.print(f"Throughput: {summary['ok'] / seconds * 60:.1f} sets/min, "
+                      f"{summary['problems'] / seconds * 60:.1f} problems/min")
+        console.print(f"Mean per set: LLM {summary['llm_seconds'] / finished:.1f}s, "
+                      f"compile {summary['compile_seconds'] / finished:.1f}s")
+
+def _print_result(result: dict) -> None:
+    if result['status'] == 'ok':
+        console.print(f"[green]✓ {result['id']}[/green] "
+                      f"(LLM {result['llm_seconds']:.1f}s, compile {result['compile_seconds']:.1f}s)")
+    else:
+        console.print(f"[red]✗ {result['id']} ({result['stage']}): {result['error']}[/red]")
+
 def main():
     args = setup_args().parse_args()
-    
+
     try:
         # Select provider
         if args.provider == 'gemini':
             provider = GeminiProvider()
         else:
             provider = ClaudeProvider()
-            
+
+        if os.path.isdir(args.template_file) or args.template_file.lower().endswith('.jsonl'):
+            if not args.output_dir:
+                console.print("[red]Error: batch mode needs --output-dir[/red]")
+                return 1
+            # A batch keeps its interaction log with its output
+            generator = ProblemGenerator(provider, log_dir=os.path.join(args.output_dir, 'logs'))
+            difficulties = args.difficulties.split(',') if args.difficulties else [args.difficulty]
+            unknown = set(difficulties) - set(DIFFICULTIES)
+            if unknown:
+                console.print(f"[red]Error: unknown difficulties: {', '.join(sorted(unknown))}[/red]")
+                return 1
+            items = find_items(args.template_file, difficulties, args.num_problems)
+            console.print(f"[yellow]Generating {len(items)} sets using {args.provider}...[/yellow]")
+            summary = run_batch(generator, items, args.output_dir, args.results, args.llm_concurrency,
+                                args.compile_concurrency, args.rerun, on_result=_print_result)
+            print_throughput(summary)
+            return 1 if summary['failed'] else 0
+
         generator = ProblemGenerator(provider)
-        
         console.print(f"[yellow]Generating {args.num_problems} problems and solutions using {args.provider}...[/yellow]")
-        
-        problems_pdf, solutions_pdf = generator.create_problem_set(
+
+        problems_pdf, solutions_pdf, _, _ = generator.create_problem_set(
             args.template_file,
             output_dir=args.output_dir,
             difficulty=args.difficulty,
             num_problems=args.num_problems
         )
-        
+
         console.print(f"[green]✓ Generated problems saved to: {problems_pdf}[/green]")
         console.print(f"[green]✓ Generated solutions saved to: {solutions_pdf}[/green]")
-        
+
         if args.output_dir:
             problems_tex = os.path.join(args.output_dir, "problems.tex")
             solutions_tex = os.path.join(args.output_dir, "solutions.tex")
             console.print(f"[green]✓ LaTeX sources saved to: {problems_tex} and {solutions_tex}[/green]")
-            
+
     except Exception as e:
         console.print(f"[red]Error: {str(e)}[/red]")
         return 1
-        
+
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,14 @@
+"""Gunicorn settings for the API: gunicorn -c gunicorn.conf.py app:app
+
+With several workers, point PROMETHEUS_MULTIPROC_DIR at an empty directory
+(cleared on each deploy) so /metrics reports every worker.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8081')
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+
+def child_exit(server, worker):
+    # A dead worker's in-flight gauges would otherwise be summed forever
+    from utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
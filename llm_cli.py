@@ -2,6 +2,7 @@
 import argparse
 import os
 import sys
+import time
 from typing import Dict, List, Optional
 from rich.console import Console
 from rich import print as rprint
@@ -30,6 +31,8 @@ def setup_args() -> argparse.ArgumentParser:
                        help='Paths to image files to include')
     parser.add_argument('--log-dir', required=True,
                        help='Directory to store logs')
+    parser.add_argument('--log-backend', choices=['jsonl', 'legacy'],
+                       help='Interaction log format (default: LLM_LOG_BACKEND setting)')
     return parser
 
 def parse_vars(var_list: List[str]) -> Dict[str, str]:
@@ -48,7 +51,7 @@ def main():
     args = parser.parse_args()
 
     # Setup logging
-    logger = setup_logging(args.log_dir)
+    logger = setup_logging(args.log_dir, args.log_backend)
 
     # Validate and process images
     if args.images:
@@ -75,6 +78,7 @@ def main():
             provider = GeminiProvider()
 
         # Execute the prompt
+        start = time.perf_counter()
         response = provider.execute(
             prompt=final_prompt,
             image_paths=args.images
@@ -86,7 +90,8 @@ def main():
             prompt=final_prompt,
             variables=template_vars,
             images=args.images,
-            response=response
+            response=response,
+            latency_ms=(time.perf_counter() - start) * 1000
         )
 
         # Display the response
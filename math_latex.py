@@ -1,42 +1,71 @@
 #!/usr/bin/env python3
 import argparse
 import os
+import re
 import sys
 from typing import Optional
-from rich.console import Console
 import tempfile
-from pylatex import Document, Package
+import time
 from providers.claude_provider import ClaudeProvider
 from providers.gemini_provider import GeminiProvider
+from utils.latex_compiler import LatexCompiler
 from utils.logger import setup_logging
+from utils.metrics import span
+from utils.render_compare import MATCH, MISMATCH, ComparisonReport, compare_documents, render_page
 
-console = Console()
+# Resolution of the pages sent to the LLM when the local comparison is unsure
+LLM_PAGE_DPI = 150
+
+_CODE_FENCE = re.compile(r'^```[a-zA-Z]*[ \t]*$', re.MULTILINE)
+
+def standalone_document(latex: str) -> str:
+    """Strip markdown code fences and wrap a bare conversion in a document, so it compiles on its own."""
+    latex = _CODE_FENCE.sub('', latex).strip()
+    if '\\documentclass' in latex:
+        return latex
+    return ("\\documentclass{article}\n\\usepackage{amsmath,amssymb}\n\\begin{document}\n"
+            f"{latex}\n\\end{{document}}\n")
 
 class MathLatexConverter:
-    def __init__(self, provider, log_dir: str = 'logs'):
+    def __init__(self, provider, log_dir: Optional[str] = None):
+        from config import Config
         self.provider = provider
-        self.log_dir = log_dir
-        self.logger = setup_logging(log_dir)
+        self.log_dir = log_dir or Config.LLM_LOG_DIR
+        self.logger = setup_logging(self.log_dir)
 
     def convert_to_latex(self, file_path: str) -> str:
         """Convert a math problem from PDF/image to LaTeX."""
         with open('latex_prompt.txt', 'r') as file:
             prompt = file.read()
         
-        latex = self.provider.execute(prompt, [file_path])
+        start = time.perf_counter()
+        with span('convert.pdf_to_latex'):
+            latex = self.provider.execute(prompt, [file_path])
         self.logger.log_interaction(
             model=self.provider.__class__.__name__,
             prompt=prompt,
             response=latex,
             images=[file_path],
-            variables={}  # Add empty variables dict
+            variables={},  # Add empty variables dict
+            latency_ms=(time.perf_counter() - start) * 1000
         )
         return latex
 
-    def validate_conversion(self, original_file: str, latex_content: str) -> bool:
-        """Validate the conversion by comparing with LLM."""
+    def validate_conversion(self, original_file: str, latex_content: str, page: Optional[int] = None) -> bool:
+        """Validate the conversion by comparing with LLM.
+
+        Args:
+            original_file: The converted document, or with page an image of one of its pages
+            latex_content: The conversion
+            page: Number of the page original_file shows, when it is a single page
+        """
+        if page is None:
+            question = "Compare this LaTeX code with the content in the document. Are they mathematically equivalent?"
+        else:
+            question = (f"This image is page {page} of the converted document. Does the LaTeX code reproduce "
+                        "everything on this page, with mathematically equivalent expressions?")
         prompt = (
-            "Compare this LaTeX code with the content in the document. Are they mathematically equivalent?\n\n"
+            f"{question}\n\n"
             f"LaTeX Code:\n{latex_content}\n\n"
             "Consider:\n"
             "1. Mathematical expressions and symbols\n"
@@ -45,16 +74,60 @@ class MathLatexConverter:
             "Answer with ONLY 'yes' or 'no'."
         )
         
+        start = time.perf_counter()
         result = self.provider.execute(prompt, [original_file])
         self.logger.log_interaction(
             model=self.provider.__class__.__name__,
             prompt=prompt,
             response=result,
             images=[original_file],
-            variables={}
+            variables={},
+            latency_ms=(time.perf_counter() - start) * 1000
         )
         return result.strip().lower() == 'yes'
 
+    def validate_rendered(self, original_file: str, latex_content: str, compiler: Optional[LatexCompiler] = None,
+                          llm_fallback: bool = True, workers: int = 4) -> ComparisonReport:
+        """
+        Validate the conversion by compiling it and comparing the pages with the original.
+
+        Pages are rasterized at low resolution and scored locally on their
+        ink and, where both have one, their text layer (see
+        utils.render_compare). Only pages the scores leave ambiguous are sent
+        to the LLM, one page image each.
+
+        Args:
+            original_file: The converted PDF or image
+            latex_content: The conversion
+            compiler: Compiles the conversion (default: LatexCompiler())
+            llm_fallback: Whether to ask the LLM about ambiguous pages
+            workers: Most pages compared at once
+
+        Returns:
+            The verdict on each page
+
+        Raises:
+            RuntimeError: If the conversion does not compile
+        """
+        compiler = compiler or LatexCompiler()
+        with tempfile.TemporaryDirectory() as work_dir:
+            tex_file = os.path.join(work_dir, 'conversion.tex')
+            with open(tex_file, 'w') as f:
+                f.write(standalone_document(latex_content))
+            with span('convert.render_compare'):
+                rendered = compiler.compile_to_pdf(tex_file, work_dir)
+                report = compare_documents(original_file, rendered, workers=workers)
+
+            if llm_fallback:
+                for page in report.ambiguous():
+                    image, _ = render_page(original_file, page.page - 1, LLM_PAGE_DPI)
+                    image_file = os.path.join(work_dir, f'page-{page.page}.png')
+                    image.save(image_file)
+                    matches = self.validate_conversion(image_file, latex_content, page=page.page)
+                    page.verdict = MATCH if matches else MISMATCH
+                    page.checked_by_llm = True
+        return report
+
 def setup_args() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description='Convert math problems from PDF/image to LaTeX'
@@ -67,11 +140,17 @@ def setup_args() -> argparse.ArgumentParser:
                        help='Directory to store logs')
     parser.add_argument('--validate', action='store_true',
                        help='Validate the conversion by rendering and comparing')
+    parser.add_argument('--validation-mode', choices=['render', 'hybrid', 'llm'], default='hybrid',
+                       help='render: compare compiled pages locally; hybrid: also ask the LLM about '
+                            'ambiguous pages; llm: ask the LLM about the whole document')
     parser.add_argument('--output',
                        help='Output file for the LaTeX code (optional)')
     return parser
 
 def main():
+    # rich is only needed by the command line, not by the importing web app
+    from rich.console import Console
+    console = Console()
     args = setup_args().parse_args()
     
     # Initialize provider
@@ -94,7 +173,18 @@ def main():
         # Validate if requested
         if args.validate:
             console.print("\n[yellow]Validating conversion...[/yellow]")
-            if converter.validate_conversion(args.input, latex):
+            if args.validation_mode == 'llm':
+                valid = converter.validate_conversion(args.input, latex)
+            else:
+                report = converter.validate_rendered(args.input, latex,
+                                                     llm_fallback=args.validation_mode == 'hybrid')
+                for page in report.pages:
+                    text = '-' if page.text is None else f"{page.text:.2f}"
+                    checked = ' (checked by LLM)' if page.checked_by_llm else ''
+                    console.print(f"Page {page.page}: visual {page.visual:.2f}, text {text}, "
+                                  f"{page.verdict}{checked}")
+                valid = report.valid
+            if valid:
                 console.print("[green]✓ Conversion validated successfully[/green]")
             else:
                 console.print("[red]⚠ Conversion may not be accurate[/red]")
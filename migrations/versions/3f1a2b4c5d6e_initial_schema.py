@@ -0,0 +1,80 @@
+"""initial schema
+
+Revision ID: 3f1a2b4c5d6e
+Revises: 
+Create Date: 2025-02-04 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a2b4c5d6e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases from before migrations were created by db.create_all(); keep
+    # the tables they already have and only create the missing ones
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'users' not in existing:
+        _create_users()
+    if 'problem_sets' not in existing:
+        _create_problem_sets()
+    if 'generated_sets' not in existing:
+        _create_generated_sets()
+
+
+def _create_users():
+    op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('password_hash', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+    )
+
+
+def _create_problem_sets():
+    op.create_table('problem_sets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('original_pdf_path', sa.String(length=512), nullable=True),
+        sa.Column('latex_template', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def _create_generated_sets():
+    op.create_table('generated_sets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('problem_set_id', sa.Integer(), nullable=False),
+        sa.Column('provider', sa.Enum('CLAUDE', 'GEMINI', name='provider'), nullable=False),
+        sa.Column('difficulty', sa.Enum('SAME', 'CHALLENGE', 'HARDER', name='difficultylevel'), nullable=False),
+        sa.Column('num_problems', sa.Integer(), nullable=False),
+        sa.Column('problems_pdf_path', sa.String(length=512), nullable=False),
+        sa.Column('solutions_pdf_path', sa.String(length=512), nullable=False),
+        sa.Column('problems_latex', sa.Text(), nullable=False),
+        sa.Column('solutions_latex', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['problem_set_id'], ['problem_sets.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('generated_sets')
+    op.drop_table('problem_sets')
+    op.drop_table('users')
+    sa.Enum(name='difficultylevel').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='provider').drop(op.get_bind(), checkfirst=True)
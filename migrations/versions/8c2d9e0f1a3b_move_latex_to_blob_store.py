@@ -0,0 +1,94 @@
+"""move latex payloads to the blob store
+
+Revision ID: 8c2d9e0f1a3b
+Revises: 3f1a2b4c5d6e
+Create Date: 2025-02-10 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+from utils.blob_store import create_blob_store
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2d9e0f1a3b'
+down_revision = '3f1a2b4c5d6e'
+branch_labels = None
+depends_on = None
+
+# (table, payload column) pairs moved into the blob store
+PAYLOADS = [
+    ('problem_sets', 'latex_template'),
+    ('generated_sets', 'problems_latex'),
+    ('generated_sets', 'solutions_latex'),
+]
+
+
+def _blob_store():
+    return create_blob_store(current_app.config)
+
+
+def upgrade():
+    for table, column in PAYLOADS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(f'{column}_hash', sa.String(length=64), nullable=True))
+            batch_op.add_column(sa.Column(f'{column}_size', sa.Integer(), nullable=True))
+
+    # Copy each payload into the blob store one row at a time to keep memory flat
+    bind = op.get_bind()
+    store = _blob_store()
+    for table, column in PAYLOADS:
+        ids = [row.id for row in bind.execute(sa.text(f'SELECT id FROM {table}'))]
+        for row_id in ids:
+            text = bind.execute(
+                sa.text(f'SELECT {column} FROM {table} WHERE id = :id'), {'id': row_id}
+            ).scalar()
+            if text is None:
+                continue
+            digest, size = store.put_text(text)
+            bind.execute(
+                sa.text(f'UPDATE {table} SET {column}_hash = :digest, {column}_size = :size WHERE id = :id'),
+                {'digest': digest, 'size': size, 'id': row_id}
+            )
+
+    with op.batch_alter_table('problem_sets') as batch_op:
+        batch_op.drop_column('latex_template')
+
+    with op.batch_alter_table('generated_sets') as batch_op:
+        for column in ('problems_latex', 'solutions_latex'):
+            batch_op.alter_column(f'{column}_hash', existing_type=sa.String(length=64), nullable=False)
+            batch_op.alter_column(f'{column}_size', existing_type=sa.Integer(), nullable=False)
+            batch_op.drop_column(column)
+
+
+def downgrade():
+    with op.batch_alter_table('problem_sets') as batch_op:
+        batch_op.add_column(sa.Column('latex_template', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.add_column(sa.Column('problems_latex', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('solutions_latex', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    store = _blob_store()
+    for table, column in PAYLOADS:
+        rows = list(bind.execute(sa.text(f'SELECT id, {column}_hash FROM {table}')))
+        for row_id, digest in rows:
+            if digest is None:
+                continue
+            bind.execute(
+                sa.text(f'UPDATE {table} SET {column} = :text WHERE id = :id'),
+                {'text': store.get_text(digest), 'id': row_id}
+            )
+
+    with op.batch_alter_table('problem_sets') as batch_op:
+        batch_op.drop_column('latex_template_hash')
+        batch_op.drop_column('latex_template_size')
+
+    with op.batch_alter_table('generated_sets') as batch_op:
+        for column in ('problems_latex', 'solutions_latex'):
+            batch_op.alter_column(column, existing_type=sa.Text(), nullable=False)
+            batch_op.drop_column(f'{column}_hash')
+            batch_op.drop_column(f'{column}_size')
@@ -0,0 +1,28 @@
+"""add the dedup key to jobs for shared results
+
+Revision ID: a4c8e2f7b913
+Revises: f2b9d4e6a1c3
+Create Date: 2025-02-27 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c8e2f7b913'
+down_revision = 'f2b9d4e6a1c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.add_column(sa.Column('dedup_key', sa.String(length=64), nullable=True))
+    op.create_index('ix_jobs_dedup_key_status', 'jobs', ['dedup_key', 'status'])
+
+
+def downgrade():
+    op.drop_index('ix_jobs_dedup_key_status', table_name='jobs')
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_column('dedup_key')
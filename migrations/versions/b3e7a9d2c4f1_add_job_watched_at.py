@@ -0,0 +1,26 @@
+"""add the time a client last followed each job
+
+Revision ID: b3e7a9d2c4f1
+Revises: e9a3c5f1d2b7
+Create Date: 2025-03-24 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e7a9d2c4f1'
+down_revision = 'e9a3c5f1d2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.add_column(sa.Column('watched_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_column('watched_at')
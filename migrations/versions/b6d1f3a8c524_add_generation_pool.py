@@ -0,0 +1,44 @@
+"""add the pre-generation pool and demand tracking
+
+Revision ID: b6d1f3a8c524
+Revises: a4c8e2f7b913
+Create Date: 2025-03-03 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1f3a8c524'
+down_revision = 'a4c8e2f7b913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.add_column(sa.Column('pooled', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('pooled_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_generated_sets_problem_set_id_pooled', 'generated_sets', ['problem_set_id', 'pooled'])
+    op.create_table('generation_demand',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('problem_set_id', sa.Integer(), nullable=False),
+        sa.Column('provider', sa.String(length=16), nullable=False),
+        sa.Column('difficulty', sa.String(length=16), nullable=False),
+        sa.Column('num_problems', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('last_requested_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['problem_set_id'], ['problem_sets.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('problem_set_id', 'provider', 'difficulty', 'num_problems',
+                            name='uq_generation_demand_settings')
+    )
+
+
+def downgrade():
+    op.drop_table('generation_demand')
+    op.drop_index('ix_generated_sets_problem_set_id_pooled', table_name='generated_sets')
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.drop_column('pooled_at')
+        batch_op.drop_column('pooled')
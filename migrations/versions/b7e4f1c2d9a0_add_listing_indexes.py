@@ -0,0 +1,42 @@
+"""add indexes for the listing queries
+
+Revision ID: b7e4f1c2d9a0
+Revises: 8c2d9e0f1a3b
+Create Date: 2025-02-12 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4f1c2d9a0'
+down_revision = '8c2d9e0f1a3b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the indexes outside a transaction so Postgres can create them
+    # concurrently without blocking writes on large tables
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_problem_sets_user_id_created_at',
+            'problem_sets',
+            ['user_id', 'created_at'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_generated_sets_problem_set_id_created_at',
+            'generated_sets',
+            ['problem_set_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_generated_sets_problem_set_id_created_at', table_name='generated_sets',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_problem_sets_user_id_created_at', table_name='problem_sets',
+                      postgresql_concurrently=True)
@@ -0,0 +1,48 @@
+"""add content hashes of the generated pdfs
+
+Revision ID: c41d8a7e2f65
+Revises: b7e4f1c2d9a0
+Create Date: 2025-02-14 00:00:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+from utils.blob_store import file_digest
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8a7e2f65'
+down_revision = 'b7e4f1c2d9a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.add_column(sa.Column('problems_pdf_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('solutions_pdf_hash', sa.String(length=64), nullable=True))
+
+    # Hash the PDFs that are still on disk; missing files keep a NULL hash
+    bind = op.get_bind()
+    rows = list(bind.execute(sa.text(
+        'SELECT id, problems_pdf_path, solutions_pdf_path FROM generated_sets'
+    )))
+    for row_id, problems_pdf, solutions_pdf in rows:
+        values = {'id': row_id, 'problems': None, 'solutions': None}
+        if problems_pdf and os.path.exists(problems_pdf):
+            values['problems'] = file_digest(problems_pdf)
+        if solutions_pdf and os.path.exists(solutions_pdf):
+            values['solutions'] = file_digest(solutions_pdf)
+        bind.execute(sa.text(
+            'UPDATE generated_sets SET problems_pdf_hash = :problems, solutions_pdf_hash = :solutions '
+            'WHERE id = :id'
+        ), values)
+
+
+def downgrade():
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.drop_column('solutions_pdf_hash')
+        batch_op.drop_column('problems_pdf_hash')
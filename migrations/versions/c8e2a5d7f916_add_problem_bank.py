@@ -0,0 +1,71 @@
+"""add the problem bank with its full-text index and seen problems
+
+Revision ID: c8e2a5d7f916
+Revises: b6d1f3a8c524
+Create Date: 2025-03-06 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2a5d7f916'
+down_revision = 'b6d1f3a8c524'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE bank_problems_fts USING fts5("
+        "problem_latex, content='bank_problems', content_rowid='id')",
+        "CREATE TRIGGER bank_problems_fts_insert AFTER INSERT ON bank_problems BEGIN "
+        "INSERT INTO bank_problems_fts(rowid, problem_latex) VALUES (new.id, new.problem_latex); END",
+        "CREATE TRIGGER bank_problems_fts_delete AFTER DELETE ON bank_problems BEGIN "
+        "INSERT INTO bank_problems_fts(bank_problems_fts, rowid, problem_latex) "
+        "VALUES ('delete', old.id, old.problem_latex); END"
+    ],
+    'postgresql': [
+        "ALTER TABLE bank_problems ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', problem_latex)) STORED",
+        "CREATE INDEX ix_bank_problems_search_vector ON bank_problems USING gin (search_vector)"
+    ]
+}
+
+
+def upgrade():
+    op.create_table('bank_problems',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('template_hash', sa.String(length=64), nullable=False),
+        sa.Column('provider', sa.String(length=16), nullable=False),
+        sa.Column('difficulty', sa.String(length=16), nullable=False),
+        sa.Column('challenge', sa.Boolean(), nullable=False),
+        sa.Column('problem_latex', sa.Text(), nullable=False),
+        sa.Column('solution_latex', sa.Text(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('generated_set_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['generated_set_id'], ['generated_sets.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('template_hash', 'content_hash', name='uq_bank_problems_content')
+    )
+    op.create_index('ix_bank_problems_template_hash_challenge', 'bank_problems', ['template_hash', 'challenge'])
+    for statement in SEARCH_DDL.get(op.get_bind().dialect.name, []):
+        op.execute(statement)
+    op.create_table('seen_problems',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('bank_problem_id', sa.Integer(), nullable=False),
+        sa.Column('seen_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['bank_problem_id'], ['bank_problems.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'bank_problem_id')
+    )
+
+
+def downgrade():
+    op.drop_table('seen_problems')
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE bank_problems_fts")
+    op.drop_index('ix_bank_problems_template_hash_challenge', table_name='bank_problems')
+    op.drop_table('bank_problems')
@@ -0,0 +1,36 @@
+"""add minhash fingerprints of banked problems and duplicate counts
+
+Revision ID: d4f7b2c9e081
+Revises: c8e2a5d7f916
+Create Date: 2025-03-10 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f7b2c9e081'
+down_revision = 'c8e2a5d7f916'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('bank_problems', sa.Column('minhash', sa.JSON(), nullable=True))
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.add_column(sa.Column('duplicate_problems', sa.Integer(), nullable=True))
+    op.create_table('bank_problem_buckets',
+        sa.Column('bucket', sa.String(length=16), nullable=False),
+        sa.Column('bank_problem_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['bank_problem_id'], ['bank_problems.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bucket', 'bank_problem_id')
+    )
+
+
+def downgrade():
+    op.drop_table('bank_problem_buckets')
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.drop_column('duplicate_problems')
+    # A plain DROP COLUMN: batch mode would rebuild the table without its full-text triggers
+    op.drop_column('bank_problems', 'minhash')
@@ -0,0 +1,56 @@
+"""add stored file sizes for quotas
+
+Revision ID: d93a6b1f0c47
+Revises: c41d8a7e2f65
+Create Date: 2025-02-17 00:00:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93a6b1f0c47'
+down_revision = 'c41d8a7e2f65'
+branch_labels = None
+depends_on = None
+
+
+def _size(path):
+    if path and os.path.exists(path):
+        return os.path.getsize(path)
+    return None
+
+
+def upgrade():
+    with op.batch_alter_table('problem_sets') as batch_op:
+        batch_op.add_column(sa.Column('original_pdf_size', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.add_column(sa.Column('problems_pdf_size', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('solutions_pdf_size', sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    for row_id, path in list(bind.execute(sa.text('SELECT id, original_pdf_path FROM problem_sets'))):
+        bind.execute(sa.text('UPDATE problem_sets SET original_pdf_size = :size WHERE id = :id'),
+                     {'size': _size(path), 'id': row_id})
+
+    rows = list(bind.execute(sa.text(
+        'SELECT id, problems_pdf_path, solutions_pdf_path FROM generated_sets'
+    )))
+    for row_id, problems_pdf, solutions_pdf in rows:
+        bind.execute(sa.text(
+            'UPDATE generated_sets SET problems_pdf_size = :problems, solutions_pdf_size = :solutions '
+            'WHERE id = :id'
+        ), {'problems': _size(problems_pdf), 'solutions': _size(solutions_pdf), 'id': row_id})
+
+
+def downgrade():
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.drop_column('solutions_pdf_size')
+        batch_op.drop_column('problems_pdf_size')
+
+    with op.batch_alter_table('problem_sets') as batch_op:
+        batch_op.drop_column('original_pdf_size')
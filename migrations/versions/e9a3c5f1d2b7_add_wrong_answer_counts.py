@@ -0,0 +1,26 @@
+"""add counts of answers failing the local check
+
+Revision ID: e9a3c5f1d2b7
+Revises: d4f7b2c9e081
+Create Date: 2025-03-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9a3c5f1d2b7'
+down_revision = 'd4f7b2c9e081'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.add_column(sa.Column('wrong_answers', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('generated_sets') as batch_op:
+        batch_op.drop_column('wrong_answers')
@@ -0,0 +1,28 @@
+"""add the cancelled job status
+
+Revision ID: f2b9d4e6a1c3
+Revises: e5a7c3d1b8f2
+Create Date: 2025-02-24 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b9d4e6a1c3'
+down_revision = 'e5a7c3d1b8f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Other databases store the enum as a plain string column
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE jobstatus ADD VALUE IF NOT EXISTS 'CANCELLED'")
+
+
+def downgrade():
+    # Postgres cannot drop a value from an enum type; the unused value is left in place
+    op.execute(sa.text("UPDATE jobs SET status = 'FAILED' WHERE status = 'CANCELLED'"))
@@ -2,8 +2,34 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import enum
 
+from utils.blob_store import get_default_blob_store
+
 db = SQLAlchemy()
 
+class BlobText:
+    """Text payload kept in the blob store and referenced by <name>_hash/<name>_size columns."""
+    
+    def __set_name__(self, owner, name):
+        self.hash_attr = f'{name}_hash'
+        self.size_attr = f'{name}_size'
+        
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        digest = getattr(obj, self.hash_attr)
+        if digest is None:
+            return None
+        return get_default_blob_store().get_text(digest)
+        
+    def __set__(self, obj, value):
+        if value is None:
+            setattr(obj, self.hash_attr, None)
+            setattr(obj, self.size_attr, None)
+            return
+        digest, size = get_default_blob_store().put_text(value)
+        setattr(obj, self.hash_attr, digest)
+        setattr(obj, self.size_attr, size)
+
 class DifficultyLevel(enum.Enum):
     SAME = 'same'
     CHALLENGE = 'challenge'
@@ -13,6 +39,17 @@ class Provider(enum.Enum):
     CLAUDE = 'claude'
     GEMINI = 'gemini'
 
+class JobKind(enum.Enum):
+    GENERATE = 'generate'
+    CONVERT = 'convert'
+
+class JobStatus(enum.Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -28,7 +65,10 @@ class ProblemSet(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(255), nullable=False)
     original_pdf_path = db.Column(db.String(512))
-    latex_template = db.Column(db.Text)
+    original_pdf_size = db.Column(db.Integer)
+    latex_template_hash = db.Column(db.String(64))
+    latex_template_size = db.Column(db.Integer)
+    latex_template = BlobText()
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     generated_sets = db.relationship('GeneratedSet', backref='problem_set', lazy=True)
@@ -42,7 +82,144 @@ class GeneratedSet(db.Model):
     num_problems = db.Column(db.Integer, nullable=False, default=5)
     problems_pdf_path = db.Column(db.String(512), nullable=False)
     solutions_pdf_path = db.Column(db.String(512), nullable=False)
-    problems_latex = db.Column(db.Text, nullable=False)
-    solutions_latex = db.Column(db.Text, nullable=False)
+    # SHA-256 and size of the compiled PDFs; NULL until compiled (or after eviction)
+    problems_pdf_hash = db.Column(db.String(64))
+    solutions_pdf_hash = db.Column(db.String(64))
+    problems_pdf_size = db.Column(db.Integer)
+    solutions_pdf_size = db.Column(db.Integer)
+    # The LaTeX bodies live in the blob store; rows only keep their hashes and sizes
+    problems_latex_hash = db.Column(db.String(64), nullable=False)
+    problems_latex_size = db.Column(db.Integer, nullable=False)
+    solutions_latex_hash = db.Column(db.String(64), nullable=False)
+    solutions_latex_size = db.Column(db.Integer, nullable=False)
+    problems_latex = BlobText()
+    solutions_latex = BlobText()
+    # Pre-generated sets wait, hidden, in the pool until a request claims one;
+    # pooled_at stays set afterwards so pre-generation can be budgeted
+    pooled = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    pooled_at = db.Column(db.DateTime)
+    # Near-duplicate problems left in the set after replacement; NULL when not checked
+    duplicate_problems = db.Column(db.Integer)
+    # Answers still failing the local check after regeneration; NULL when not checked
+    wrong_answers = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class GenerationDemand(db.Model):
+    """How often a problem set is generated with given settings, decayed over time."""
+    __tablename__ = 'generation_demand'
+    id = db.Column(db.Integer, primary_key=True)
+    problem_set_id = db.Column(db.Integer, db.ForeignKey('problem_sets.id'), nullable=False)
+    provider = db.Column(db.String(16), nullable=False)
+    difficulty = db.Column(db.String(16), nullable=False)
+    num_problems = db.Column(db.Integer, nullable=False)
+    # Requests, each counting half as much per POOL_DEMAND_HALF_LIFE since it was made
+    score = db.Column(db.Float, nullable=False, default=0.0)
+    last_requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('problem_set_id', 'provider', 'difficulty', 'num_problems',
+                            name='uq_generation_demand_settings'),
+    )
+
+class BankProblem(db.Model):
+    """One generated problem and its solution, kept for assembling later sets."""
+    __tablename__ = 'bank_problems'
+    id = db.Column(db.Integer, primary_key=True)
+    # Hash of the template the problem was generated from; sets are only assembled from matching templates
+    template_hash = db.Column(db.String(64), nullable=False)
+    provider = db.Column(db.String(16), nullable=False)
+    difficulty = db.Column(db.String(16), nullable=False)
+    challenge = db.Column(db.Boolean, nullable=False, default=False)
+    problem_latex = db.Column(db.Text, nullable=False)
+    solution_latex = db.Column(db.Text, nullable=False)
+    # SHA-256 of the whitespace-normalized problem, so repeats are banked once
+    content_hash = db.Column(db.String(64), nullable=False)
+    # MinHash signature (utils.fingerprint) for near-duplicate checks
+    minhash = db.Column(db.JSON)
+    generated_set_id = db.Column(db.Integer, db.ForeignKey('generated_sets.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('template_hash', 'content_hash', name='uq_bank_problems_content'),
+    )
+
+class BankProblemBucket(db.Model):
+    """LSH bucket of one band of a bank problem's MinHash signature."""
+    __tablename__ = 'bank_problem_buckets'
+    bucket = db.Column(db.String(16), primary_key=True)
+    bank_problem_id = db.Column(db.Integer, db.ForeignKey('bank_problems.id', ondelete='CASCADE'), primary_key=True)
+
+class SeenProblem(db.Model):
+    """A bank problem that has been in one of a user's generated sets."""
+    __tablename__ = 'seen_problems'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    bank_problem_id = db.Column(db.Integer, db.ForeignKey('bank_problems.id'), primary_key=True)
+    seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Full-text index over the banked problems: an FTS5 table kept in sync by
+# triggers on SQLite, a generated tsvector column with a GIN index on PostgreSQL
+BANK_SEARCH_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS bank_problems_fts USING fts5("
+        "problem_latex, content='bank_problems', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS bank_problems_fts_insert AFTER INSERT ON bank_problems BEGIN "
+        "INSERT INTO bank_problems_fts(rowid, problem_latex) VALUES (new.id, new.problem_latex); END",
+        "CREATE TRIGGER IF NOT EXISTS bank_problems_fts_delete AFTER DELETE ON bank_problems BEGIN "
+        "INSERT INTO bank_problems_fts(bank_problems_fts, rowid, problem_latex) "
+        "VALUES ('delete', old.id, old.problem_latex); END"
+    ],
+    'postgresql': [
+        "ALTER TABLE bank_problems ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', problem_latex)) STORED",
+        "CREATE INDEX ix_bank_problems_search_vector ON bank_problems USING gin (search_vector)"
+    ]
+}
+
+for dialect, statements in BANK_SEARCH_DDL.items():
+    for statement in statements:
+        db.event.listen(BankProblem.__table__, 'after_create', db.DDL(statement).execute_if(dialect=dialect))
+db.event.listen(BankProblem.__table__, 'before_drop',
+                db.DDL("DROP TABLE IF EXISTS bank_problems_fts").execute_if(dialect='sqlite'))
+
+class Job(db.Model):
+    """Generation or conversion work waiting for, or claimed by, a worker process."""
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.Enum(JobKind), nullable=False)
+    status = db.Column(db.Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    problem_set_id = db.Column(db.Integer, db.ForeignKey('problem_sets.id'))
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    progress = db.Column(db.Integer)
+    message = db.Column(db.String(255))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)
+    # Jobs with the same key run once and share the result (set when the request opted in)
+    dedup_key = db.Column(db.String(64))
+    # The worker holding the job must renew its lease before it expires, or
+    # the job is handed to another worker
+    lease_owner = db.Column(db.String(255))
+    lease_expires_at = db.Column(db.DateTime)
+    # Last time a client read the job's status; jobs no one follows any more are cancelled
+    watched_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Listings filter by owner and sort newest first; these match those query shapes
+db.Index('ix_problem_sets_user_id_created_at', ProblemSet.user_id, ProblemSet.created_at)
+db.Index(
+    'ix_generated_sets_problem_set_id_created_at',
+    GeneratedSet.problem_set_id,
+    GeneratedSet.created_at.desc(),
+    GeneratedSet.id.desc()
+)
+# Requests claim the oldest pooled set matching their settings
+db.Index('ix_generated_sets_problem_set_id_pooled', GeneratedSet.problem_set_id, GeneratedSet.pooled)
+# Assembly draws a template's unseen problems, challenging or not
+db.Index('ix_bank_problems_template_hash_challenge', BankProblem.template_hash, BankProblem.challenge)
+# Workers claim the oldest queued job and sweep running jobs with expired leases
+db.Index('ix_jobs_status_created_at', Job.status, Job.created_at)
+db.Index('ix_jobs_dedup_key_status', Job.dedup_key, Job.status)
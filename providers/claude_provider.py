@@ -3,10 +3,9 @@ import sys
 from typing import List, Optional
 import base64
 import mimetypes
-import anthropic
-from anthropic import Anthropic
 from . import LLMProvider
-import PyPDF2
+from utils.cancellation import CancelledError, current_token
+from utils.metrics import record_tokens, span
 
 class ClaudeProvider(LLMProvider):
     def __init__(self):
@@ -14,78 +13,99 @@ class ClaudeProvider(LLMProvider):
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable must be set")
 
+        # Imported here so loading the app does not pay for the SDK
+        from anthropic import Anthropic
         self.client = Anthropic(api_key=self.api_key)
         self.model = "claude-3-5-sonnet-20241022"
 
     def execute(self, prompt: str, file_paths: Optional[List[str]] = None) -> str:
         try:
-            if file_paths:
-                # Prepare files for multimodal input
-                content_items = []
-                for file_path in file_paths:
-                    # Use .tex extension for LaTeX files
-                    if file_path.endswith('.tex'):
-                        mime_type = 'text/plain'
-                    else:
-                        mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+            with span('llm.claude', model=self.model, files=len(file_paths or [])):
+                if file_paths:
+                    # Prepare files for multimodal input
+                    content_items = []
+                    for file_path in file_paths:
+                        # Use .tex extension for LaTeX files
+                        if file_path.endswith('.tex'):
+                            mime_type = 'text/plain'
+                        else:
+                            mime_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
                     
-                    # Handle different file types
-                    if mime_type == 'application/pdf':
-                        with open(file_path, 'rb') as f:
-                            file_data = base64.b64encode(f.read()).decode('utf-8')
-                            content_items.append({
-                                "type": "document",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "application/pdf",
-                                    "data": file_data
-                                }
-                            })
-                    elif mime_type.startswith('text/'):
-                        # For text files, just read the content
-                        with open(file_path, 'r') as f:
-                            content_items.append({
-                                "type": "text",
-                                "text": f.read()
-                            })
-                    else:
-                        # For images and other files
-                        with open(file_path, 'rb') as f:
-                            file_data = base64.b64encode(f.read()).decode('utf-8')
-                            content_items.append({
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": mime_type,
-                                    "data": file_data
-                                }
-                            })
+                        # Handle different file types
+                        if mime_type == 'application/pdf':
+                            with open(file_path, 'rb') as f:
+                                file_data = base64.b64encode(f.read()).decode('utf-8')
+                                content_items.append({
+                                    "type": "document",
+                                    "source": {
+                                        "type": "base64",
+                                        "media_type": "application/pdf",
+                                        "data": file_data
+                                    }
+                                })
+                        elif mime_type.startswith('text/'):
+                            # For text files, just read the content
+                            with open(file_path, 'r') as f:
+                                content_items.append({
+                                    "type": "text",
+                                    "text": f.read()
+                                })
+                        else:
+                            # For images and other files
+                            with open(file_path, 'rb') as f:
+                                file_data = base64.b64encode(f.read()).decode('utf-8')
+                                content_items.append({
+                                    "type": "image",
+                                    "source": {
+                                        "type": "base64",
+                                        "media_type": mime_type,
+                                        "data": file_data
+                                    }
+                                })
 
-                # Add the prompt as text content
-                content_items.append({
-                    "type": "text",
-                    "text": prompt
-                })
+                    # Add the prompt as text content
+                    content_items.append({
+                        "type": "text",
+                        "text": prompt
+                    })
 
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=4096,
-                    messages=[{
-                        "role": "user",
-                        "content": content_items
-                    }]
-                )
-            else:
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=4096,
-                    messages=[{
-                        "role": "user",
-                        "content": prompt
-                    }]
-                )
+                    message = self._create_message(content_items)
+                else:
+                    message = self._create_message(prompt)
 
-            return message.content[0].text
+                usage = getattr(message, 'usage', None)
+                if usage:
+                    record_tokens('claude', usage.input_tokens, usage.output_tokens)
+                return message.content[0].text
 
+        except CancelledError:
+            raise
         except Exception as e:
-            raise Exception(f"Claude API error: {str(e)}")
\ No newline at end of file
+            token = current_token()
+            if token and token.cancelled:
+                # Closing the stream on cancel surfaces as a connection error
+                raise CancelledError(token.reason)
+            raise Exception(f"Claude API error: {str(e)}")
+
+    def _create_message(self, content):
+        """Stream the response so a cancelled request stops generating (and billing) at once."""
+        token = current_token()
+        if token:
+            token.check()
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=4096,
+            messages=[{
+                "role": "user",
+                "content": content
+            }]
+        ) as stream:
+            unregister = token.on_cancel(stream.close) if token else None
+            try:
+                for _ in stream.text_stream:
+                    if token:
+                        token.check()
+                return stream.get_final_message()
+            finally:
+                if unregister:
+                    unregister()
\ No newline at end of file
@@ -1,8 +1,8 @@
 import os
 from typing import List, Optional
-import google.generativeai as genai
 from . import LLMProvider
-import PyPDF2
+from utils.cancellation import CancelledError, current_token
+from utils.metrics import record_tokens, span
 import tempfile
 import base64
 
@@ -12,13 +12,17 @@ class GeminiProvider(LLMProvider):
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY environment variable must be set")
 
+        # Imported here so loading the app does not pay for the SDK
+        import google.generativeai as genai
         genai.configure(api_key=self.api_key)
+        self._genai = genai
         self.model = None
 
     def _read_file_content(self, file_path: str) -> str:
         """Read content from a file, handling both text and PDF files."""
         try:
             if file_path.lower().endswith('.pdf'):
+                import PyPDF2
                 with open(file_path, 'rb') as file:
                     pdf_reader = PyPDF2.PdfReader(file)
                     text = ""
@@ -40,7 +44,7 @@ class GeminiProvider(LLMProvider):
     def execute(self, prompt: str, file_paths: Optional[List[str]] = None) -> str:
         try:
             # Always use text-only model since we're working with LaTeX
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+            self.model = self._genai.GenerativeModel('gemini-2.0-flash-exp')
 
             # If files are provided, read their contents and append to prompt
             if file_paths:
@@ -60,7 +64,18 @@ class GeminiProvider(LLMProvider):
             full_prompt += "\n\nIMPORTANT: Return ONLY the LaTeX code without any markdown code blocks or backticks."
 
             # Generate response
-            response = self.model.generate_content(full_prompt)
+            with span('llm.gemini', model='gemini-2.0-flash-exp', files=len(file_paths or [])):
+                token = current_token()
+                if token:
+                    token.check()
+                # Stream so a cancelled request stops reading (and billing) at the next chunk
+                response = self.model.generate_content(full_prompt, stream=True)
+                for _ in response:
+                    if token:
+                        token.check()
+                usage = getattr(response, 'usage_metadata', None)
+                if usage:
+                    record_tokens('gemini', usage.prompt_token_count, usage.candidates_token_count)
 
             # Ensure the response is not blocked
             if response.prompt_feedback.block_reason:
@@ -81,5 +96,7 @@ class GeminiProvider(LLMProvider):
             text = text.replace('```latex', '').replace('```', '').replace('`', '')
             return text.strip()
 
+        except CancelledError:
+            raise
         except Exception as e:
             raise Exception(f"Gemini API error: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from . import LLMProvider
+from utils.logger import iter_interactions, read_log_file
+
+class ReplayMissError(LookupError):
+    """Raised when no recorded interaction matches a prompt."""
+
+    def __init__(self, prompt_hash: str):
+        super().__init__(f"No recorded interaction for prompt {prompt_hash}")
+        self.prompt_hash = prompt_hash
+
+def prompt_hash(prompt: str) -> str:
+    """Return the key recorded interactions are indexed by."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+class ReplayProvider(LLMProvider):
+    """Serve recorded interactions instead of calling a live model.
+
+    Interactions are loaded from a log directory (JSONL segments and legacy
+    interaction_*.json files) or a single log file and indexed by the SHA-256
+    of their prompt. Prompts recorded more than once return their responses
+    in turn. Optionally each call sleeps for the recorded latency, or for one
+    sampled from all recorded latencies, so benchmarks see realistic timing
+    as well as realistic response sizes.
+
+    Args:
+        source: Log directory or log file to replay
+        model: Only replay interactions recorded for this model
+        latency: None for no delay, 'recorded' to replay each interaction's
+            own latency, or 'sampled' to draw from all recorded latencies
+        latency_scale: Factor applied to every delay
+        default_latency_ms: Delay used when no latency was recorded
+        on_miss: 'raise' to raise ReplayMissError for unknown prompts, or
+            'any' to answer with a randomly chosen recorded response
+        seed: Seed for the random choices, for repeatable runs
+    """
+
+    def __init__(self, source: str, model: Optional[str] = None, latency: Optional[str] = None,
+                 latency_scale: float = 1.0, default_latency_ms: float = 0.0, on_miss: str = 'raise',
+                 seed: Optional[int] = None):
+        if latency not in (None, 'recorded', 'sampled'):
+            raise ValueError(f"Unknown latency mode: {latency}")
+        if on_miss not in ('raise', 'any'):
+            raise ValueError(f"Unknown miss policy: {on_miss}")
+
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.default_latency_ms = default_latency_ms
+        self.on_miss = on_miss
+        self.hits = 0
+        self.misses = 0
+        self.missed_prompts: Dict[str, int] = {}
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[Dict]] = {}
+        self._next: Dict[str, int] = {}
+        self._entries: List[Dict] = []
+        self._load(source, model)
+        self._latencies = [entry['latency_ms'] for entry in self._entries if entry['latency_ms'] is not None]
+
+    def _load(self, source: str, model: Optional[str]) -> None:
+        if os.path.isdir(source):
+            entries = iter_interactions(source)
+        elif os.path.isfile(source):
+            entries = read_log_file(source)
+        else:
+            raise FileNotFoundError(f"Replay source not found: {source}")
+
+        for entry in entries:
+            if entry.get('response') is None or not isinstance(entry.get('prompt'), str):
+                continue
+            if model and entry.get('model') != model:
+                continue
+            recorded = {'response': entry['response'], 'latency_ms': entry.get('latency_ms')}
+            self._index.setdefault(prompt_hash(entry['prompt']), []).append(recorded)
+            self._entries.append(recorded)
+
+    def __len__(self) -> int:
+        """Number of recorded interactions available for replay."""
+        return len(self._entries)
+
+    def _lookup(self, prompt: str) -> Dict:
+        key = prompt_hash(prompt)
+        with self._lock:
+            recordings = self._index.get(key)
+            if recordings:
+                self.hits += 1
+                position = self._next.get(key, 0)
+                self._next[key] = position + 1
+                return recordings[position % len(recordings)]
+
+            self.misses += 1
+            self.missed_prompts[key] = self.missed_prompts.get(key, 0) + 1
+            if self.on_miss == 'raise' or not self._entries:
+                raise ReplayMissError(key)
+            return self._random.choice(self._entries)
+
+    def _delay(self, recorded: Dict) -> float:
+        if self.latency == 'recorded' and recorded['latency_ms'] is not None:
+            latency_ms = recorded['latency_ms']
+        elif self.latency == 'sampled' and self._latencies:
+            with self._lock:
+                latency_ms = self._random.choice(self._latencies)
+        elif self.latency:
+            latency_ms = self.default_latency_ms
+        else:
+            return 0.0
+        return latency_ms * self.latency_scale / 1000
+
+    def execute(self, prompt: str, file_paths: Optional[List[str]] = None) -> str:
+        """
+        Return the recorded response for the prompt.
+
+        Files are ignored: uploads get fresh temporary paths on every run,
+        so interactions are matched on the prompt text alone.
+
+        Raises:
+            ReplayMissError: If the prompt was never recorded and on_miss is 'raise'
+        """
+        recorded = self._lookup(prompt)
+        delay = self._delay(recorded)
+        if delay > 0:
+            time.sleep(delay)
+        return recorded['response']
+
+    def stats(self) -> Dict:
+        """Return hit and miss counts, with the hashes of prompts that missed."""
+        with self._lock:
+            return {
+                'recorded': len(self._entries),
+                'unique_prompts': len(self._index),
+                'hits': self.hits,
+                'misses': self.misses,
+                'missed_prompts': dict(self.missed_prompts)
+            }
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import statistics
+import sys
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator
+from rich.console import Console
+
+from utils.logger import iter_interactions
+
+console = Console()
+
+def parse_time(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid time '{value}', use ISO format (e.g. 2025-02-04T00:36)")
+
+def setup_args() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Search the LLM interaction logs (JSONL segments and legacy JSON files)'
+    )
+    parser.add_argument('log_dir',
+                       help='Directory containing the interaction logs')
+    parser.add_argument('--model',
+                       help='Only show interactions with this model')
+    parser.add_argument('--since', type=parse_time,
+                       help='Only show interactions logged at or after this time (ISO format)')
+    parser.add_argument('--until', type=parse_time,
+                       help='Only show interactions logged before this time (ISO format)')
+    parser.add_argument('--min-latency', type=float,
+                       help='Only show interactions that took at least this many milliseconds')
+    parser.add_argument('--max-latency', type=float,
+                       help='Only show interactions that took at most this many milliseconds')
+    parser.add_argument('--no-legacy', action='store_true',
+                       help='Skip legacy interaction_*.json files')
+    parser.add_argument('--limit', type=int,
+                       help='Stop after this many matching interactions')
+    parser.add_argument('--summary', action='store_true',
+                       help='Print counts and latency percentiles instead of the interactions')
+    return parser
+
+def filter_interactions(args) -> Iterator[Dict]:
+    """Yield the interactions matching the command line filters."""
+    matched = 0
+    for entry in iter_interactions(args.log_dir, include_legacy=not args.no_legacy,
+                                   since=args.since, until=args.until):
+        if args.limit is not None and matched >= args.limit:
+            return
+        if args.model and entry.get('model') != args.model:
+            continue
+        latency = entry.get('latency_ms')
+        if args.min_latency is not None and (latency is None or latency < args.min_latency):
+            continue
+        if args.max_latency is not None and (latency is None or latency > args.max_latency):
+            continue
+        matched += 1
+        yield entry
+
+def summarize(entries: Iterator[Dict]) -> Dict:
+    models = Counter()
+    latencies = []
+    for entry in entries:
+        models[entry.get('model')] += 1
+        if entry.get('latency_ms') is not None:
+            latencies.append(entry['latency_ms'])
+
+    summary = {'count': sum(models.values()), 'models': dict(models)}
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+        summary['latency_ms'] = {
+            'p50': quantiles[49],
+            'p95': quantiles[94],
+            'p99': quantiles[98],
+            'max': max(latencies)
+        }
+    return summary
+
+def main():
+    args = setup_args().parse_args()
+
+    try:
+        entries = filter_interactions(args)
+        if args.summary:
+            console.print_json(json.dumps(summarize(entries)))
+        else:
+            # One JSON object per line so the output can be piped into jq
+            for entry in entries:
+                sys.stdout.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -2,6 +2,10 @@ import os
 import pytest
 import tempfile
 
+# Point the app at an in-memory database before any test module imports it
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+
 @pytest.fixture(scope='session')
 def test_data_dir():
     """Path to test data directory."""
@@ -17,3 +21,42 @@ def temp_output_dir():
     """Temporary directory for test outputs."""
     with tempfile.TemporaryDirectory() as temp_dir:
         yield temp_dir
+
+@pytest.fixture(scope='session')
+def llm_log_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('llm_logs'))
+
+@pytest.fixture(autouse=True)
+def isolated_llm_log(llm_log_dir, monkeypatch):
+    """Record LLM interactions of tests outside the repository's logs directory."""
+    from config import Config
+    monkeypatch.setattr(Config, 'LLM_LOG_DIR', llm_log_dir)
+
+@pytest.fixture
+def blob_store(tmp_path):
+    """A blob store in a temporary directory, used for the LaTeX columns."""
+    from utils.blob_store import LocalBlobStore, set_default_blob_store
+    store = LocalBlobStore(str(tmp_path / 'blobs'))
+    set_default_blob_store(store)
+    return store
+
+@pytest.fixture
+def app(blob_store):
+    """The Flask app, inside an app context with freshly created tables."""
+    from app import app as flask_app
+    from models.database import db
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+
+@pytest.fixture
+def user_id(app):
+    """Id of a user to own problem sets and jobs."""
+    from models.database import db, User
+    user = User(email='teacher@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
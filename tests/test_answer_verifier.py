@@ -0,0 +1,107 @@
+import pytest
+from utils import answer_verifier
+from utils.answer_verifier import OK, TIMEOUT, UNKNOWN, WRONG, AnswerVerifier, check_answer
+from utils.latex_parser import parse_problems, parse_solutions
+
+PROBLEMS = r"""\begin{enumerate}
+\item $\displaystyle \lim_{x \to 0} \frac{\sin 3x}{x}$
+\item \textbf{[Challenge]} Find $\displaystyle \lim_{x \to \infty} \left(1 + \frac{1}{x}\right)^{x}$.
+\item $\displaystyle \lim_{x \to 0} \frac{|x|}{x}$
+\item Sketch the graph of $y = x^2$.
+\end{enumerate}"""
+
+SOLUTIONS = r"""Solution:
+\begin{align*}
+\lim_{x \to 0} \frac{\sin 3x}{x} &= 3 \lim_{x \to 0} \frac{\sin 3x}{3x} = \boxed{3}
+\end{align*}
+
+Solution:
+$\displaystyle L = \boxed{L = e}$
+
+Solution:
+The one-sided limits are $1$ and $-1$, so the limit is $\boxed{\text{DNE}}$.
+
+Solution:
+A parabola."""
+
+@pytest.fixture
+def verifier():
+    yield AnswerVerifier(processes=1, timeout=30)
+    answer_verifier.shutdown()
+
+def test_expressions_from_parsed_items():
+    problems = parse_problems(PROBLEMS).items
+    solutions = parse_solutions(SOLUTIONS).items
+    assert answer_verifier.limit_expression(problems[1]) == r'\lim_{x \to \infty} (1 + \frac{1}{x} )^{x}'
+    assert answer_verifier.limit_expression(problems[3]) is None
+    assert answer_verifier.answer_expression(solutions[1]) == 'e'
+    assert answer_verifier.answer_expression(solutions[3]) is None
+
+def test_check_answer():
+    assert check_answer(r'\lim_{x \to 2} \frac{x^2 - 4}{x - 2}', '4') == OK
+    assert check_answer(r'\lim_{x \to 2} \frac{x^2 - 4}{x - 2}', r'\frac{8}{2}') == OK
+    assert check_answer(r'\lim_{x \to 2} \frac{x^2 - 4}{x - 2}', '2') == WRONG
+    assert check_answer(r'\lim_{x \to -\infty} \frac{x^3 + 2}{x^2 - 1}', r'-\infty') == OK
+    assert check_answer(r'\lim_{x \to 0} \frac{\sin(\pi x)}{x}', r'\pi') == OK
+    assert check_answer(r'\lim_{x \to 0} \frac{1}{x}', r'\text{does not exist}') == OK
+    assert check_answer(r'\lim_{x \to 0} \frac{1}{x}', r'\infty') == WRONG
+    # Answers in terms of unknown symbols cannot be checked
+    assert check_answer(r'\lim_{x \to 0} \frac{\sin x}{x}', 'k') == UNKNOWN
+
+def test_verify_pairs_problems_with_solutions(verifier):
+    problems = parse_problems(PROBLEMS).items
+    solutions = parse_solutions(SOLUTIONS).items
+    assert verifier.verify(problems, solutions) == [OK, OK, OK, UNKNOWN]
+    wrong = parse_solutions(SOLUTIONS.replace(r'\boxed{3}', r'\boxed{1}')).items
+    assert verifier.verify(problems, wrong) == [WRONG, OK, OK, UNKNOWN]
+    assert verifier.verify(problems, solutions[:2]) == [UNKNOWN] * 4
+
+def test_verdicts_are_cached(verifier, monkeypatch):
+    verdicts = verifier.verify_latex(PROBLEMS, SOLUTIONS)
+    # Cached verdicts never reach the pool, even with different spacing
+    monkeypatch.setattr(answer_verifier, '_acquire_pool', lambda processes: pytest.fail('pool used'))
+    assert verifier.verify_latex(PROBLEMS.replace(r'\displaystyle ', ''), SOLUTIONS) == verdicts
+
+def test_start_in_background(verifier):
+    import time
+    verifier.start()
+    deadline = time.monotonic() + answer_verifier.STARTUP_TIMEOUT
+    while answer_verifier._pool is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    pool = answer_verifier._pool
+    verifier.start()
+    assert verifier.verify_latex(r"\begin{enumerate}\item $\lim_{x \to 2} x^2$\end{enumerate}",
+                                 r"Solution: $\boxed{4}$") == [OK]
+    assert answer_verifier._pool is pool
+
+def test_timeout_restarts_the_pool(verifier):
+    problems = parse_problems(r"\begin{enumerate}\item $\lim_{x \to 1} \frac{x^3 - 1}{x - 1}$\end{enumerate}").items
+    solutions = parse_solutions(r"Solution: $\boxed{3}$").items
+    # Start the pool beforehand so the timeout only has the check itself to cut short
+    answer_verifier._release_pool(answer_verifier._acquire_pool(1))
+    verifier.timeout = 0.000001
+    assert verifier.verify(problems, solutions) == [TIMEOUT]
+    assert answer_verifier._pool is None
+    # Timeouts are not cached
+    verifier.timeout = 30
+    assert verifier.verify(problems, solutions) == [OK]
+
+class FakePool:
+    terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+def test_broken_pool_is_kept_for_its_other_users(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(answer_verifier, '_pool', pool)
+    assert answer_verifier._acquire_pool(1) is pool
+    assert answer_verifier._acquire_pool(1) is pool
+
+    answer_verifier._release_pool(pool, broken=True)
+    # New verifications get new processes; the other one keeps its own
+    assert answer_verifier._pool is None
+    assert not pool.terminated
+    answer_verifier._release_pool(pool)
+    assert pool.terminated
@@ -0,0 +1,579 @@
+import io
+import os
+import json
+import time
+import zipfile
+import pytest
+from datetime import datetime, timedelta
+
+import app as app_module
+import api.service
+from models.database import db, User, GeneratedSet, DifficultyLevel, ProblemSet, Provider
+from utils.password_hasher import PasswordHasher
+from utils.blob_store import file_digest
+from benchmarks.stubs import MINIMAL_PDF, FakeLatexCompiler, StubProvider
+from tests.mock_provider import MockProvider
+
+@pytest.fixture
+def app(app, tmp_path):
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app.config['PDF_SENDFILE_MODE'] = ''
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(client):
+    """Register a user and return its Authorization header."""
+    response = client.post('/api/auth/register', json={
+        'email': 'teacher@example.com',
+        'password': 'secret'
+    })
+    assert response.status_code == 201
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+@pytest.fixture
+def problem_set_id(client, auth_headers):
+    response = client.post('/api/problem-sets', headers=auth_headers, json={
+        'name': 'Limits',
+        'template': r'\begin{enumerate}\item $\lim_{x \to 0} x$\end{enumerate}'
+    })
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+def test_login(client, auth_headers):
+    response = client.post('/api/auth/login', json={'email': 'teacher@example.com', 'password': 'secret'})
+    assert response.status_code == 200
+    response = client.post('/api/auth/login', json={'email': 'teacher@example.com', 'password': 'wrong'})
+    assert response.status_code == 401
+
+def test_login_rehashes_on_cost_change(client, auth_headers, monkeypatch):
+    """Test that logging in upgrades hashes made with an old cost."""
+    old_hash = User.query.one().password_hash
+    assert old_hash.startswith('$2b$04$')
+
+    monkeypatch.setattr(app_module, 'password_hasher', PasswordHasher(rounds=5, max_workers=1))
+    response = client.post('/api/auth/login', json={'email': 'teacher@example.com', 'password': 'secret'})
+    assert response.status_code == 200
+    assert User.query.one().password_hash.startswith('$2b$05$')
+
+def test_login_busy_returns_503(client, auth_headers, monkeypatch):
+    """Test that a full hashing queue is reported with Retry-After."""
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_pending=0, retry_after=3)
+    hasher._slots.acquire()
+    monkeypatch.setattr(app_module, 'password_hasher', hasher)
+    response = client.post('/api/auth/login', json={'email': 'teacher@example.com', 'password': 'secret'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+
+def add_generated_sets(problem_set_id, count):
+    """Insert generated sets with increasing creation times."""
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        db.session.add(GeneratedSet(
+            problem_set_id=problem_set_id,
+            provider=Provider.CLAUDE,
+            difficulty=DifficultyLevel.SAME,
+            num_problems=3,
+            problems_pdf_path=f'/tmp/problems_{i}.pdf',
+            solutions_pdf_path=f'/tmp/solutions_{i}.pdf',
+            problems_latex=f'problems {i}',
+            solutions_latex=f'solutions {i}',
+            created_at=start + timedelta(minutes=i)
+        ))
+    db.session.commit()
+
+def test_generated_sets_pagination(client, auth_headers, problem_set_id):
+    """Test that cursor pagination walks every set exactly once, newest first."""
+    add_generated_sets(problem_set_id, 5)
+
+    seen = []
+    cursor = None
+    while True:
+        url = f'/api/problem-sets/{problem_set_id}/generated?limit=2'
+        if cursor:
+            url += f'&cursor={cursor}'
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= 2
+        seen.extend(item['id'] for item in page)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+
+    assert seen == [5, 4, 3, 2, 1]
+
+def test_generated_sets_listing_omits_latex(client, auth_headers, problem_set_id):
+    """Test that listings do not include the LaTeX bodies."""
+    add_generated_sets(problem_set_id, 1)
+    response = client.get(f'/api/problem-sets/{problem_set_id}/generated', headers=auth_headers)
+    item = response.get_json()[0]
+    assert 'problems_latex' not in item
+    assert 'X-Next-Cursor' not in response.headers
+
+def test_generated_sets_invalid_params(client, auth_headers, problem_set_id):
+    """Test validation of the pagination parameters."""
+    url = f'/api/problem-sets/{problem_set_id}/generated'
+    assert client.get(url + '?limit=abc', headers=auth_headers).status_code == 400
+    assert client.get(url + '?limit=0', headers=auth_headers).status_code == 400
+    assert client.get(url + '?cursor=not-a-cursor', headers=auth_headers).status_code == 400
+
+def test_generated_set_latex(client, auth_headers, problem_set_id):
+    """Test fetching the LaTeX of a single generated set on demand."""
+    add_generated_sets(problem_set_id, 1)
+
+    response = client.get('/api/generated-sets/1/latex', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'id': 1,
+        'problems_latex': 'problems 0',
+        'solutions_latex': 'solutions 0'
+    }
+
+    response = client.get('/api/generated-sets/1/latex?type=solutions', headers=auth_headers)
+    assert response.get_json() == {'id': 1, 'solutions_latex': 'solutions 0'}
+
+    assert client.get('/api/generated-sets/1/latex?type=bad', headers=auth_headers).status_code == 400
+    assert client.get('/api/generated-sets/99/latex', headers=auth_headers).status_code == 404
+
+@pytest.fixture
+def pdf_set_id(app, problem_set_id):
+    """A generated set whose problems PDF exists on disk."""
+    output_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'generated')
+    os.makedirs(output_dir)
+    pdf_path = os.path.join(output_dir, 'problems.pdf')
+    with open(pdf_path, 'wb') as f:
+        f.write(b'%PDF-1.4 ' + b'x' * 1000)
+    generated_set = GeneratedSet(
+        problem_set_id=problem_set_id,
+        provider=Provider.CLAUDE,
+        difficulty=DifficultyLevel.SAME,
+        num_problems=3,
+        problems_pdf_path=pdf_path,
+        solutions_pdf_path=os.path.join(output_dir, 'missing.pdf'),
+        problems_pdf_hash=file_digest(pdf_path),
+        solutions_pdf_hash='0' * 64,  # compiled once, file since removed
+        problems_latex='problems',
+        solutions_latex='solutions'
+    )
+    db.session.add(generated_set)
+    db.session.commit()
+    return generated_set.id
+
+def test_download_conditional_get(client, auth_headers, pdf_set_id):
+    """Test content-hash ETags and 304 responses for unchanged PDFs."""
+    url = f'/api/generated-sets/{pdf_set_id}/download?type=problems'
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+    etag = response.headers['ETag']
+    assert etag.strip('"') == db.session.get(GeneratedSet, pdf_set_id).problems_pdf_hash
+    assert 'private' in response.headers['Cache-Control']
+
+    response = client.get(url, headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_download_range(client, auth_headers, pdf_set_id):
+    """Test byte-range requests for incremental PDF viewing."""
+    url = f'/api/generated-sets/{pdf_set_id}/download?type=problems'
+    response = client.get(url, headers={**auth_headers, 'Range': 'bytes=0-3'})
+    assert response.status_code == 206
+    assert response.data == b'%PDF'
+    assert response.headers['Content-Range'] == 'bytes 0-3/1009'
+
+def test_download_missing_file(client, auth_headers, pdf_set_id):
+    response = client.get(f'/api/generated-sets/{pdf_set_id}/download?type=solutions', headers=auth_headers)
+    assert response.status_code == 404
+
+def test_download_x_accel_redirect(app, client, auth_headers, pdf_set_id):
+    """Test that the proxy mode only authorizes and points nginx at the file."""
+    app.config['PDF_SENDFILE_MODE'] = 'x-accel-redirect'
+    response = client.get(f'/api/generated-sets/{pdf_set_id}/download?type=problems', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/protected-uploads/generated/problems.pdf'
+    assert response.data == b''
+
+class FakeCompiler:
+    """Writes a small PDF instead of running Tectonic and counts builds."""
+    builds = 0
+
+    def compile_to_pdf(self, tex_file, output_dir=None):
+        FakeCompiler.builds += 1
+        pdf_path = os.path.join(output_dir, os.path.basename(tex_file).replace('.tex', '.pdf'))
+        with open(pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4 compiled')
+        return pdf_path
+
+def test_lazy_compile_on_first_download(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that uncompiled PDFs are built once on first download and marked on the row."""
+    monkeypatch.setattr(api.service, 'LatexCompiler', FakeCompiler)
+    FakeCompiler.builds = 0
+    pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], 'generated_lazy', 'problems.pdf')
+    generated_set = GeneratedSet(
+        problem_set_id=problem_set_id,
+        provider=Provider.CLAUDE,
+        difficulty=DifficultyLevel.SAME,
+        num_problems=3,
+        problems_pdf_path=pdf_path,
+        solutions_pdf_path=pdf_path.replace('problems', 'solutions'),
+        problems_latex='problems',
+        solutions_latex='solutions'
+    )
+    db.session.add(generated_set)
+    db.session.commit()
+
+    url = f'/api/generated-sets/{generated_set.id}/download?type=problems'
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.data == b'%PDF-1.4 compiled'
+    assert db.session.get(GeneratedSet, generated_set.id).problems_pdf_hash == file_digest(pdf_path)
+
+    assert client.get(url, headers=auth_headers).status_code == 200
+    assert FakeCompiler.builds == 1
+
+def test_generate_with_backend_hooks(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that generation uses the configured provider and compiler factories."""
+    providers = []
+    def provider_factory(name):
+        providers.append(name)
+        return StubProvider(response_size=100)
+    monkeypatch.setitem(app.config, 'PROVIDER_FACTORY', provider_factory)
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeLatexCompiler)
+
+    response = client.post(f'/api/problem-sets/{problem_set_id}/generate', headers=auth_headers, json={
+        'provider': 'gemini', 'difficulty': 'same', 'num_problems': 3
+    })
+    assert response.status_code == 201
+    assert providers == ['gemini']
+    generated_set = db.session.get(GeneratedSet, response.get_json()['id'])
+    with open(generated_set.problems_pdf_path, 'rb') as f:
+        assert f.read() == MINIMAL_PDF
+    assert generated_set.solutions_pdf_size == len(MINIMAL_PDF)
+
+def test_generate_in_queue_mode(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that queue mode only enqueues and a worker runs the job."""
+    from worker import JobWorker
+    monkeypatch.setitem(app.config, 'GENERATION_MODE', 'queue')
+    monkeypatch.setitem(app.config, 'PROVIDER_FACTORY', lambda name: StubProvider(response_size=100))
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeLatexCompiler)
+
+    response = client.post(f'/api/problem-sets/{problem_set_id}/generate', headers=auth_headers, json={
+        'provider': 'claude', 'difficulty': 'harder', 'num_problems': 3
+    })
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] == 'queued'
+    assert response.headers['Location'] == f"/api/jobs/{job['id']}"
+    assert GeneratedSet.query.count() == 0
+
+    worker = JobWorker(app, heartbeat_interval=60)
+    assert worker.run_once() == job['id']
+    assert worker.run_once() is None
+
+    job = client.get(f"/api/jobs/{job['id']}", headers=auth_headers).get_json()
+    assert job['status'] == 'succeeded'
+    assert job['progress'] == 100
+    generated_set = db.session.get(GeneratedSet, job['result']['generated_set_id'])
+    assert generated_set.difficulty == DifficultyLevel.HARDER
+    assert generated_set.problems_pdf_size == len(MINIMAL_PDF)
+    assert client.get('/api/jobs/999', headers=auth_headers).status_code == 404
+
+def test_shared_result_generation(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that concurrent identical requests opting into shared_result run the pipeline once."""
+    import threading
+    provider = StubProvider(latency=0.3, response_size=100)
+    monkeypatch.setitem(app.config, 'PROVIDER_FACTORY', lambda name: provider)
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeLatexCompiler)
+    other_set_id = client.post('/api/problem-sets', headers=auth_headers, json={
+        'name': 'Limits again',
+        'template': r'\begin{enumerate}\item $\lim_{x \to 0} x$\end{enumerate}'
+    }).get_json()['id']
+
+    responses = {}
+    def generate(set_id):
+        responses[set_id] = client.post(f'/api/problem-sets/{set_id}/generate', headers=auth_headers, json={
+            'provider': 'claude', 'difficulty': 'same', 'num_problems': 3, 'shared_result': True
+        })
+    threads = [threading.Thread(target=generate, args=(set_id,)) for set_id in (problem_set_id, other_set_id)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    # One run: a problems call and a solutions call
+    assert provider.calls == 2
+    results = {set_id: response.get_json() for set_id, response in responses.items()}
+    assert all(response.status_code == 201 for response in responses.values())
+    assert sorted(result['shared'] for result in results.values()) == [False, True]
+    for set_id, result in results.items():
+        generated_set = db.session.get(GeneratedSet, result['id'])
+        assert generated_set.problem_set_id == set_id
+        assert os.path.exists(generated_set.problems_pdf_path)
+    first, second = (db.session.get(GeneratedSet, result['id']) for result in results.values())
+    assert first.problems_latex_hash == second.problems_latex_hash
+    assert first.problems_pdf_path != second.problems_pdf_path
+
+def test_shared_result_jobs(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that queued jobs with the same dedup key are run once and all receive the result."""
+    from worker import JobWorker
+    monkeypatch.setitem(app.config, 'GENERATION_MODE', 'queue')
+    provider = StubProvider(response_size=100)
+    monkeypatch.setitem(app.config, 'PROVIDER_FACTORY', lambda name: provider)
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeLatexCompiler)
+    payload = {'provider': 'claude', 'difficulty': 'same', 'num_problems': 3, 'shared_result': True}
+    job_ids = [client.post(f'/api/problem-sets/{problem_set_id}/generate', headers=auth_headers,
+                           json=payload).get_json()['id'] for _ in range(2)]
+    unshared = client.post(f'/api/problem-sets/{problem_set_id}/generate', headers=auth_headers,
+                           json={**payload, 'shared_result': False}).get_json()['id']
+
+    worker = JobWorker(app, heartbeat_interval=60)
+    assert worker.run_once() == job_ids[0]
+    assert provider.calls == 2
+    first, second = (client.get(f'/api/jobs/{job_id}', headers=auth_headers).get_json() for job_id in job_ids)
+    assert first['status'] == second['status'] == 'succeeded'
+    assert second['result'] == {**first['result'], 'shared': True}
+    assert client.get(f'/api/jobs/{unshared}', headers=auth_headers).get_json()['status'] == 'queued'
+    assert worker.run_once() == unshared
+    assert worker.run_once() is None
+
+def test_generate_from_pool(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that popular settings are pre-generated and each pooled set is handed out once."""
+    from app import run_pool_refill
+    monkeypatch.setitem(app.config, 'PROVIDER_FACTORY', lambda name: StubProvider(response_size=100))
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeLatexCompiler)
+    monkeypatch.setitem(app.config, 'POOL_SIZE', 1)
+    monkeypatch.setitem(app.config, 'POOL_MIN_DEMAND', 0.5)
+    url = f'/api/problem-sets/{problem_set_id}/generate'
+    payload = {'provider': 'claude', 'difficulty': 'same', 'num_problems': 3}
+
+    first = client.post(url, headers=auth_headers, json=payload).get_json()
+    assert not first['pooled']
+    assert run_pool_refill()['generated'] == 1
+    # Pooled sets stay hidden until claimed
+    listing = client.get(f'/api/problem-sets/{problem_set_id}/generated', headers=auth_headers).get_json()
+    assert [item['id'] for item in listing] == [first['id']]
+    # Assembled sets never take from the pool
+    assembled = client.post(url, headers=auth_headers, json={**payload, 'mode': 'assemble'})
+    assert assembled.status_code == 201
+    assert not assembled.get_json()['pooled']
+
+    second = client.post(url, headers=auth_headers, json=payload)
+    assert second.status_code == 201
+    assert second.get_json()['pooled']
+    assert second.get_json()['id'] != first['id']
+    assert client.get(f"/api/generated-sets/{second.get_json()['id']}/download?type=problems",
+                      headers=auth_headers).status_code == 200
+    assert not client.post(url, headers=auth_headers, json=payload).get_json()['pooled']
+
+def test_assemble_from_problem_bank(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that assembled sets reuse banked problems the user has not seen and generate the rest."""
+    # One problem and one solution per call
+    provider = StubProvider(response_size=1)
+    monkeypatch.setitem(app.config, 'PROVIDER_FACTORY', lambda name: provider)
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeLatexCompiler)
+    payload = {'provider': 'claude', 'difficulty': 'same', 'num_problems': 1}
+    assert client.post(f'/api/problem-sets/{problem_set_id}/generate', headers=auth_headers,
+                       json=payload).status_code == 201
+    assert provider.calls == 2
+
+    # Another teacher with the same template gets the banked problem without an LLM call
+    token = client.post('/api/auth/register', json={'email': 'other@example.com', 'password': 'secret'}
+                        ).get_json()['token']
+    other_headers = {'Authorization': f'Bearer {token}'}
+    template = db.session.get(ProblemSet, problem_set_id).latex_template
+    other_set_id = client.post('/api/problem-sets', headers=other_headers,
+                               json={'name': 'Limits', 'template': template}).get_json()['id']
+    url = f'/api/problem-sets/{other_set_id}/generate'
+    response = client.post(url, headers=other_headers, json={**payload, 'mode': 'assemble'})
+    assert response.status_code == 201
+    assert provider.calls == 2
+    generated_set = db.session.get(GeneratedSet, response.get_json()['id'])
+    assert '\\lim' in generated_set.problems_latex
+    assert 'Solution:' in generated_set.solutions_latex
+
+    # Once everything banked has been seen, the shortfall is generated. The stub
+    # repeats the problem the user was just given, so it is regenerated once and
+    # then kept as a flagged duplicate
+    response = client.post(url, headers=other_headers, json={**payload, 'mode': 'assemble'})
+    assert response.status_code == 201
+    assert provider.calls == 5
+    assert db.session.get(GeneratedSet, response.get_json()['id']).duplicate_problems == 1
+    assert client.post(url, headers=other_headers, json={**payload, 'mode': 'bank'}).status_code == 400
+
+def test_wrong_answers_are_regenerated(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that only the solutions whose boxed answers fail the local check are asked for again."""
+    defaults = MockProvider()
+    blocks = defaults.solutions_response.split('\n\n')
+    wrong = defaults.solutions_response.replace(r'\boxed{-\infty}', r'\boxed{\infty}')
+    responses = [wrong, blocks[1]]
+    prompts = []
+    provider = MockProvider()
+
+    def execute(prompt, file_paths=None):
+        if 'Generate detailed solutions' not in prompt:
+            return defaults.problems_response
+        prompts.append(prompt)
+        return responses.pop(0)
+    monkeypatch.setattr(provider, 'execute', execute)
+    monkeypatch.setitem(app.config, 'PROVIDER_FACTORY', lambda name: provider)
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeLatexCompiler)
+    response = client.post(f'/api/problem-sets/{problem_set_id}/generate', headers=auth_headers,
+                           json={'provider': 'claude', 'difficulty': 'same', 'num_problems': 3})
+    assert response.status_code == 201
+    assert responses == []
+    # Only the problem with the wrong answer was sent again
+    assert r'\frac{x^3 + 2}{x^2 - 1}' in prompts[1] and '3x^2 - 2x + 1' not in prompts[1]
+    generated_set = db.session.get(GeneratedSet, response.get_json()['id'])
+    assert generated_set.wrong_answers == 0
+    assert r'\boxed{-\infty}' in generated_set.solutions_latex
+    assert generated_set.solutions_latex.count('Solution:') == 3
+
+def test_cancel_inline_generation(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that cancelling aborts a running generation without saving anything."""
+    import threading
+    import time
+    monkeypatch.setitem(app.config, 'PROVIDER_FACTORY', lambda name: StubProvider(latency=30))
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeLatexCompiler)
+    responses = []
+    request = threading.Thread(target=lambda: responses.append(client.post(
+        f'/api/problem-sets/{problem_set_id}/generate', headers=auth_headers,
+        json={'provider': 'claude', 'difficulty': 'same', 'num_problems': 3})))
+    start = time.perf_counter()
+    request.start()
+    cancel_url = f'/api/problem-sets/{problem_set_id}/generate/cancel'
+    while client.post(cancel_url, headers=auth_headers).status_code != 202:
+        assert time.perf_counter() - start < 5
+        time.sleep(0.01)
+    request.join(5)
+
+    assert responses[0].status_code == 499
+    assert time.perf_counter() - start < 5
+    assert GeneratedSet.query.count() == 0
+    generated_root = os.path.join(app.config['UPLOAD_FOLDER'], 'generated')
+    assert not [files for _, _, files in os.walk(generated_root) if files]
+
+def test_cancel_queued_job(app, client, auth_headers, problem_set_id, monkeypatch):
+    from worker import JobWorker
+    monkeypatch.setitem(app.config, 'GENERATION_MODE', 'queue')
+    response = client.post(f'/api/problem-sets/{problem_set_id}/generate', headers=auth_headers, json={
+        'provider': 'claude', 'difficulty': 'same', 'num_problems': 3
+    })
+    job_id = response.get_json()['id']
+
+    response = client.post(f'/api/jobs/{job_id}/cancel', headers=auth_headers)
+    assert response.status_code == 202
+    assert response.get_json()['status'] == 'cancelled'
+    assert client.post(f'/api/jobs/{job_id}/cancel', headers=auth_headers).status_code == 409
+    assert client.post('/api/jobs/999/cancel', headers=auth_headers).status_code == 404
+    assert JobWorker(app).run_once() is None
+
+def test_export_problem_set(app, client, auth_headers, problem_set_id, pdf_set_id):
+    """Test the streamed ZIP export, its manifest and resuming with Range."""
+    generated_set = db.session.get(GeneratedSet, pdf_set_id)
+    generated_set.solutions_pdf_path = generated_set.problems_pdf_path
+    generated_set.solutions_pdf_hash = generated_set.problems_pdf_hash
+    db.session.commit()
+
+    url = f'/api/problem-sets/{problem_set_id}/export?ids={pdf_set_id}'
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    data = response.data
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        manifest = json.loads(zf.read('manifest.json'))
+        assert manifest['generated_sets'][0]['id'] == pdf_set_id
+        assert zf.read(f'generated_set_{pdf_set_id}/problems.tex') == b'problems'
+        assert zf.getinfo(f'generated_set_{pdf_set_id}/problems.pdf').compress_type == zipfile.ZIP_STORED
+
+    etag = response.headers['ETag']
+    response = client.get(url, headers={**auth_headers, 'Range': 'bytes=100-', 'If-Range': etag})
+    assert response.status_code == 206
+    assert response.data == data[100:]
+
+    # A stale If-Range restarts the download from the beginning
+    response = client.get(url, headers={**auth_headers, 'Range': 'bytes=100-', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == data
+
+def test_export_compiles_missing_pdfs_in_the_background(app, client, auth_headers, problem_set_id, monkeypatch):
+    """Test that exports of lazily compiled sets answer 202 until their PDFs are built."""
+    monkeypatch.setitem(app.config, 'LATEX_COMPILER_FACTORY', FakeCompiler)
+    monkeypatch.setitem(app.config, 'EXPORT_MAX_COMPILES', 1)
+    FakeCompiler.builds = 0
+    pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], 'generated_lazy', 'problems.pdf')
+    generated_set = GeneratedSet(
+        problem_set_id=problem_set_id,
+        provider=Provider.CLAUDE,
+        difficulty=DifficultyLevel.SAME,
+        num_problems=3,
+        problems_pdf_path=pdf_path,
+        solutions_pdf_path=pdf_path.replace('problems', 'solutions'),
+        problems_latex='problems',
+        solutions_latex='solutions'
+    )
+    db.session.add(generated_set)
+    db.session.commit()
+
+    url = f'/api/problem-sets/{problem_set_id}/export'
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 202
+    assert response.headers['Retry-After'] == str(app.config['EXPORT_RETRY_AFTER'])
+    assert response.get_json()['pending_pdfs'] == 2
+
+    deadline = time.monotonic() + 10
+    while response.status_code == 202:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+        # Requests share the test's session, which would keep the rows as first loaded
+        db.session.expire_all()
+        response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert FakeCompiler.builds == 2
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+        assert zf.read(f'generated_set_{generated_set.id}/solutions.pdf') == b'%PDF-1.4 compiled'
+
+def test_export_unknown_problem_set(client, auth_headers):
+    assert client.get('/api/problem-sets/99/export', headers=auth_headers).status_code == 404
+
+def test_metrics_endpoint(app, client, auth_headers, monkeypatch):
+    """Test that request latency is exported and the optional token is enforced."""
+    client.get('/api/problem-sets', headers=auth_headers)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert 'mathgen_http_request_duration_seconds_count{endpoint="/api/problem-sets",method="GET",status="200"}' in body
+    assert 'mathgen_sse_connections' in body
+
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'scraper-secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scraper-secret'}).status_code == 200
+
+def test_request_profiling(app, client, auth_headers, tmp_path, monkeypatch):
+    """Test that admins can profile a request and download it as folded stacks."""
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+    response = client.get('/api/problem-sets', headers={**auth_headers, 'X-Profile': '1'})
+    assert 'X-Profile-Id' not in response.headers
+    assert client.get('/api/admin/profiles', headers=auth_headers).status_code == 403
+
+    monkeypatch.setitem(app.config, 'ADMIN_EMAILS', ['teacher@example.com'])
+    response = client.get('/api/problem-sets', headers={**auth_headers, 'X-Profile': '1'})
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+
+    response = client.get('/api/admin/profiles', headers=auth_headers)
+    profiles = response.get_json()['profiles']
+    assert [profile['id'] for profile in profiles] == [profile_id]
+    assert profiles[0]['path'] == '/api/problem-sets'
+    assert profiles[0]['status'] == 200
+
+    response = client.get(f'/api/admin/profiles/{profile_id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert client.get('/api/admin/profiles/missing', headers=auth_headers).status_code == 404
+
@@ -0,0 +1,48 @@
+import os
+import pytest
+from utils.blob_store import LocalBlobStore, create_blob_store
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalBlobStore(str(tmp_path / 'blobs'))
+
+def stored_files(store):
+    return [f for _, _, files in os.walk(store.root) for f in files]
+
+def test_roundtrip(store):
+    """Test that stored text comes back unchanged."""
+    text = r"\begin{enumerate}\item $\displaystyle \lim_{x \to \infty} \frac{1}{x}$\end{enumerate}"
+    digest, size = store.put_text(text)
+    assert size == len(text.encode('utf-8'))
+    assert store.exists(digest)
+    assert store.get_text(digest) == text
+
+def test_identical_content_stored_once(store):
+    """Test that identical payloads share a single blob."""
+    first, _ = store.put_text("same document")
+    second, _ = store.put_text("same document")
+    assert first == second
+    assert len(stored_files(store)) == 1
+    assert list(store.iter_digests()) == [first]
+
+def test_blobs_are_compressed(store):
+    """Test that blobs are stored zstd-compressed."""
+    text = "\\item $x^2$\n" * 1000
+    digest, size = store.put_text(text)
+    path = os.path.join(store.root, digest[:2], digest[2:4], f"{digest}.zst")
+    assert os.path.getsize(path) < size / 10
+
+def test_missing_blob(store):
+    """Test that reading an unknown digest raises FileNotFoundError."""
+    with pytest.raises(FileNotFoundError):
+        store.get('0' * 64)
+
+def test_delete(store):
+    digest = store.put(b"temporary")
+    store.delete(digest)
+    assert not store.exists(digest)
+    store.delete(digest)  # deleting twice is a no-op
+
+def test_create_blob_store_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        create_blob_store({'BLOB_STORE_BACKEND': 'ftp', 'BLOB_STORE_PATH': str(tmp_path)})
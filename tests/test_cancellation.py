@@ -0,0 +1,68 @@
+import time
+import pytest
+
+from utils.cancellation import (CancellationRegistry, CancelledError, CancelToken, cancellation_scope,
+                                check_cancelled, current_token)
+
+def test_cancel_runs_abort_callbacks_once():
+    token = CancelToken()
+    aborted = []
+    token.on_cancel(lambda: aborted.append('stream'))
+    unregister = token.on_cancel(lambda: aborted.append('compile'))
+    unregister()
+
+    assert token.cancel('Tab closed')
+    assert not token.cancel('Again')
+    assert aborted == ['stream']
+    with pytest.raises(CancelledError, match='Tab closed'):
+        token.check()
+
+    # Registering after cancellation aborts straight away
+    token.on_cancel(lambda: aborted.append('late'))
+    assert aborted == ['stream', 'late']
+
+def test_cancellation_scope():
+    token = CancelToken()
+    with cancellation_scope(token):
+        assert current_token() is token
+        check_cancelled()
+        token.cancel()
+        with pytest.raises(CancelledError):
+            check_cancelled()
+    assert current_token() is None
+    check_cancelled()
+
+def test_registry_cancels_by_key():
+    registry = CancellationRegistry()
+    first, second = CancelToken(), CancelToken()
+    registry.register(1, first, key=10)
+    registry.register(1, second, key=20)
+
+    assert registry.cancel(1, key=20) == 1
+    assert second.cancelled and not first.cancelled
+    assert registry.cancel(2) == 0
+    registry.unregister(1, first)
+    assert registry.cancel(1, key=10) == 0
+
+def test_registry_cancels_watched_work_after_grace_period():
+    registry = CancellationRegistry(grace_period=0.05)
+    unwatched = CancelToken()
+    registry.register(1, unwatched)
+    # Work nobody ever watched keeps running when a stream opens and closes elsewhere
+    registry.subscribe(2)
+    registry.unsubscribe(2)
+
+    registry.subscribe(1)
+    watched = CancelToken()
+    registry.register(1, watched)
+    registry.unsubscribe(1)
+    # A reconnect within the grace period keeps the work alive
+    registry.subscribe(1)
+    time.sleep(0.1)
+    assert not watched.cancelled
+
+    registry.unsubscribe(1)
+    assert watched.wait(1)
+    assert watched.reason == 'All progress subscribers disconnected'
+    # Work running when the stream opened counts as watched too
+    assert unwatched.cancelled
@@ -1,7 +1,11 @@
+import json
 import os
 import pytest
 import tempfile
-from generate_problems import setup_args
+from benchmarks.stubs import MINIMAL_PDF, FakeLatexCompiler, StubProvider
+from generate_problems import completed_items, find_items, run_batch, setup_args
+from utils.logger import setup_logging
+from utils.problem_generator import ProblemGenerator
 
 @pytest.fixture
 def test_data_dir():
@@ -51,3 +55,82 @@ def test_cli_args_validation(template_file):
     # Test invalid number of problems
     with pytest.raises(SystemExit):
         parser.parse_args([template_file, '--num-problems', 'invalid'])
+
+def batch_templates(root):
+    os.makedirs(os.path.join(root, 'calculus'))
+    for name in ('a.tex', 'calculus/b.tex', 'notes.txt'):
+        with open(os.path.join(root, name), 'w') as f:
+            f.write('\\begin{enumerate}\n\\item $\\displaystyle \\lim_{x \\to 0} x$\n\\end{enumerate}')
+    return root
+
+def test_cli_args_batch(template_file):
+    args = setup_args().parse_args([template_file, '--difficulties', 'same,harder',
+                                    '--llm-concurrency', '8', '--compile-concurrency', '3', '--rerun'])
+    assert args.difficulties == 'same,harder'
+    assert args.llm_concurrency == 8
+    assert args.compile_concurrency == 3
+    assert args.rerun
+
+def test_find_items(temp_output_dir):
+    source = batch_templates(os.path.join(temp_output_dir, 'templates'))
+    items = find_items(source, ['same', 'harder'], 4)
+    assert [item.id for item in items] == ['a-same-4', 'a-harder-4', 'calculus__b-same-4', 'calculus__b-harder-4']
+
+    manifest = os.path.join(temp_output_dir, 'batch.jsonl')
+    with open(manifest, 'w') as f:
+        f.write(json.dumps({'template': 'templates/a.tex', 'difficulty': 'challenge', 'num_problems': 3}) + '\n\n')
+        f.write(json.dumps({'template': 'templates/calculus/b.tex', 'id': 'b'}) + '\n')
+    items = find_items(manifest, ['same'], 5)
+    assert [(item.id, item.difficulty, item.num_problems) for item in items] == [
+        ('templates__a-challenge-3', 'challenge', 3), ('b', 'same', 5)]
+    assert os.path.exists(items[0].template)
+
+class FailingCompiler(FakeLatexCompiler):
+    def compile_to_pdf(self, tex_file, output_dir=None):
+        if 'calculus' in output_dir:
+            raise RuntimeError('Tectonic compilation failed')
+        return super().compile_to_pdf(tex_file, output_dir)
+
+def test_run_batch_resumes(temp_output_dir):
+    source = batch_templates(os.path.join(temp_output_dir, 'templates'))
+    output_dir = os.path.join(temp_output_dir, 'out')
+    items = find_items(source, ['same', 'challenge'], 3)
+    provider = StubProvider(response_size=200)
+    generator = ProblemGenerator(provider, latex_compiler=FailingCompiler())
+
+    summary = run_batch(generator, items, output_dir, llm_concurrency=3, compile_concurrency=2)
+    assert (summary['ok'], summary['failed'], summary['skipped'], summary['problems']) == (2, 2, 0, 6)
+    assert provider.calls == 8
+    assert os.path.exists(os.path.join(output_dir, 'a-same-3', 'problems.pdf'))
+    assert os.path.exists(os.path.join(output_dir, 'a-same-3', 'solutions.tex'))
+    with open(os.path.join(output_dir, 'results.jsonl')) as f:
+        results = {result['id']: result for result in map(json.loads, f)}
+    assert results['a-challenge-3']['status'] == 'ok'
+    assert results['calculus__b-same-3']['stage'] == 'compile'
+
+    # A rerun only retries the failed sets
+    generator.latex_compiler = FakeLatexCompiler()
+    summary = run_batch(generator, items, output_dir)
+    assert (summary['ok'], summary['failed'], summary['skipped']) == (2, 0, 2)
+    assert provider.calls == 12
+    assert set(completed_items(os.path.join(output_dir, 'results.jsonl'))) == {item.id for item in items}
+
+    summary = run_batch(generator, items, output_dir, rerun=True)
+    assert (summary['ok'], summary['skipped']) == (4, 0)
+
+def test_pdf_templates_are_converted_once(temp_output_dir):
+    pdf = os.path.join(temp_output_dir, 'limits.pdf')
+    with open(pdf, 'wb') as f:
+        f.write(MINIMAL_PDF)
+    provider = StubProvider(response_size=200)
+    generator = ProblemGenerator(provider, latex_compiler=FakeLatexCompiler())
+    items = find_items(temp_output_dir, ['same', 'challenge', 'harder'], 3)
+
+    output_dir = os.path.join(temp_output_dir, 'out')
+    summary = run_batch(generator, items, output_dir, llm_concurrency=3)
+    assert summary['ok'] == 3
+    # One conversion, then problems and solutions for each set
+    assert provider.calls == 1 + 3 * 2
+    # The conversion is recorded with the batch's output
+    setup_logging(os.path.join(output_dir, 'logs')).close()
+    assert os.listdir(os.path.join(output_dir, 'logs'))
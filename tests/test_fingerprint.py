@@ -0,0 +1,47 @@
+from utils.fingerprint import LSHIndex, MinHasher, find_duplicates, normalize, numbers, similarity
+
+LIMIT = r"Evaluate $\lim_{x \to 0} \frac{\sin 3x}{x}$."
+RENAMED = r"Evaluate $\displaystyle\lim_{t\to 0}\dfrac{\sin 3t}{t}$."
+DERIVATIVE = r"Find the derivative of $f(x) = x^{3} + 2x$."
+
+def test_normalize_ignores_presentation():
+    assert normalize(LIMIT) == normalize(RENAMED)
+    assert normalize(r"Compute $1,000.50 + x^{2}$") == ['compute', '1000.5', '+', 'v0', '^', '2']
+    assert normalize(r"\textbf{[Challenge]} $y = 2.0$") == normalize('$y=2$')
+
+def test_similar_problems_share_signatures():
+    hasher = MinHasher()
+    assert similarity(hasher.signature(LIMIT), hasher.signature(RENAMED)) == 1.0
+    assert similarity(hasher.signature(LIMIT), hasher.signature(DERIVATIVE)) < 0.3
+    # Signatures are stable, so they can be stored and compared later
+    assert MinHasher().signature(LIMIT) == hasher.signature(LIMIT)
+
+def test_lsh_index_finds_near_duplicates():
+    hasher = MinHasher()
+    index = LSHIndex()
+    index.add('limit', hasher.signature(LIMIT))
+    index.add('derivative', hasher.signature(DERIVATIVE))
+    assert [key for key, _ in index.query(hasher.signature(RENAMED), 0.8)] == ['limit']
+    assert index.query(hasher.signature(r"Solve $x^2 - 5x + 6 = 0$ for $x$."), 0.8) == []
+
+def test_find_duplicates_within_list_and_index():
+    hasher = MinHasher()
+    assert find_duplicates([LIMIT, DERIVATIVE, RENAMED], hasher) == {2: 0}
+    index = LSHIndex()
+    index.add(('bank', 7), hasher.signature(DERIVATIVE))
+    assert find_duplicates([DERIVATIVE, LIMIT], hasher, index=index) == {0: ('bank', 7)}
+
+def test_coefficient_variants_are_not_duplicates():
+    original = r"$\lim_{x \to \infty} (3x^2+2x-1)/(5x^2-4)$"
+    variant = r"$\lim_{x \to \infty} (3x^2+2x-1)/(5x^2-7)$"
+    hasher = MinHasher()
+    # Most shingles are shared, but the problem asks for another limit
+    assert similarity(hasher.signature(original), hasher.signature(variant)) >= 0.85
+    assert numbers(original) != numbers(variant)
+    assert numbers(r"$y = 2 + 3x$") == numbers(r"$y = 3x + 2.0$")
+    assert find_duplicates([original, variant], hasher, 0.85) == {}
+
+    index = LSHIndex()
+    index.add(('bank', 7), hasher.signature(original))
+    assert find_duplicates([variant], hasher, 0.85, index, {('bank', 7): numbers(original)}) == {}
+    assert find_duplicates([original], hasher, 0.85, index, {('bank', 7): numbers(original)}) == {0: ('bank', 7)}
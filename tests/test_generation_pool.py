@@ -0,0 +1,81 @@
+import pytest
+from datetime import datetime, timedelta
+
+from models.database import db, DifficultyLevel, GeneratedSet, GenerationDemand, ProblemSet, Provider
+from utils import generation_pool
+
+DAY = 24 * 60 * 60
+
+@pytest.fixture
+def problem_set_id(user_id):
+    problem_set = ProblemSet(user_id=user_id, name='Limits', latex_template='template')
+    db.session.add(problem_set)
+    db.session.commit()
+    return problem_set.id
+
+def pooled_set(problem_set_id: int, pooled_at: datetime = None) -> GeneratedSet:
+    generated_set = GeneratedSet(problem_set_id=problem_set_id, provider=Provider.CLAUDE,
+                                 difficulty=DifficultyLevel.SAME, num_problems=3,
+                                 problems_pdf_path='problems.pdf', solutions_pdf_path='solutions.pdf',
+                                 problems_latex='problems', solutions_latex='solutions',
+                                 pooled=True, pooled_at=pooled_at or datetime.utcnow())
+    db.session.add(generated_set)
+    db.session.commit()
+    return generated_set
+
+def test_demand_decays(problem_set_id):
+    now = datetime(2025, 3, 1)
+    for _ in range(4):
+        demand = generation_pool.record_demand(problem_set_id, 'Claude', 'SAME', 3, half_life=DAY, now=now)
+    assert demand.score == 4
+    demand = generation_pool.record_demand(problem_set_id, 'claude', 'same', 3, half_life=DAY,
+                                           now=now + timedelta(days=1))
+    assert demand.score == pytest.approx(3)
+    assert GenerationDemand.query.count() == 1
+
+def test_pooled_sets_are_claimed_once(problem_set_id):
+    first = pooled_set(problem_set_id, datetime.utcnow() - timedelta(hours=1)).id
+    second = pooled_set(problem_set_id).id
+
+    assert generation_pool.claim(problem_set_id, 'claude', 'harder', 3) is None
+    claimed = generation_pool.claim(problem_set_id, 'claude', 'same', 3)
+    assert claimed.id == first
+    assert not claimed.pooled
+    assert generation_pool.claim(problem_set_id, 'claude', 'same', 3).id == second
+    assert generation_pool.claim(problem_set_id, 'claude', 'same', 3) is None
+
+def test_refill_tops_up_popular_settings_within_budget(problem_set_id):
+    for _ in range(6):
+        generation_pool.record_demand(problem_set_id, 'claude', 'same', 3, half_life=DAY)
+    generation_pool.record_demand(problem_set_id, 'claude', 'harder', 3, half_life=DAY)
+    generated = []
+
+    def generate(demand):
+        generated.append((demand.difficulty, demand.num_problems))
+        return pooled_set(demand.problem_set_id)
+
+    refiller = generation_pool.PoolRefiller(generate, pool_size=2, min_demand=5, half_life=DAY, daily_budget=3)
+    report = refiller.run()
+    # Only the popular settings get a pool, and only up to its size
+    assert generated == [('same', 3), ('same', 3)]
+    assert report['generated'] == 2
+    assert report['budget_left'] == 1
+    assert refiller.run()['generated'] == 0
+
+    generation_pool.claim(problem_set_id, 'claude', 'same', 3)
+    generation_pool.claim(problem_set_id, 'claude', 'same', 3)
+    report = refiller.run()
+    assert report['generated'] == 1
+    assert report['budget_left'] == 0
+
+def test_refill_yields_and_expires(problem_set_id):
+    for _ in range(5):
+        generation_pool.record_demand(problem_set_id, 'claude', 'same', 3, half_life=DAY)
+    pooled_set(problem_set_id, datetime.utcnow() - timedelta(days=8))
+
+    busy = generation_pool.PoolRefiller(lambda demand: pooled_set(problem_set_id), pool_size=1,
+                                        half_life=DAY, is_idle=lambda: False)
+    report = busy.run()
+    assert report['expired'] == 1
+    assert report['generated'] == 0
+    assert GeneratedSet.query.count() == 0
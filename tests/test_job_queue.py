@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+from models.database import db, Job, JobKind, JobStatus
+from utils import job_queue
+
+def test_claim_oldest_matching_job(user_id):
+    convert = job_queue.enqueue(JobKind.CONVERT, user_id, {})
+    generate = job_queue.enqueue(JobKind.GENERATE, user_id, {'num_problems': 3})
+
+    job = job_queue.claim('worker-a', 60, kinds=[JobKind.GENERATE])
+    assert job.id == generate.id
+    assert job.status == JobStatus.RUNNING
+    assert job.lease_owner == 'worker-a'
+    assert job.attempts == 1
+
+    assert job_queue.claim('worker-b', 60).id == convert.id
+    assert job_queue.claim('worker-b', 60) is None
+
+def test_lease_ownership(user_id):
+    job_id = job_queue.enqueue(JobKind.GENERATE, user_id, {}).id
+    job_queue.claim('worker-a', 60)
+
+    assert not job_queue.heartbeat(job_id, 'worker-b', 60)
+    assert job_queue.heartbeat(job_id, 'worker-a', 60, progress=50, message='Generating solutions...')
+    assert not job_queue.complete(job_id, 'worker-b', {'generated_set_id': 1})
+    assert job_queue.complete(job_id, 'worker-a', {'generated_set_id': 1})
+
+    job = db.session.get(Job, job_id, populate_existing=True)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.result == {'generated_set_id': 1}
+    assert job.message == 'Generating solutions...'
+    assert job.lease_owner is None
+
+def test_fail_retries_until_out_of_attempts(user_id):
+    job_id = job_queue.enqueue(JobKind.GENERATE, user_id, {}, max_attempts=2).id
+    job_queue.claim('worker-a', 60)
+    assert job_queue.fail(job_id, 'worker-a', 'Claude API error') == JobStatus.QUEUED
+    job_queue.claim('worker-a', 60)
+    assert job_queue.fail(job_id, 'worker-a', 'Claude API error') == JobStatus.FAILED
+    assert job_queue.fail(job_id, 'worker-a', 'again') is None
+
+    permanent = job_queue.enqueue(JobKind.GENERATE, user_id, {}, max_attempts=3).id
+    job_queue.claim('worker-a', 60)
+    assert job_queue.fail(permanent, 'worker-a', 'Problem set missing', retry=False) == JobStatus.FAILED
+
+def test_release_stale_leases(user_id):
+    retried = job_queue.enqueue(JobKind.GENERATE, user_id, {}, max_attempts=2).id
+    exhausted = job_queue.enqueue(JobKind.GENERATE, user_id, {}, max_attempts=1).id
+    job_queue.claim('dead-worker', 60)
+    job_queue.claim('dead-worker', 60)
+
+    assert job_queue.release_stale() == 0
+    assert job_queue.release_stale(datetime.utcnow() + timedelta(seconds=61)) == 2
+    assert db.session.get(Job, retried, populate_existing=True).status == JobStatus.QUEUED
+    assert db.session.get(Job, exhausted).status == JobStatus.FAILED
+    assert job_queue.claim('worker-a', 60).id == retried
+
+def test_worker_fails_jobs_it_cannot_run(app, user_id):
+    from worker import JobWorker
+    job_id = job_queue.enqueue(JobKind.CONVERT, user_id, {}, problem_set_id=42, max_attempts=3).id
+    assert JobWorker(app, heartbeat_interval=60).run_once() == job_id
+    job = db.session.get(Job, job_id, populate_existing=True)
+    assert job.status == JobStatus.FAILED
+    assert job.error.startswith('LookupError')
+
+def test_worker_sweeps_without_a_free_slot(app, user_id):
+    import threading
+    import time
+    from worker import JobWorker
+    job_id = job_queue.enqueue(JobKind.GENERATE, user_id, {}, max_attempts=2).id
+    job_queue.claim('dead-worker', 0)
+
+    # No slots, as if every one were busy with a long job
+    worker = JobWorker(app, concurrency=0, lease_seconds=60)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while db.session.get(Job, job_id, populate_existing=True).status != JobStatus.QUEUED:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+
+def test_cancel_unwatched_jobs(user_id):
+    polled = job_queue.enqueue(JobKind.GENERATE, user_id, {}).id
+    never_polled = job_queue.enqueue(JobKind.GENERATE, user_id, {}).id
+    queued = job_queue.enqueue(JobKind.CONVERT, user_id, {}).id
+    job_queue.claim('worker-a', 60, kinds=[JobKind.GENERATE])
+    job_queue.claim('worker-a', 60, kinds=[JobKind.GENERATE])
+    for job_id in (polled, queued):
+        job_queue.watch(db.session.get(Job, job_id))
+
+    later = datetime.utcnow() + timedelta(seconds=61)
+    assert job_queue.cancel_unwatched(60) == 0
+    assert job_queue.cancel_unwatched(60, never_polled, 'worker-a', now=later) == 0
+    assert job_queue.cancel_unwatched(60, polled, 'worker-a', now=later) == 1
+    # The worker finds it lost the lease at its next heartbeat
+    assert not job_queue.heartbeat(polled, 'worker-a', 60)
+    assert job_queue.heartbeat(never_polled, 'worker-a', 60)
+
+    assert job_queue.cancel_unwatched(60, now=later) == 1
+    job = db.session.get(Job, queued, populate_existing=True)
+    assert job.status == JobStatus.CANCELLED
+    assert job.error == 'All progress subscribers disconnected'
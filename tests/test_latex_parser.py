@@ -0,0 +1,84 @@
+import time
+from utils.latex_parser import format_list, parse_problems, parse_solutions, tokenize
+from utils.problem_generator import SOLUTIONS_PREAMBLE
+
+PROBLEMS = r"""\begin{enumerate}
+\item $\displaystyle \lim_{x \to 0} \frac{\sin x}{x}$
+\item \textbf{[Challenge]} $\displaystyle \lim_{x \to \infty} x e^{-x}$
+% \item a commented-out problem
+\item Evaluate both:
+  \begin{enumerate}
+  \item $\lim_{x \to 1} x^2$
+  \item \[\lim_{x \to 2} x^3\]
+  \end{enumerate}
+\end{enumerate}"""
+
+SOLUTIONS = SOLUTIONS_PREAMBLE + r"""
+Solution:
+\begin{align*}
+\lim_{x \to 0} \frac{\sin x}{x} &= \boxed{1}
+\end{align*}
+
+Solution:
+The answer is $\boxed{\frac{1}{2}}$, not $\{0\}$.
+"""
+
+def test_tokenize_covers_the_input():
+    latex = r"\begin{align*} x^{2} \\ 50\% \end{align*} % done"
+    tokens = tokenize(latex)
+    assert ''.join(latex[token.start:token.end] for token in tokens) == latex
+    assert [token.kind for token in tokens if token.kind not in ('text', 'lbrace', 'rbrace')] == \
+        ['begin', 'escape', 'escape', 'end', 'comment']
+    assert tokens[0].value == 'align*'
+
+def test_parse_problems():
+    document = parse_problems(PROBLEMS)
+    assert [item.challenge for item in document.items] == [False, True, False]
+    assert document.items[0].latex == r'$\displaystyle \lim_{x \to 0} \frac{\sin x}{x}$'
+    assert document.items[0].math[0].latex == r'\displaystyle \lim_{x \to 0} \frac{\sin x}{x}'
+    # Nested lists belong to their item
+    nested = document.items[2]
+    assert nested.latex.startswith('Evaluate both:') and nested.latex.endswith(r'\end{enumerate}')
+    assert [span.display for span in nested.math] == [False, True]
+    assert PROBLEMS[nested.start:nested.end] == nested.latex
+
+def test_round_trip():
+    document = parse_problems(PROBLEMS)
+    again = parse_problems(document.to_latex())
+    assert again.to_dict() == document.to_dict()
+    converted = "\\documentclass{article}\n\\begin{document}\n" + PROBLEMS + "\n\\end{document}"
+    document = parse_problems(converted)
+    assert len(document.items) == 3
+    assert document.preamble.startswith('\\documentclass') and document.postamble.strip() == '\\end{document}'
+    assert parse_problems(document.to_latex()).to_dict() == document.to_dict()
+
+def test_lenient_with_llm_output():
+    # Cut off before \end{enumerate}, with a stray \end
+    document = parse_problems("\\begin{enumerate}\n\\item $x$\n\\end{itemize}\n\\item $y$")
+    assert [item.latex for item in document.items] == ['$x$\n\\end{itemize}', '$y$']
+    document = parse_problems("Just text, no list")
+    assert document.items == [] and document.list_environment is None
+    assert format_list(['a', 'b']) == "\\begin{enumerate}\n\\item a\n\\item b\n\\end{enumerate}"
+
+def test_parse_solutions():
+    document = parse_solutions(SOLUTIONS)
+    assert document.preamble.startswith('% Custom spacing')
+    assert len(document.items) == 2
+    assert all(item.latex.startswith('Solution:') for item in document.items)
+    assert [item.answers for item in document.items] == [['1'], [r'\frac{1}{2}']]
+    assert document.items[0].math[0].display
+    assert parse_solutions(document.to_latex()).to_dict()['items'] == document.to_dict()['items']
+
+def test_parse_is_linear():
+    def parse(count):
+        items = [r"\textbf{[Challenge]} $\displaystyle \lim_{x \to %d} \frac{x^{2} - %d}{x - 1}$" % (i, i)
+                 for i in range(count)]
+        start = time.process_time()
+        document = parse_problems(format_list(items))
+        return document, time.process_time() - start
+
+    _, small = parse(5000)
+    document, large = parse(20000)
+    # Four times the items: about four times the work, sixteen if it were quadratic
+    assert large < 10 * max(small, 0.01)
+    assert len(document.items) == 20000 and all(item.challenge for item in document.items)
@@ -0,0 +1,55 @@
+import json
+import pytest
+
+from benchmarks.load_test import SCENARIO_DEFAULTS, create_provider_factory, load_scenario, percentile, summarize
+from utils.logger import JsonlLogger
+
+def test_load_scenario_defaults(tmp_path):
+    """Test that a flat scenario becomes a single stage with defaults filled in."""
+    path = tmp_path / 'scenario.json'
+    path.write_text(json.dumps({'name': 'flat', 'duration': 5, 'rate': 2, 'mix': {'login': 1}}))
+    scenario = load_scenario(str(path))
+    assert scenario['stages'] == [{'duration': 5, 'rate': 2}]
+    assert scenario['arrival'] == 'poisson'
+
+def test_load_scenario_unknown_operation(tmp_path):
+    path = tmp_path / 'scenario.json'
+    path.write_text(json.dumps({'mix': {'delete_everything': 1}}))
+    with pytest.raises(ValueError):
+        load_scenario(str(path))
+
+def test_summarize():
+    """Test per-endpoint percentiles, throughput and error rates."""
+    records = [
+        {'endpoint': 'GET /api/problem-sets', 'status': 200, 'error': None,
+         'latency': (i + 1) / 1000, 'service_time': 0.001}
+        for i in range(100)
+    ]
+    records.append({'endpoint': 'POST /api/auth/login', 'status': None, 'error': 'TimeoutError',
+                    'latency': 1.0, 'service_time': 1.0})
+    report = summarize(records, elapsed=10.0)
+
+    listing = report['GET /api/problem-sets']
+    assert listing['requests'] == 100
+    assert listing['throughput_rps'] == 10.0
+    assert listing['p50_ms'] == pytest.approx(50)
+    assert listing['p99_ms'] == pytest.approx(99)
+    assert report['POST /api/auth/login']['statuses'] == {'TimeoutError': 1}
+    assert report['overall']['errors'] == 1
+    assert percentile([], 0.5) == 0.0
+
+def test_replay_provider_factory(tmp_path):
+    """Test that a replayed log is shared by every request and misses fall back to recorded answers."""
+    logger = JsonlLogger(str(tmp_path))
+    logger.log_interaction(model='claude', prompt='Generate 5 problems', variables={}, response='recorded')
+    logger.close()
+
+    factory = create_provider_factory({**SCENARIO_DEFAULTS, 'replay': str(tmp_path), 'replay_latency': 'none'})
+    provider = factory('claude')
+    assert factory('gemini') is provider
+    assert provider.execute('Generate 5 problems') == 'recorded'
+    assert provider.execute('Something else') == 'recorded'
+    assert provider.stats()['misses'] == 1
+
+    stub = create_provider_factory(dict(SCENARIO_DEFAULTS))('claude')
+    assert type(stub).__name__ == 'StubProvider'
@@ -0,0 +1,103 @@
+import os
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta
+
+from query_logs import setup_args, filter_interactions, summarize
+from utils.logger import JsonlLogger, Logger, iter_interactions, setup_logging
+
+def log(logger, model='claude', response='ok', latency_ms=None):
+    logger.log_interaction(model=model, prompt='Solve $x^2 = 4$', variables={},
+                           response=response, latency_ms=latency_ms)
+
+def test_jsonl_roundtrip(tmp_path):
+    """Test that interactions written in the background can be read back."""
+    logger = JsonlLogger(str(tmp_path), compress=False)
+    for i in range(3):
+        log(logger, response=f'answer {i}', latency_ms=i * 100)
+    logger.flush()
+
+    entries = list(iter_interactions(str(tmp_path)))
+    assert [entry['response'] for entry in entries] == ['answer 0', 'answer 1', 'answer 2']
+    assert entries[2]['latency_ms'] == 200
+    segments = os.listdir(tmp_path)
+    assert len(segments) == 1 and segments[0].endswith('.jsonl')
+    logger.close()
+
+def test_rotation_and_compression(tmp_path):
+    """Test that full segments are rotated and gzipped."""
+    logger = JsonlLogger(str(tmp_path), max_bytes=1, compress=True)
+    for i in range(5):
+        log(logger, response=f'answer {i}')
+    logger.close()
+
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 5
+    assert all(name.endswith('.jsonl.gz') for name in files)
+    with gzip.open(tmp_path / files[0], 'rt') as f:
+        assert json.loads(f.readline())['model'] == 'claude'
+    assert len(list(iter_interactions(str(tmp_path)))) == 5
+
+def test_sampling(tmp_path):
+    """Test that a zero sample rate records nothing."""
+    logger = JsonlLogger(str(tmp_path), sample_rate=0.0)
+    log(logger)
+    logger.close()
+    assert os.listdir(tmp_path) == []
+
+def test_full_queue_drops_entries(tmp_path):
+    """Test that the queue is bounded and overflowing entries are counted."""
+    logger = JsonlLogger(str(tmp_path), queue_size=1)
+    logger.close()
+    logger._closed = False  # writer stopped, so the queue cannot drain
+    log(logger)
+    log(logger)
+    assert logger.dropped == 1
+
+def test_legacy_files_do_not_collide(tmp_path, monkeypatch):
+    """Test that legacy files logged in the same microsecond get distinct names."""
+    logger = Logger(str(tmp_path))
+    monkeypatch.setattr(Logger, '_build_entry', staticmethod(lambda *args: {
+        'timestamp': '2025-02-04T00:36:47.435248', 'model': 'claude', 'response': 'ok'
+    }))
+    log(logger)
+    log(logger)
+    files = os.listdir(tmp_path)
+    assert len(files) == 2
+    assert all(name.startswith('interaction_') and name.endswith('.json') for name in files)
+
+def test_setup_logging_backends(tmp_path):
+    """Test that setup_logging reuses loggers and rejects unknown backends."""
+    logger = setup_logging(str(tmp_path), 'jsonl')
+    assert isinstance(logger, JsonlLogger)
+    assert setup_logging(str(tmp_path), 'jsonl') is logger
+    assert type(setup_logging(str(tmp_path), 'legacy')) is Logger
+    with pytest.raises(ValueError):
+        setup_logging(str(tmp_path), 'syslog')
+    logger.close()
+
+def test_query_filters(tmp_path):
+    """Test filtering by model, latency and time range across both formats."""
+    legacy = Logger(str(tmp_path))
+    log(legacy, model='gemini', latency_ms=50)
+    logger = JsonlLogger(str(tmp_path))
+    log(logger, model='claude', latency_ms=900)
+    log(logger, model='claude', latency_ms=100)
+    logger.close()
+
+    def query(*argv):
+        return list(filter_interactions(setup_args().parse_args([str(tmp_path), *argv])))
+
+    assert len(query()) == 3
+    assert [entry['model'] for entry in query('--no-legacy')] == ['claude', 'claude']
+    assert [entry['latency_ms'] for entry in query('--model', 'claude', '--min-latency', '500')] == [900]
+    assert len(query('--max-latency', '100')) == 2
+    tomorrow = (datetime.now() + timedelta(days=1)).isoformat()
+    assert query('--since', tomorrow) == []
+    assert len(query('--until', tomorrow, '--limit', '2')) == 2
+
+    summary = summarize(iter(query()))
+    assert summary['count'] == 3
+    assert summary['models'] == {'gemini': 1, 'claude': 2}
+    assert summary['latency_ms']['max'] == 900
@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import runpy
+import pytest
+from prometheus_client import REGISTRY
+
+from utils.metrics import record_tokens, span
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_spans_nest_and_record_durations(caplog):
+    """Test that nested spans share a trace and land in the stage histogram."""
+    before = sample('mathgen_stage_duration_seconds_count', stage='test.inner', outcome='ok')
+    with caplog.at_level(logging.DEBUG, logger='mathgen.trace'):
+        with span('test.outer', set_id=7) as outer:
+            with span('test.inner') as inner:
+                pass
+
+    assert inner.trace_id == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    assert sample('mathgen_stage_duration_seconds_count', stage='test.inner', outcome='ok') == before + 1
+    assert sample('mathgen_stage_in_flight', stage='test.outer') == 0
+
+    logged = [json.loads(record.getMessage()) for record in caplog.records]
+    assert [(entry['name'], record.levelno) for entry, record in zip(logged, caplog.records)] == \
+        [('test.inner', logging.DEBUG), ('test.outer', logging.INFO)]
+    assert logged[1]['set_id'] == 7
+
+def test_quick_nested_spans_log_at_debug(caplog):
+    """Test that only top-level, failed and slow spans reach the INFO log."""
+    with caplog.at_level(logging.INFO, logger='mathgen.trace'):
+        with span('test.request'):
+            with span('test.quick'):
+                pass
+            with pytest.raises(KeyError):
+                with span('test.unlucky'):
+                    raise KeyError('missing')
+    assert [json.loads(record.getMessage())['name'] for record in caplog.records] == \
+        ['test.unlucky', 'test.request']
+
+def test_span_records_errors():
+    with pytest.raises(KeyError):
+        with span('test.failing') as failing:
+            raise KeyError('missing')
+    assert failing.outcome == 'error'
+    assert failing.attributes['error'] == 'KeyError'
+    assert sample('mathgen_stage_duration_seconds_count', stage='test.failing', outcome='error') == 1
+
+def test_record_tokens():
+    before = sample('mathgen_llm_tokens_total', provider='test', direction='output')
+    with span('test.llm') as llm:
+        record_tokens('test', 120, 80)
+    assert llm.attributes == {'input_tokens': 120, 'output_tokens': 80}
+    assert sample('mathgen_llm_tokens_total', provider='test', direction='output') == before + 80
+
+def test_gunicorn_drops_gauges_of_dead_workers(tmp_path, monkeypatch):
+    """Test that gunicorn's child_exit hook removes a dead worker's live gauges."""
+    class Worker:
+        pid = 4242
+
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    live = tmp_path / f'gauge_livesum_{Worker.pid}.db'
+    live.write_bytes(b'')
+    config = runpy.run_path(os.path.join(os.path.dirname(__file__), '..', 'gunicorn.conf.py'))
+    config['child_exit'](None, Worker())
+    assert not live.exists()
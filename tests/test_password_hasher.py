@@ -0,0 +1,40 @@
+import pytest
+from utils.password_hasher import PasswordHasher, HasherBusyError
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_pending=1)
+    yield hasher
+    hasher.shutdown()
+
+def test_hash_and_check(hasher):
+    """Test that a hashed password verifies and a wrong one does not."""
+    password_hash = hasher.hash_password('correct horse')
+    assert password_hash.startswith('$2b$04$')
+    assert hasher.check_password(password_hash, 'correct horse')
+    assert not hasher.check_password(password_hash, 'battery staple')
+
+def test_malformed_hash(hasher):
+    assert not hasher.check_password('not-a-hash', 'anything')
+
+def test_needs_rehash(hasher):
+    """Test that hashes made with a different cost are flagged for rehashing."""
+    password_hash = hasher.hash_password('secret')
+    assert not hasher.needs_rehash(password_hash)
+
+    stronger = PasswordHasher(rounds=5)
+    assert stronger.needs_rehash(password_hash)
+    assert stronger.needs_rehash('not-a-hash')
+
+def test_long_passwords_are_truncated(hasher):
+    """Test that passwords beyond bcrypt's 72 byte limit still hash."""
+    password_hash = hasher.hash_password('a' * 100)
+    assert hasher.check_password(password_hash, 'a' * 72)
+
+def test_full_queue_raises_busy():
+    """Test that requests beyond the queue bound are rejected immediately."""
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_pending=0, retry_after=7)
+    hasher._slots.acquire()  # occupy the only slot
+    with pytest.raises(HasherBusyError) as exc_info:
+        hasher.hash_password('secret')
+    assert exc_info.value.retry_after == 7
@@ -0,0 +1,52 @@
+import os
+import pytest
+
+from benchmarks.pipeline_benchmark import compare, run_benchmark
+from benchmarks.stubs import MINIMAL_PDF, FakeLatexCompiler, StubProvider
+from utils.problem_generator import ProblemGenerator
+
+def test_create_problem_set_offline(template_file, temp_output_dir):
+    """Test that the stubs drive the whole pipeline without Tectonic or an API key."""
+    provider = StubProvider(response_size=500)
+    generator = ProblemGenerator(provider, latex_compiler=FakeLatexCompiler())
+    problems_pdf, solutions_pdf, problems_latex, solutions_latex = generator.create_problem_set(
+        template_file, output_dir=temp_output_dir)
+
+    assert provider.calls == 2
+    with open(problems_pdf, 'rb') as f:
+        assert f.read() == MINIMAL_PDF
+    assert os.path.dirname(solutions_pdf) == temp_output_dir
+    assert len(problems_latex) > 500
+    assert '\\boxed' in solutions_latex
+
+def test_run_benchmark_reports_stages():
+    result = run_benchmark('create_problem_set', {
+        'iterations': 2, 'warmup': 0, 'llm_latency': 0.0, 'response_size': 200,
+        'compiler': 'fake', 'compile_latency': 0.0, 'num_problems': 3
+    })
+    assert result['iterations'] == 2
+    assert result['peak_rss_kb'] > 0
+    assert result['stages']['llm']['calls'] == 4
+    assert result['stages']['compile']['calls'] == 4
+
+def test_run_benchmark_replays_recorded_log(template_file, tmp_path):
+    """Test that the pipeline runs offline from a log its own generations recorded."""
+    generator = ProblemGenerator(StubProvider(response_size=200), FakeLatexCompiler(), log_dir=str(tmp_path))
+    generator.create_problem_set(template_file, num_problems=3)
+    generator.logger.flush()
+
+    result = run_benchmark('create_problem_set', {
+        'iterations': 2, 'warmup': 0, 'llm_latency': 0.0, 'response_size': 200,
+        'compiler': 'fake', 'compile_latency': 0.0, 'num_problems': 3, 'replay': str(tmp_path)
+    })
+    assert result['stages']['llm']['calls'] == 4
+    assert result['replay']['hits'] == 4
+    assert result['replay']['misses'] == 0
+
+def test_compare_flags_regressions():
+    baseline = {'benchmarks': [{'name': 'compile_to_pdf', 'mean_ms': 10.0}]}
+    results = [{'name': 'compile_to_pdf', 'mean_ms': 12.0}, {'name': 'convert_to_latex', 'mean_ms': 1.0}]
+    comparisons = compare(results, baseline, threshold=0.1)
+    assert len(comparisons) == 1
+    assert comparisons[0]['change'] == pytest.approx(0.2)
+    assert comparisons[0]['regression']
@@ -0,0 +1,114 @@
+import pytest
+from datetime import datetime
+
+from models.database import db, BankProblem, DifficultyLevel, GeneratedSet, ProblemSet, Provider, SeenProblem, User
+from utils import generation_pool, problem_bank
+
+PROBLEMS = r"""\begin{enumerate}
+\item $\displaystyle \lim_{x \to 0} \frac{\sin x}{x}$
+\item \textbf{[Challenge]} $\displaystyle \lim_{x \to \infty} x e^{-x}$
+\item Evaluate both:
+  \begin{enumerate}
+  \item $\lim_{x \to 1} x^2$
+  \item $\lim_{x \to 2} x^3$
+  \end{enumerate}
+\end{enumerate}"""
+
+SOLUTIONS = r"""% preamble
+\setlength{\jot}{12pt}
+
+Solution:
+$\displaystyle \lim_{x \to 0} \frac{\sin x}{x} = \boxed{1}$
+
+Solution:
+$\displaystyle \lim_{x \to \infty} x e^{-x} = \boxed{0}$
+
+Solution:
+Both limits: $\boxed{1}$ and $\boxed{8}$"""
+
+@pytest.fixture
+def user_ids(user_id):
+    other = User(email='other@example.com', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+    return [user_id, other.id]
+
+def test_split_generated_latex():
+    problems = problem_bank.split_problems(PROBLEMS)
+    assert len(problems) == 3
+    assert problems[0] == r'$\displaystyle \lim_{x \to 0} \frac{\sin x}{x}$'
+    assert '\\item $\\lim_{x \\to 2} x^3$' in problems[2]
+    solutions = problem_bank.split_solutions(SOLUTIONS)
+    assert len(solutions) == 3
+    assert all(solution.startswith('Solution:') for solution in solutions)
+    assert 'preamble' not in solutions[0]
+
+def test_bank_set_stores_each_problem_once(user_ids):
+    rows = problem_bank.bank_set('t' * 64, 'Claude', 'harder', PROBLEMS, SOLUTIONS, user_ids[0])
+    assert [row.challenge for row in rows] == [False, True, False]
+    again = problem_bank.bank_set('t' * 64, 'claude', 'same', PROBLEMS, SOLUTIONS, user_ids[1])
+    assert [row.id for row in again] == [row.id for row in rows]
+    assert BankProblem.query.count() == 3
+    assert SeenProblem.query.count() == 6
+    # Unpaired output is not banked
+    assert problem_bank.bank_set('u' * 64, 'claude', 'same', PROBLEMS, 'no solutions', user_ids[0]) == []
+
+def test_pooled_sets_are_seen_once_claimed(user_ids):
+    problem_set = ProblemSet(user_id=user_ids[0], name='Limits', latex_template='template')
+    db.session.add(problem_set)
+    db.session.commit()
+    generated_set = GeneratedSet(problem_set_id=problem_set.id, provider=Provider.CLAUDE,
+                                 difficulty=DifficultyLevel.SAME, num_problems=3,
+                                 problems_pdf_path='problems.pdf', solutions_pdf_path='solutions.pdf',
+                                 problems_latex=PROBLEMS, solutions_latex=SOLUTIONS,
+                                 pooled=True, pooled_at=datetime.utcnow())
+    db.session.add(generated_set)
+    db.session.commit()
+    problem_bank.bank_set(problem_set.latex_template_hash, 'claude', 'same', PROBLEMS, SOLUTIONS, user_ids[0],
+                          generated_set.id, seen=False)
+    assert SeenProblem.query.count() == 0
+
+    assert generation_pool.claim(problem_set.id, 'claude', 'same', 3).id == generated_set.id
+    assert {row.user_id for row in SeenProblem.query} == {user_ids[0]}
+    assert SeenProblem.query.count() == 3
+
+def test_search_uses_full_text_index(user_ids):
+    problem_bank.bank_set('t' * 64, 'claude', 'same', PROBLEMS, SOLUTIONS, user_ids[0])
+    assert [row.problem_latex for row in problem_bank.search('t' * 64, 'sin')] == \
+        [r'$\displaystyle \lim_{x \to 0} \frac{\sin x}{x}$']
+    assert len(problem_bank.search('t' * 64, 'lim displaystyle')) == 2
+    assert problem_bank.search('u' * 64, 'sin') == []
+    # FTS5 syntax in the query is taken literally
+    assert problem_bank.search('t' * 64, 'sin OR "') == []
+
+def test_draw_skips_seen_problems(user_ids):
+    first, second = user_ids
+    problem_bank.bank_set('t' * 64, 'claude', 'same', PROBLEMS, SOLUTIONS, first)
+    assert problem_bank.draw(first, 't' * 64, False, 5) == []
+
+    regular = problem_bank.draw(second, 't' * 64, False, 5)
+    assert len(regular) == 2
+    challenge = problem_bank.draw(second, 't' * 64, True, 5, query='infty')
+    assert [row.challenge for row in challenge] == [True]
+    assert problem_bank.draw(second, 't' * 64, False, 5, exclude=[regular[0].id]) == regular[1:]
+
+    problems, solutions = problem_bank.assemble(regular + challenge)
+    assert problem_bank.split_problems(problems) == [row.problem_latex for row in regular + challenge]
+    assert len(problem_bank.split_solutions(solutions)) == 3
+
+def test_duplicate_check_against_seen_problems(user_ids):
+    first, second = user_ids
+    problem_bank.bank_set('t' * 64, 'claude', 'same', PROBLEMS, SOLUTIONS, first)
+    bank_id = BankProblem.query.order_by(BankProblem.id).first().id
+    renamed = r'$\lim_{t \to 0} \dfrac{\sin t}{t}$'
+    new = r'$\lim_{x \to 3} (x^2 - 9)/(x - 3)$'
+
+    check = problem_bank.DuplicateCheck()
+    assert check.find(first, 't' * 64, [new, renamed, new]) == {1: ('bank', bank_id), 2: 0}
+    # Problems the user has not been given, or of another template, are fair game
+    assert check.find(second, 't' * 64, [renamed]) == {}
+    assert check.find(first, 'u' * 64, [renamed]) == {}
+    # Another exponent makes another problem, however similar the rest is
+    both = 'Evaluate both:\n\\begin{enumerate}\n\\item $\\lim_{t \\to 1} t^2$\n\\item $\\lim_{t \\to 2} t^%d$\n\\end{enumerate}'
+    assert problem_bank.DuplicateCheck(threshold=0.8).find(first, 't' * 64, [both % 4, both % 3]) == \
+        {1: ('bank', bank_id + 2)}
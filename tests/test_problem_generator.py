@@ -1,6 +1,7 @@
 import os
 import pytest
 import tempfile
+from utils.latex_parser import parse_problems
 from utils.problem_generator import ProblemGenerator
 from tests.mock_provider import MockProvider
 
@@ -32,8 +33,7 @@ def test_generate_problems_with_num(problem_generator, template_file):
     """Test generating a specific number of problems."""
     num_problems = 3
     problems = problem_generator.generate_problems(template_file, num_problems=num_problems)
-    # Count \item occurrences to verify number of problems
-    assert problems.count("\\item") == num_problems
+    assert len(parse_problems(problems).items) == num_problems
 
 def test_generate_problems_difficulty(problem_generator, template_file):
     """Test generating problems with different difficulty levels."""
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from utils.profiler import Profile, ProfileStore, SamplingProfiler, active_profile, propagate
+
+def busy_work(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+def test_profile_samples_propagated_threads():
+    """Test that worker threads joined with propagate are sampled into the caller's profile."""
+    profiler = SamplingProfiler(interval=0.001)
+    with profiler.profile('test') as profile:
+        assert active_profile() is profile
+        worker = threading.Thread(target=propagate(busy_work), args=(0.1,), name='worker')
+        worker.start()
+        worker.join()
+    assert active_profile() is None
+
+    folded = profile.folded()
+    assert any(line.startswith('worker;') and 'busy_work' in line for line in folded.splitlines())
+    stack, count = folded.splitlines()[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert profile.to_dict()['samples'] == sum(profile.samples.values())
+
+    # The sampler stops once no profile is active
+    time.sleep(0.05)
+    assert profiler._thread is None
+
+def test_store_keeps_most_recent(tmp_path):
+    store = ProfileStore(str(tmp_path), max_profiles=2)
+    profiles = []
+    for index in range(3):
+        profile = Profile('GET /', path='/')
+        profile.id = f"20240101T00000{index}_abcdef0{index}"
+        profile.samples['MainThread;main (app.py:1)'] = index + 1
+        store.save(profile)
+        profiles.append(profile)
+
+    assert [entry['id'] for entry in store.list()] == [profiles[2].id, profiles[1].id]
+    assert store.get(profiles[0].id) is None
+    with open(store.get(profiles[2].id)) as f:
+        assert f.read() == 'MainThread;main (app.py:1) 3\n'
+    assert store.get('../secret') is None
@@ -0,0 +1,104 @@
+import shutil
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+from math_latex import MathLatexConverter, standalone_document
+from utils.render_compare import (AMBIGUOUS, MATCH, MISMATCH, compare_documents, text_overlap,
+                                  visual_similarity)
+
+LIMITS = [r'1. lim x->0 sin(x)/x', r'2. lim x->inf (3x^2+1)/(x^2-3)', r'3. lim x->1 ln(x)/(x-1)',
+          r'4. lim x->0 (1+x)^(1/x)']
+OTHER = ['1. Find the derivative of x^3', '2. Integrate cos(x) dx', '3. Solve x^2 = 4']
+
+def page(lines, size=16, offset=40):
+    image = Image.new('RGB', (425, 550), 'white')
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=size)
+    for i, line in enumerate(lines):
+        draw.text((offset, 40 + i * 30), line, fill='black', font=font)
+    return image
+
+def save_pdf(path, *pages):
+    pages[0].save(path, save_all=True, append_images=list(pages[1:]))
+    return str(path)
+
+def test_visual_similarity():
+    original = page(LIMITS)
+    # Typeset again in another size and position, as a compiled conversion would be
+    assert visual_similarity(original, page(LIMITS, size=18, offset=60)) > 0.9
+    assert visual_similarity(original, page(OTHER)) < 0.5
+    assert visual_similarity(original, page(LIMITS[:2])) < 0.5
+    assert visual_similarity(original, page([])) == 0.0
+    assert visual_similarity(page([]), page([])) == 1.0
+
+def test_visual_similarity_ignores_specks_at_the_edges():
+    scan = page(LIMITS)
+    ImageDraw.Draw(scan).rectangle((420, 0, 424, 3), fill='black')
+    assert visual_similarity(scan, page(LIMITS, size=18)) > 0.9
+
+def test_text_overlap():
+    assert text_overlap('lim x to 0 of x', 'lim x to 0 of x') == 1.0
+    assert text_overlap('lim x to 0', 'lim x to 1') == pytest.approx(3 / 5)
+    assert text_overlap(None, 'lim') is None
+
+def test_compare_documents(tmp_path):
+    original = save_pdf(tmp_path / 'original.pdf', page(LIMITS), page(OTHER), page(LIMITS[:1]))
+    rendered = save_pdf(tmp_path / 'rendered.pdf', page(LIMITS, size=18), page(LIMITS))
+    report = compare_documents(original, rendered, workers=2)
+    assert [p.verdict for p in report.pages] == [MATCH, MISMATCH, MISMATCH]
+    assert report.pages[0].text is None
+    assert not report.valid
+
+    report = compare_documents(original, rendered, accept=0.99, reject=0.01)
+    assert [p.page for p in report.ambiguous()] == [1, 2]
+
+def test_compare_image_with_pdf(tmp_path):
+    image = tmp_path / 'original.png'
+    page(LIMITS).save(image)
+    report = compare_documents(str(image), save_pdf(tmp_path / 'rendered.pdf', page(LIMITS, offset=80)))
+    assert report.valid
+    assert report.to_dict()['pages'][0]['verdict'] == MATCH
+
+def test_standalone_document():
+    latex = standalone_document("```latex\n\\begin{enumerate}\n\\item $x$\n\\end{enumerate}\n```")
+    assert latex.startswith('\\documentclass{article}')
+    assert '```' not in latex
+    full = '\\documentclass{article}\n\\begin{document}\nx\n\\end{document}'
+    assert standalone_document(full) == full
+
+class PageCompiler:
+    """Compiles every document to a fixed PDF."""
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+
+    def compile_to_pdf(self, tex_file, output_dir=None):
+        return shutil.copy(self.pdf, output_dir)
+
+class Validator:
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+
+    def execute(self, prompt, file_paths=None):
+        self.calls.append((prompt, file_paths))
+        return self.answer
+
+@pytest.mark.parametrize('answer, verdict', [('yes', MATCH), ('no', MISMATCH)])
+def test_only_ambiguous_pages_go_to_the_llm(tmp_path, answer, verdict):
+    # The second page has half its lines changed: neither clearly right nor clearly wrong
+    original = save_pdf(tmp_path / 'original.pdf', page(LIMITS), page(LIMITS[:2] + OTHER[:2]))
+    rendered = save_pdf(tmp_path / 'rendered.pdf', page(LIMITS, size=18), page(LIMITS, size=18))
+    provider = Validator(answer)
+    converter = MathLatexConverter(provider, str(tmp_path / 'logs'))
+
+    report = converter.validate_rendered(original, 'converted', PageCompiler(rendered))
+    assert [p.verdict for p in report.pages] == [MATCH, verdict]
+    assert [p.checked_by_llm for p in report.pages] == [False, True]
+    assert len(provider.calls) == 1
+    prompt, files = provider.calls[0]
+    assert 'page 2' in prompt
+    assert files[0].endswith('page-2.png')
+
+    report = converter.validate_rendered(original, 'converted', PageCompiler(rendered), llm_fallback=False)
+    assert report.pages[1].verdict == AMBIGUOUS
+    assert len(provider.calls) == 1
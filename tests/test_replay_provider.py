@@ -0,0 +1,96 @@
+import os
+import time
+import pytest
+
+from benchmarks.stubs import FakeLatexCompiler, StubProvider
+from providers.replay_provider import ReplayProvider, ReplayMissError, prompt_hash
+from utils.logger import JsonlLogger, Logger
+from utils.problem_generator import ProblemGenerator
+
+@pytest.fixture
+def log_dir(tmp_path):
+    """A log directory with both a JSONL segment and a legacy file."""
+    legacy = Logger(str(tmp_path))
+    legacy.log_interaction(model='gemini', prompt='Write a haiku', variables={}, response='Crimson leaves flutter')
+    logger = JsonlLogger(str(tmp_path), compress=True)
+    logger.log_interaction(model='claude', prompt='Generate 2 problems', variables={},
+                           response='first', latency_ms=30)
+    logger.log_interaction(model='claude', prompt='Generate 2 problems', variables={},
+                           response='second', latency_ms=10)
+    logger.close()
+    return str(tmp_path)
+
+def test_replays_recorded_responses(log_dir):
+    """Test that both log formats are indexed and repeated prompts cycle."""
+    provider = ReplayProvider(log_dir)
+    assert len(provider) == 3
+    assert provider.execute('Write a haiku') == 'Crimson leaves flutter'
+    assert provider.execute('Generate 2 problems', ['/tmp/upload.pdf']) == 'first'
+    assert provider.execute('Generate 2 problems') == 'second'
+    assert provider.execute('Generate 2 problems') == 'first'
+
+def test_filter_by_model(log_dir):
+    provider = ReplayProvider(log_dir, model='claude')
+    assert len(provider) == 2
+    with pytest.raises(ReplayMissError):
+        provider.execute('Write a haiku')
+
+def test_miss_reporting(log_dir):
+    """Test that misses are counted and can fall back to any recorded response."""
+    strict = ReplayProvider(log_dir)
+    with pytest.raises(ReplayMissError) as exc_info:
+        strict.execute('Unknown prompt')
+    assert exc_info.value.prompt_hash == prompt_hash('Unknown prompt')
+
+    lenient = ReplayProvider(log_dir, on_miss='any', seed=1)
+    assert lenient.execute('Unknown prompt') in ('Crimson leaves flutter', 'first', 'second')
+    lenient.execute('Write a haiku')
+    stats = lenient.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['missed_prompts'] == {prompt_hash('Unknown prompt'): 1}
+
+def test_single_file_source(log_dir):
+    segment = next(name for name in os.listdir(log_dir) if name.endswith('.jsonl.gz'))
+    provider = ReplayProvider(os.path.join(log_dir, segment))
+    assert len(provider) == 2
+
+def test_recorded_latency(log_dir, monkeypatch):
+    """Test that recorded latencies are replayed with scaling and defaults."""
+    sleeps = []
+    monkeypatch.setattr(time, 'sleep', sleeps.append)
+    provider = ReplayProvider(log_dir, latency='recorded', latency_scale=2.0, default_latency_ms=5)
+    provider.execute('Generate 2 problems')
+    provider.execute('Write a haiku')
+    assert sleeps == [0.06, 0.01]
+
+def test_sampled_latency(log_dir, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(time, 'sleep', sleeps.append)
+    provider = ReplayProvider(log_dir, latency='sampled', seed=0)
+    for _ in range(10):
+        provider.execute('Write a haiku')
+    assert set(sleeps) <= {0.03, 0.01}
+
+def test_invalid_options(log_dir):
+    with pytest.raises(ValueError):
+        ReplayProvider(log_dir, latency='normal')
+    with pytest.raises(ValueError):
+        ReplayProvider(log_dir, on_miss='ignore')
+    with pytest.raises(FileNotFoundError):
+        ReplayProvider(os.path.join(log_dir, 'missing'))
+
+def test_generation_completes_from_recorded_log(tmp_path, template_file):
+    """Test that a generation recorded by ProblemGenerator replays without a live model."""
+    record_dir = str(tmp_path / 'recorded')
+    recording = ProblemGenerator(StubProvider(response_size=300), FakeLatexCompiler(), log_dir=record_dir)
+    _, _, problems, solutions = recording.create_problem_set(template_file, num_problems=3, difficulty='challenge')
+    recording.logger.flush()
+
+    provider = ReplayProvider(record_dir)
+    replaying = ProblemGenerator(provider, FakeLatexCompiler(), log_dir=str(tmp_path / 'replayed'))
+    _, _, replayed_problems, replayed_solutions = replaying.create_problem_set(
+        template_file, num_problems=3, difficulty='challenge')
+    assert (replayed_problems, replayed_solutions) == (problems, solutions)
+    assert provider.stats()['hits'] == 2
+    assert provider.stats()['misses'] == 0
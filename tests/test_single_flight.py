@@ -0,0 +1,165 @@
+import threading
+import time
+import pytest
+from utils.single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    """Test that callers arriving during a call get its result without rerunning it."""
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'pdf'
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['pdf'] * 5
+    assert not flight.in_flight('key')
+
+def test_errors_are_shared():
+    flight = SingleFlight()
+    started = threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError('compile failed')
+
+    def follower():
+        started.wait()
+        try:
+            flight.do('key', fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=follower)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        flight.do('key', fail)
+    thread.join()
+    assert errors == ['compile failed']
+
+def test_results_are_not_cached():
+    flight = SingleFlight()
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 2
+
+def test_shared_calls_fan_out_progress():
+    """Test that every caller following a shared call receives its events and result."""
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    events = {name: [] for name in ('first', 'second')}
+    results = {}
+
+    def work(report, token):
+        calls.append(1)
+        report('Generating problems...', 10)
+        release.wait(5)
+        report('Generation complete!', 100)
+        return 42
+
+    def request(name):
+        listener = lambda message, percent: events[name].append(message)
+        results[name] = flight.do_shared('key', work, listener=listener)
+
+    first = threading.Thread(target=request, args=('first',))
+    first.start()
+    while not events['first']:
+        time.sleep(0.01)
+    second = threading.Thread(target=request, args=('second',))
+    second.start()
+    while not events['second']:
+        time.sleep(0.01)
+    release.set()
+    first.join()
+    second.join()
+
+    assert len(calls) == 1
+    assert results == {'first': (42, False), 'second': (42, True)}
+    # Late joiners start with the latest event
+    assert events['first'] == events['second'] == ['Generating problems...', 'Generation complete!']
+
+def test_shared_call_cancelled_when_every_caller_leaves():
+    from utils.cancellation import CancelledError, CancelToken
+    flight = SingleFlight()
+    started = threading.Event()
+    work_tokens = []
+
+    def work(report, token):
+        work_tokens.append(token)
+        started.set()
+        token.wait(5)
+        token.check()
+
+    first, second = CancelToken(), CancelToken()
+    errors = []
+
+    def request(token):
+        try:
+            flight.do_shared('key', work, cancel_token=token)
+        except CancelledError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=request, args=(token,)) for token in (first, second)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    while flight._calls['key'].participants < 2:
+        time.sleep(0.01)
+
+    first.cancel('Tab closed')
+    threads[0].join(5)
+    assert errors == ['Tab closed']
+    assert not work_tokens[0].cancelled
+
+    second.cancel('Tab closed')
+    threads[1].join(5)
+    assert work_tokens[0].wait(5)
+    assert len(errors) == 2
+
+def test_join_after_every_caller_left():
+    """Test that a caller arriving while abandoned work winds down starts a fresh call."""
+    from utils.cancellation import CancelledError, CancelToken
+    flight = SingleFlight()
+    started = threading.Event()
+    tokens = []
+
+    def work(report, token):
+        tokens.append(token)
+        if len(tokens) > 1:
+            return 'fresh'
+        started.set()
+        token.wait(5)
+        # Aborting a provider stream or killing the compiler takes a while
+        time.sleep(0.3)
+        token.check()
+
+    first = CancelToken()
+    errors = []
+
+    def leave():
+        try:
+            flight.do_shared('key', work, cancel_token=first)
+        except CancelledError as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=leave)
+    thread.start()
+    started.wait(5)
+    first.cancel('Tab closed')
+    thread.join(5)
+    assert errors == ['Tab closed']
+
+    # The abandoned work is still unwinding
+    assert flight.do_shared('key', work) == ('fresh', False)
+    assert tokens[0].cancelled and not tokens[1].cancelled
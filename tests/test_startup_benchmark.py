@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.startup_benchmark import REPO_ROOT, is_own_package, package_breakdown, parse_importtime
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:       300 |        500 |   flask.json
+import time:       200 |        700 | flask
+import time:      1000 |       1700 | app
+"""
+
+def test_parse_importtime():
+    modules = parse_importtime(SAMPLE)
+    assert [module['module'] for module in modules] == ['_io', 'flask.json', 'flask', 'app']
+    assert [module['depth'] for module in modules] == [2, 1, 0, 0]
+    assert modules[1]['cumulative_us'] == 500
+    assert package_breakdown(modules) == {'_io': 120, 'flask': 500, 'app': 1000}
+    assert [name for name in package_breakdown(modules) if is_own_package(name)] == ['app']
+
+def test_app_import_skips_heavy_dependencies():
+    """Test that importing the app leaves provider SDKs, PDF libraries and migrations unloaded."""
+    heavy = ['anthropic', 'google.generativeai', 'PyPDF2', 'pylatex', 'rich', 'flask_migrate', 'alembic']
+    script = f"import sys, app; print([name for name in {heavy!r} if name in sys.modules])"
+    result = subprocess.run([sys.executable, '-c', script], cwd=REPO_ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'DATABASE_URL': 'sqlite:///:memory:'})
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,137 @@
+import os
+import time
+import pytest
+from datetime import datetime, timedelta
+
+from models.database import db, ProblemSet, GeneratedSet, DifficultyLevel, Provider
+from utils.storage import StorageGarbageCollector, new_storage_dir, run_locked, storage_usage
+
+@pytest.fixture
+def upload_folder(tmp_path):
+    return str(tmp_path / 'uploads')
+
+@pytest.fixture
+def problem_set(user_id):
+    problem_set = ProblemSet(user_id=user_id, name='Limits', latex_template=r'\item $x$')
+    db.session.add(problem_set)
+    db.session.commit()
+    return problem_set
+
+def age(path, seconds):
+    """Backdate a file's modification time."""
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+def write_file(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'%PDF' + b'0' * (size - 4))
+    return path
+
+def add_generated_set(problem_set, upload_folder, pdf_size=1000, created_at=None):
+    output_dir = new_storage_dir(upload_folder, 'generated')
+    generated_set = GeneratedSet(
+        problem_set_id=problem_set.id,
+        provider=Provider.CLAUDE,
+        difficulty=DifficultyLevel.SAME,
+        num_problems=1,
+        problems_pdf_path=write_file(os.path.join(output_dir, 'problems.pdf'), pdf_size),
+        solutions_pdf_path=write_file(os.path.join(output_dir, 'solutions.pdf'), pdf_size),
+        problems_pdf_hash='0' * 64,
+        solutions_pdf_hash='0' * 64,
+        problems_pdf_size=pdf_size,
+        solutions_pdf_size=pdf_size,
+        problems_latex=r'\item $x + 1$',
+        solutions_latex=r'\item $x + 1$ \solution',
+        created_at=created_at or datetime.utcnow()
+    )
+    db.session.add(generated_set)
+    db.session.commit()
+    return generated_set
+
+def test_new_storage_dir_is_sharded(tmp_path):
+    """Test that storage directories are spread over hash-prefixed subdirectories."""
+    path = new_storage_dir(str(tmp_path), 'generated')
+    relative = os.path.relpath(path, str(tmp_path)).split(os.sep)
+    assert relative[0] == 'generated'
+    assert relative[3].startswith(relative[1] + relative[2])
+    assert os.path.isdir(path)
+    assert new_storage_dir(str(tmp_path), 'generated') != path
+
+def test_removes_orphaned_files(problem_set, upload_folder, blob_store):
+    """Test that files no row refers to are removed once past the grace period."""
+    generated_set = add_generated_set(problem_set, upload_folder)
+    orphan_dir = new_storage_dir(upload_folder, 'generated')
+    old_orphan = write_file(os.path.join(orphan_dir, 'problems.pdf'), 500)
+    age(old_orphan, 7200)
+    age(orphan_dir, 7200)
+    fresh_orphan = write_file(os.path.join(new_storage_dir(upload_folder, 'generated'), 'problems.pdf'), 500)
+
+    report = StorageGarbageCollector(upload_folder, blob_store, grace_period=3600).run()
+
+    assert report['orphaned_files'] == 1
+    assert report['bytes_reclaimed'] == 500
+    assert not os.path.exists(old_orphan)
+    assert not os.path.exists(orphan_dir)
+    assert os.path.exists(fresh_orphan)
+    assert os.path.exists(generated_set.problems_pdf_path)
+    assert os.path.exists(generated_set.solutions_pdf_path)
+
+def test_removes_orphaned_blobs(problem_set, upload_folder, blob_store):
+    """Test that unreferenced blobs are removed and referenced ones kept."""
+    orphan = blob_store.put(b'abandoned generation')
+    age(blob_store._path(orphan), 7200)
+    fresh = blob_store.put(b'generation in progress')
+
+    report = StorageGarbageCollector(upload_folder, blob_store, grace_period=3600).run()
+
+    assert report['orphaned_blobs'] == 1
+    assert not blob_store.exists(orphan)
+    assert blob_store.exists(fresh)
+    assert blob_store.exists(problem_set.latex_template_hash)
+
+def test_reused_blob_survives_collection(problem_set, upload_folder, blob_store):
+    """Test that storing an existing orphaned blob again protects it from collection."""
+    digest = blob_store.put(b'regenerated document')
+    age(blob_store._path(digest), 7200)
+    blob_store.put(b'regenerated document')
+
+    StorageGarbageCollector(upload_folder, blob_store, grace_period=3600).run()
+    assert blob_store.exists(digest)
+
+def test_expires_old_pdfs(problem_set, upload_folder, blob_store):
+    """Test that PDFs past retention are deleted but stay recompilable."""
+    old = add_generated_set(problem_set, upload_folder, created_at=datetime.utcnow() - timedelta(days=40))
+    recent = add_generated_set(problem_set, upload_folder)
+
+    report = StorageGarbageCollector(upload_folder, blob_store, retention_days=30).run()
+
+    assert report['expired_pdfs'] == 2
+    assert report['bytes_reclaimed'] == 2000
+    assert not os.path.exists(old.problems_pdf_path)
+    assert old.problems_pdf_hash is None and old.problems_pdf_size is None
+    assert old.problems_latex == r'\item $x + 1$'
+    assert recent.problems_pdf_hash is not None
+
+def test_quota_evicts_oldest_pdfs(problem_set, upload_folder, blob_store):
+    """Test that over-quota users lose their oldest compiled PDFs first."""
+    now = datetime.utcnow()
+    oldest = add_generated_set(problem_set, upload_folder, created_at=now - timedelta(days=2))
+    newest = add_generated_set(problem_set, upload_folder, created_at=now - timedelta(days=1))
+    usage = storage_usage(problem_set.user_id)
+
+    report = StorageGarbageCollector(upload_folder, blob_store, user_quota_bytes=usage - 1500).run()
+
+    assert report['quota_evicted_pdfs'] == 2
+    assert oldest.problems_pdf_hash is None and oldest.solutions_pdf_hash is None
+    assert newest.problems_pdf_hash is not None
+    assert storage_usage(problem_set.user_id) == usage - 2000
+
+def test_run_locked_skips_when_busy(app, upload_folder, blob_store, tmp_path):
+    """Test that only one collector runs at a time."""
+    import fcntl
+    lock_path = str(tmp_path / 'gc.lock')
+    collector = StorageGarbageCollector(upload_folder, blob_store)
+    with open(lock_path, 'w') as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        assert run_locked(collector, lock_path) is None
+    assert run_locked(collector, lock_path) is not None
@@ -0,0 +1,49 @@
+import io
+import zipfile
+import pytest
+from datetime import datetime
+from utils.zip_stream import ZipEntry, ZipStream
+
+@pytest.fixture
+def entries(tmp_path):
+    pdf = tmp_path / 'problems.pdf'
+    pdf.write_bytes(b'%PDF-1.4 ' + bytes(range(256)) * 1000)
+    latex = r'\begin{enumerate}\item $x$\end{enumerate}'.encode('utf-8')
+    modified = datetime(2025, 2, 4, 12, 30)
+    return [
+        ZipEntry('manifest.json', 2, lambda: b'{}', modified),
+        ZipEntry('set_1/problems.pdf', pdf.stat().st_size, str(pdf), modified),
+        ZipEntry('set_1/problems.tex', len(latex), lambda: latex, modified),
+    ]
+
+def test_archive_is_valid_and_stored(entries):
+    """Test that the streamed bytes form a readable, uncompressed ZIP."""
+    archive = ZipStream(entries)
+    data = b''.join(archive.iter_bytes())
+    assert len(data) == archive.total_size
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ['manifest.json', 'set_1/problems.pdf', 'set_1/problems.tex']
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+        assert zf.read('manifest.json') == b'{}'
+        assert zf.getinfo('set_1/problems.tex').date_time == (2025, 2, 4, 12, 30, 0)
+
+def test_output_is_deterministic(entries):
+    first = b''.join(ZipStream(entries).iter_bytes())
+    for entry in entries:
+        entry.crc = None
+    assert b''.join(ZipStream(entries).iter_bytes()) == first
+
+def test_resume_from_any_offset(entries):
+    """Test that a fresh stream started mid-archive produces the matching suffix."""
+    full = b''.join(ZipStream(entries).iter_bytes())
+    for offset in (1, 35, 1000, len(full) - 30, len(full) - 1):
+        for entry in entries:
+            entry.crc = None
+        assert b''.join(ZipStream(entries).iter_bytes(offset)) == full[offset:]
+
+def test_byte_ranges(entries):
+    archive = ZipStream(entries)
+    full = b''.join(archive.iter_bytes())
+    assert b''.join(archive.iter_bytes(100, 5000)) == full[100:5000]
@@ -0,0 +1,324 @@
+import logging
+import math
+import multiprocessing
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.latex_parser import Item, parse_problems, parse_solutions
+
+logger = logging.getLogger(__name__)
+
+# Verdicts
+OK = 'ok'
+WRONG = 'wrong'
+UNKNOWN = 'unknown'  # nothing checkable, or SymPy could not decide
+TIMEOUT = 'timeout'
+
+# Verdicts kept, keyed by normalized limit and answer
+CACHE_SIZE = 10000
+
+# Seconds new worker processes get to import SymPy
+STARTUP_TIMEOUT = 60
+
+_PRESENTATION = re.compile(r'\\(?:displaystyle|textstyle|limits|left|right)\b|\\[,;:!]|~')
+_DOES_NOT_EXIST = re.compile(r'\bDNE\b|does\s+not\s+exist|undefined', re.IGNORECASE)
+# The lark grammar has no \pi; a placeholder symbol is swapped back after parsing
+_PI = re.compile(r'\\pi\b')
+_PI_PLACEHOLDER = 'P_{pi}'
+
+def normalize(latex: str) -> str:
+    """Drop presentation markup and collapse whitespace, so equal expressions share a cache entry."""
+    return ' '.join(_PRESENTATION.sub(' ', latex).split()).rstrip('.,; ')
+
+def _split_top_level(latex: str, separator: str = '=') -> List[str]:
+    parts = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(latex):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(latex[start:i])
+            start = i + 1
+    parts.append(latex[start:])
+    return parts
+
+def limit_expression(problem: Item) -> Optional[str]:
+    """Return the limit a problem asks for, or None unless it asks for exactly one."""
+    limits = [span.latex for span in problem.math if '\\lim' in span.latex]
+    if len(limits) != 1:
+        return None
+    expression = limits[0][limits[0].index('\\lim'):]
+    expression = normalize(_split_top_level(expression)[0])
+    return expression or None
+
+def answer_expression(solution: Item) -> Optional[str]:
+    """Return a solution's final boxed answer, without any 'x =' in front of it."""
+    if not solution.answers:
+        return None
+    answer = normalize(_split_top_level(solution.answers[-1])[-1])
+    return answer or None
+
+def _parse(latex: str):
+    import sympy
+    from lark import Tree
+    from sympy.parsing.latex import parse_latex
+
+    expression = parse_latex(_PI.sub(f' {_PI_PLACEHOLDER} ', latex), backend='lark')
+    if isinstance(expression, Tree):
+        # Juxtaposition makes some inputs ambiguous, as in \lim_{x \to 0} 3x^2 - 2x;
+        # the reading where the limit covers the whole expression is the intended one
+        options = [option for option in expression.children if isinstance(option, sympy.Basic)]
+        limits = [option for option in options if isinstance(option, sympy.Limit)]
+        if not options:
+            raise ValueError(f"Cannot read {latex}")
+        expression = (limits or options)[0]
+    return expression.subs({sympy.Symbol(_PI_PLACEHOLDER): sympy.pi})
+
+def _numeric_limit(limit):
+    """Estimate a limit SymPy could not evaluate from values ever closer to the point."""
+    import sympy
+    function, variable, point, direction = limit.args
+    if point in (sympy.oo, -sympy.oo):
+        sign = 1 if point == sympy.oo else -1
+        samples = [[sign * 10 ** k for k in (4, 6, 8)]]
+    else:
+        sides = {'+': [1], '-': [-1], '+-': [1, -1]}[str(direction)]
+        samples = [[point + side * sympy.Rational(1, 10 ** k) for k in (4, 6, 8)] for side in sides]
+    estimates = []
+    for points in samples:
+        values = [complex(function.subs(variable, x).evalf()) for x in points]
+        if any(value.imag for value in values):
+            return None
+        values = [value.real for value in values]
+        if abs(values[-1]) > 1e6 and abs(values[-1]) > abs(values[0]):
+            estimates.append(sympy.oo if values[-1] > 0 else -sympy.oo)
+        elif abs(values[-1] - values[-2]) <= 1e-4 * max(1.0, abs(values[-1])):
+            estimates.append(sympy.Float(values[-1]))
+        else:
+            return None
+    if len(set(estimates)) != 1:
+        return sympy.nan
+    return estimates[0]
+
+def _same_value(value, answer) -> bool:
+    import sympy
+    if value == answer:
+        return True
+    if isinstance(value, sympy.AccumBounds) or not (value.is_finite and answer.is_finite):
+        return False
+    difference = complex((value - answer).evalf())
+    return abs(difference) <= 1e-6 * max(1.0, abs(complex(answer.evalf())))
+
+def check_answer(limit_latex: str, answer_latex: str) -> str:
+    """
+    Decide whether an answer is the value of a limit. Runs in a worker process.
+
+    Returns:
+        OK, WRONG or UNKNOWN
+    """
+    import sympy
+    try:
+        limit = _parse(limit_latex)
+    except Exception:
+        return UNKNOWN
+    if not isinstance(limit, sympy.Limit):
+        return UNKNOWN
+    variable = limit.args[1]
+    if variable != sympy.Symbol('e'):
+        limit = limit.subs(sympy.Symbol('e'), sympy.E)
+    try:
+        value = limit.doit()
+    except ValueError:
+        # The one-sided limits differ
+        value = sympy.nan
+    except Exception:
+        value = limit
+    if isinstance(value, sympy.Basic) and value.has(sympy.Limit):
+        try:
+            value = _numeric_limit(limit)
+        except (TypeError, ValueError):
+            value = None
+        if value is None:
+            return UNKNOWN
+
+    exists = not (value in (sympy.nan, sympy.zoo) or isinstance(value, sympy.AccumBounds))
+    if _DOES_NOT_EXIST.search(answer_latex):
+        return WRONG if exists else OK
+    try:
+        answer = _parse(answer_latex).subs(sympy.Symbol('e'), sympy.E)
+    except Exception:
+        return UNKNOWN
+    if answer.free_symbols:
+        return UNKNOWN
+    return OK if exists and _same_value(value, answer) else WRONG
+
+def _warm_up() -> None:
+    # Importing SymPy and building the grammar takes about a second; do it
+    # before the first item's timeout starts
+    _parse('1')
+
+_pool = None
+_pool_lock = threading.Lock()
+# Verifications using each pool; a pool is only terminated once it has none
+_pool_users: Dict[object, int] = {}
+_cache: 'OrderedDict[Tuple[str, str], str]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _start_pool(processes: int):
+    """Return the current pool, starting one if needed. Call with _pool_lock held."""
+    global _pool
+    if _pool is None:
+        # Spawned, not forked: the web process runs threads
+        pool = multiprocessing.get_context('spawn').Pool(processes, initializer=_warm_up)
+        try:
+            pool.apply_async(_warm_up).get(STARTUP_TIMEOUT)
+        except Exception:
+            # Workers that cannot start are restarted forever; give up on them
+            pool.terminate()
+            raise
+        _pool = pool
+    return _pool
+
+def _start_in_background(processes: int) -> None:
+    try:
+        with _pool_lock:
+            _start_pool(processes)
+    except Exception as e:
+        logger.error(f"Error starting the answer check processes: {str(e)}")
+
+def _acquire_pool(processes: int):
+    """Return the current pool, counting the caller as one of its users until _release_pool."""
+    with _pool_lock:
+        pool = _start_pool(processes)
+        _pool_users[pool] = _pool_users.get(pool, 0) + 1
+        return pool
+
+def _release_pool(pool, broken: bool = False) -> None:
+    """
+    Stop using a pool.
+
+    A broken pool (one with a worker stuck in SymPy) is replaced for new
+    callers right away, but only terminated once its other users are done
+    with it, so their checks are not lost.
+    """
+    global _pool
+    with _pool_lock:
+        if broken and _pool is pool:
+            _pool = None
+        _pool_users[pool] -= 1
+        if _pool_users[pool] or _pool is pool:
+            return
+        del _pool_users[pool]
+    pool.terminate()
+
+def shutdown() -> None:
+    """Stop the worker processes; the next verification starts new ones."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.terminate()
+
+class AnswerVerifier:
+    """Check the boxed answers of generated limit problems with SymPy.
+
+    Answers are evaluated in a shared pool of worker processes, so a
+    pathological limit can be abandoned without holding up the request.
+    Verdicts are cached by normalized limit and answer. Only problems asking
+    for a single limit are checked; anything else is UNKNOWN and left alone.
+
+    Args:
+        processes: Worker processes; fixed when the pool is first started
+        timeout: Seconds each item may take. Items wait for free processes,
+            so a verification allows timeout for every round of processes
+            its items need, counted from when they are submitted; items not
+            done by then count as TIMEOUT
+        regenerate: Whether wrong solutions should be regenerated rather than only counted
+        max_rounds: Regeneration attempts before wrong solutions are kept
+    """
+
+    def __init__(self, processes: int = 2, timeout: float = 5.0, regenerate: bool = True, max_rounds: int = 1):
+        self.processes = processes
+        self.timeout = timeout
+        self.regenerate = regenerate
+        self.max_rounds = max_rounds
+
+    def start(self) -> None:
+        """
+        Start the worker processes on a background thread unless they are running.
+
+        Importing SymPy takes seconds, so callers start the pool as soon as
+        they know a verification will follow, e.g. when a generation begins,
+        rather than making the first verification wait for it.
+        """
+        if _pool is None:
+            threading.Thread(target=_start_in_background, args=(self.processes,), name='answer-check-start',
+                             daemon=True).start()
+
+    def verify(self, problems: Sequence[Item], solutions: Sequence[Item]) -> List[str]:
+        """
+        Check each solution's answer against its problem.
+
+        Returns:
+            A verdict per problem; all UNKNOWN if problems and solutions do not pair up
+        """
+        if len(problems) != len(solutions):
+            return [UNKNOWN] * len(problems)
+        keys = []
+        for problem, solution in zip(problems, solutions):
+            limit = limit_expression(problem)
+            answer = answer_expression(solution)
+            keys.append((limit, answer) if limit and answer else None)
+
+        verdicts: Dict[Tuple[str, str], str] = {}
+        with _cache_lock:
+            for key in keys:
+                if key in _cache:
+                    _cache.move_to_end(key)
+                    verdicts[key] = _cache[key]
+        pending = {key for key in keys if key and key not in verdicts}
+        if pending:
+            verdicts.update(self._evaluate(pending))
+        return [verdicts.get(key, UNKNOWN) if key else UNKNOWN for key in keys]
+
+    def verify_latex(self, problems: str, solutions: str) -> List[str]:
+        """Check generated problems and solutions given as LaTeX."""
+        return self.verify(parse_problems(problems).items, parse_solutions(solutions).items)
+
+    def _evaluate(self, keys) -> Dict[Tuple[str, str], str]:
+        pool = _acquire_pool(self.processes)
+        verdicts = {}
+        timed_out = False
+        try:
+            results = {key: pool.apply_async(check_answer, key) for key in keys}
+            # One deadline for the whole batch, so time spent queued behind
+            # other items is not charged to each item again
+            deadline = time.monotonic() + self.timeout * math.ceil(len(results) / self.processes)
+            for key, result in results.items():
+                try:
+                    verdicts[key] = result.get(max(0.0, deadline - time.monotonic()))
+                except multiprocessing.TimeoutError:
+                    verdicts[key] = TIMEOUT
+                    timed_out = True
+                except Exception as e:
+                    logger.warning(f"Checking {key[0]} = {key[1]} failed: {str(e)}")
+                    verdicts[key] = UNKNOWN
+        finally:
+            # A worker stuck in SymPy cannot be interrupted; after a timeout the
+            # pool is replaced once no other verification is using it
+            _release_pool(pool, broken=timed_out)
+        if timed_out:
+            logger.warning("Answer check timed out, restarting the verifier processes")
+        with _cache_lock:
+            for key, verdict in verdicts.items():
+                if verdict != TIMEOUT:
+                    _cache[key] = verdict
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        return verdicts
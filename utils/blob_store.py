@@ -0,0 +1,249 @@
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional, Tuple
+
+import zstandard
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 of a file, reading it in chunks."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class BlobStore(ABC):
+    """Content-addressed store for large payloads such as LaTeX documents.
+
+    Blobs are keyed by the SHA-256 of their uncompressed content and stored
+    zstd-compressed, so identical payloads are only ever stored once.
+    """
+
+    def __init__(self, compression_level: int = 3):
+        self.compression_level = compression_level
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """Return the content address for the given bytes."""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def _relative_key(digest: str) -> str:
+        """Spread blobs over two levels of hash-prefixed directories."""
+        return f"{digest[:2]}/{digest[2:4]}/{digest}.zst"
+
+    def put(self, data: bytes) -> str:
+        """Store bytes and return their digest. Existing blobs are not rewritten."""
+        digest = self.digest(data)
+        if self.exists(digest):
+            # Mark the blob as recently used so garbage collection does not
+            # remove it before the row that now references it is committed
+            self._touch(digest)
+        else:
+            compressed = zstandard.ZstdCompressor(level=self.compression_level).compress(data)
+            self._write(digest, compressed)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Return the uncompressed bytes stored under the digest.
+
+        Raises:
+            FileNotFoundError: If no blob exists for the digest
+        """
+        return zstandard.ZstdDecompressor().decompress(self._read(digest))
+
+    def put_text(self, text: str) -> Tuple[str, int]:
+        """Store text as UTF-8 and return its digest and uncompressed size."""
+        data = text.encode('utf-8')
+        return self.put(data), len(data)
+
+    def get_text(self, digest: str) -> str:
+        """Return the text stored under the digest."""
+        return self.get(digest).decode('utf-8')
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        """Check whether a blob is stored under the digest."""
+        pass
+
+    @abstractmethod
+    def delete(self, digest: str) -> None:
+        """Delete the blob stored under the digest, if any."""
+        pass
+
+    @abstractmethod
+    def iter_digests(self) -> Iterator[str]:
+        """Iterate over the digests of all stored blobs."""
+        pass
+
+    @abstractmethod
+    def modified_at(self, digest: str) -> float:
+        """Return when the blob was written, as a Unix timestamp.
+
+        Raises:
+            FileNotFoundError: If no blob exists for the digest
+        """
+        pass
+
+    def _touch(self, digest: str) -> None:
+        """Refresh the modification time of an existing blob, if supported."""
+        pass
+
+    @abstractmethod
+    def _read(self, digest: str) -> bytes:
+        """Read the compressed bytes of a blob."""
+        pass
+
+    @abstractmethod
+    def _write(self, digest: str, compressed: bytes) -> None:
+        """Write the compressed bytes of a blob."""
+        pass
+
+class LocalBlobStore(BlobStore):
+    """Blob store backed by a local directory."""
+
+    def __init__(self, root: str, compression_level: int = 3):
+        super().__init__(compression_level)
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, *self._relative_key(digest).split('/'))
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def iter_digests(self) -> Iterator[str]:
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.zst'):
+                    yield filename[:-len('.zst')]
+
+    def modified_at(self, digest: str) -> float:
+        return os.path.getmtime(self._path(digest))
+
+    def _touch(self, digest: str) -> None:
+        try:
+            os.utime(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _read(self, digest: str) -> bytes:
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Blob not found: {digest}")
+
+    def _write(self, digest: str, compressed: bytes) -> None:
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial blob
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compressed)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+class S3BlobStore(BlobStore):
+    """Blob store backed by an S3-compatible bucket (AWS S3, MinIO, ...)."""
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 client=None, compression_level: int = 3):
+        super().__init__(compression_level)
+        self.bucket = bucket
+        self.prefix = prefix
+        if client is None:
+            # boto3 is only needed when the S3 backend is actually used
+            import boto3
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.client = client
+
+    def _key(self, digest: str) -> str:
+        return self.prefix + self._relative_key(digest)
+
+    def exists(self, digest: str) -> bool:
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self._key(digest), MaxKeys=1)
+        return response.get('KeyCount', 0) > 0
+
+    def delete(self, digest: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(digest))
+
+    def iter_digests(self) -> Iterator[str]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                filename = item['Key'].rsplit('/', 1)[-1]
+                if filename.endswith('.zst'):
+                    yield filename[:-len('.zst')]
+
+    def modified_at(self, digest: str) -> float:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+        except self.client.exceptions.ClientError:
+            raise FileNotFoundError(f"Blob not found: {digest}")
+        return response['LastModified'].timestamp()
+
+    def _read(self, digest: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(digest))
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(f"Blob not found: {digest}")
+        return response['Body'].read()
+
+    def _write(self, digest: str, compressed: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=compressed)
+
+def create_blob_store(config) -> BlobStore:
+    """
+    Create a blob store from configuration.
+
+    Args:
+        config: Mapping with the BLOB_STORE_* settings (e.g. Flask app.config)
+
+    Returns:
+        BlobStore instance for the configured backend
+
+    Raises:
+        ValueError: If the configured backend is unknown
+    """
+    backend = config.get('BLOB_STORE_BACKEND', 'local')
+    level = int(config.get('BLOB_STORE_COMPRESSION_LEVEL', 3))
+
+    if backend == 'local':
+        return LocalBlobStore(config['BLOB_STORE_PATH'], compression_level=level)
+    if backend == 's3':
+        return S3BlobStore(
+            config['BLOB_STORE_S3_BUCKET'],
+            prefix=config.get('BLOB_STORE_S3_PREFIX', ''),
+            endpoint_url=config.get('BLOB_STORE_S3_ENDPOINT_URL'),
+            compression_level=level
+        )
+    raise ValueError(f"Unknown blob store backend: {backend}")
+
+_default_store: Optional[BlobStore] = None
+
+def set_default_blob_store(store: BlobStore) -> None:
+    """Set the process-wide blob store used by the database models."""
+    global _default_store
+    _default_store = store
+
+def get_default_blob_store() -> BlobStore:
+    """Return the process-wide blob store, creating it from Config if unset."""
+    global _default_store
+    if _default_store is None:
+        from config import Config
+        _default_store = create_blob_store(vars(Config))
+    return _default_store
@@ -0,0 +1,188 @@
+import contextvars
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+
+_current_token: contextvars.ContextVar[Optional['CancelToken']] = contextvars.ContextVar('cancel_token', default=None)
+
+class CancelledError(Exception):
+    """Raised inside a pipeline whose work has been cancelled."""
+
+class CancelToken:
+    """Cooperative cancellation signal shared by every stage of one piece of work.
+
+    Stages call check() between steps, and code blocked on something
+    external (an HTTP response, a subprocess) registers a callback with
+    on_cancel() that aborts it from the cancelling thread.
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'Cancelled') -> bool:
+        """
+        Cancel the work and run the registered abort callbacks.
+
+        Returns:
+            False if the token was already cancelled
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # Aborting is best effort; the stage still sees the token
+                pass
+        return True
+
+    def check(self) -> None:
+        """Raise CancelledError if the work has been cancelled."""
+        if self._event.is_set():
+            raise CancelledError(self.reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until cancelled or the timeout passes; returns whether it was cancelled."""
+        return self._event.wait(timeout)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a callback that aborts a blocking operation.
+
+        The callback runs right away if the token is already cancelled.
+
+        Returns:
+            A function that unregisters the callback once the operation is over
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+def current_token() -> Optional[CancelToken]:
+    """Return the cancel token of the work running in this context, if any."""
+    return _current_token.get()
+
+def check_cancelled() -> None:
+    """Raise CancelledError if the current context's work has been cancelled."""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+@contextmanager
+def cancellation_scope(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """Make a token visible to providers and compilers called inside the block."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+class CancellationRegistry:
+    """Track in-flight work by group so it can be cancelled from other requests.
+
+    Groups are normally a user's problem set. Besides explicit cancellation,
+    work can be tied to the group's progress subscribers: once work has been watched by
+    at least one subscriber, it is cancelled when the last subscriber has
+    been gone for the grace period.
+
+    Args:
+        grace_period: Seconds without subscribers before watched work is cancelled
+    """
+
+    def __init__(self, grace_period: float = 10):
+        self.grace_period = grace_period
+        self._lock = threading.Lock()
+        self._work: Dict[Hashable, Dict[CancelToken, Hashable]] = defaultdict(dict)
+        self._watched: Dict[Hashable, set] = defaultdict(set)
+        self._subscribers: Dict[Hashable, int] = defaultdict(int)
+        self._timers: Dict[Hashable, threading.Timer] = {}
+
+    def register(self, group: Hashable, token: CancelToken, key: Hashable = None) -> None:
+        """Add work to a group, under an optional key such as the problem set id."""
+        with self._lock:
+            self._work[group][token] = key
+            if self._subscribers.get(group):
+                self._watched[group].add(token)
+
+    def unregister(self, group: Hashable, token: CancelToken) -> None:
+        with self._lock:
+            self._work[group].pop(token, None)
+            self._watched[group].discard(token)
+            if not self._work[group]:
+                del self._work[group]
+                self._watched.pop(group, None)
+
+    def active(self) -> int:
+        """Return the number of pieces of work registered across all groups."""
+        with self._lock:
+            return sum(len(work) for work in self._work.values())
+
+    def cancel(self, group: Hashable, key: Hashable = None, reason: str = 'Cancelled by user') -> int:
+        """
+        Cancel a group's work, or only the work registered under key.
+
+        Returns:
+            int: Number of pieces of work cancelled
+        """
+        with self._lock:
+            tokens = [token for token, token_key in self._work.get(group, {}).items()
+                      if key is None or token_key == key]
+        return sum(token.cancel(reason) for token in tokens)
+
+    def subscribe(self, group: Hashable) -> None:
+        """Record a new progress subscriber; the group's running work now counts as watched."""
+        with self._lock:
+            self._subscribers[group] += 1
+            if group in self._work:
+                self._watched[group].update(self._work[group])
+            timer = self._timers.pop(group, None)
+        if timer:
+            timer.cancel()
+
+    def unsubscribe(self, group: Hashable) -> None:
+        """Record a subscriber leaving; the last one starts the grace period."""
+        with self._lock:
+            remaining = self._subscribers.get(group, 0) - 1
+            if remaining > 0:
+                self._subscribers[group] = remaining
+                return
+            self._subscribers.pop(group, None)
+            if not self._watched.get(group):
+                return
+            timer = threading.Timer(self.grace_period, self._expire, args=(group,))
+            timer.daemon = True
+            self._timers[group] = timer
+        timer.start()
+
+    def subscribers(self, group: Hashable) -> int:
+        with self._lock:
+            return self._subscribers.get(group, 0)
+
+    def _expire(self, group: Hashable) -> None:
+        with self._lock:
+            self._timers.pop(group, None)
+            if self._subscribers.get(group):
+                return
+            tokens = list(self._watched.get(group, ()))
+        for token in tokens:
+            token.cancel('All progress subscribers disconnected')
@@ -0,0 +1,200 @@
+import hashlib
+import random
+import re
+import struct
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Markup that changes how a problem looks but not what it asks
+_IGNORED = re.compile(
+    r'\\textbf\{\s*\[Challenge\]\s*\}|\[Challenge\]|\\(?:displaystyle|textstyle|left|right|limits|quad|qquad)\b'
+    r'|\\[,;:!]|~|\$|\\\[|\\\]'
+)
+_FRACTIONS = re.compile(r'\\[dt]frac\b')
+_THOUSANDS = re.compile(r'(?<![\d.])\d{1,3}(?:,\d{3})+(?![\d,])')
+_TOKEN = re.compile(r'\\[a-zA-Z]+|\d+(?:\.\d+)?|\.\d+|[a-zA-Z]+|\S')
+
+# Mersenne prime for the universal hash family of the permutations
+_PRIME = (1 << 61) - 1
+
+Signature = Tuple[int, ...]
+
+def _number(token: str) -> str:
+    try:
+        value = Decimal(token).normalize()
+    except InvalidOperation:
+        return token
+    # normalize() turns 100 into 1E+2; quantize integers back
+    if value == value.to_integral_value():
+        value = value.quantize(Decimal(1))
+    return str(value)
+
+def normalize(latex: str) -> List[str]:
+    """
+    Reduce a problem's LaTeX to tokens that ignore presentation.
+
+    Whitespace, \\displaystyle and similar markup, math delimiters and the
+    challenge marker are dropped, \\dfrac and \\tfrac become \\frac, numbers
+    are written canonically (1,000.50 -> 1000.5) and single-letter
+    variables are renamed in order of appearance, so 'x' and 't' versions
+    of the same limit produce the same tokens. Braces around a single token
+    are dropped (x^{2} -> x^2).
+
+    Returns:
+        The canonical tokens
+    """
+    text = _FRACTIONS.sub(r'\\frac', _IGNORED.sub(' ', latex))
+    text = _THOUSANDS.sub(lambda match: match.group().replace(',', ''), text)
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if token[0].isdigit() or token[0] == '.' and len(token) > 1:
+            token = _number(token)
+        elif token.isalpha() and len(token) > 1:
+            token = token.lower()
+        tokens.append(token)
+
+    # Drop braces around a single token
+    unbraced = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i] == '{' and i + 2 < len(tokens) and tokens[i + 2] == '}' and tokens[i + 1] not in '{}':
+            unbraced.append(tokens[i + 1])
+            i += 3
+        else:
+            unbraced.append(tokens[i])
+            i += 1
+
+    names: Dict[str, str] = {}
+    return [names.setdefault(token, f'v{len(names)}') if len(token) == 1 and token.isalpha() else token
+            for token in unbraced]
+
+def numbers(latex: str) -> Tuple[str, ...]:
+    """Return the canonical numbers of a problem, sorted, so reordered terms keep them equal."""
+    return tuple(sorted(token for token in normalize(latex) if token[0].isdigit()))
+
+def shingles(tokens: Sequence[str], size: int = 3) -> Set[str]:
+    """Return the overlapping runs of size tokens; shorter problems are one shingle."""
+    if len(tokens) <= size:
+        return {' '.join(tokens)}
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class MinHasher:
+    """Compute MinHash signatures of LaTeX problems.
+
+    The share of equal positions in two signatures estimates the Jaccard
+    similarity of the problems' normalized shingles. Signatures are only
+    comparable between hashers with the same parameters; the defaults are
+    what the problem bank stores.
+
+    Args:
+        num_perm: Signature length
+        shingle_size: Tokens per shingle
+        seed: Seed of the permutations
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, latex: str) -> Signature:
+        hashes = [_hash(shingle) for shingle in shingles(normalize(latex), self.shingle_size)]
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self._permutations)
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimate the Jaccard similarity of two problems from their signatures."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+class LSHIndex:
+    """Find signatures likely to be similar without comparing against all of them.
+
+    Signatures are cut into bands; two signatures become candidates when
+    any band matches exactly. With 16 bands of 4 rows, pairs with a
+    similarity of 0.8 are found with a probability above 99.9%, pairs of
+    0.3 only about one time in eight. Candidates are then checked against
+    the threshold.
+
+    Args:
+        bands: Number of bands; must divide the signature length
+    """
+
+    def __init__(self, bands: int = 16):
+        self.bands = bands
+        self._buckets: Dict[str, Set[Hashable]] = defaultdict(set)
+        self._signatures: Dict[Hashable, Signature] = {}
+
+    def bucket_keys(self, signature: Signature) -> List[str]:
+        """Return the bucket of each band, for storing the index elsewhere (such as a database)."""
+        rows = len(signature) // self.bands
+        keys = []
+        for band in range(self.bands):
+            values = signature[band * rows:(band + 1) * rows]
+            packed = struct.pack(f'>H{rows}Q', band, *values)
+            keys.append(hashlib.blake2b(packed, digest_size=8).hexdigest())
+        return keys
+
+    def add(self, key: Hashable, signature: Signature) -> None:
+        self._signatures[key] = signature
+        for bucket in self.bucket_keys(signature):
+            self._buckets[bucket].add(key)
+
+    def candidates(self, signature: Signature) -> Set[Hashable]:
+        found = set()
+        for bucket in self.bucket_keys(signature):
+            found |= self._buckets.get(bucket, set())
+        return found
+
+    def query(self, signature: Signature, threshold: float = 0.8) -> List[Tuple[Hashable, float]]:
+        """
+        Return the indexed keys similar to a signature.
+
+        Returns:
+            Pairs of key and estimated similarity, most similar first
+        """
+        matches = [(key, similarity(signature, self._signatures[key])) for key in self.candidates(signature)]
+        return sorted([match for match in matches if match[1] >= threshold], key=lambda match: -match[1])
+
+def find_duplicates(problems: Iterable[str], hasher: Optional[MinHasher] = None, threshold: float = 0.8,
+                    index: Optional[LSHIndex] = None,
+                    index_numbers: Optional[Dict[Hashable, Tuple[str, ...]]] = None) -> Dict[int, Hashable]:
+    """
+    Find problems that nearly repeat an earlier problem of the list or one in an index.
+
+    A long problem with one coefficient changed still shares most of its
+    shingles with the original, but asks something else; similar problems
+    only count as duplicates when their numbers are the same too.
+
+    Args:
+        problems: LaTeX of each problem
+        hasher: Computes the signatures (default: MinHasher())
+        threshold: Similarity from which problems count as duplicates
+        index: Earlier problems to check against as well, such as a bank
+        index_numbers: numbers() of the indexed problems; those missing
+            are compared by signature only
+
+    Returns:
+        Position of each duplicate mapped to what it repeats: the position
+        of the earlier problem, or the key of the indexed problem
+    """
+    hasher = hasher or MinHasher()
+    index_numbers = index_numbers or {}
+    seen = LSHIndex()
+    seen_numbers: Dict[int, Tuple[str, ...]] = {}
+    duplicates = {}
+    for position, problem in enumerate(problems):
+        signature = hasher.signature(problem)
+        own = numbers(problem)
+        matches = [key for key, _ in (index.query(signature, threshold) if index else [])
+                   if index_numbers.get(key, own) == own]
+        matches = matches or [key for key, _ in seen.query(signature, threshold) if seen_numbers[key] == own]
+        if matches:
+            duplicates[position] = matches[0]
+        else:
+            seen.add(position, signature)
+            seen_numbers[position] = own
+    return duplicates
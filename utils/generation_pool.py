@@ -0,0 +1,188 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models.database import db, DifficultyLevel, GeneratedSet, GenerationDemand, Provider
+from utils import problem_bank
+
+logger = logging.getLogger(__name__)
+
+def decayed_score(demand: GenerationDemand, half_life: float, now: Optional[datetime] = None) -> float:
+    """Return a demand's score as of now, halved for every half_life seconds since its last request."""
+    now = now or datetime.utcnow()
+    elapsed = max((now - demand.last_requested_at).total_seconds(), 0.0)
+    return demand.score * 0.5 ** (elapsed / half_life)
+
+def record_demand(problem_set_id: int, provider: str, difficulty: str, num_problems: int,
+                  half_life: float, now: Optional[datetime] = None) -> GenerationDemand:
+    """
+    Count a generation request towards the demand for its settings and commit it.
+
+    Concurrent requests can occasionally overwrite each other's count; demand
+    only decides what to pre-generate, so that is not worth a lock.
+
+    Args:
+        problem_set_id: Problem set being generated from
+        provider: 'claude' or 'gemini'
+        difficulty: 'same', 'challenge' or 'harder'
+        num_problems: Number of problems requested
+        half_life: Seconds after which a request counts half as much
+
+    Returns:
+        GenerationDemand: The updated demand row
+    """
+    now = now or datetime.utcnow()
+    settings = dict(problem_set_id=problem_set_id, provider=provider.lower(), difficulty=difficulty.lower(),
+                    num_problems=num_problems)
+    demand = GenerationDemand.query.filter_by(**settings).first()
+    if demand is None:
+        demand = GenerationDemand(score=0.0, last_requested_at=now, **settings)
+        db.session.add(demand)
+    demand.score = decayed_score(demand, half_life, now) + 1
+    demand.last_requested_at = now
+    db.session.commit()
+    return demand
+
+def _matching(problem_set_id: int, provider: str, difficulty: str, num_problems: int) -> tuple:
+    return (GeneratedSet.problem_set_id == problem_set_id,
+            GeneratedSet.provider == Provider[provider.upper()],
+            GeneratedSet.difficulty == DifficultyLevel[difficulty.upper()],
+            GeneratedSet.num_problems == num_problems,
+            GeneratedSet.pooled.is_(True))
+
+def available(problem_set_id: int, provider: str, difficulty: str, num_problems: int) -> int:
+    """Return the number of pooled sets ready for these settings."""
+    return db.session.query(db.func.count(GeneratedSet.id)).filter(
+        *_matching(problem_set_id, provider, difficulty, num_problems)).scalar()
+
+def claim(problem_set_id: int, provider: str, difficulty: str, num_problems: int) -> Optional[GeneratedSet]:
+    """
+    Take the oldest pooled set matching a request out of the pool.
+
+    Each set is handed out at most once: the UPDATE only succeeds while the
+    row is still pooled, so concurrent requests never get the same set.
+    The claimed set is dated now, like a freshly generated one, and its
+    problems are marked seen by the problem set's owner.
+
+    Returns:
+        The claimed set, or None when the pool has nothing for these settings
+    """
+    candidates = db.session.execute(
+        db.select(GeneratedSet.id).where(*_matching(problem_set_id, provider, difficulty, num_problems))
+        .order_by(GeneratedSet.pooled_at, GeneratedSet.id).limit(5)
+    ).scalars().all()
+    for generated_set_id in candidates:
+        claimed = db.session.execute(
+            db.update(GeneratedSet)
+            .where(GeneratedSet.id == generated_set_id, GeneratedSet.pooled.is_(True))
+            .values(pooled=False, created_at=datetime.utcnow())
+        ).rowcount
+        if claimed:
+            generated_set = db.session.get(GeneratedSet, generated_set_id, populate_existing=True)
+            problem_set = generated_set.problem_set
+            problem_bank.mark_set_seen(problem_set.latex_template_hash, generated_set.problems_latex,
+                                       problem_set.user_id)
+            db.session.commit()
+            return generated_set
+    db.session.rollback()
+    return None
+
+def pregenerated_since(since: datetime) -> int:
+    """Return the number of sets pre-generated since a point in time, claimed or not."""
+    return db.session.query(db.func.count(GeneratedSet.id)).filter(GeneratedSet.pooled_at >= since).scalar()
+
+class PoolRefiller:
+    """Keep a few pre-generated sets ready for the most requested settings.
+
+    Settings whose decayed demand reaches min_demand get a pool of
+    pool_size sets. A run tops the pools up, most demanded first, until
+    they are full, the daily budget of pre-generations is spent or is_idle
+    reports real requests waiting. Pooled sets nobody claimed within
+    max_age_days are dropped, and their files are left to the storage GC.
+
+    Args:
+        generate: Called with a GenerationDemand to generate one pooled set for its settings
+        pool_size: Sets kept ready for each popular setting
+        min_demand: Decayed request count at which settings get a pool
+        half_life: Seconds after which a request counts half as much
+        daily_budget: Pre-generations allowed in any 24 hours, 0 for none
+        max_age_days: Days a pooled set may wait to be claimed, 0 keeps them forever
+        is_idle: Returns False when refilling should yield to user requests
+    """
+
+    def __init__(self, generate: Callable[[GenerationDemand], GeneratedSet], pool_size: int = 2,
+                 min_demand: float = 5.0, half_life: float = 7 * 24 * 60 * 60, daily_budget: int = 50,
+                 max_age_days: int = 7, is_idle: Optional[Callable[[], bool]] = None):
+        self.generate = generate
+        self.pool_size = pool_size
+        self.min_demand = min_demand
+        self.half_life = half_life
+        self.daily_budget = daily_budget
+        self.max_age_days = max_age_days
+        self.is_idle = is_idle or (lambda: True)
+
+    def targets(self, now: Optional[datetime] = None) -> List[Tuple[GenerationDemand, int]]:
+        """
+        List the settings whose pools need sets, most demanded first.
+
+        Returns:
+            Pairs of demand row and number of sets missing from its pool
+        """
+        now = now or datetime.utcnow()
+        # Decay only lowers scores, so rows below the threshold can be skipped in SQL
+        demands = GenerationDemand.query.filter(GenerationDemand.score >= self.min_demand).all()
+        scored = [(decayed_score(demand, self.half_life, now), demand) for demand in demands]
+        targets = []
+        for score, demand in sorted(scored, key=lambda item: -item[0]):
+            if score < self.min_demand:
+                continue
+            missing = self.pool_size - available(demand.problem_set_id, demand.provider, demand.difficulty,
+                                                 demand.num_problems)
+            if missing > 0:
+                targets.append((demand, missing))
+        return targets
+
+    def run(self) -> Dict[str, int]:
+        """
+        Run one refill pass. Must be called inside an app context.
+
+        Returns:
+            Dict with the numbers of sets generated, failed and expired and the
+            budget left for the next 24 hours
+        """
+        now = datetime.utcnow()
+        report = {'generated': 0, 'failed': 0, 'expired': self._expire(now), 'budget_left': 0}
+        budget_left = self.daily_budget - pregenerated_since(now - timedelta(days=1))
+        for demand, missing in self.targets(now):
+            for _ in range(missing):
+                if budget_left <= 0 or not self.is_idle():
+                    report['budget_left'] = max(budget_left, 0)
+                    logger.info(f"Pool refill stopped early: {report}")
+                    return report
+                try:
+                    self.generate(demand)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Pre-generating set {demand.problem_set_id} "
+                                 f"({demand.provider}, {demand.difficulty}) failed: {str(e)}")
+                    report['failed'] += 1
+                    # Skip the remaining sets for these settings, but still count the attempt
+                    budget_left -= 1
+                    break
+                report['generated'] += 1
+                budget_left -= 1
+        report['budget_left'] = max(budget_left, 0)
+        logger.info(f"Pool refill finished: {report}")
+        return report
+
+    def _expire(self, now: datetime) -> int:
+        if not self.max_age_days:
+            return 0
+        expired = db.session.execute(
+            db.delete(GeneratedSet).where(
+                GeneratedSet.pooled.is_(True),
+                GeneratedSet.pooled_at < now - timedelta(days=self.max_age_days)
+            )
+        ).rowcount
+        db.session.commit()
+        return expired
@@ -0,0 +1,279 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from models.database import db, Job, JobKind, JobStatus
+
+logger = logging.getLogger(__name__)
+
+def enqueue(kind: JobKind, user_id: int, payload: Dict, problem_set_id: Optional[int] = None,
+            max_attempts: int = 1, dedup_key: Optional[str] = None) -> Job:
+    """
+    Add a job to the queue and commit it.
+
+    Jobs with a dedup_key share one execution: if a job with the same key
+    is already running, the new job joins its lease and receives its
+    result, and queued jobs with the same key are claimed together.
+
+    Args:
+        kind: What the worker should do
+        user_id: Owner of the job, who may read its status
+        payload: Handler arguments, stored as JSON
+        problem_set_id: Problem set the job works on, if any
+        max_attempts: Times the job is tried before it is marked failed
+        dedup_key: Identifies jobs that may share a result
+
+    Returns:
+        Job: The queued (or joined) job
+    """
+    job = Job(kind=kind, status=JobStatus.QUEUED, user_id=user_id, problem_set_id=problem_set_id,
+              payload=payload, attempts=0, max_attempts=max_attempts, dedup_key=dedup_key)
+    if dedup_key:
+        now = datetime.utcnow()
+        running = db.session.execute(
+            db.select(Job).where(Job.dedup_key == dedup_key, Job.status == JobStatus.RUNNING,
+                                 Job.lease_expires_at > now).limit(1)
+        ).scalar()
+        if running:
+            # If the run finishes before noticing this job, the lease expires and
+            # the job is requeued to run on its own
+            job.status = JobStatus.RUNNING
+            job.lease_owner = running.lease_owner
+            job.lease_expires_at = running.lease_expires_at
+            job.attempts = 1
+            job.started_at = now
+            job.progress = running.progress
+            job.message = running.message
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def pending(kinds: Optional[Iterable[JobKind]] = None) -> int:
+    """Return the number of queued jobs, optionally of some kinds only."""
+    query = db.session.query(db.func.count(Job.id)).filter(Job.status == JobStatus.QUEUED)
+    if kinds:
+        query = query.filter(Job.kind.in_(list(kinds)))
+    return query.scalar()
+
+def claim(worker_id: str, lease_seconds: int, kinds: Optional[Iterable[JobKind]] = None) -> Optional[Job]:
+    """
+    Claim the oldest queued job for a worker.
+
+    On PostgreSQL the candidate row is locked with FOR UPDATE SKIP LOCKED so
+    concurrent workers pick different jobs without waiting on each other.
+    The status check in the UPDATE keeps the claim atomic on databases that
+    ignore row locks, such as SQLite.
+
+    Args:
+        worker_id: Identifies the claiming worker in the lease
+        lease_seconds: How long the claim holds without a heartbeat
+        kinds: Job kinds this worker handles (default: all)
+
+    Returns:
+        The claimed job, or None when the queue is empty
+    """
+    query = db.select(Job.id).where(Job.status == JobStatus.QUEUED)
+    if kinds:
+        query = query.where(Job.kind.in_(list(kinds)))
+    query = query.order_by(Job.created_at, Job.id).limit(1).with_for_update(skip_locked=True)
+    job_id = db.session.execute(query).scalar()
+    if job_id is None:
+        db.session.rollback()
+        return None
+
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        db.update(Job)
+        .where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+        .values(status=JobStatus.RUNNING, lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=Job.attempts + 1, started_at=now, error=None)
+    ).rowcount
+    if not claimed:
+        # Another worker got there first
+        db.session.commit()
+        return None
+    job = db.session.get(Job, job_id, populate_existing=True)
+    if job.dedup_key:
+        # Identical queued jobs ride along under the same lease
+        db.session.execute(
+            db.update(Job)
+            .where(Job.dedup_key == job.dedup_key, Job.status == JobStatus.QUEUED)
+            .values(status=JobStatus.RUNNING, lease_owner=worker_id,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds),
+                    attempts=Job.attempts + 1, started_at=now, error=None)
+        )
+    db.session.commit()
+    return job
+
+def _leased(job_id: int, worker_id: str, dedup_key: Optional[str] = None) -> tuple:
+    """Conditions matching a job, and the jobs sharing its run, while worker_id holds them."""
+    if dedup_key:
+        member = db.or_(Job.id == job_id, Job.dedup_key == dedup_key)
+    else:
+        member = Job.id == job_id
+    return (member, Job.lease_owner == worker_id, Job.status == JobStatus.RUNNING)
+
+def shared_jobs(job_id: int, worker_id: str, dedup_key: Optional[str] = None) -> List[Job]:
+    """Return the running jobs that share a job's execution, the job itself included."""
+    return list(db.session.execute(
+        db.select(Job).where(*_leased(job_id, worker_id, dedup_key)).order_by(Job.id)
+        .execution_options(populate_existing=True)
+    ).scalars())
+
+def heartbeat(job_id: int, worker_id: str, lease_seconds: int, progress: Optional[int] = None,
+              message: Optional[str] = None, dedup_key: Optional[str] = None) -> bool:
+    """
+    Extend a worker's lease on a running job, optionally recording progress.
+
+    With a dedup_key the lease and progress of every job sharing the run
+    are updated too.
+
+    Returns:
+        False if the worker no longer holds the lease on any of the jobs
+    """
+    values = {'lease_expires_at': datetime.utcnow() + timedelta(seconds=lease_seconds)}
+    if progress is not None:
+        values['progress'] = progress
+    if message is not None:
+        values['message'] = message[:255]
+    renewed = db.session.execute(
+        db.update(Job).where(*_leased(job_id, worker_id, dedup_key)).values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return bool(renewed)
+
+def complete(job_id: int, worker_id: str, result: Optional[Dict] = None) -> bool:
+    """
+    Mark a job as succeeded.
+
+    Returns:
+        False if the worker lost the lease, in which case the result is dropped
+    """
+    done = db.session.execute(
+        db.update(Job)
+        .where(Job.id == job_id, Job.lease_owner == worker_id, Job.status == JobStatus.RUNNING)
+        .values(status=JobStatus.SUCCEEDED, result=result, progress=100, lease_owner=None,
+                lease_expires_at=None, finished_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return bool(done)
+
+def fail(job_id: int, worker_id: str, error: str, retry: bool = True) -> Optional[JobStatus]:
+    """
+    Record a failed attempt, requeueing the job while it has attempts left.
+
+    Args:
+        job_id: The failed job
+        worker_id: Worker that held the lease
+        error: Description of the failure
+        retry: Whether another attempt could succeed
+
+    Returns:
+        The job's new status, or None if the worker lost the lease
+    """
+    job = db.session.get(Job, job_id, populate_existing=True)
+    if not job or job.lease_owner != worker_id or job.status != JobStatus.RUNNING:
+        db.session.rollback()
+        return None
+    if retry and job.attempts < job.max_attempts:
+        job.status = JobStatus.QUEUED
+    else:
+        job.status = JobStatus.FAILED
+        job.finished_at = datetime.utcnow()
+    job.error = error
+    job.lease_owner = None
+    job.lease_expires_at = None
+    db.session.commit()
+    return job.status
+
+def cancel(job_id: int, user_id: int) -> bool:
+    """
+    Cancel a queued or running job on behalf of its owner.
+
+    A running job's worker notices at its next heartbeat, when it finds it
+    no longer holds the lease, and aborts the job.
+
+    Returns:
+        False if the job does not exist, belongs to someone else or has already finished
+    """
+    cancelled = db.session.execute(
+        db.update(Job)
+        .where(Job.id == job_id, Job.user_id == user_id,
+               Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]))
+        .values(status=JobStatus.CANCELLED, lease_owner=None, lease_expires_at=None,
+                error='Cancelled by user', finished_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return bool(cancelled)
+
+def watch(job: Job) -> None:
+    """Record that a client is following a queued or running job."""
+    if job.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+        job.watched_at = datetime.utcnow()
+        db.session.commit()
+
+def cancel_unwatched(timeout: float, job_id: Optional[int] = None, worker_id: Optional[str] = None,
+                     dedup_key: Optional[str] = None, now: Optional[datetime] = None) -> int:
+    """
+    Cancel jobs whose clients stopped following them.
+
+    A job counts as followed once its status has been read (see watch); when
+    nobody has read it for timeout seconds the client is taken to be gone.
+    Jobs never read are left alone. A running job's worker notices at its
+    next heartbeat, like any other cancellation.
+
+    Args:
+        timeout: Seconds since the last read after which a job is cancelled
+        job_id: Only consider this job and, with dedup_key, the jobs sharing
+            its run under worker_id's lease (default: every queued or running job)
+        worker_id: Worker holding job_id's lease
+        dedup_key: Key of the run job_id belongs to
+        now: Current time (default: utcnow)
+
+    Returns:
+        int: Number of jobs cancelled
+    """
+    now = now or datetime.utcnow()
+    if job_id is None:
+        scope = (Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]),)
+    else:
+        scope = _leased(job_id, worker_id, dedup_key)
+    cancelled = db.session.execute(
+        db.update(Job).where(*scope, Job.watched_at < now - timedelta(seconds=timeout))
+        .values(status=JobStatus.CANCELLED, lease_owner=None, lease_expires_at=None,
+                error='All progress subscribers disconnected', finished_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if cancelled:
+        logger.info(f"Cancelled {cancelled} jobs no client is following")
+    return cancelled
+
+def release_stale(now: Optional[datetime] = None) -> int:
+    """
+    Return running jobs whose lease has expired to the queue.
+
+    A lease expires when its worker died or stalled without renewing it. Jobs
+    out of attempts are marked failed instead.
+
+    Returns:
+        int: Number of jobs released
+    """
+    now = now or datetime.utcnow()
+    stale = (Job.status == JobStatus.RUNNING, Job.lease_expires_at < now)
+    requeued = db.session.execute(
+        db.update(Job).where(*stale, Job.attempts < Job.max_attempts)
+        .values(status=JobStatus.QUEUED, lease_owner=None, lease_expires_at=None,
+                error='Worker lease expired')
+    ).rowcount
+    failed = db.session.execute(
+        db.update(Job).where(*stale)
+        .values(status=JobStatus.FAILED, lease_owner=None, lease_expires_at=None,
+                error='Worker lease expired', finished_at=now)
+    ).rowcount
+    db.session.commit()
+    if requeued or failed:
+        logger.warning(f"Released {requeued} stale jobs and failed {failed} out of attempts")
+    return requeued + failed
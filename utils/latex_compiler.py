@@ -1,14 +1,24 @@
 import os
 import subprocess
 import shutil
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
+from utils.cancellation import current_token
+from utils.metrics import COMPILE_DURATION, span
+
+@lru_cache(maxsize=None)
+def find_tectonic() -> Optional[str]:
+    """Locate the Tectonic binary once per process instead of searching PATH per compiler."""
+    return shutil.which('tectonic')
+
 class LatexCompiler:
     def __init__(self):
         """Initialize the LaTeX compiler."""
         # Check if tectonic is available
-        self.tectonic_path = shutil.which('tectonic')
+        self.tectonic_path = find_tectonic()
         if not self.tectonic_path:
             raise RuntimeError("Tectonic not found. Please install it with 'brew install tectonic'")
         
@@ -37,13 +47,14 @@ class LatexCompiler:
         
         try:
             # Run tectonic
-            result = subprocess.run(
-                [self.tectonic_path, str(tex_path)],
-                cwd=str(tex_path.parent),
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                with span('latex.compile', file=tex_path.name):
+                    self._run_tectonic(tex_path)
+                outcome = 'ok'
+            finally:
+                COMPILE_DURATION.labels(outcome=outcome).observe(time.perf_counter() - start)
             
             # Get the generated PDF path
             temp_pdf = str(tex_path).replace(".tex", ".pdf")
@@ -60,3 +71,27 @@ class LatexCompiler:
         except subprocess.CalledProcessError as e:
             error_msg = e.stderr if e.stderr else e.stdout
             raise RuntimeError(f"Tectonic compilation failed:\n{error_msg}")
+
+    def _run_tectonic(self, tex_path: Path) -> None:
+        """Run Tectonic, killing it as soon as the surrounding work is cancelled."""
+        token = current_token()
+        if token:
+            token.check()
+        process = subprocess.Popen(
+            [self.tectonic_path, str(tex_path)],
+            cwd=str(tex_path.parent),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        unregister = token.on_cancel(process.kill) if token else None
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            if unregister:
+                unregister()
+        if token:
+            token.check()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, process.args, stdout, stderr)
+
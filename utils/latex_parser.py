@@ -0,0 +1,303 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Marker the LLM is asked to put before challenging problems
+CHALLENGE_MARKER = '[Challenge]'
+
+LIST_ENVIRONMENTS = frozenset({'enumerate', 'itemize'})
+
+# Environments whose whole body is display math
+MATH_ENVIRONMENTS = frozenset({
+    'equation', 'equation*', 'align', 'align*', 'alignat', 'alignat*', 'gather', 'gather*',
+    'multline', 'multline*', 'flalign', 'flalign*', 'eqnarray', 'eqnarray*', 'displaymath', 'math'
+})
+
+# Closing delimiter of each math opener
+_MATH_CLOSERS = {'$': '$', '$$': '$$', '\\(': '\\)', '\\[': '\\]'}
+
+# One alternative per token kind. Every character belongs to exactly one
+# token, so a single left-to-right scan covers the whole input.
+_TOKEN = re.compile(r"""
+    (?P<comment>%[^\n]*)
+  | \\begin\s*\{(?P<begin>[^{}]*)\}
+  | \\end\s*\{(?P<end>[^{}]*)\}
+  | (?P<math>\$\$|\$|\\\(|\\\)|\\\[|\\\])
+  | (?P<command>\\[a-zA-Z@]+\*?)
+  | (?P<escape>\\.?)
+  | (?P<lbrace>\{)
+  | (?P<rbrace>\})
+  | (?P<text>[^\\{}$%]+)
+""", re.VERBOSE | re.DOTALL)
+
+_SOLUTION_LABEL = 'Solution:'
+
+class Token:
+    """A lexical unit of LaTeX source.
+
+    Args:
+        kind: 'comment', 'begin', 'end', 'math', 'command', 'escape',
+            'lbrace', 'rbrace' or 'text'
+        value: The environment name for 'begin' and 'end', the matched text otherwise
+        start: Offset of the token in the source
+        end: Offset just past the token
+    """
+
+    __slots__ = ('kind', 'value', 'start', 'end')
+
+    def __init__(self, kind: str, value: str, start: int, end: int):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"Token({self.kind!r}, {self.value!r}, {self.start}, {self.end})"
+
+def tokenize(latex: str) -> List[Token]:
+    """Split LaTeX source into tokens in one linear pass."""
+    tokens = []
+    for match in _TOKEN.finditer(latex):
+        kind = match.lastgroup
+        tokens.append(Token(kind, match.group(kind), match.start(), match.end()))
+    return tokens
+
+class MathSpan:
+    """A piece of math in an item.
+
+    Args:
+        latex: The math, without its delimiters or environment
+        display: Whether it is display math ($$, \\[, align* and the like)
+        start: Offset of the opening delimiter in the source
+        end: Offset just past the closing delimiter
+    """
+
+    __slots__ = ('latex', 'display', 'start', 'end')
+
+    def __init__(self, latex: str, display: bool, start: int, end: int):
+        self.latex = latex
+        self.display = display
+        self.start = start
+        self.end = end
+
+    def to_dict(self) -> Dict:
+        return {'latex': self.latex, 'display': self.display}
+
+class Item:
+    """One problem, or one solution, of a parsed set.
+
+    Args:
+        latex: Source of the item, without its \\item and surrounding whitespace
+        start: Offset of the item's content in the source
+        end: Offset just past the item's content
+        challenge: Whether the item carries the challenge marker
+        math: Math spans in the item, in order
+        answers: Contents of the item's \\boxed answers, in order
+    """
+
+    __slots__ = ('latex', 'start', 'end', 'challenge', 'math', 'answers')
+
+    def __init__(self, latex: str, start: int, end: int, challenge: bool = False,
+                 math: Optional[List[MathSpan]] = None, answers: Optional[List[str]] = None):
+        self.latex = latex
+        self.start = start
+        self.end = end
+        self.challenge = challenge
+        self.math = math or []
+        self.answers = answers or []
+
+    def to_dict(self) -> Dict:
+        return {'latex': self.latex, 'challenge': self.challenge,
+                'math': [span.to_dict() for span in self.math], 'answers': self.answers}
+
+class Document:
+    """Structured form of generated or converted LaTeX.
+
+    Args:
+        preamble: Source before the first item, such as a document header
+            or the solutions preamble
+        items: The problems or solutions
+        postamble: Source after the last item
+        list_environment: List the items were written in, or None for
+            solutions, which follow each other as 'Solution:' blocks
+    """
+
+    def __init__(self, preamble: str, items: List[Item], postamble: str = '',
+                 list_environment: Optional[str] = 'enumerate'):
+        self.preamble = preamble
+        self.items = items
+        self.postamble = postamble
+        self.list_environment = list_environment
+
+    def to_latex(self) -> str:
+        """Serialize back to LaTeX; parsing the result gives the same items."""
+        if self.list_environment:
+            body = format_list((item.latex for item in self.items), self.list_environment)
+        else:
+            body = "\n\n".join(item.latex for item in self.items)
+        parts = [self.preamble.rstrip(), body, self.postamble.lstrip()]
+        return "\n".join(part for part in parts if part)
+
+    def to_dict(self) -> Dict:
+        return {'preamble': self.preamble, 'items': [item.to_dict() for item in self.items],
+                'postamble': self.postamble}
+
+def format_list(items: Iterable[str], environment: str = 'enumerate') -> str:
+    """Write items as a LaTeX list, the shape generated problems come in."""
+    return (f"\\begin{{{environment}}}\n" + "\n".join(f"\\item {item}" for item in items) +
+            f"\n\\end{{{environment}}}")
+
+class _Collector:
+    """Math spans, answers and the challenge flag seen while an item is open."""
+
+    def __init__(self, start: int):
+        self.start = start
+        self.challenge = False
+        self.math: List[MathSpan] = []
+        self.answers: List[str] = []
+
+    def close(self, latex: str, end: int) -> Optional[Item]:
+        body = latex[self.start:end]
+        stripped = body.strip()
+        if not stripped:
+            return None
+        start = self.start + len(body) - len(body.lstrip())
+        return Item(stripped, start, start + len(stripped), self.challenge, self.math, self.answers)
+
+def _is_line_start(latex: str, offset: int) -> bool:
+    line_start = latex.rfind('\n', 0, offset) + 1
+    return not latex[line_start:offset].strip(' \t')
+
+def _parse(latex: str, solutions: bool) -> Document:
+    items: List[Item] = []
+    current: Optional[_Collector] = None
+    environments: List[str] = []
+    list_depth = 0
+    list_environment = None
+    body_start = body_end = None
+    # Braces still open, each with the offset its \boxed content starts at, if it is one
+    braces: List[Optional[int]] = []
+    box_pending = False
+    math_open: Optional[Token] = None
+    math_environment: Optional[Token] = None
+
+    def finish(end: int) -> None:
+        nonlocal current
+        if current is not None:
+            item = current.close(latex, end)
+            if item:
+                items.append(item)
+        current = None
+
+    for token in tokenize(latex):
+        kind = token.kind
+        if kind == 'comment':
+            continue
+        if box_pending and not (kind == 'text' and not token.value.strip()):
+            box_pending = False
+            if kind == 'lbrace':
+                braces.append(token.end)
+                continue
+            if kind == 'text' and current is not None:
+                # \boxed 3 boxes a single character
+                current.answers.append(token.value.lstrip()[0])
+
+        if kind == 'lbrace':
+            braces.append(None)
+        elif kind == 'rbrace':
+            if braces:
+                box_start = braces.pop()
+                if box_start is not None and current is not None:
+                    current.answers.append(latex[box_start:token.start].strip())
+        elif kind == 'command':
+            if token.value == '\\boxed':
+                box_pending = True
+            elif token.value == '\\item' and not solutions and list_depth == 1:
+                finish(token.start)
+                current = _Collector(token.end)
+        elif kind == 'math' and math_environment is None:
+            if math_open is None:
+                if token.value in _MATH_CLOSERS:
+                    math_open = token
+            elif token.value == _MATH_CLOSERS[math_open.value]:
+                if current is not None:
+                    current.math.append(MathSpan(latex[math_open.end:token.start].strip(),
+                                                 math_open.value in ('$$', '\\['), math_open.start, token.end))
+                math_open = None
+        elif kind == 'begin':
+            name = token.value.strip()
+            environments.append(name)
+            if name in MATH_ENVIRONMENTS and math_environment is None and math_open is None:
+                math_environment = token
+            elif name in LIST_ENVIRONMENTS and not solutions:
+                list_depth += 1
+                if list_depth == 1:
+                    list_environment = list_environment or name
+                    if body_start is None:
+                        body_start = token.start
+        elif kind == 'end':
+            name = token.value.strip()
+            if name not in environments:
+                # Stray \end, as LLMs sometimes write; nothing to close
+                continue
+            while environments:
+                closed = environments.pop()
+                if closed in LIST_ENVIRONMENTS and not solutions:
+                    list_depth -= 1
+                    if list_depth == 0:
+                        finish(token.start)
+                        body_end = token.end
+                if closed == name:
+                    break
+            if math_environment is not None and name == math_environment.value.strip():
+                if current is not None:
+                    current.math.append(MathSpan(latex[math_environment.end:token.start].strip(), True,
+                                                 math_environment.start, token.end))
+                math_environment = None
+        elif kind == 'text':
+            if current is not None and CHALLENGE_MARKER in token.value:
+                current.challenge = True
+            if solutions and not environments and math_open is None:
+                offset = token.value.find(_SOLUTION_LABEL)
+                while offset != -1:
+                    position = token.start + offset
+                    if _is_line_start(latex, position):
+                        if body_start is None:
+                            body_start = position
+                        finish(position)
+                        current = _Collector(position)
+                    offset = token.value.find(_SOLUTION_LABEL, offset + 1)
+
+    # Unterminated output is common; whatever is open ends with the input
+    finish(len(latex))
+    if body_start is None:
+        return Document(latex, [], '', None if solutions else list_environment)
+    postamble = latex[body_end:] if body_end is not None and not solutions else ''
+    return Document(latex[:body_start], items, postamble, None if solutions else list_environment or 'enumerate')
+
+def parse_problems(latex: str) -> Document:
+    """
+    Parse a list of problems, as generated or converted from a PDF.
+
+    Items are those of the outermost enumerate or itemize lists; nested
+    lists stay part of the item they belong to. Text between two outermost
+    lists is not kept. Output cut off before its \\end{enumerate} still
+    yields its last item.
+
+    Args:
+        latex: Generated problems, or a whole converted document
+
+    Returns:
+        The parsed document; without a list its items are empty and the
+        whole input is the preamble
+    """
+    return _parse(latex, solutions=False)
+
+def parse_solutions(latex: str) -> Document:
+    """
+    Parse generated solutions into one item per 'Solution:' block.
+
+    Blocks start where a line starts with 'Solution:' outside any
+    environment or math; what comes before the first block, such as the
+    solutions preamble, is the document's preamble.
+    """
+    return _parse(latex, solutions=True)
@@ -1,9 +1,26 @@
+import atexit
+import glob
+import gzip
 import json
+import logging
 import os
+import queue
+import random
+import shutil
+import threading
+import time
+import uuid
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
+
+SEGMENT_PREFIX = 'interactions_'
+LEGACY_PATTERN = 'interaction_*.json'
+
+_STOP = object()
 
 class Logger:
+    """Legacy interaction log writing one pretty-printed JSON file per call."""
+
     def __init__(self, log_dir: str):
         self.log_dir = log_dir
         self._setup_log_directory()
@@ -12,48 +29,301 @@ class Logger:
         """Create the log directory if it doesn't exist."""
         os.makedirs(self.log_dir, exist_ok=True)
 
+    @staticmethod
+    def _build_entry(model: str, prompt: str, variables: Dict[str, str], images: Optional[List[str]],
+                     response: Optional[str], latency_ms: Optional[float]) -> Dict:
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "model": model,
+            "prompt": prompt,
+            "variables": variables,
+            "images": images or [],
+            "response": response
+        }
+        if latency_ms is not None:
+            entry["latency_ms"] = round(latency_ms, 3)
+        return entry
+
     def log_interaction(
         self,
         model: str,
         prompt: str,
         variables: Dict[str, str],
         images: Optional[List[str]] = None,
-        response: Optional[str] = None
+        response: Optional[str] = None,
+        latency_ms: Optional[float] = None
     ) -> None:
         """
         Log an LLM interaction to a JSON file.
-        
+
         Args:
             model: Name of the LLM model used
             prompt: The processed prompt
             variables: Dictionary of template variables
             images: List of image paths used
             response: The model's response
+            latency_ms: How long the model took to answer, if measured
         """
-        timestamp = datetime.now().isoformat()
-        log_entry = {
-            "timestamp": timestamp,
-            "model": model,
-            "prompt": prompt,
-            "variables": variables,
-            "images": images or [],
-            "response": response
-        }
+        log_entry = self._build_entry(model, prompt, variables, images, response, latency_ms)
 
-        filename = f"interaction_{timestamp.replace(':', '-')}.json"
+        # The random suffix keeps calls landing in the same microsecond apart
+        timestamp = log_entry["timestamp"].replace(':', '-')
+        filename = f"interaction_{timestamp}_{uuid.uuid4().hex[:8]}.json"
         log_path = os.path.join(self.log_dir, filename)
 
-        with open(log_path, 'w', encoding='utf-8') as f:
+        with open(log_path, 'x', encoding='utf-8') as f:
             json.dump(log_entry, f, indent=2, ensure_ascii=False)
 
-def setup_logging(log_dir: str) -> Logger:
+    def flush(self) -> None:
+        """Wait until every logged interaction is on disk."""
+        pass
+
+    def close(self) -> None:
+        """Release any resources held by the logger."""
+        pass
+
+class JsonlLogger(Logger):
+    """Interaction log appending JSON lines to rotated segment files.
+
+    log_interaction only serializes the entry and hands it to a background
+    thread, so LLM calls never wait on the filesystem. The writer appends to
+    the current segment, starts a new one once it reaches max_bytes or is
+    older than rotate_interval, and gzips segments it has finished with.
+    The queue is bounded: when the writer cannot keep up, entries are
+    dropped and counted rather than buffered without limit.
+    """
+
+    def __init__(self, log_dir: str, max_bytes: int = 64 * 1024 * 1024, rotate_interval: int = 24 * 60 * 60,
+                 compress: bool = True, sample_rate: float = 1.0, queue_size: int = 1000):
+        super().__init__(log_dir)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.sample_rate = sample_rate
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._segment = None
+        self._segment_path: Optional[str] = None
+        self._segment_started = 0.0
+        self._segment_bytes = 0
+        self._segment_count = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='interaction-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log_interaction(
+        self,
+        model: str,
+        prompt: str,
+        variables: Dict[str, str],
+        images: Optional[List[str]] = None,
+        response: Optional[str] = None,
+        latency_ms: Optional[float] = None
+    ) -> None:
+        """
+        Queue an LLM interaction for the background writer.
+
+        Args:
+            model: Name of the LLM model used
+            prompt: The processed prompt
+            variables: Dictionary of template variables
+            images: List of image paths used
+            response: The model's response
+            latency_ms: How long the model took to answer, if measured
+        """
+        if self._closed or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return
+        line = json.dumps(self._build_entry(model, prompt, variables, images, response, latency_ms),
+                          ensure_ascii=False)
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logging.getLogger(__name__).warning(
+                    f"Interaction log queue full, {self.dropped} entries dropped")
+
+    def flush(self) -> None:
+        """Wait until every queued interaction has been written."""
+        if self._closed or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self) -> None:
+        """Write out queued interactions, finish the current segment and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                # Close idle segments on schedule even when nothing is logged
+                if self._segment and self._segment_expired():
+                    self._finish_segment()
+                continue
+
+            if isinstance(item, str):
+                try:
+                    self._write(item)
+                    # Lines are buffered; flush once the backlog is drained
+                    if self._queue.empty():
+                        self._segment.flush()
+                except Exception as e:
+                    logging.getLogger(__name__).error(f"Failed to write interaction log: {str(e)}")
+                continue
+
+            if self._segment:
+                self._segment.flush()
+            if item is _STOP:
+                self._finish_segment()
+                return
+            item.set()
+
+    def _segment_expired(self) -> bool:
+        return bool(self.rotate_interval) and time.time() - self._segment_started >= self.rotate_interval
+
+    def _write(self, line: str) -> None:
+        if self._segment and (self._segment_bytes >= self.max_bytes or self._segment_expired()):
+            self._finish_segment()
+        if self._segment is None:
+            self._open_segment()
+        data = line + '\n'
+        self._segment.write(data)
+        self._segment_bytes += len(data.encode('utf-8'))
+
+    def _open_segment(self) -> None:
+        self._segment_count += 1
+        started = datetime.now()
+        # Including the pid lets several worker processes share a directory
+        filename = f"{SEGMENT_PREFIX}{started.strftime('%Y%m%dT%H%M%S')}_{os.getpid()}_{self._segment_count}.jsonl"
+        self._segment_path = os.path.join(self.log_dir, filename)
+        self._segment = open(self._segment_path, 'a', encoding='utf-8')
+        self._segment_started = time.time()
+        self._segment_bytes = 0
+
+    def _finish_segment(self) -> None:
+        if self._segment is None:
+            return
+        self._segment.close()
+        path = self._segment_path
+        self._segment = None
+        self._segment_path = None
+        if self.compress:
+            with open(path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(path + '.gz.tmp', path + '.gz')
+            os.remove(path)
+
+_loggers: Dict[tuple, Logger] = {}
+_loggers_lock = threading.Lock()
+
+def setup_logging(log_dir: str, backend: Optional[str] = None) -> Logger:
     """
     Setup and return a Logger instance.
-    
+
+    Loggers are shared per directory and backend, so repeated calls do not
+    start additional writer threads.
+
     Args:
         log_dir: Directory to store logs
-        
+        backend: 'jsonl' or 'legacy' (default: LLM_LOG_BACKEND setting)
+
     Returns:
         Logger instance
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    from config import Config
+    backend = backend or Config.LLM_LOG_BACKEND
+    if backend not in ('jsonl', 'legacy'):
+        raise ValueError(f"Unknown interaction log backend: {backend}")
+
+    key = (os.path.abspath(log_dir), backend)
+    with _loggers_lock:
+        logger = _loggers.get(key)
+        if logger is None or getattr(logger, '_closed', False):
+            if backend == 'legacy':
+                logger = Logger(log_dir)
+            else:
+                logger = JsonlLogger(
+                    log_dir,
+                    max_bytes=Config.LLM_LOG_MAX_BYTES,
+                    rotate_interval=Config.LLM_LOG_ROTATE_INTERVAL,
+                    compress=Config.LLM_LOG_COMPRESS,
+                    sample_rate=Config.LLM_LOG_SAMPLE_RATE,
+                    queue_size=Config.LLM_LOG_QUEUE_SIZE
+                )
+            _loggers[key] = logger
+        return logger
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def log_files(log_dir: str, include_legacy: bool = True) -> List[str]:
+    """Return the JSONL segments (and legacy JSON files) in a log directory, oldest first."""
+    paths = glob.glob(os.path.join(log_dir, f'{SEGMENT_PREFIX}*.jsonl'))
+    paths += glob.glob(os.path.join(log_dir, f'{SEGMENT_PREFIX}*.jsonl.gz'))
+    if include_legacy:
+        paths += glob.glob(os.path.join(log_dir, LEGACY_PATTERN))
+    return sorted(paths, key=os.path.getmtime)
+
+def read_log_file(path: str) -> Iterator[Dict]:
+    """
+    Yield the interactions stored in a segment or legacy log file.
+
+    Lines that fail to parse, such as a partially written last line of an
+    active segment, are skipped.
+    """
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                yield json.load(f)
+            except json.JSONDecodeError:
+                pass
+        return
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def iter_interactions(log_dir: str, include_legacy: bool = True, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None) -> Iterator[Dict]:
+    """
+    Iterate over logged interactions, optionally limited to a time range.
+
+    Segments last modified before since are skipped without being opened.
+
+    Args:
+        log_dir: Directory containing the logs
+        include_legacy: Also read legacy interaction_*.json files
+        since: Only yield interactions logged at or after this time
+        until: Only yield interactions logged before this time
     """
-    return Logger(log_dir)
+    for path in log_files(log_dir, include_legacy):
+        if since and datetime.fromtimestamp(os.path.getmtime(path)) < since:
+            continue
+        for entry in read_log_file(path):
+            timestamp = _parse_timestamp(entry.get('timestamp'))
+            if since and (timestamp is None or timestamp < since):
+                continue
+            if until and (timestamp is None or timestamp >= until):
+                continue
+            yield entry
@@ -0,0 +1,177 @@
+import contextvars
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               REGISTRY, generate_latest, multiprocess)
+
+logger = logging.getLogger('mathgen.trace')
+
+# Stages range from millisecond DB commits to multi-minute LLM calls
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_DURATION = Histogram(
+    'mathgen_stage_duration_seconds', 'Time spent in each pipeline stage',
+    ['stage', 'outcome'], buckets=DURATION_BUCKETS
+)
+STAGE_IN_FLIGHT = Gauge(
+    'mathgen_stage_in_flight', 'Pipeline stages currently running',
+    ['stage'], multiprocess_mode='livesum'
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'mathgen_http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'endpoint', 'status'], buckets=DURATION_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    'mathgen_http_requests_in_flight', 'HTTP requests currently being served',
+    multiprocess_mode='livesum'
+)
+LLM_TOKENS = Counter(
+    'mathgen_llm_tokens_total', 'Tokens sent to and received from LLM providers',
+    ['provider', 'direction']
+)
+COMPILE_DURATION = Histogram(
+    'mathgen_latex_compile_duration_seconds', 'Tectonic compilation time',
+    ['outcome'], buckets=DURATION_BUCKETS
+)
+DUPLICATE_PROBLEMS = Counter(
+    'mathgen_duplicate_problems_total', 'Near-duplicate generated problems',
+    ['outcome']
+)
+ANSWER_CHECKS = Counter(
+    'mathgen_answer_checks_total', 'Generated answers checked with SymPy',
+    ['verdict']
+)
+SSE_CONNECTIONS = Gauge(
+    'mathgen_sse_connections', 'Open progress event streams',
+    multiprocess_mode='livesum'
+)
+
+# Nested spans are logged at DEBUG unless they fail or take at least this long;
+# top-level spans (requests, jobs) are always logged at INFO
+SLOW_SPAN_SECONDS = 1.0
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+class Span:
+    """A timed stage of work, nested under whichever span was active when it started."""
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.outcome = 'ok'
+
+    def set(self, **attributes) -> None:
+        """Attach attributes discovered while the span runs, e.g. token counts."""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'outcome': self.outcome,
+            **self.attributes
+        }
+
+def start_span(name: str, **attributes) -> Tuple[Span, contextvars.Token]:
+    """
+    Start a span and make it the active one.
+
+    Prefer the span() context manager; this is for code that starts and
+    ends a span in different callbacks, such as request hooks.
+
+    Returns:
+        The span and the token to pass to end_span
+    """
+    current = Span(name, _current_span.get(), **attributes)
+    STAGE_IN_FLIGHT.labels(stage=name).inc()
+    return current, _current_span.set(current)
+
+def end_span(current: Span, token: contextvars.Token, error: Optional[BaseException] = None) -> None:
+    """Finish a span started with start_span, recording its duration and outcome."""
+    current.duration = time.perf_counter() - current.start
+    if error is not None:
+        current.outcome = 'error'
+        current.set(error=type(error).__name__)
+    STAGE_IN_FLIGHT.labels(stage=current.name).dec()
+    try:
+        _current_span.reset(token)
+    except (ValueError, RuntimeError):
+        # Streamed responses can finish in a different context than they started
+        pass
+    STAGE_DURATION.labels(stage=current.name, outcome=current.outcome).observe(current.duration)
+    notable = current.parent_id is None or current.outcome == 'error' or current.duration >= SLOW_SPAN_SECONDS
+    level = logging.INFO if notable else logging.DEBUG
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps(current.to_dict(), default=str))
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time a stage, record it in the stage histogram and log it as a structured span.
+
+    Top-level, failed and slow spans are logged at INFO, others at DEBUG.
+
+    Args:
+        name: Stage name, used as the metric label; keep the set of names small
+        **attributes: Extra fields for the span log line
+
+    Yields:
+        Span: The running span, for attaching attributes
+    """
+    current, token = start_span(name, **attributes)
+    try:
+        yield current
+    except BaseException as e:
+        end_span(current, token, e)
+        raise
+    end_span(current, token)
+
+def current_span() -> Optional[Span]:
+    """Return the innermost active span, if any."""
+    return _current_span.get()
+
+def record_tokens(provider: str, input_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    """Count provider tokens and attach them to the active span."""
+    if input_tokens:
+        LLM_TOKENS.labels(provider=provider, direction='input').inc(input_tokens)
+    if output_tokens:
+        LLM_TOKENS.labels(provider=provider, direction='output').inc(output_tokens)
+    active = current_span()
+    if active:
+        active.set(input_tokens=input_tokens, output_tokens=output_tokens)
+
+def metrics_response() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    When PROMETHEUS_MULTIPROC_DIR is set (e.g. under gunicorn with several
+    workers) the values written by every worker process are aggregated.
+
+    Returns:
+        Tuple of the response body and its content type
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int) -> None:
+    """Drop a finished worker's live gauges; call from gunicorn's child_exit hook."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,103 @@
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from typing import Optional
+
+import bcrypt
+
+# bcrypt only looks at the first 72 bytes; older bcrypt releases truncated
+# silently, so truncate explicitly to keep existing hashes verifiable
+MAX_PASSWORD_BYTES = 72
+
+_COST_PATTERN = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+class HasherBusyError(Exception):
+    """Raised when the password hashing queue is full or too slow to answer."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+def _encode(password: str) -> bytes:
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+def _hash_password(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _check_password(password_hash: str, password: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, password_hash.encode('utf-8'))
+    except ValueError:
+        # Malformed stored hash
+        return False
+
+class PasswordHasher:
+    """Run bcrypt in a dedicated process pool with a bounded queue.
+
+    bcrypt is deliberately CPU-bound; running it on the request thread holds
+    the GIL and stalls every other request served by the same worker. Work is
+    handed to a small process pool instead, and callers are turned away with
+    HasherBusyError once more than max_workers + max_pending hashes are in
+    flight.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 2, max_pending: int = 32,
+                 timeout: float = 10.0, retry_after: int = 1):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the app does not fork workers
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusyError(self.retry_after)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusyError(self.retry_after)
+
+    def hash_password(self, password: str) -> str:
+        """
+        Hash a password with the configured cost.
+
+        Raises:
+            HasherBusyError: If the hashing queue is full
+        """
+        return self._run(_hash_password, _encode(password), self.rounds)
+
+    def check_password(self, password_hash: str, password: str) -> bool:
+        """
+        Check a password against a stored bcrypt hash.
+
+        Raises:
+            HasherBusyError: If the hashing queue is full
+        """
+        return self._run(_check_password, password_hash, _encode(password))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Check whether a stored hash was made with a different cost."""
+        match = _COST_PATTERN.match(password_hash)
+        return not match or int(match.group(1)) != self.rounds
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
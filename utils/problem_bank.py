@@ -0,0 +1,215 @@
+import hashlib
+import logging
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from models.database import db, BankProblem, BankProblemBucket, SeenProblem
+from utils.fingerprint import LSHIndex, MinHasher, Signature, find_duplicates, numbers
+from utils.latex_parser import format_list, parse_problems, parse_solutions
+
+logger = logging.getLogger(__name__)
+
+# Signatures in the bank are only comparable when computed the same way
+_hasher = MinHasher()
+_lsh = LSHIndex()
+
+def split_problems(problems: str) -> List[str]:
+    """
+    Split a generated enumerate list into its items.
+
+    Only items of the outermost list are returned; nested lists stay part
+    of the item they belong to.
+
+    Returns:
+        The LaTeX of each item, without its \\item
+    """
+    return [item.latex for item in parse_problems(problems).items]
+
+def split_solutions(solutions: str) -> List[str]:
+    """Split generated solutions into one block per problem, each starting with 'Solution:'."""
+    return [item.latex for item in parse_solutions(solutions).items]
+
+def content_hash(problem: str) -> str:
+    return hashlib.sha256(' '.join(problem.split()).encode('utf-8')).hexdigest()
+
+def bank_set(template_hash: str, provider: str, difficulty: str, problems: str, solutions: str,
+             user_id: int, generated_set_id: Optional[int] = None, seen: bool = True) -> List[BankProblem]:
+    """
+    Store the problems of a generated set in the bank and mark them seen by its owner.
+
+    Problems already in the bank for the template are reused rather than
+    stored twice. Sets whose problems and solutions cannot be paired up
+    are not banked. Commits the session.
+
+    Args:
+        template_hash: Hash of the template the set was generated from
+        provider: 'claude' or 'gemini'
+        difficulty: Difficulty the set was requested at
+        problems: The set's enumerate list of problems
+        solutions: The set's solutions
+        user_id: Owner of the set
+        generated_set_id: The set the problems first appeared in
+        seen: Whether the owner has been given the set; pooled sets are only
+            marked seen once claimed
+
+    Returns:
+        The bank rows of the set's problems, in order
+    """
+    problem_items = parse_problems(problems).items
+    solution_items = parse_solutions(solutions).items
+    if not problem_items or len(problem_items) != len(solution_items):
+        logger.warning(f"Not banking set {generated_set_id}: {len(problem_items)} problems "
+                       f"but {len(solution_items)} solutions")
+        return []
+
+    rows = []
+    new_rows = []
+    for problem, solution in zip(problem_items, solution_items):
+        digest = content_hash(problem.latex)
+        row = BankProblem.query.filter_by(template_hash=template_hash, content_hash=digest).first()
+        if row is None:
+            row = BankProblem(template_hash=template_hash, provider=provider.lower(),
+                              difficulty=difficulty.lower(), challenge=problem.challenge,
+                              problem_latex=problem.latex, solution_latex=solution.latex, content_hash=digest,
+                              minhash=list(_hasher.signature(problem.latex)), generated_set_id=generated_set_id)
+            db.session.add(row)
+            new_rows.append(row)
+        rows.append(row)
+    db.session.flush()
+    db.session.add_all(BankProblemBucket(bucket=bucket, bank_problem_id=row.id)
+                       for row in new_rows for bucket in set(_lsh.bucket_keys(tuple(row.minhash))))
+    if seen:
+        mark_seen(user_id, rows)
+    db.session.commit()
+    return rows
+
+def mark_seen(user_id: int, rows: Iterable[BankProblem]) -> None:
+    """Record that a user has been given these problems; does not commit."""
+    ids = {row.id for row in rows}
+    if not ids:
+        return
+    seen = set(db.session.execute(
+        db.select(SeenProblem.bank_problem_id).where(SeenProblem.user_id == user_id,
+                                                     SeenProblem.bank_problem_id.in_(ids))
+    ).scalars())
+    db.session.add_all(SeenProblem(user_id=user_id, bank_problem_id=problem_id) for problem_id in ids - seen)
+
+def mark_set_seen(template_hash: str, problems: str, user_id: int) -> None:
+    """Record that a user has been given the banked problems of a set; does not commit."""
+    digests = {content_hash(item.latex) for item in parse_problems(problems).items}
+    if not digests:
+        return
+    mark_seen(user_id, BankProblem.query.filter(BankProblem.template_hash == template_hash,
+                                                BankProblem.content_hash.in_(digests)).all())
+
+def _search_condition(query: str):
+    """Full-text match of the problems against query, using the database's own index."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # Quote each word so FTS5 operators in user input are taken literally
+        terms = ' '.join('"{}"'.format(word.replace('"', '""')) for word in query.split())
+        return BankProblem.id.in_(db.text(
+            "SELECT rowid FROM bank_problems_fts WHERE bank_problems_fts MATCH :terms"
+        ).bindparams(terms=terms))
+    if dialect == 'postgresql':
+        return db.text("bank_problems.search_vector @@ plainto_tsquery('english', :terms)").bindparams(terms=query)
+    return db.and_(*(BankProblem.problem_latex.contains(word) for word in query.split()))
+
+def search(template_hash: str, query: str, limit: int = 50) -> List[BankProblem]:
+    """Return the template's banked problems matching a full-text query."""
+    return BankProblem.query.filter(BankProblem.template_hash == template_hash,
+                                    _search_condition(query)).order_by(BankProblem.id).limit(limit).all()
+
+def draw(user_id: int, template_hash: str, challenge: bool, count: int,
+         query: Optional[str] = None, exclude: Iterable[int] = ()) -> List[BankProblem]:
+    """
+    Pick random banked problems of a template that the user has not seen.
+
+    Args:
+        user_id: User the problems are for
+        template_hash: Template the problems must come from
+        challenge: Whether to pick challenging or regular problems
+        count: Problems wanted
+        query: Only pick problems matching this full-text query
+        exclude: Bank ids already picked
+
+    Returns:
+        Up to count problems
+    """
+    if count <= 0:
+        return []
+    unseen = ~db.exists().where(SeenProblem.user_id == user_id, SeenProblem.bank_problem_id == BankProblem.id)
+    filters = [BankProblem.template_hash == template_hash, BankProblem.challenge.is_(challenge), unseen]
+    if query:
+        filters.append(_search_condition(query))
+    exclude = list(exclude)
+    if exclude:
+        filters.append(BankProblem.id.notin_(exclude))
+    return BankProblem.query.filter(*filters).order_by(db.func.random()).limit(count).all()
+
+def assemble(rows: List[BankProblem]) -> Tuple[str, str]:
+    """
+    Build the problem list and solutions of a set from banked problems.
+
+    Returns:
+        Tuple of the enumerate list of problems and the solutions, shaped like
+        ProblemGenerator output without the solutions preamble
+    """
+    problems = format_list(row.problem_latex for row in rows)
+    solutions = "\n\n".join(row.solution_latex for row in rows)
+    return problems, solutions
+
+def seen_candidates(user_id: int, template_hash: str,
+                    problems: Iterable[str]) -> List[Tuple[int, Signature, Tuple[str, ...]]]:
+    """
+    Find the banked problems a user has seen that may be near-duplicates of some problems.
+
+    Only bank rows sharing an LSH bucket with one of the problems are
+    loaded, so the cost depends on the matches, not on the size of the bank.
+
+    Returns:
+        Bank id, MinHash signature and numbers of each candidate
+    """
+    buckets = {bucket for problem in problems for bucket in _lsh.bucket_keys(_hasher.signature(problem))}
+    if not buckets:
+        return []
+    # A subquery rather than DISTINCT, which PostgreSQL cannot apply to JSON columns
+    matching = db.select(BankProblemBucket.bank_problem_id).where(BankProblemBucket.bucket.in_(buckets))
+    candidates = db.session.execute(
+        db.select(BankProblem.id, BankProblem.minhash, BankProblem.problem_latex)
+        .join(SeenProblem, db.and_(SeenProblem.bank_problem_id == BankProblem.id, SeenProblem.user_id == user_id))
+        .where(BankProblem.id.in_(matching), BankProblem.template_hash == template_hash)
+    ).all()
+    return [(bank_id, tuple(minhash), numbers(latex)) for bank_id, minhash, latex in candidates]
+
+class DuplicateCheck:
+    """Find near-duplicate problems in a new set before paying for its solutions.
+
+    A problem is a duplicate when it nearly repeats an earlier problem of
+    the set, or a banked problem the set's owner has already been given,
+    with the same numbers; variants with other coefficients are kept.
+
+    Args:
+        threshold: Estimated similarity from which problems count as duplicates
+        replace: Whether duplicates should be regenerated rather than only flagged
+        max_rounds: Regeneration attempts before the remaining duplicates are kept
+    """
+
+    def __init__(self, threshold: float = 0.85, replace: bool = True, max_rounds: int = 1):
+        self.threshold = threshold
+        self.replace = replace
+        self.max_rounds = max_rounds
+
+    def find(self, user_id: int, template_hash: str, problems: List[str]) -> Dict[int, Hashable]:
+        """
+        Find the duplicates among a new set's problems.
+
+        Returns:
+            Position of each duplicate mapped to the position of the earlier
+            problem or, for problems repeating the bank, ('bank', id)
+        """
+        index = LSHIndex(_lsh.bands)
+        index_numbers = {}
+        for bank_id, signature, bank_numbers in seen_candidates(user_id, template_hash, problems):
+            index.add(('bank', bank_id), signature)
+            index_numbers[('bank', bank_id)] = bank_numbers
+        return find_duplicates(problems, _hasher, self.threshold, index, index_numbers)
@@ -2,38 +2,81 @@ import os
 from typing import Optional, List, Dict, Tuple
 from pathlib import Path
 import tempfile
+import time
 
 from math_latex import MathLatexConverter
 from .latex_compiler import LatexCompiler
+from .latex_parser import CHALLENGE_MARKER, parse_problems
 from providers.claude_provider import ClaudeProvider
+from utils.logger import setup_logging
+from utils.metrics import span
+
+# Share of challenging problems requested for each difficulty
+CHALLENGE_RATIOS = {
+    'same': 0,
+    'challenge': 0.2,  # 20% challenging
+    'harder': 0.8  # 80% challenging
+}
+
+# Put before the solutions, inside the document body
+SOLUTIONS_PREAMBLE = """% Custom spacing for limit notation
+\\def\\limit#1{\\lim\\limits_{#1}\\;}
+\\def\\infinity{\\infty}
+
+% Better fraction spacing
+\\setlength{\\jot}{12pt}
+\\setlength{\\arraycolsep}{2pt}
+
+% Better display math spacing
+\\setlength{\\abovedisplayskip}{12pt}
+\\setlength{\\belowdisplayskip}{12pt}
+\\setlength{\\abovedisplayshortskip}{12pt}
+\\setlength{\\belowdisplayshortskip}{12pt}
+"""
+
+def challenge_count(difficulty: str, num_problems: int) -> int:
+    """Return how many of num_problems should be challenging at a difficulty."""
+    return int(num_problems * CHALLENGE_RATIOS.get(difficulty, 0))
 
 class ProblemGenerator:
-    def __init__(self, provider=None):
-        """Initialize the problem generator with an LLM provider."""
+    def __init__(self, provider=None, latex_compiler=None, log_dir: Optional[str] = None):
+        """Initialize the problem generator with an LLM provider, optional LaTeX compiler and interaction log directory."""
+        from config import Config
         self.provider = provider or ClaudeProvider()
-        self.latex_compiler = LatexCompiler()
+        self.latex_compiler = latex_compiler or LatexCompiler()
+        self.log_dir = log_dir or Config.LLM_LOG_DIR
+        self.logger = setup_logging(self.log_dir)
+
+    def _execute(self, prompt: str, variables: Dict[str, str]) -> str:
+        """Ask the provider and record the interaction, so it can be replayed."""
+        start = time.perf_counter()
+        response = self.provider.execute(prompt)
+        self.logger.log_interaction(
+            model=self.provider.__class__.__name__,
+            prompt=prompt,
+            response=response,
+            variables=variables,
+            latency_ms=(time.perf_counter() - start) * 1000
+        )
+        return response
         
     def generate_problems(self, template_file: str, difficulty: str = 'same', num_problems: int = 5) -> str:
         """Generate problems based on the template and difficulty level."""
         if template_file.lower().endswith('.pdf'):
-            template_content = MathLatexConverter(self.provider, "logs").convert_to_latex(template_file)
+            template_content = MathLatexConverter(self.provider, self.log_dir).convert_to_latex(template_file)
         else:
             with open(template_file, 'r') as f:
                 template_content = f.read()
                 
         # Calculate number of challenging problems based on difficulty
-        num_challenging = {
-            'same': 0,
-            'challenge': int(num_problems * 0.2),  # 20% challenging
-            'harder': int(num_problems * 0.8)  # 80% challenging
-        }.get(difficulty, 0)
+        num_challenging = challenge_count(difficulty, num_problems)
         
         # Create prompt based on difficulty
         prompt = f"""Generate {num_problems} LaTeX math problems about limits, following these rules:
 1. Use similar notation and style as the example.
 2. Include a mix of different types of limits (polynomials, rational functions, exponential).
 3. {num_challenging} problems should be more challenging than the example.
-4. Mark challenging problems with \\textbf{{[Challenge]}} before the problem.
+4. Mark challenging problems with \\textbf{{{CHALLENGE_MARKER}}} before the problem.
 5. Use \\begin{{enumerate}} to list the problems.
 6. Use \\displaystyle for all limits.
 7. Return ONLY the LaTeX code for the problems, without any document class or preamble.
@@ -42,10 +85,11 @@ Example problems:
 {template_content}"""
 
         # Get problems from LLM
-        problems = self.provider.execute(prompt)
+        with span('generator.problems', difficulty=difficulty, num_problems=num_problems):
+            problems = self._execute(prompt, {'difficulty': difficulty, 'num_problems': str(num_problems)})
         
-        # Ensure problems are wrapped in enumerate
-        if "\\begin{enumerate}" not in problems:
+        # Ensure problems are wrapped in a list
+        if parse_problems(problems).list_environment is None:
             problems = "\\begin{enumerate}\n" + problems + "\n\\end{enumerate}"
             
         return problems
@@ -67,27 +111,13 @@ Problems to solve:
 {problems_latex}"""
 
         # Get solutions from LLM
-        solutions = self.provider.execute(prompt)
+        with span('generator.solutions'):
+            solutions = self._execute(prompt, {})
         
         # Add custom spacing commands for better formatting
-        preamble = """% Custom spacing for limit notation
-\\def\\limit#1{\\lim\\limits_{#1}\\;}
-\\def\\infinity{\\infty}
-
-% Better fraction spacing
-\\setlength{\\jot}{12pt}
-\\setlength{\\arraycolsep}{2pt}
+        return SOLUTIONS_PREAMBLE + "\n" + solutions
 
-% Better display math spacing
-\\setlength{\\abovedisplayskip}{12pt}
-\\setlength{\\belowdisplayskip}{12pt}
-\\setlength{\\abovedisplayshortskip}{12pt}
-\\setlength{\\belowdisplayshortskip}{12pt}
-"""
-        
-        return preamble + "\n" + solutions
-
-    def _create_latex_document(self, content: str, title: str) -> str:
+    def latex_document(self, content: str, title: str) -> str:
         """Create a complete LaTeX document with the given content."""
         return f"""\\documentclass{{article}}
 \\usepackage{{amsmath}}
@@ -102,6 +132,49 @@ Problems to solve:
 \\end{{document}}
 """
 
+    def generate_set(self, template_file: str, difficulty: str = 'same',
+                     num_problems: int = 5) -> Tuple[str, str]:
+        """
+        Generate the problems and solutions of a set, without compiling them.
+
+        Returns:
+            Tuple[str, str]: The problem and solution LaTeX documents
+        """
+        problems = self.generate_problems(template_file, difficulty, num_problems)
+        problems_latex = self.latex_document(problems, "Problems")
+        solutions = self.generate_solutions(problems)
+        solutions_latex = self.latex_document(solutions, "Solutions")
+        return problems_latex, solutions_latex
+
+    def compile_set(self, problems_latex: str, solutions_latex: str,
+                    output_dir: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Compile the problem and solution documents of a set.
+
+        With output_dir, the LaTeX sources are saved there as problems.tex and
+        solutions.tex and compiled to problems.pdf and solutions.pdf next to them.
+
+        Returns:
+            Tuple[str, str]: Paths to the problem and solution PDFs
+        """
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            pdfs = []
+            for name, latex in (('problems', problems_latex), ('solutions', solutions_latex)):
+                tex_file = os.path.join(output_dir, f"{name}.tex")
+                with open(tex_file, 'w') as f:
+                    f.write(latex)
+                pdfs.append(self.latex_compiler.compile_to_pdf(tex_file, output_dir))
+            return pdfs[0], pdfs[1]
+
+        pdfs = []
+        for latex in (problems_latex, solutions_latex):
+            with tempfile.NamedTemporaryFile(suffix='.tex', mode='w') as temp:
+                temp.write(latex)
+                temp.flush()
+                pdfs.append(self.latex_compiler.compile_to_pdf(temp.name))
+        return pdfs[0], pdfs[1]
+
     def create_problem_set(self, template_file: str, 
                           output_dir: Optional[str] = None,
                           difficulty: str = 'same',
@@ -119,38 +192,6 @@ Problems to solve:
             Tuple[str, str, str, str]: Paths to the generated problem and solution PDFs,
                                      and their corresponding LaTeX content
         """
-        # Generate problems with specified difficulty
-        problems = self.generate_problems(template_file, difficulty, num_problems)
-        problems_latex = self._create_latex_document(problems, "Problems")
-        
-        # Generate solutions
-        solutions = self.generate_solutions(problems)
-        solutions_latex = self._create_latex_document(solutions, "Solutions")
-        
-        # Create output directory if needed
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-        
-        # Generate problem PDF
-        with tempfile.NamedTemporaryFile(suffix='.tex', mode='w') as temp:
-            temp.write(problems_latex)
-            temp.flush()
-            problems_pdf = self.latex_compiler.compile_to_pdf(temp.name, output_dir)
-            
-        # Generate solutions PDF
-        with tempfile.NamedTemporaryFile(suffix='.tex', mode='w') as temp:
-            temp.write(solutions_latex)
-            temp.flush()
-            solutions_pdf = self.latex_compiler.compile_to_pdf(temp.name, output_dir)
-            
-        # Save LaTeX source if output_dir is specified
-        if output_dir:
-            problems_tex = os.path.join(output_dir, "problems.tex")
-            solutions_tex = os.path.join(output_dir, "solutions.tex")
-            
-            with open(problems_tex, 'w') as f:
-                f.write(problems_latex)
-            with open(solutions_tex, 'w') as f:
-                f.write(solutions_latex)
-            
+        problems_latex, solutions_latex = self.generate_set(template_file, difficulty, num_problems)
+        problems_pdf, solutions_pdf = self.compile_set(problems_latex, solutions_latex, output_dir)
         return problems_pdf, solutions_pdf, problems_latex, solutions_latex
@@ -0,0 +1,258 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+_active_profile: contextvars.ContextVar[Optional['Profile']] = contextvars.ContextVar('active_profile', default=None)
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _short_path(filename: str) -> str:
+    """Shorten a source path to something readable in a flamegraph frame."""
+    if filename.startswith(_REPO_ROOT + os.sep):
+        return os.path.relpath(filename, _REPO_ROOT)
+    parts = filename.split(os.sep)
+    if 'site-packages' in parts:
+        return '/'.join(parts[parts.index('site-packages') + 1:])
+    return '/'.join(parts[-2:])
+
+class Profile:
+    """Folded stack samples of one request and the threads working for it.
+
+    Args:
+        name: Label for the profile, e.g. the request method and path
+        **metadata: Extra fields stored alongside the samples
+    """
+
+    def __init__(self, name: str, **metadata):
+        self.id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.metadata = metadata
+        self.samples: Counter = Counter()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def add_thread(self, ident: int, label: str) -> None:
+        with self._lock:
+            self._threads[ident] = label
+
+    def remove_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.pop(ident, None)
+
+    def threads(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._threads)
+
+    def folded(self) -> str:
+        """Render the samples in the folded format read by flamegraph.pl and speedscope."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'samples': sum(self.samples.values()),
+            **self.metadata
+        }
+
+class SamplingProfiler:
+    """Sample the stacks of registered threads from a background thread.
+
+    The sampler thread only runs while at least one profile is active, so
+    there is no cost when profiling is off.
+
+    Args:
+        interval: Seconds between samples
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._profiles: List[Profile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict = {}
+
+    def start(self, profile: Profile) -> contextvars.Token:
+        """
+        Start sampling the current thread into a profile and make it the active one.
+
+        Returns:
+            The token to pass to stop
+        """
+        profile.add_thread(threading.get_ident(), threading.current_thread().name)
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+        return _active_profile.set(profile)
+
+    def stop(self, profile: Profile, token: Optional[contextvars.Token] = None) -> Profile:
+        """Stop sampling a profile started with start."""
+        with self._lock:
+            if profile in self._profiles:
+                self._profiles.remove(profile)
+        profile.duration = time.perf_counter() - profile.start
+        if token is not None:
+            try:
+                _active_profile.reset(token)
+            except (ValueError, RuntimeError):
+                # Streamed responses can finish in a different context than they started
+                pass
+        return profile
+
+    @contextmanager
+    def profile(self, name: str, **metadata) -> Iterator[Profile]:
+        """Profile the enclosed block, including threads that join it with propagate."""
+        current = Profile(name, **metadata)
+        token = self.start(current)
+        try:
+            yield current
+        finally:
+            self.stop(current, token)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+            frames = sys._current_frames()
+            for profile in profiles:
+                for ident, thread_label in profile.threads().items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.samples[self._fold(thread_label, frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _fold(self, thread_label: str, frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+                self._labels[code] = label
+            stack.append(label)
+            frame = frame.f_back
+        stack.append(thread_label.replace(';', ','))
+        return ';'.join(reversed(stack))
+
+def active_profile() -> Optional[Profile]:
+    """Return the profile the current context is being sampled into, if any."""
+    return _active_profile.get()
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Wrap a function handed to a worker thread so it runs in the caller's context.
+
+    The worker is sampled into the caller's active profile while the function
+    runs, and spans it opens nest under the caller's span.
+
+    Args:
+        fn: Function to run on another thread
+
+    Returns:
+        A callable for Thread(target=...) or an executor
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(_run_attached, fn, *args, **kwargs)
+
+    return run
+
+def _run_attached(fn: Callable, *args, **kwargs):
+    profile = _active_profile.get()
+    if profile is None:
+        return fn(*args, **kwargs)
+    ident = threading.get_ident()
+    profile.add_thread(ident, threading.current_thread().name)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profile.remove_thread(ident)
+
+class ProfileStore:
+    """Keep the most recent profiles on disk as folded stacks with a JSON sidecar.
+
+    Args:
+        directory: Where profiles are written
+        max_profiles: Number of profiles kept; older ones are deleted
+    """
+
+    def __init__(self, directory: str, max_profiles: int = 100):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def _path(self, profile_id: str, extension: str) -> str:
+        if not profile_id or os.sep in profile_id or profile_id.startswith('.'):
+            raise ValueError(f"Invalid profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, profile: Profile) -> str:
+        """
+        Write a finished profile and prune the oldest beyond the limit.
+
+        Returns:
+            Path of the folded stack file
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(profile.id, 'folded')
+        with open(path, 'w') as f:
+            f.write(profile.folded())
+        with open(self._path(profile.id, 'json'), 'w') as f:
+            json.dump(profile.to_dict(), f)
+        self.prune()
+        return path
+
+    def list(self) -> List[Dict]:
+        """Return the metadata of stored profiles, newest first."""
+        profiles = []
+        for profile_id in self._ids():
+            try:
+                with open(self._path(profile_id, 'json')) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def get(self, profile_id: str) -> Optional[str]:
+        """Return the path of a stored profile's folded stacks, if it exists."""
+        try:
+            path = self._path(profile_id, 'folded')
+        except ValueError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def prune(self) -> int:
+        """Delete the oldest profiles beyond max_profiles, returning how many were removed."""
+        removed = 0
+        for profile_id in self._ids()[self.max_profiles:]:
+            for extension in ('folded', 'json'):
+                try:
+                    os.remove(self._path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        return removed
+
+    def _ids(self) -> List[str]:
+        # Ids start with a UTC timestamp, so they sort newest first in reverse
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name[:-len('.folded')] for name in os.listdir(self.directory)
+                       if name.endswith('.folded')), reverse=True)
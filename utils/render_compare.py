@@ -0,0 +1,197 @@
+import multiprocessing
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# Verdicts
+MATCH = 'match'
+MISMATCH = 'mismatch'
+AMBIGUOUS = 'ambiguous'
+
+# Low resolution is enough to see whether the same content is on the page
+DEFAULT_DPI = 50
+# Side of the square pages are scaled to before comparing
+COMPARE_SIZE = 64
+# Share of a page's ink below which marks apart from the content are not cropped to
+SPECK_SHARE = 0.02
+
+_WORD = re.compile(r'\w+')
+
+class PageComparison:
+    """How closely one rendered page matches the original.
+
+    Args:
+        page: Page number, from 1
+        visual: Correlation of the pages' ink, from 0 to 1
+        text: Overlap of the pages' words, or None if either has no text layer
+        verdict: MATCH, MISMATCH or AMBIGUOUS
+    """
+
+    def __init__(self, page: int, visual: float, text: Optional[float], verdict: str):
+        self.page = page
+        self.visual = visual
+        self.text = text
+        self.verdict = verdict
+        self.checked_by_llm = False
+
+    @property
+    def score(self) -> float:
+        """Visual similarity, averaged with the text overlap when there is one."""
+        return self.visual if self.text is None else (self.visual + self.text) / 2
+
+    def to_dict(self) -> Dict:
+        return {'page': self.page, 'visual': round(self.visual, 3),
+                'text': None if self.text is None else round(self.text, 3), 'score': round(self.score, 3),
+                'verdict': self.verdict, 'checked_by_llm': self.checked_by_llm}
+
+class ComparisonReport:
+    """Page by page comparison of an original document with its rendered conversion."""
+
+    def __init__(self, pages: List[PageComparison]):
+        self.pages = pages
+
+    @property
+    def valid(self) -> bool:
+        return bool(self.pages) and all(page.verdict == MATCH for page in self.pages)
+
+    def ambiguous(self) -> List[PageComparison]:
+        return [page for page in self.pages if page.verdict == AMBIGUOUS]
+
+    def to_dict(self) -> Dict:
+        return {'valid': self.valid, 'pages': [page.to_dict() for page in self.pages]}
+
+def _is_pdf(path: str) -> bool:
+    return path.lower().endswith('.pdf')
+
+def page_count(path: str) -> int:
+    """Return the pages of a PDF; images are a single page."""
+    if not _is_pdf(path):
+        return 1
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+def render_page(path: str, index: int, dpi: int = DEFAULT_DPI):
+    """
+    Rasterize one page of a PDF or image.
+
+    Returns:
+        Tuple of the page as a PIL image and its text layer, None for images
+        and scans without one
+    """
+    from PIL import Image
+    if not _is_pdf(path):
+        with Image.open(path) as image:
+            return image.convert('RGB'), None
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        page = pdf[index]
+        image = page.render(scale=dpi / 72).to_pil()
+        text = page.get_textpage().get_text_range()
+        return image, text if text.strip() else None
+    finally:
+        pdf.close()
+
+def _span(profile: List[int]) -> Tuple[int, int]:
+    """Extent of the ink in a row or column profile, leaving out faint specks apart from the rest."""
+    gap = max(2, len(profile) // 50)
+    runs: List[List[int]] = []  # start, end and ink of each stretch of ink
+    for position, ink in enumerate(profile):
+        if not ink:
+            continue
+        if runs and position - runs[-1][1] < gap:
+            runs[-1][1] = position + 1
+            runs[-1][2] += ink
+        else:
+            runs.append([position, position + 1, ink])
+    total = sum(run[2] for run in runs)
+    while len(runs) > 1 and runs[0][2] < SPECK_SHARE * total:
+        runs.pop(0)
+    while len(runs) > 1 and runs[-1][2] < SPECK_SHARE * total:
+        runs.pop()
+    return runs[0][0], runs[-1][1]
+
+def _ink(image):
+    """Grayscale page cropped to its ink, blurred and scaled to COMPARE_SIZE."""
+    from PIL import Image, ImageFilter, ImageOps
+    gray = ImageOps.invert(image.convert('L'))
+    mask = gray.point(lambda value: 255 if value > 64 else 0)
+    if mask.getbbox() is None:
+        return None
+    # Crop to the content so margins and paper size do not count, leaving
+    # out the specks scans have along their edges
+    width, height = mask.size
+    left, right = _span(list(mask.resize((width, 1), Image.BOX).tobytes()))
+    top, bottom = _span(list(mask.resize((1, height), Image.BOX).tobytes()))
+    gray = gray.crop((left, top, right, bottom)).resize((COMPARE_SIZE, COMPARE_SIZE), Image.BOX)
+    # Blurring forgives small differences in fonts and line breaks
+    return gray.filter(ImageFilter.GaussianBlur(2))
+
+def visual_similarity(original, rendered) -> float:
+    """Correlation of two pages' ink, from 0 (unrelated) to 1 (identical)."""
+    a, b = _ink(original), _ink(rendered)
+    if a is None or b is None:
+        return 1.0 if a is None and b is None else 0.0
+    xs, ys = list(a.tobytes()), list(b.tobytes())
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    spread = (sum((x - mean_x) ** 2 for x in xs) * sum((y - mean_y) ** 2 for y in ys)) ** 0.5
+    return max(covariance / spread, 0.0) if spread else float(xs == ys)
+
+def text_overlap(original: Optional[str], rendered: Optional[str]) -> Optional[float]:
+    """Share of words two pages have in common, counting repeats; None without both text layers."""
+    if original is None or rendered is None:
+        return None
+    a, b = Counter(_WORD.findall(original.lower())), Counter(_WORD.findall(rendered.lower()))
+    total = sum((a | b).values())
+    return sum((a & b).values()) / total if total else 1.0
+
+def compare_page(original: str, rendered: str, index: int, dpi: int = DEFAULT_DPI) -> Tuple[float, Optional[float]]:
+    """Compare page index of two documents. Runs in a worker process."""
+    original_image, original_text = render_page(original, index, dpi)
+    rendered_image, rendered_text = render_page(rendered, index, dpi)
+    return visual_similarity(original_image, rendered_image), text_overlap(original_text, rendered_text)
+
+def compare_documents(original: str, rendered: str, dpi: int = DEFAULT_DPI, accept: float = 0.9,
+                      reject: float = 0.6, workers: int = 4) -> ComparisonReport:
+    """
+    Compare an original PDF or image with the PDF compiled from its conversion, page by page.
+
+    Pages are rasterized and scored in parallel worker processes (PDFium is
+    not thread-safe). Pages only one of the documents has count as
+    mismatches.
+
+    Args:
+        original: The document that was converted
+        rendered: The compiled conversion
+        dpi: Resolution pages are rasterized at
+        accept: Score from which a page matches
+        reject: Score up to which a page does not match; pages in between are ambiguous
+        workers: Most pages compared at once
+
+    Returns:
+        The verdict on each page
+    """
+    original_pages, rendered_pages = page_count(original), page_count(rendered)
+    shared = min(original_pages, rendered_pages)
+    if shared <= 1:
+        scores = [compare_page(original, rendered, 0, dpi)] if shared else []
+    else:
+        # Spawned, not forked: the web process runs threads
+        with ProcessPoolExecutor(min(workers, shared), mp_context=multiprocessing.get_context('spawn')) as pool:
+            scores = list(pool.map(compare_page, [original] * shared, [rendered] * shared, range(shared),
+                                   [dpi] * shared))
+
+    pages = []
+    for index, (visual, text) in enumerate(scores):
+        page = PageComparison(index + 1, visual, text, AMBIGUOUS)
+        page.verdict = MATCH if page.score >= accept else MISMATCH if page.score <= reject else AMBIGUOUS
+        pages.append(page)
+    for index in range(shared, max(original_pages, rendered_pages)):
+        pages.append(PageComparison(index + 1, 0.0, None, MISMATCH))
+    return ComparisonReport(pages)
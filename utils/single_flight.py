@@ -0,0 +1,162 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from utils.cancellation import CancelledError, CancelToken
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Only used by do_shared
+        self.token = CancelToken()
+        self.participants = 0
+        self.listeners: List[Callable] = []
+        self.waiters: List[threading.Event] = []
+        self.last_event: Optional[tuple] = None
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait for it and receive the same result or exception.
+    Nothing is cached once the call has finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) unless a call with the same key is in flight.
+
+        Args:
+            key: Identifies calls that may share a result
+            fn: Function to run
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Check whether a call with the key is currently running."""
+        with self._lock:
+            return key in self._calls
+
+    def do_shared(self, key: Hashable, fn: Callable[[Callable, CancelToken], Any],
+                  listener: Optional[Callable] = None,
+                  cancel_token: Optional[CancelToken] = None) -> Tuple[Any, bool]:
+        """
+        Run long, followable work once for every concurrent caller with the same key.
+
+        Unlike do(), the work runs on its own thread and every caller,
+        including the first, just waits for it. That lets any caller leave:
+        when a caller's cancel_token is cancelled it stops waiting, and the
+        work itself is cancelled once no caller is left.
+
+        Args:
+            key: Identifies calls that may share a result
+            fn: Called as fn(report, token). report(*event) is passed on to
+                every attached caller's listener; token is cancelled when all
+                callers have left
+            listener: Receives this caller's copy of reported events, starting
+                with the latest one when joining a running call
+            cancel_token: Cancels this caller's interest in the result
+
+        Returns:
+            Tuple of the result and whether this caller joined a call already in flight
+
+        Raises:
+            CancelledError: If cancel_token was cancelled before the work finished
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            # A call every caller has left is winding down; start afresh rather than share its cancellation
+            leader = call is None or call.token.cancelled
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            call.participants += 1
+            if listener:
+                call.listeners.append(listener)
+            last_event = call.last_event
+            wake = threading.Event()
+            call.waiters.append(wake)
+
+        if listener and last_event and not leader:
+            listener(*last_event)
+
+        if leader:
+            def report(*event):
+                with self._lock:
+                    call.last_event = event
+                    listeners = list(call.listeners)
+                for each in listeners:
+                    each(*event)
+
+            def run():
+                try:
+                    call.result = fn(report, call.token)
+                except BaseException as e:
+                    call.error = e
+                finally:
+                    with self._lock:
+                        # An abandoned call may already have been replaced by a new one
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                        waiters = list(call.waiters)
+                    call.done.set()
+                    for waiter in waiters:
+                        waiter.set()
+
+            threading.Thread(target=run, name='single-flight', daemon=True).start()
+
+        unregister = cancel_token.on_cancel(wake.set) if cancel_token else None
+        try:
+            wake.wait()
+        finally:
+            if unregister:
+                unregister()
+
+        if not call.done.is_set():
+            # This caller was cancelled; the last one to leave cancels the work
+            with self._lock:
+                call.participants -= 1
+                if listener in call.listeners:
+                    call.listeners.remove(listener)
+                abandoned = call.participants == 0
+                if abandoned and self._calls.get(key) is call:
+                    # Callers arriving while the work winds down start a new call
+                    del self._calls[key]
+            if abandoned:
+                call.token.cancel('Every request waiting for this result was cancelled')
+            raise CancelledError(cancel_token.reason)
+
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
@@ -0,0 +1,236 @@
+import fcntl
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from models.database import db, ProblemSet, GeneratedSet
+from utils.blob_store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+def new_storage_dir(root: str, category: str) -> str:
+    """
+    Create a fresh directory under root/category.
+
+    Directories are spread over two levels of hash-prefixed subdirectories
+    (root/category/ab/cd/abcd...) so no single directory accumulates
+    hundreds of thousands of entries.
+
+    Args:
+        root: Storage root, normally UPLOAD_FOLDER
+        category: Kind of content, e.g. 'originals' or 'generated'
+
+    Returns:
+        str: Path to the new, empty directory
+    """
+    token = uuid.uuid4().hex
+    path = os.path.join(root, category, token[:2], token[2:4], token)
+    os.makedirs(path)
+    return path
+
+def storage_usage(user_id: int) -> int:
+    """Return the bytes a user's problem sets and generated sets account for.
+
+    Sets still waiting in the pre-generation pool are not charged to anyone.
+    """
+    coalesce = db.func.coalesce
+    generated = db.session.query(db.func.sum(
+        coalesce(GeneratedSet.problems_pdf_size, 0) + coalesce(GeneratedSet.solutions_pdf_size, 0) +
+        GeneratedSet.problems_latex_size + GeneratedSet.solutions_latex_size
+    )).join(ProblemSet).filter(ProblemSet.user_id == user_id, GeneratedSet.pooled.is_(False)).scalar()
+    originals = db.session.query(db.func.sum(
+        coalesce(ProblemSet.original_pdf_size, 0) + coalesce(ProblemSet.latex_template_size, 0)
+    )).filter(ProblemSet.user_id == user_id).scalar()
+    return (generated or 0) + (originals or 0)
+
+def evict_pdf(generated_set: GeneratedSet, kind: str) -> int:
+    """
+    Delete a compiled PDF, keeping its LaTeX so it can be rebuilt on demand.
+
+    Args:
+        generated_set: Generated set owning the PDF
+        kind: 'problems' or 'solutions'
+
+    Returns:
+        int: Bytes reclaimed
+    """
+    path = getattr(generated_set, f'{kind}_pdf_path')
+    reclaimed = 0
+    try:
+        reclaimed = os.path.getsize(path)
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    setattr(generated_set, f'{kind}_pdf_hash', None)
+    setattr(generated_set, f'{kind}_pdf_size', None)
+    return reclaimed
+
+class StorageGarbageCollector:
+    """Reclaim disk space in the upload folder and the blob store.
+
+    A run removes files and blobs no ProblemSet or GeneratedSet row refers
+    to (once they are older than the grace period, so in-progress work is
+    left alone), drops compiled PDFs past the retention period, and evicts
+    each over-quota user's oldest compiled PDFs. Evicted PDFs keep their
+    LaTeX and are recompiled on the next download.
+    """
+
+    def __init__(self, upload_folder: str, blob_store: Optional[BlobStore] = None,
+                 grace_period: int = 3600, retention_days: int = 0, user_quota_bytes: int = 0):
+        self.upload_folder = os.path.abspath(upload_folder)
+        self.blob_store = blob_store
+        self.grace_period = grace_period
+        self.retention_days = retention_days
+        self.user_quota_bytes = user_quota_bytes
+
+    def run(self) -> Dict[str, int]:
+        """
+        Run one collection pass. Must be called inside an app context.
+
+        Returns:
+            Dict with counts of removed files, blobs and evicted PDFs and the
+            total bytes reclaimed
+        """
+        report = {
+            'orphaned_files': 0,
+            'orphaned_blobs': 0,
+            'expired_pdfs': 0,
+            'quota_evicted_pdfs': 0,
+            'bytes_reclaimed': 0
+        }
+        self._expire_pdfs(report)
+        self._enforce_quotas(report)
+        self._remove_orphaned_files(report)
+        if self.blob_store is not None:
+            self._remove_orphaned_blobs(report)
+        logger.info(f"Storage GC finished: {report}")
+        return report
+
+    def _referenced_paths(self) -> Set[str]:
+        paths = set()
+        for (path,) in db.session.query(ProblemSet.original_pdf_path).filter(
+                ProblemSet.original_pdf_path.isnot(None)).yield_per(1000):
+            paths.add(os.path.abspath(path))
+        for problems_pdf, solutions_pdf in db.session.query(
+                GeneratedSet.problems_pdf_path, GeneratedSet.solutions_pdf_path).yield_per(1000):
+            paths.add(os.path.abspath(problems_pdf))
+            paths.add(os.path.abspath(solutions_pdf))
+        return paths
+
+    def _referenced_blobs(self) -> Set[str]:
+        digests = set()
+        for (digest,) in db.session.query(ProblemSet.latex_template_hash).filter(
+                ProblemSet.latex_template_hash.isnot(None)).yield_per(1000):
+            digests.add(digest)
+        for problems, solutions in db.session.query(
+                GeneratedSet.problems_latex_hash, GeneratedSet.solutions_latex_hash).yield_per(1000):
+            digests.add(problems)
+            digests.add(solutions)
+        return digests
+
+    def _remove_orphaned_files(self, report: Dict[str, int]) -> None:
+        referenced = self._referenced_paths()
+        cutoff = time.time() - self.grace_period
+        # Directories this pass removed something from; their mtime is fresh
+        # because of us, not because new work is being written to them
+        touched = set()
+
+        for dirpath, dirnames, filenames in os.walk(self.upload_folder, topdown=False):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                # Dotfiles are our own bookkeeping, e.g. the GC lock
+                if path in referenced or filename.startswith('.'):
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                report['orphaned_files'] += 1
+                report['bytes_reclaimed'] += stat.st_size
+                touched.add(dirpath)
+
+            # Prune directories emptied by this or earlier passes
+            if dirpath != self.upload_folder and not os.listdir(dirpath):
+                try:
+                    if dirpath in touched or os.stat(dirpath).st_mtime <= cutoff:
+                        os.rmdir(dirpath)
+                        touched.add(os.path.dirname(dirpath))
+                except OSError:
+                    pass
+
+    def _remove_orphaned_blobs(self, report: Dict[str, int]) -> None:
+        referenced = self._referenced_blobs()
+        cutoff = time.time() - self.grace_period
+        for digest in list(self.blob_store.iter_digests()):
+            if digest in referenced:
+                continue
+            try:
+                if self.blob_store.modified_at(digest) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.blob_store.delete(digest)
+            report['orphaned_blobs'] += 1
+
+    def _expire_pdfs(self, report: Dict[str, int]) -> None:
+        if not self.retention_days:
+            return
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        expired = GeneratedSet.query.filter(
+            GeneratedSet.created_at < cutoff,
+            db.or_(GeneratedSet.problems_pdf_hash.isnot(None), GeneratedSet.solutions_pdf_hash.isnot(None))
+        ).all()
+        for generated_set in expired:
+            for kind in ('problems', 'solutions'):
+                if getattr(generated_set, f'{kind}_pdf_hash'):
+                    report['bytes_reclaimed'] += evict_pdf(generated_set, kind)
+                    report['expired_pdfs'] += 1
+        db.session.commit()
+
+    def _enforce_quotas(self, report: Dict[str, int]) -> None:
+        if not self.user_quota_bytes:
+            return
+        for (user_id,) in db.session.query(ProblemSet.user_id).distinct().all():
+            excess = storage_usage(user_id) - self.user_quota_bytes
+            if excess <= 0:
+                continue
+
+            compiled = GeneratedSet.query.join(ProblemSet).filter(
+                ProblemSet.user_id == user_id,
+                GeneratedSet.pooled.is_(False),
+                db.or_(GeneratedSet.problems_pdf_hash.isnot(None), GeneratedSet.solutions_pdf_hash.isnot(None))
+            ).order_by(GeneratedSet.created_at, GeneratedSet.id).all()
+            for generated_set in compiled:
+                if excess <= 0:
+                    break
+                for kind in ('problems', 'solutions'):
+                    size = getattr(generated_set, f'{kind}_pdf_size') or 0
+                    if getattr(generated_set, f'{kind}_pdf_hash'):
+                        report['bytes_reclaimed'] += evict_pdf(generated_set, kind)
+                        report['quota_evicted_pdfs'] += 1
+                        excess -= size
+            db.session.commit()
+
+def run_locked(collector: StorageGarbageCollector, lock_path: str) -> Optional[Dict[str, int]]:
+    """
+    Run the collector unless another process is already running one.
+
+    Returns:
+        The run's report, or None if the lock was held elsewhere
+    """
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        try:
+            return collector.run()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,170 @@
+import struct
+import zlib
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Union
+
+CHUNK_SIZE = 64 * 1024
+
+# General purpose flags: sizes and CRC follow the data (bit 3), UTF-8 names (bit 11)
+FLAGS = 0x0808
+VERSION = 20
+MAX_ZIP_SIZE = 0xFFFFFFFF
+MAX_ZIP_ENTRIES = 0xFFFF
+
+class ZipEntry:
+    """A file to include in a ZipStream.
+
+    Args:
+        name: Path of the file inside the archive
+        size: Size of the content in bytes
+        source: Path to a file on disk, or a callable returning the content bytes
+        modified: Timestamp recorded for the entry
+    """
+
+    def __init__(self, name: str, size: int, source: Union[str, Callable[[], bytes]],
+                 modified: Optional[datetime] = None):
+        self.name = name
+        self.size = size
+        self.source = source
+        self.modified = modified or datetime(1980, 1, 1)
+        self.crc: Optional[int] = None
+
+    def read(self, start: int = 0) -> Iterator[bytes]:
+        """Yield the content from the given offset in bounded chunks."""
+        if callable(self.source):
+            data = self.source()
+            for offset in range(start, len(data), CHUNK_SIZE):
+                yield data[offset:offset + CHUNK_SIZE]
+            return
+        with open(self.source, 'rb') as f:
+            f.seek(start)
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                yield chunk
+
+def _dos_datetime(value: datetime):
+    value = max(value, datetime(1980, 1, 1))
+    dos_time = (value.hour << 11) | (value.minute << 5) | (value.second // 2)
+    dos_date = ((value.year - 1980) << 9) | (value.month << 5) | value.day
+    return dos_time, dos_date
+
+class ZipStream:
+    """Deterministic, uncompressed ZIP archive generated on the fly.
+
+    Every entry is stored without compression, so the exact byte layout and
+    total length are known from the entry sizes alone. That lets the archive
+    be streamed in constant memory from any byte offset, which is what a
+    client needs to resume an interrupted download with a Range request.
+    CRCs are computed while the content streams past, or by re-reading the
+    entry when a resumed download skipped over it.
+    """
+
+    def __init__(self, entries: List[ZipEntry]):
+        if len(entries) > MAX_ZIP_ENTRIES:
+            raise ValueError(f"Too many entries for a ZIP archive: {len(entries)}")
+        self.entries = entries
+
+        # (offset, length, kind, entry index) for every region of the archive
+        self._segments = []
+        offset = 0
+        self._local_offsets = []
+        for index, entry in enumerate(entries):
+            name_length = len(entry.name.encode('utf-8'))
+            self._local_offsets.append(offset)
+            for kind, length in (('header', 30 + name_length), ('data', entry.size), ('descriptor', 16)):
+                self._segments.append((offset, length, kind, index))
+                offset += length
+
+        self._central_offset = offset
+        central_size = sum(46 + len(entry.name.encode('utf-8')) for entry in entries)
+        self._segments.append((offset, central_size, 'central', None))
+        offset += central_size
+        self._segments.append((offset, 22, 'end', None))
+        self.total_size = offset + 22
+
+        if self.total_size > MAX_ZIP_SIZE:
+            raise ValueError(f"Archive too large without ZIP64: {self.total_size} bytes")
+
+    def _crc(self, index: int) -> int:
+        entry = self.entries[index]
+        if entry.crc is None:
+            crc = 0
+            for chunk in entry.read():
+                crc = zlib.crc32(chunk, crc)
+            entry.crc = crc
+        return entry.crc
+
+    def _local_header(self, index: int) -> bytes:
+        entry = self.entries[index]
+        name = entry.name.encode('utf-8')
+        dos_time, dos_date = _dos_datetime(entry.modified)
+        # CRC and sizes are left zero here and written in the data descriptor
+        return struct.pack('<IHHHHHIIIHH', 0x04034b50, VERSION, FLAGS, 0, dos_time, dos_date,
+                           0, 0, 0, len(name), 0) + name
+
+    def _descriptor(self, index: int) -> bytes:
+        entry = self.entries[index]
+        return struct.pack('<IIII', 0x08074b50, self._crc(index), entry.size, entry.size)
+
+    def _central_directory(self) -> bytes:
+        records = []
+        for index, entry in enumerate(self.entries):
+            name = entry.name.encode('utf-8')
+            dos_time, dos_date = _dos_datetime(entry.modified)
+            records.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, VERSION, VERSION, FLAGS, 0, dos_time, dos_date,
+                self._crc(index), entry.size, entry.size, len(name), 0, 0, 0, 0, 0,
+                self._local_offsets[index]
+            ) + name)
+        return b''.join(records)
+
+    def _end_record(self) -> bytes:
+        count = len(self.entries)
+        central_size = self._segments[-1][0] - self._central_offset
+        return struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count,
+                           central_size, self._central_offset, 0)
+
+    def _segment_bytes(self, kind: str, index: Optional[int], skip: int) -> Iterator[bytes]:
+        if kind == 'data':
+            entry = self.entries[index]
+            if skip == 0 and entry.crc is None:
+                crc = 0
+                for chunk in entry.read():
+                    crc = zlib.crc32(chunk, crc)
+                    yield chunk
+                entry.crc = crc
+            else:
+                yield from entry.read(skip)
+            return
+
+        if kind == 'header':
+            data = self._local_header(index)
+        elif kind == 'descriptor':
+            data = self._descriptor(index)
+        elif kind == 'central':
+            data = self._central_directory()
+        else:
+            data = self._end_record()
+        yield data[skip:]
+
+    def iter_bytes(self, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Yield the archive bytes in [start, stop).
+
+        Args:
+            start: First byte offset to produce
+            stop: Offset to stop before (default: end of archive)
+        """
+        stop = self.total_size if stop is None else min(stop, self.total_size)
+        for offset, length, kind, index in self._segments:
+            if offset + length <= start or length == 0:
+                continue
+            if offset >= stop:
+                break
+            skip = max(0, start - offset)
+            remaining = min(offset + length, stop) - (offset + skip)
+            for chunk in self._segment_bytes(kind, index, skip):
+                if remaining <= 0:
+                    break
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+                yield chunk
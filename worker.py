@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Run queued generation and conversion jobs outside the web process.
+
+Start as many workers as needed, on any machine that can reach the
+database and the upload folder:
+
+    GENERATION_MODE=queue python worker.py --concurrency 4
+
+Each worker claims jobs from the jobs table, renews its lease while a job
+runs and, from a thread of its own, returns jobs abandoned by dead workers
+to the queue.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Iterable, Optional
+
+from flask import Flask, current_app
+
+from api.service import convert_pdf, copy_generated_set, run_generation
+from models.database import db, GeneratedSet, Job, JobKind, ProblemSet
+from utils import job_queue
+from utils.cancellation import CancelToken, CancelledError
+from utils.metrics import span
+from utils.storage import new_storage_dir
+
+logger = logging.getLogger('worker')
+
+def handle_generate(job: Job, progress: Callable, cancel_token: CancelToken) -> Dict:
+    """Generate a new set from the job's problem set."""
+    from app import get_answer_verifier, get_duplicate_check, get_latex_compiler, get_provider
+    problem_set = db.session.get(ProblemSet, job.problem_set_id)
+    if not problem_set or not problem_set.latex_template_hash:
+        raise LookupError(f"Problem set {job.problem_set_id} has no LaTeX template")
+    payload = job.payload
+    generated_set = run_generation(
+        problem_set, payload['provider'], payload['difficulty'], payload['num_problems'],
+        get_provider(payload['provider']), get_latex_compiler(),
+        output_dir=new_storage_dir(current_app.config['UPLOAD_FOLDER'], 'generated'),
+        lazy_compile=current_app.config['LAZY_PDF_COMPILE'],
+        progress=progress,
+        cancel_token=cancel_token,
+        mode=payload.get('mode', 'generate'),
+        query=payload.get('query'),
+        duplicate_check=get_duplicate_check(),
+        answer_verifier=get_answer_verifier()
+    )
+    return {'generated_set_id': generated_set.id}
+
+def handle_convert(job: Job, progress: Callable, cancel_token: CancelToken) -> Dict:
+    """Extract the LaTeX template of an uploaded problem set."""
+    from app import get_provider
+    problem_set = db.session.get(ProblemSet, job.problem_set_id)
+    if not problem_set or not problem_set.original_pdf_path:
+        raise LookupError(f"Problem set {job.problem_set_id} has no uploaded PDF")
+    problem_set.latex_template = convert_pdf(problem_set.original_pdf_path, get_provider('claude'), progress,
+                                             cancel_token)
+    db.session.commit()
+    return {'problem_set_id': problem_set.id}
+
+def share_result(job: Job, member: Job, result: Dict) -> Dict:
+    """Turn the result of a shared run into the result of another job that joined it."""
+    if job.kind != JobKind.GENERATE or member.problem_set_id == job.problem_set_id:
+        return {**result, 'shared': True}
+    generated_set = copy_generated_set(
+        db.session.get(GeneratedSet, result['generated_set_id']),
+        db.session.get(ProblemSet, member.problem_set_id),
+        new_storage_dir(current_app.config['UPLOAD_FOLDER'], 'generated')
+    )
+    return {'generated_set_id': generated_set.id, 'shared': True}
+
+HANDLERS = {
+    JobKind.GENERATE: handle_generate,
+    JobKind.CONVERT: handle_convert
+}
+
+# Failures another attempt will not fix, such as a deleted problem set or a missing API key
+PERMANENT_ERRORS = (LookupError, ValueError)
+
+class JobWorker:
+    """Claim jobs and run them on a fixed number of threads.
+
+    Args:
+        app: Flask app providing the configuration and database
+        concurrency: Jobs run at the same time
+        kinds: Job kinds to handle (default: all)
+        lease_seconds: Lease taken on each claimed job
+        heartbeat_interval: Seconds between lease renewals while a job runs
+        poll_interval: Seconds to wait when the queue is empty
+        name: Prefix of the lease owner ids (default: host:pid)
+        refill: Called between jobs, at most every refill_interval seconds,
+            while the queue is empty; used to top up the pre-generation pool
+        refill_interval: Seconds between refill calls
+        unwatched_timeout: Seconds after the client last polled a job before
+            the job is cancelled (0: never)
+    """
+
+    def __init__(self, app: Flask, concurrency: int = 2, kinds: Optional[Iterable[JobKind]] = None,
+                 lease_seconds: int = 60, heartbeat_interval: float = 5, poll_interval: float = 1.0,
+                 name: Optional[str] = None, refill: Optional[Callable[[], object]] = None,
+                 refill_interval: float = 60, unwatched_timeout: float = 0):
+        self.app = app
+        self.concurrency = concurrency
+        self.kinds = list(kinds) if kinds else None
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.refill = refill
+        self.refill_interval = refill_interval
+        self.unwatched_timeout = unwatched_timeout
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        """Run until stop() is called, then let running jobs finish."""
+        threads = [threading.Thread(target=self._loop, args=(slot,), name=f'job-worker-{slot}')
+                   for slot in range(self.concurrency)]
+        # Sweeping must not wait for a slot to be free, since every slot may be running a long job
+        threads.append(threading.Thread(target=self._sweep_loop, name='job-worker-sweep'))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _sweep_loop(self) -> None:
+        # Return abandoned jobs once per lease, starting with those left by a previous run
+        next_sweep = time.monotonic()
+        while not self._stopping.wait(max(0.0, next_sweep - time.monotonic())):
+            next_sweep = time.monotonic() + self.lease_seconds
+            try:
+                with self.app.app_context():
+                    job_queue.release_stale()
+                    if self.unwatched_timeout:
+                        # Queued jobs whose clients left are not worth starting
+                        job_queue.cancel_unwatched(self.unwatched_timeout)
+            except Exception as e:
+                logger.error(f"Error releasing stale jobs: {str(e)}")
+
+    def _loop(self, slot: int) -> None:
+        last_refill = 0.0
+        while not self._stopping.is_set():
+            try:
+                job_id = self.run_once(slot)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job_id = None
+            if job_id is None and slot == 0 and self.refill and \
+                    time.monotonic() - last_refill >= self.refill_interval:
+                # Idle time goes to pre-generating sets; the refill yields once jobs are queued
+                last_refill = time.monotonic()
+                try:
+                    self.refill()
+                except Exception as e:
+                    logger.error(f"Error refilling the pool: {str(e)}")
+            if job_id is None:
+                self._stopping.wait(self.poll_interval)
+
+    def run_once(self, slot: int = 0) -> Optional[int]:
+        """
+        Claim one job and run it to completion.
+
+        Returns:
+            The id of the job that ran, or None if the queue was empty
+        """
+        worker_id = f"{self.name}:{slot}"
+        with self.app.app_context():
+            job = job_queue.claim(worker_id, self.lease_seconds, self.kinds)
+            if job is None:
+                return None
+            logger.info(f"{worker_id} running {job.kind.value} job {job.id} (attempt {job.attempts})")
+            self._run(job, worker_id)
+            return job.id
+
+    def _run(self, job: Job, worker_id: str) -> None:
+        job_id = job.id
+        dedup_key = job.dedup_key
+        finished = threading.Event()
+        # Losing the lease means the job was cancelled or handed to another
+        # worker; either way this worker should stop spending on it
+        token = CancelToken()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, dedup_key, worker_id, finished, token),
+                                     name=f'job-heartbeat-{job_id}', daemon=True)
+        heartbeat.start()
+
+        def progress(message: str, percent: Optional[int] = None) -> None:
+            # Progress doubles as a heartbeat from the job's own thread
+            if not job_queue.heartbeat(job_id, worker_id, self.lease_seconds, percent, message, dedup_key):
+                token.cancel('Job cancelled or lease lost')
+                token.check()
+
+        try:
+            with span(f'job.{job.kind.value}', job_id=job_id):
+                result = HANDLERS[job.kind](job, progress, token)
+        except CancelledError as e:
+            finished.set()
+            db.session.rollback()
+            logger.info(f"Job {job_id} stopped: {str(e)}")
+            return
+        except Exception as e:
+            finished.set()
+            db.session.rollback()
+            logger.error(f"Job {job_id} failed: {str(e)}\n{''.join(traceback.format_tb(e.__traceback__))}")
+            for member in job_queue.shared_jobs(job_id, worker_id, dedup_key):
+                job_queue.fail(member.id, worker_id, f"{type(e).__name__}: {str(e)}",
+                               retry=not isinstance(e, PERMANENT_ERRORS))
+            return
+        finished.set()
+        completed = 0
+        for member in job_queue.shared_jobs(job_id, worker_id, dedup_key):
+            member_result = result if member.id == job_id else share_result(job, member, result)
+            completed += job_queue.complete(member.id, worker_id, member_result)
+        if not completed:
+            logger.warning(f"Job {job_id} finished after its lease was lost; another worker may repeat it")
+
+    def _heartbeat(self, job_id: int, dedup_key: Optional[str], worker_id: str, finished: threading.Event,
+                   token: CancelToken) -> None:
+        while not finished.wait(self.heartbeat_interval):
+            try:
+                with self.app.app_context():
+                    if self.unwatched_timeout:
+                        job_queue.cancel_unwatched(self.unwatched_timeout, job_id, worker_id, dedup_key)
+                    # Jobs sharing this run keep it alive until every one of them is cancelled
+                    if not job_queue.heartbeat(job_id, worker_id, self.lease_seconds, dedup_key=dedup_key):
+                        logger.warning(f"{worker_id} lost the lease on job {job_id}, stopping it")
+                        token.cancel('Job cancelled or lease lost')
+                        return
+            except Exception as e:
+                logger.error(f"Heartbeat for job {job_id} failed: {str(e)}")
+
+def setup_args() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Run queued problem generation and PDF conversion jobs'
+    )
+    parser.add_argument('--concurrency', type=int,
+                       help='Jobs to run at once (default: WORKER_CONCURRENCY setting)')
+    parser.add_argument('--kinds', default=','.join(kind.value for kind in JobKind),
+                       help='Comma separated job kinds to handle (default: all)')
+    parser.add_argument('--lease', type=int,
+                       help='Seconds a claimed job stays leased without a heartbeat (default: JOB_LEASE_SECONDS setting)')
+    parser.add_argument('--poll-interval', type=float,
+                       help='Seconds between polls of an empty queue (default: WORKER_POLL_INTERVAL setting)')
+    return parser
+
+def main():
+    args = setup_args().parse_args()
+    from app import app, get_answer_verifier, run_pool_refill
+    try:
+        kinds = [JobKind(kind.strip()) for kind in args.kinds.split(',') if kind.strip()]
+    except ValueError as e:
+        logger.error(f"Error: {str(e)}")
+        return 1
+
+    worker = JobWorker(
+        app,
+        concurrency=args.concurrency or app.config['WORKER_CONCURRENCY'],
+        kinds=kinds,
+        lease_seconds=args.lease or app.config['JOB_LEASE_SECONDS'],
+        heartbeat_interval=app.config['JOB_HEARTBEAT_INTERVAL'],
+        poll_interval=args.poll_interval or app.config['WORKER_POLL_INTERVAL'],
+        refill=run_pool_refill if app.config['POOL_SIZE'] else None,
+        refill_interval=app.config['POOL_REFILL_INTERVAL'],
+        unwatched_timeout=app.config['JOB_UNWATCHED_TIMEOUT']
+    )
+    answer_verifier = get_answer_verifier()
+    if answer_verifier:
+        # Ready before the first generation job needs it
+        answer_verifier.start()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: worker.stop())
+    logger.info(f"Worker {worker.name} started with {worker.concurrency} slots for {', '.join(k.value for k in kinds)}")
+    worker.run()
+    logger.info(f"Worker {worker.name} stopped")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())